@@ -36,6 +36,12 @@ with app.app_context():
     from .database_maintenance import db_maintenance_manager
     from .database_backup import db_backup_manager
     from .database_partitioning import db_partition_manager
+    from .song_counters import song_counters
+    from .version_store import version_store
+    from .pdf_artifact_cache import pdf_artifact_cache
+    from .pdf_job_progress import pdf_job_progress
+    from .audit_pipeline import audit_pipeline
+    from . import song_shares  # Dual-writes song_shares rows when songs are flushed
 
     # Initialize performance managers with app
     db_performance.init_app(app)
@@ -44,6 +50,11 @@ with app.app_context():
     db_maintenance_manager.init_app(app)
     db_backup_manager.init_app(app)
     db_partition_manager.init_app(app)
+    song_counters.init_app(app)
+    version_store.init_app(app)
+    pdf_artifact_cache.init_app(app)
+    pdf_job_progress.init_app(app)
+    audit_pipeline.init_app(app)
 
 # Initialize WebSocket server
 from .websocket_server import websocket_server
@@ -12,6 +12,8 @@ from dataclasses import dataclass, asdict
 from enum import Enum
 from collections import Counter, defaultdict
 
+from .chordpro_parser import SongAST, parse_chordpro, SECTION_START_ALIASES, SECTION_END_ALIASES
+
 
 class SectionType(Enum):
     """Enumeration for song section types"""
@@ -185,16 +187,16 @@ class MusicTheoryAnalyzer:
 
     def parse_chordpro_content(self, content: str) -> Dict[str, Any]:
         """Parse ChordPro content and extract musical information"""
-        lines = content.split('\n')
+        song = parse_chordpro(content)
         
         # Extract metadata
-        title = self._extract_metadata(content, 'title')
-        artist = self._extract_metadata(content, 'artist')
-        key = self._extract_metadata(content, 'key')
+        title = self._extract_metadata(song, 'title')
+        artist = self._extract_metadata(song, 'artist')
+        key = self._extract_metadata(song, 'key')
         
         # Extract chords and structure
-        chords = self._extract_chords(content)
-        sections = self._extract_sections(lines)
+        chords = self._extract_chords(song)
+        sections = self._extract_sections(song)
         
         return {
             'title': title,
@@ -205,76 +207,75 @@ class MusicTheoryAnalyzer:
             'content': content
         }
 
-    def _extract_metadata(self, content: str, field: str) -> Optional[str]:
+    def _as_song(self, content: Any) -> SongAST:
+        """Accept raw content, a list of lines or an already parsed song"""
+        if isinstance(content, SongAST):
+            return content
+        if isinstance(content, (list, tuple)):
+            content = '\n'.join(content)
+        return parse_chordpro(content)
+
+    def _extract_metadata(self, content: Any, field: str) -> Optional[str]:
         """Extract metadata field from ChordPro content"""
-        pattern = rf'\{{{field}:\s*([^}}]+)\}}'
-        match = re.search(pattern, content, re.IGNORECASE)
-        return match.group(1).strip() if match else None
+        field = field.lower()
+        for directive in self._as_song(content).directives:
+            if directive.value and directive.name.lower() == field:
+                return directive.value
+        return None
 
-    def _extract_chords(self, content: str) -> List[str]:
+    def _extract_chords(self, content: Any) -> List[str]:
         """Extract all chords from ChordPro content"""
-        chord_pattern = r'\[([^\]]+)\]'
-        chords = re.findall(chord_pattern, content)
-        return [chord.strip() for chord in chords if chord.strip()]
+        return list(self._as_song(content).chords)
 
-    def _extract_sections(self, lines: List[str]) -> List[SongSection]:
+    def _extract_sections(self, lines: Any) -> List[SongSection]:
         """Extract song sections from ChordPro content"""
+        song = self._as_song(lines)
         sections = []
-        current_section = None
         
-        for i, line in enumerate(lines):
-            line = line.strip()
+        for section in song.sections:
+            chords = []
+            lyrics = []
+            for line in song.section_lines(section):
+                if line.directive is not None:
+                    continue
+                chords.extend(token.name for token in line.chords)
+                text = line.lyrics.strip()
+                if text:
+                    lyrics.append(text)
             
-            # Detect section markers
-            start_match = re.match(r'\{start_of_(\w+)(?:\s*:\s*(\d+))?\}', line, re.IGNORECASE)
-            end_match = re.match(r'\{end_of_(\w+)\}', line, re.IGNORECASE)
-            simple_match = re.match(r'\{(\w+)\}', line, re.IGNORECASE)
-            
-            if start_match:
-                section_type = self._normalize_section_type(start_match.group(1))
-                section_number = int(start_match.group(2)) if start_match.group(2) else None
-                
-                current_section = {
-                    'type': section_type,
-                    'number': section_number,
-                    'start_line': i,
-                    'chords': [],
-                    'lyrics': [],
-                    'confidence': 0.9
-                }
-                
-            elif end_match and current_section:
-                current_section['end_line'] = i
-                sections.append(SongSection(**current_section))
-                current_section = None
-                
-            elif simple_match and not start_match and not end_match:
-                # Simple section reference (like {chorus})
-                section_type = self._normalize_section_type(simple_match.group(1))
-                sections.append(SongSection(
-                    type=section_type,
-                    number=None,
-                    start_line=i,
-                    end_line=i,
-                    chords=[],
-                    lyrics=[],
-                    confidence=0.7
-                ))
-                
-            elif current_section:
-                # Add content to current section
-                chords = re.findall(r'\[([^\]]+)\]', line)
-                current_section['chords'].extend(chords)
-                
-                lyrics = re.sub(r'\[([^\]]+)\]', '', line).strip()
-                if lyrics:
-                    current_section['lyrics'].append(lyrics)
-        
-        # Close any open section
-        if current_section:
-            current_section['end_line'] = len(lines) - 1
-            sections.append(SongSection(**current_section))
+            label = section.label
+            sections.append(SongSection(
+                type=self._normalize_section_type(section.section_type),
+                number=int(label) if label and label.isdigit() else None,
+                start_line=section.start_line,
+                end_line=section.end_line,
+                chords=chords,
+                lyrics=lyrics,
+                confidence=0.9
+            ))
+        
+        # Simple section references (like {chorus})
+        for line in song.lines:
+            directive = line.directive
+            if directive is None or directive.value is not None:
+                continue
+            name = directive.raw
+            if (not re.fullmatch(r'\w+', name)
+                    or name.lower().startswith(('start_of_', 'end_of_'))
+                    or name.lower() in SECTION_START_ALIASES
+                    or name.lower() in SECTION_END_ALIASES):
+                continue
+            sections.append(SongSection(
+                type=self._normalize_section_type(name),
+                number=None,
+                start_line=line.index,
+                end_line=line.index,
+                chords=[],
+                lyrics=[],
+                confidence=0.7
+            ))
         
+        sections.sort(key=lambda section: section.start_line)
         return sections
 
     def _normalize_section_type(self, section_name: str) -> SectionType:
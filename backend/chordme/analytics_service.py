@@ -261,13 +261,7 @@ class PerformanceAnalyticsService:
         # Apply user filter if specified
         if user_id:
             # Filter to songs user can access (owned by user or public/shared)
-            query = query.filter(
-                or_(
-                    Song.user_id == user_id,
-                    Song.share_settings == 'public',
-                    Song.shared_with.contains([user_id])
-                )
-            )
+            query = query.filter(Song.accessible_to(user_id))
         
         # Group and order by performance count
         popular_songs = query.group_by(
@@ -775,13 +769,7 @@ class PerformanceAnalyticsService:
     def _export_songs_data(user_id: int) -> List[Dict[str, Any]]:
         """Export user's song analytics data."""
         # Get all songs the user has access to
-        songs = Song.query.filter(
-            or_(
-                Song.user_id == user_id,
-                Song.share_settings == 'public',
-                Song.shared_with.contains([user_id])
-            )
-        ).all()
+        songs = Song.query.filter(Song.accessible_to(user_id)).all()
         
         songs_data = []
         for song in songs:
@@ -1,13 +1,16 @@
 from . import app, db, __version__
-from .models import User, Song, Chord, SongSection, SongVersion
+from .models import User, Song, SongShare, Chord, SongSection, SongVersion
 from .utils import validate_email, validate_password, create_error_response, create_success_response, generate_jwt_token, sanitize_input, auth_required, validate_positive_integer, validate_request_size, sanitize_html_content
 from .rate_limiter import rate_limit
 from .csrf_protection import csrf_protect, get_csrf_token
 from .security_headers import security_headers, security_error_handler
-from .chordpro_utils import validate_chordpro_content, ChordProValidator, detect_key_signature
-from .etag_cache import cache_api_response, cache_song_response, conditional_request
-from .query_cache import cache_query, cache_model_query, cache_count_query
-from flask import send_from_directory, send_file, request, jsonify, g, Response
+from .chordpro_utils import validate_chordpro_content, ChordProValidator, detect_key_signature, detect_key_signatures
+from .etag_cache import cache_api_response, cache_song_response, conditional_request, generate_query_etag
+from .song_counters import count_song_view, counter_version_aggregates, counter_version_columns
+from .version_store import version_store
+from .streaming_archive import stream_zip, unique_filename, iter_songs, iter_user_songs
+from .query_cache import cache_query, cache_model_query, cache_count_query, cached_model_dicts
+from flask import send_from_directory, send_file, request, jsonify, g, Response, stream_with_context
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 import os
@@ -1039,10 +1042,21 @@ def update_user_password_change():
 
 # Song management endpoints - all require authentication
 
+def _user_songs_version():
+    """Row-version validator for the current user's song list, including its counters."""
+    return generate_query_etag(Song.query.filter(Song.user_id == g.current_user_id), Song,
+                               counter_version_aggregates())
+
+
+def _song_version(song_id):
+    """Row-version validator for a single song, including its counters."""
+    return generate_query_etag(Song.query.filter(Song.id == song_id), Song, counter_version_aggregates())
+
+
 @app.route('/api/v1/songs', methods=['GET'])
 @auth_required
 @security_headers
-@cache_song_response(ttl=1800)  # Cache for 30 minutes
+@cache_song_response(ttl=1800, version_func=_user_songs_version)  # Cache for 30 minutes
 def get_songs():
     """
     Get all songs for authenticated user
@@ -1078,11 +1092,13 @@ def get_songs():
           $ref: '#/definitions/Error'
     """
     try:
-        # Get songs for the current user
-        songs = Song.query.filter_by(author_id=g.current_user_id).all()
+        # Get song versions for the current user; bodies come from cache fragments
+        versions = db.session.query(Song.id, Song.updated_at, *counter_version_columns()).filter(
+            Song.user_id == g.current_user_id
+        ).order_by(Song.id).all()
         
         # Convert to dict format
-        songs_data = [song.to_dict() for song in songs]
+        songs_data = cached_model_dicts(Song, versions)
         
         return create_success_response(
             data={'songs': songs_data},
@@ -1097,6 +1113,80 @@ def get_songs():
         )
 
 
+@app.route('/api/v1/songs/shared', methods=['GET'])
+@auth_required
+@security_headers
+def get_shared_songs():
+    """
+    Get songs shared with the authenticated user
+    ---
+    tags:
+      - Songs
+    summary: List songs shared with me
+    description: Retrieve the songs other users have shared with the authenticated user
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: permission_level
+        description: Only return songs shared with this permission level
+        required: false
+        type: string
+        enum: [read, edit, admin]
+    responses:
+      200:
+        description: Shared songs retrieved successfully
+        schema:
+          allOf:
+            - $ref: '#/definitions/Success'
+            - type: object
+              properties:
+                data:
+                  type: object
+                  properties:
+                    songs:
+                      type: array
+                      items:
+                        $ref: '#/definitions/Song'
+      400:
+        description: Invalid permission level
+        schema:
+          $ref: '#/definitions/Error'
+      401:
+        description: Authentication required
+        schema:
+          $ref: '#/definitions/Error'
+      500:
+        description: Internal server error
+        schema:
+          $ref: '#/definitions/Error'
+    """
+    try:
+        permission_level = request.args.get('permission_level')
+        if permission_level and permission_level not in ('read', 'edit', 'admin'):
+            return create_error_response("permission_level must be 'read', 'edit', or 'admin'", 400)
+        
+        # Index lookup on song_shares; bodies come from cache fragments
+        versions = db.session.query(Song.id, Song.updated_at, *counter_version_columns()).filter(
+            Song.shared_to(g.current_user_id, [permission_level] if permission_level else None),
+            Song.is_deleted == False
+        ).order_by(Song.id).all()
+        
+        songs_data = cached_model_dicts(Song, versions)
+        
+        return create_success_response(
+            data={'songs': songs_data},
+            message=f"Retrieved {len(songs_data)} shared songs"
+        )
+        
+    except Exception as e:
+        return security_error_handler.handle_server_error(
+            "An error occurred while retrieving shared songs",
+            exception=e,
+            ip_address=request.remote_addr
+        )
+
+
 @app.route('/api/v1/songs', methods=['POST'])
 @auth_required
 @validate_request_size(max_content_length=50*1024)  # 50KB for song content
@@ -1236,7 +1326,8 @@ def create_song():
 @auth_required
 @validate_positive_integer('song_id')
 @security_headers
-@cache_song_response(ttl=3600)  # Cache individual songs for 1 hour
+@count_song_view
+@cache_song_response(ttl=3600, version_func=_song_version)  # Cache individual songs for 1 hour
 def get_song(song_id):
     """
     Get a specific song by ID
@@ -1301,25 +1392,11 @@ def get_song(song_id):
 
 
 def create_version_snapshot(song, user_id):
-    """Create a version snapshot of a song before modification."""
-    # Get the next version number for this song
-    latest_version = SongVersion.query.filter_by(song_id=song.id)\
-                                     .order_by(SongVersion.version_number.desc())\
-                                     .first()
-    
-    next_version_number = (latest_version.version_number + 1) if latest_version else 1
-    
-    # Create the version snapshot
-    version = SongVersion(
-        song_id=song.id,
-        version_number=next_version_number,
-        title=song.title,
-        content=song.content,
-        created_by=user_id
-    )
-    
-    db.session.add(version)
-    return version
+    """Create a version snapshot of a song before modification.
+
+    Returns None when the latest version already matches the song.
+    """
+    return version_store.snapshot(song, user_id)
 
 
 @app.route('/api/v1/songs/<int:song_id>', methods=['PUT'])
@@ -1438,7 +1515,7 @@ def update_song(song_id):
             SongSection.query.filter_by(song_id=song.id).delete()
         
         # Create version snapshot before making changes
-        if title or content:
+        if (title and title != song.title) or (content and content != song.content):
             create_version_snapshot(song, g.current_user_id)
         
         # Apply the updates
@@ -1764,7 +1841,7 @@ def export_song_pdf(song_id):
     """
     try:
         from .permission_helpers import check_song_permission
-        from .pdf_generator import generate_song_pdf
+        from .pdf_artifact_cache import cached_song_pdf
         
         # Check if user has read access to the song
         song, has_permission = check_song_permission(song_id, g.current_user_id, 'read')
@@ -1859,7 +1936,7 @@ def export_song_pdf(song_id):
         title = title_override or song.title
         artist = artist_override or getattr(song, 'artist', None)  # Song model might not have artist field
         
-        pdf_bytes = generate_song_pdf(
+        pdf_bytes = cached_song_pdf(
             content=content,
             title=title,
             artist=artist,
@@ -2118,28 +2195,22 @@ def batch_export_songs_pdf():
                 return create_error_response(f"Invalid {color_name} color format. Use #RRGGBB format", 400)
         
         # Verify all songs exist and user has access
-        songs = []
-        for song_id in song_ids:
-            song, has_permission = check_song_permission(song_id, g.current_user_id, 'read')
-            if not song or not has_permission:
-                return create_error_response(f"Song with ID {song_id} not found or access denied", 404)
-            songs.append(song)
-        
-        # Generate PDFs and create ZIP
-        from .pdf_generator import generate_song_pdf
-        import zipfile
-        from io import BytesIO
+        from .permission_helpers import resolve_song_permissions, first_denied_song
+        denied_id = first_denied_song(resolve_song_permissions(song_ids, g.current_user_id, 'read'))
+        if denied_id is not None:
+            return create_error_response(f"Song with ID {denied_id} not found or access denied", 404)
         
-        zip_buffer = BytesIO()
+        # Generate PDFs, reusing cached artifacts, and stream them into the ZIP one at a time
+        from .pdf_artifact_cache import cached_song_pdf
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for song in songs:
+        def song_pdfs():
+            for song in iter_songs(song_ids):
                 try:
                     # Generate PDF for this song
-                    pdf_bytes = generate_song_pdf(
+                    pdf_bytes = cached_song_pdf(
                         content=song.content,
                         title=song.title,
-                        artist=getattr(song, 'artist', None),
+                        artist=song.artist,
                         paper_size=paper_size,
                         orientation=orientation,
                         template_name=template_name,
@@ -2169,19 +2240,17 @@ def batch_export_songs_pdf():
                     safe_filename = f"{safe_title[:50]}.pdf"
                     
                     # Add to ZIP
-                    zip_file.writestr(safe_filename, pdf_bytes)
+                    yield safe_filename, pdf_bytes
                     
                 except Exception as e:
                     app.logger.error(f"Failed to generate PDF for song {song.id}: {str(e)}")
                     # Continue with other songs, add error note
                     error_content = f"Error generating PDF for '{song.title}': {str(e)}"
-                    zip_file.writestr(f"ERROR-{song.title[:30]}.txt", error_content.encode('utf-8'))
-        
-        zip_buffer.seek(0)
+                    yield f"ERROR-{song.title[:30]}.txt", error_content.encode('utf-8')
         
-        # Create response with ZIP
+        # Create response streaming the ZIP
         response = Response(
-            zip_buffer.getvalue(),
+            stream_with_context(stream_zip(song_pdfs())),
             mimetype='application/zip',
             headers={
                 'Content-Disposition': 'attachment; filename="songs-export.zip"'
@@ -2189,7 +2258,7 @@ def batch_export_songs_pdf():
         )
         
         # Log batch export activity
-        app.logger.info(f"Batch PDF export: {len(songs)} songs exported by user {g.current_user_id} from IP {request.remote_addr}")
+        app.logger.info(f"Batch PDF export: {len(song_ids)} songs exported by user {g.current_user_id} from IP {request.remote_addr}")
         
         return response
         
@@ -2495,7 +2564,7 @@ def get_song_versions(song_id):
     tags:
       - Songs
     summary: Get song version history
-    description: Retrieve all version snapshots for a specific song (requires read permissions)
+    description: Retrieve all version snapshots for a specific song without their content (requires read permissions)
     security:
       - Bearer: []
     parameters:
@@ -2529,8 +2598,9 @@ def get_song_versions(song_id):
                             type: integer
                           title:
                             type: string
-                          content:
-                            type: string
+                          content_size:
+                            type: integer
+                            description: Length of the version content; fetch the version to read it
                           user_id:
                             type: integer
                           created_at:
@@ -2562,13 +2632,13 @@ def get_song_versions(song_id):
         if not song or not has_permission:
             return create_error_response("Song not found", 404)
         
-        # Get all versions for this song
+        # Get all versions for this song; content columns are deferred
         versions = SongVersion.query.filter_by(song_id=song_id)\
-                                  .order_by(SongVersion.created_at.desc())\
+                                  .order_by(SongVersion.version_number.desc())\
                                   .all()
         
-        # Convert to dict format
-        versions_data = [version.to_dict() for version in versions]
+        # Convert to dict format without reconstructing content
+        versions_data = [version.to_dict(include_content=False) for version in versions]
         
         return create_success_response(
             data={'versions': versions_data},
@@ -2762,14 +2832,15 @@ def restore_song_version(song_id, version_id):
         create_version_snapshot(song, g.current_user_id)
         
         # Restore the song to the version state
+        restored_content = version.content
         song.title = version.title
-        song.content = version.content
+        song.content = restored_content
         
         # Delete existing sections and recreate from restored content
         SongSection.query.filter_by(song_id=song.id).delete()
         
         # Parse and store sections from restored content
-        sections = ChordProValidator.extract_sections(version.content)
+        sections = ChordProValidator.extract_sections(restored_content)
         for section_data in sections:
             section = SongSection(
                 song_id=song.id,
@@ -3211,6 +3282,121 @@ def detect_key():
         )
 
 
+# Maximum number of songs accepted by the bulk key detection endpoint
+MAX_BULK_KEY_DETECTION_SONGS = 200
+
+
+@app.route('/api/v1/songs/detect-key/bulk', methods=['POST'])
+@auth_required
+@validate_request_size(max_content_length=2*1024*1024)  # 2MB for a batch of songs
+@rate_limit(max_requests=10, window_seconds=300)  # 10 bulk detections per 5 minutes
+@csrf_protect(require_token=False)  # CSRF optional for API endpoints
+@security_headers
+def detect_keys_bulk():
+    """
+    Detect key signatures for a batch of ChordPro songs
+    ---
+    tags:
+      - Songs
+    summary: Bulk key signature detection
+    description: Score many songs against the key profiles in a single vectorized pass. Results are returned in request order and use the same structure as /api/v1/songs/detect-key.
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        description: ChordPro contents to analyze
+        required: true
+        schema:
+          type: object
+          required:
+            - contents
+          properties:
+            contents:
+              type: array
+              maxItems: 200
+              items:
+                type: string
+              description: ChordPro contents to analyze for key detection
+              example: ["[C]Hello [F]world [G]test", "[Am]Sad [Dm]song [E]here"]
+    responses:
+      200:
+        description: Key detection performed successfully
+        schema:
+          allOf:
+            - $ref: '#/definitions/Success'
+            - type: object
+              properties:
+                data:
+                  type: object
+                  properties:
+                    results:
+                      type: array
+                      description: Detection results in request order, each shaped like the single-song response
+                      items:
+                        type: object
+                    count:
+                      type: integer
+                      description: Number of songs analyzed
+      400:
+        description: Invalid request data
+        schema:
+          $ref: '#/definitions/Error'
+      401:
+        description: Authentication required
+        schema:
+          $ref: '#/definitions/Error'
+      429:
+        description: Rate limit exceeded
+        schema:
+          $ref: '#/definitions/Error'
+      500:
+        description: Internal server error
+        schema:
+          $ref: '#/definitions/Error'
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return create_error_response("JSON data required", 400)
+        
+        contents = data.get('contents')
+        
+        if not isinstance(contents, list) or not contents:
+            return create_error_response("Contents must be a non-empty list", 400)
+        
+        if len(contents) > MAX_BULK_KEY_DETECTION_SONGS:
+            return create_error_response(
+                f"At most {MAX_BULK_KEY_DETECTION_SONGS} songs can be analyzed per request", 400
+            )
+        
+        if not all(isinstance(content, str) for content in contents):
+            return create_error_response("Each content must be a string", 400)
+        
+        # Sanitize input content
+        contents = [sanitize_input(content) for content in contents]
+        
+        results = detect_key_signatures(contents)
+        
+        app.logger.info(f"Bulk key detection of {len(results)} songs performed by user {g.current_user_id} from IP {request.remote_addr}")
+        
+        return create_success_response(
+            data={
+                'results': results,
+                'count': len(results)
+            },
+            message=f"Key detection completed for {len(results)} songs"
+        )
+        
+    except Exception as e:
+        return security_error_handler.handle_server_error(
+            "An error occurred while detecting key signatures",
+            exception=e,
+            ip_address=request.remote_addr
+        )
+
+
 @app.route('/api/v1/songs/upload', methods=['POST'])
 @auth_required
 @rate_limit(max_requests=10, window_seconds=300)  # 10 uploads per 5 minutes
@@ -3500,24 +3686,21 @@ def upload_multiple_song_files():
 def download_all_songs():
     """
     Download all user's songs as a ZIP file containing ChordPro files.
+    
+    The archive is streamed: songs are loaded in batches and each ChordPro
+    file is compressed and sent as soon as it is produced.
     """
     try:
-        import zipfile
-        import io
-        
-        # Get all songs for the current user
-        songs = Song.query.filter_by(author_id=g.current_user_id).all()
+        user_id = g.current_user_id
         
-        if not songs:
+        if db.session.query(Song.id).filter(Song.user_id == user_id).first() is None:
             return create_error_response("No songs found", 404)
         
-        # Create a ZIP file in memory
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        def chordpro_files():
             used_filenames = set()
+            count = 0
             
-            for song in songs:
+            for song in iter_user_songs(user_id):
                 # Generate ChordPro content
                 content = song.content
                 
@@ -3528,32 +3711,20 @@ def download_all_songs():
                 # Generate unique filename
                 safe_title = re.sub(r'[^\w\s-]', '', song.title.strip())
                 safe_title = re.sub(r'[-\s]+', '-', safe_title)
-                base_filename = f"{safe_title}.cho"
-                
-                # Handle duplicate filenames
-                filename = base_filename
-                counter = 1
-                while filename in used_filenames:
-                    name, ext = os.path.splitext(base_filename)
-                    filename = f"{name}_{counter}{ext}"
-                    counter += 1
-                
-                used_filenames.add(filename)
+                filename = unique_filename(f"{safe_title}.cho", used_filenames)
                 
-                # Add file to ZIP
-                zip_file.writestr(filename, content.encode('utf-8'))
-        
-        zip_buffer.seek(0)
+                count += 1
+                yield filename, content.encode('utf-8')
+            
+            app.logger.info(f"Bulk download: {count} songs by user {user_id} from IP {request.remote_addr}")
         
         # Generate ZIP filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         zip_filename = f"chordme_songs_{timestamp}.zip"
         
-        app.logger.info(f"Bulk download: {len(songs)} songs by user {g.current_user_id} from IP {request.remote_addr}")
-        
-        # Create response
+        # Stream the archive as it is written
         response = Response(
-            zip_buffer.getvalue(),
+            stream_with_context(stream_zip(chordpro_files())),
             mimetype='application/zip',
             headers={
                 'Content-Disposition': f'attachment; filename="{zip_filename}"',
@@ -3814,11 +3985,13 @@ def get_chords():
           $ref: '#/definitions/Error'
     """
     try:
-        # Get chords for the current user
-        chords = Chord.query.filter_by(user_id=g.current_user_id).all()
+        # Get chord versions for the current user; bodies come from cache fragments
+        versions = db.session.query(Chord.id, Chord.updated_at).filter(
+            Chord.user_id == g.current_user_id
+        ).order_by(Chord.id).all()
         
         # Convert to dict format
-        chords_data = [chord.to_dict() for chord in chords]
+        chords_data = cached_model_dicts(Chord, versions)
         
         return create_success_response(
             data={'chords': chords_data},
@@ -4534,22 +4707,19 @@ def get_song_collaborators(song_id):
             'email': owner.email
         } if owner else None
         
-        # Get collaborators
+        # Get collaborators with their shares in one indexed lookup
         collaborators = []
-        if song.shared_with and song.permissions:
-            # Get users who have access
-            shared_user_ids = song.shared_with
-            shared_users = User.query.filter(User.id.in_(shared_user_ids)).all()
-            
-            for user in shared_users:
-                permission = song.get_user_permission(user.id)
-                if permission:
-                    collaborators.append({
-                        'user_id': user.id,
-                        'email': user.email,
-                        'permission_level': permission,
-                        'granted_at': song.updated_at.isoformat() if song.updated_at else None
-                    })
+        shares = db.session.query(User.id, User.email, SongShare.level, SongShare.created_at).join(
+            SongShare, SongShare.user_id == User.id
+        ).filter(SongShare.song_id == song.id).order_by(SongShare.id).all()
+        
+        for user_id, email, level, granted_at in shares:
+            collaborators.append({
+                'user_id': user_id,
+                'email': email,
+                'permission_level': level,
+                'granted_at': granted_at.isoformat() if granted_at else None
+            })
         
         return create_success_response(
             data={
@@ -5569,7 +5739,7 @@ def async_export_batch_songs():
     """
     try:
         from .pdf_job_manager import pdf_job_manager
-        from .permission_helpers import check_song_permission
+        from .permission_helpers import resolve_song_permissions, first_denied_song
         
         data = request.get_json()
         if not data:
@@ -5586,10 +5756,9 @@ def async_export_batch_songs():
             return create_error_response("Cannot export more than 50 songs at once", 400)
         
         # Validate all songs exist and user has access
-        for song_id in song_ids:
-            song, has_permission = check_song_permission(song_id, g.current_user_id, 'read')
-            if not song or not has_permission:
-                return create_error_response(f"Song {song_id} not found or access denied", 404)
+        denied_id = first_denied_song(resolve_song_permissions(song_ids, g.current_user_id, 'read'))
+        if denied_id is not None:
+            return create_error_response(f"Song {denied_id} not found or access denied", 404)
         
         # Create and start job
         job = pdf_job_manager.create_job(
@@ -5719,7 +5888,7 @@ def async_export_multi_song():
     """
     try:
         from .pdf_job_manager import pdf_job_manager
-        from .permission_helpers import check_song_permission
+        from .permission_helpers import resolve_song_permissions, first_denied_song
         
         data = request.get_json()
         if not data:
@@ -5739,10 +5908,9 @@ def async_export_multi_song():
             return create_error_response("Cannot export more than 30 songs in a single PDF", 400)
         
         # Validate all songs exist and user has access
-        for song_id in song_ids:
-            song, has_permission = check_song_permission(song_id, g.current_user_id, 'read')
-            if not song or not has_permission:
-                return create_error_response(f"Song {song_id} not found or access denied", 404)
+        denied_id = first_denied_song(resolve_song_permissions(song_ids, g.current_user_id, 'read'))
+        if denied_id is not None:
+            return create_error_response(f"Song {denied_id} not found or access denied", 404)
         
         # Create and start job
         job = pdf_job_manager.create_job(
@@ -5795,7 +5963,10 @@ def get_pdf_job_status(job_id):
     tags:
       - PDF Export (Async)
     summary: Get job status
-    description: Get current status and progress of a PDF export job
+    description: >
+      Get current status and progress of a PDF export job. Progress is also
+      pushed to the owner's authenticated Socket.IO sessions as
+      pdf_job_progress events, so clients need not poll.
     security:
       - Bearer: []
     parameters:
@@ -5881,17 +6052,22 @@ def get_pdf_job_status(job_id):
     """
     try:
         from .pdf_job_manager import pdf_job_manager
+        from .pdf_job_progress import pdf_job_progress
         
-        job = pdf_job_manager.get_job(job_id)
-        if not job:
-            return create_error_response("Job not found", 404)
+        # Running jobs are answered from the progress channel without reading the jobs table
+        job_data = pdf_job_progress.get(job_id)
+        if job_data is None:
+            job = pdf_job_manager.get_job(job_id)
+            if not job:
+                return create_error_response("Job not found", 404)
+            job_data = job.to_dict(include_details=True)
         
         # Ensure user can only access their own jobs
-        if job.user_id != g.current_user_id:
+        if job_data['user_id'] != g.current_user_id:
             return create_error_response("Access denied", 403)
         
         return create_success_response(
-            data=job.to_dict(include_details=True),
+            data=job_data,
             message="Job status retrieved successfully"
         )
         
@@ -0,0 +1,361 @@
+"""
+Asynchronous, batched security audit log pipeline.
+
+``SecurityAuditLogger.log_security_event`` runs on the request thread for
+every permission check and used to serialize the event and write it to
+several loggers before returning. Request threads now only build the entry
+and enqueue it on a bounded in-process queue; a background writer drains the
+queue in batches of up to ``AUDIT_BATCH_SIZE`` entries (waiting at most
+``AUDIT_FLUSH_INTERVAL`` seconds to fill one) and hands each batch to the
+configured sinks (``AUDIT_SINKS``):
+
+- ``log``: the security and application loggers plus the structured logger,
+  in the same format as before
+- ``file``: one JSON line per entry appended to ``AUDIT_LOG_FILE``
+- ``database``: one multi-row insert into ``security_audit_events``
+
+When the queue is full, ``AUDIT_OVERFLOW_POLICY`` decides what the request
+thread does:
+
+- ``sample``: once the queue is ``SAMPLE_THRESHOLD`` full, only one in
+  ``AUDIT_SAMPLE_RATE`` INFO events is kept; higher severities are always
+  offered and dropped only when the queue is completely full
+- ``drop``: the event is dropped
+- ``block``: the request waits up to ``AUDIT_BLOCK_TIMEOUT`` seconds for
+  space, then drops the event
+
+Dropped, sampled-out and blocked events, the queue depth and its high-water
+mark are reported in the monitoring metrics. The queue is flushed at
+interpreter exit. Under TESTING, or with ``AUDIT_PIPELINE_ENABLED`` off,
+events are written synchronously as before.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds the writer waits to fill a batch
+DEFAULT_SAMPLE_RATE = 10  # keep one in this many INFO events under pressure
+DEFAULT_BLOCK_TIMEOUT = 0.1  # seconds a request may wait for queue space
+SAMPLE_THRESHOLD = 0.8  # queue fill ratio at which sampling starts
+OVERFLOW_POLICIES = ('sample', 'drop', 'block')
+ALWAYS_KEPT_SEVERITIES = ('WARNING', 'ERROR', 'CRITICAL')
+
+_STOP = object()
+
+
+class LogAuditSink:
+    """Writes entries to the security, application and structured loggers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def write(self, entries: List[Dict[str, Any]]):
+        from .permission_helpers import SecurityAuditLogger
+        SecurityAuditLogger.write_log_entries(entries, self.app)
+
+
+class FileAuditSink:
+    """Appends entries to a file as JSON lines, one write per batch."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, entries: List[Dict[str, Any]]):
+        lines = ''.join(json.dumps(entry, default=str) + '\n' for entry in entries)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+class DatabaseAuditSink:
+    """Inserts entries into security_audit_events with one statement per batch."""
+
+    def write(self, entries: List[Dict[str, Any]]):
+        from .models import db, SecurityAuditEvent
+        rows = [{
+            'timestamp': datetime.fromisoformat(entry['timestamp']),
+            'event_type': entry['event_type'],
+            'severity': entry['severity'],
+            'user_id': entry['user_id'],
+            'ip_address': entry['ip_address'],
+            'user_agent': (entry['user_agent'] or '')[:500],
+            'details': entry['details'],
+        } for entry in entries]
+        try:
+            db.session.execute(SecurityAuditEvent.__table__.insert(), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+class AuditLogPipeline:
+    """
+    Bounded queue of audit entries drained in batches by a background writer.
+
+    Args:
+        queue_size: Maximum number of queued entries
+        batch_size: Maximum number of entries handed to the sinks at once
+        flush_interval: Seconds the writer waits to fill a batch
+        overflow_policy: 'sample', 'drop' or 'block'
+        sample_rate: Keep one in this many INFO events while sampling
+        block_timeout: Seconds a 'block' submit waits for space
+        sinks: Objects with a ``write(entries)`` method
+    """
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, overflow_policy: str = 'sample',
+                 sample_rate: int = DEFAULT_SAMPLE_RATE, block_timeout: float = DEFAULT_BLOCK_TIMEOUT,
+                 sinks: Optional[List[Any]] = None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy: {overflow_policy}")
+        self.app = None
+        self.enabled = sinks is not None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.sample_rate = max(1, sample_rate)
+        self.block_timeout = block_timeout
+        self.sinks = sinks or []
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._sample_counter = 0
+        self.stats = {
+            'submitted': 0,
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'sampled_out': 0,
+            'blocked': 0,
+            'blocked_seconds': 0.0,
+            'batches': 0,
+            'failed_batches': 0,
+            'high_water': 0,
+        }
+
+    def init_app(self, app):
+        """Configure the pipeline and its sinks from the Flask app and flush it at exit."""
+        self.app = app
+        config = app.config
+        self._queue = queue.Queue(maxsize=int(config.get('AUDIT_QUEUE_SIZE', self._queue.maxsize)))
+        self.batch_size = int(config.get('AUDIT_BATCH_SIZE', self.batch_size))
+        self.flush_interval = float(config.get('AUDIT_FLUSH_INTERVAL', self.flush_interval))
+        self.sample_rate = max(1, int(config.get('AUDIT_SAMPLE_RATE', self.sample_rate)))
+        self.block_timeout = float(config.get('AUDIT_BLOCK_TIMEOUT', self.block_timeout))
+        policy = config.get('AUDIT_OVERFLOW_POLICY', self.overflow_policy)
+        if policy not in OVERFLOW_POLICIES:
+            logger.warning(f"Unknown audit overflow policy {policy!r}, using 'sample'")
+            policy = 'sample'
+        self.overflow_policy = policy
+
+        self.sinks = []
+        for name in str(config.get('AUDIT_SINKS', 'log')).split(','):
+            name = name.strip()
+            if name == 'log':
+                self.sinks.append(LogAuditSink(app))
+            elif name == 'file':
+                path = config.get('AUDIT_LOG_FILE')
+                if path:
+                    self.sinks.append(FileAuditSink(path))
+                else:
+                    logger.warning("Audit file sink configured without AUDIT_LOG_FILE, skipping it")
+            elif name == 'database':
+                self.sinks.append(DatabaseAuditSink())
+            elif name:
+                logger.warning(f"Unknown audit sink {name!r}, skipping it")
+
+        self.enabled = bool(config.get('AUDIT_PIPELINE_ENABLED', True))
+        atexit.register(self.shutdown)
+
+    def _active(self) -> bool:
+        # Tests assert on the log output of the call that produced it
+        return self.enabled and not (self.app is not None and self.app.config.get('TESTING'))
+
+    # Submitting
+
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        """
+        Queue an entry for the background writer without waiting for it to be
+        written. Returns False when the pipeline is disabled and the caller
+        should write the entry itself.
+        """
+        if not self._active():
+            return False
+        self._ensure_thread()
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self.stats['submitted'] += 1
+            if depth > self.stats['high_water']:
+                self.stats['high_water'] = depth
+            if self.overflow_policy == 'sample' and entry.get('severity') not in ALWAYS_KEPT_SEVERITIES \
+                    and depth >= self._queue.maxsize * SAMPLE_THRESHOLD:
+                self._sample_counter += 1
+                if self._sample_counter % self.sample_rate:
+                    self.stats['sampled_out'] += 1
+                    return True
+
+        if self.overflow_policy == 'block':
+            started = time.monotonic()
+            try:
+                self._queue.put(entry, timeout=self.block_timeout)
+                queued = True
+            except queue.Full:
+                queued = False
+            waited = time.monotonic() - started
+            with self._lock:
+                if depth >= self._queue.maxsize:
+                    self.stats['blocked'] += 1
+                    self.stats['blocked_seconds'] += waited
+        else:
+            try:
+                self._queue.put_nowait(entry)
+                queued = True
+            except queue.Full:
+                queued = False
+
+        with self._lock:
+            self.stats['enqueued' if queued else 'dropped'] += 1
+        return True
+
+    # Writing
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        failed = False
+        for sink in self.sinks:
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        sink.write(batch)
+                else:
+                    sink.write(batch)
+            except Exception as e:
+                failed = True
+                logger.error(f"Audit sink {type(sink).__name__} failed to write {len(batch)} entries: {e}")
+        with self._lock:
+            self.stats['batches'] += 1
+            self.stats['written'] += len(batch)
+            if failed:
+                self.stats['failed_batches'] += 1
+
+    def _next_batch(self):
+        """
+        Wait for the next batch. Returns the entries and the flush event or
+        stop marker that ended the batch early, if any.
+        """
+        first = self._queue.get()
+        if not isinstance(first, dict):
+            return [], first
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if not isinstance(item, dict):
+                return batch, item
+            batch.append(item)
+        return batch, None
+
+    def _run(self):
+        while True:
+            batch, marker = self._next_batch()
+            if batch:
+                self._write(batch)
+            if marker is _STOP:
+                break
+            if marker is not None:
+                marker.set()
+
+    def _drain(self):
+        """Write whatever is queued on the calling thread."""
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, dict):
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+            if batch:
+                self._write(batch)
+                batch = []
+            if item is not _STOP and not isinstance(item, dict):
+                item.set()
+        if batch:
+            self._write(batch)
+
+    def _writer_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid()
+
+    def _ensure_thread(self):
+        if self._writer_alive():
+            return
+        with self._lock:
+            if self._writer_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every entry queued so far has been written."""
+        if not self._writer_alive():
+            self._drain()
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the writer after it has written everything queued."""
+        if self._writer_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                self._thread.join(timeout=timeout)
+            except queue.Full:
+                logger.error("Audit log queue still full at shutdown, writing the rest on this thread")
+        if not self._writer_alive():
+            try:
+                self._drain()
+            except Exception as e:
+                logger.error(f"Failed to flush audit log at shutdown: {e}")
+
+    # Metrics
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pipeline metrics, including queue depth and back-pressure counters."""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['blocked_seconds'] = round(stats['blocked_seconds'], 3)
+        return dict(
+            stats,
+            enabled=self._active(),
+            queue_depth=self._queue.qsize(),
+            queue_size=self._queue.maxsize,
+            overflow_policy=self.overflow_policy,
+            sinks=[type(sink).__name__ for sink in self.sinks],
+        )
+
+
+# Global instance
+audit_pipeline = AuditLogPipeline()
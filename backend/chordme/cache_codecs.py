@@ -0,0 +1,209 @@
+"""
+Value codecs for the cache service.
+
+Cached values are stored in Redis as bytes framed by a one-byte header:
+
+    bits 7-6  format version (currently 2)
+    bits 5-4  compression (0 none, 1 zlib, 2 lz4)
+    bits 3-0  serializer (1 JSON, 2 MessagePack)
+
+Values written by earlier releases are JSON text, optionally wrapping
+hex-encoded gzip data in {"_compressed": true, "_data": ...}. Their first byte
+is always ASCII, so they can never be mistaken for a framed value and are
+still decoded transparently while a rollout is in progress.
+"""
+
+import gzip
+import json
+import logging
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    lz4 = None
+    LZ4_AVAILABLE = False
+
+
+logger = logging.getLogger(__name__)
+
+
+FORMAT_VERSION = 2
+VERSION_SHIFT = 6
+COMPRESSION_SHIFT = 4
+SERIALIZER_MASK = 0x0F
+COMPRESSION_MASK = 0x30
+
+SERIALIZER_JSON = 1
+SERIALIZER_MSGPACK = 2
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+
+SERIALIZER_IDS = {'json': SERIALIZER_JSON, 'msgpack': SERIALIZER_MSGPACK}
+COMPRESSION_IDS = {'none': COMPRESSION_NONE, 'zlib': COMPRESSION_ZLIB, 'lz4': COMPRESSION_LZ4}
+
+ZLIB_LEVEL = 3  # Favour speed; song payloads already shrink 4-6x at this level
+
+
+class CodecError(ValueError):
+    """Raised when a cached payload cannot be encoded or decoded."""
+
+
+def _to_primitive(value: Any) -> Any:
+    """Fallback conversion for types MessagePack cannot encode natively."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=str, separators=(',', ':')).encode('utf-8')
+
+
+def _json_loads(data: bytes) -> Any:
+    return json.loads(data)
+
+
+def _msgpack_dumps(value: Any) -> bytes:
+    return msgpack.packb(value, default=_to_primitive, use_bin_type=True)
+
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def _lz4_compress(data: bytes) -> bytes:
+    return lz4.frame.compress(data)
+
+
+def _lz4_decompress(data: bytes) -> bytes:
+    return lz4.frame.decompress(data)
+
+
+SERIALIZERS: Dict[int, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    SERIALIZER_JSON: (_json_dumps, _json_loads),
+}
+if MSGPACK_AVAILABLE:
+    SERIALIZERS[SERIALIZER_MSGPACK] = (_msgpack_dumps, _msgpack_loads)
+
+COMPRESSORS: Dict[int, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    COMPRESSION_ZLIB: (lambda data: zlib.compress(data, ZLIB_LEVEL), zlib.decompress),
+}
+if LZ4_AVAILABLE:
+    COMPRESSORS[COMPRESSION_LZ4] = (_lz4_compress, _lz4_decompress)
+
+
+def make_header(serializer: int, compression: int) -> int:
+    return (FORMAT_VERSION << VERSION_SHIFT) | (compression << COMPRESSION_SHIFT) | serializer
+
+
+def decode_legacy(text: Union[str, bytes]) -> Any:
+    """Decode a value written by the JSON/gzip-hex serializer of earlier releases."""
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    data = json.loads(text)
+    if isinstance(data, dict) and data.get("_compressed"):
+        return json.loads(gzip.decompress(bytes.fromhex(data["_data"])).decode())
+    return data
+
+
+class CacheCodec:
+    """
+    Encodes cache values to framed bytes and back.
+
+    Args:
+        serializer: 'msgpack' or 'json'; falls back to JSON if MessagePack
+            is not installed
+        compression: 'lz4', 'zlib' or 'none'; lz4 falls back to zlib if the
+            lz4 package is not installed
+        compression_threshold: Minimum serialized size in bytes to compress
+        namespace_thresholds: Per-namespace overrides of the threshold; a
+            negative value disables compression for that namespace
+    """
+
+    def __init__(self, serializer: str = 'msgpack', compression: str = 'lz4',
+                 compression_threshold: int = 1024,
+                 namespace_thresholds: Optional[Dict[str, int]] = None):
+        if serializer not in SERIALIZER_IDS:
+            raise ValueError(f"Unknown cache serializer: {serializer}")
+        if compression not in COMPRESSION_IDS:
+            raise ValueError(f"Unknown cache compression: {compression}")
+
+        self.serializer = SERIALIZER_IDS[serializer]
+        if self.serializer not in SERIALIZERS:
+            logger.warning(f"{serializer} is not installed, caching with JSON")
+            self.serializer = SERIALIZER_JSON
+
+        self.compression = COMPRESSION_IDS[compression]
+        if self.compression != COMPRESSION_NONE and self.compression not in COMPRESSORS:
+            logger.warning(f"{compression} is not installed, compressing cache values with zlib")
+            self.compression = COMPRESSION_ZLIB
+
+        self.compression_threshold = compression_threshold
+        self.namespace_thresholds = dict(namespace_thresholds or {})
+
+    def threshold_for(self, namespace: Optional[str] = None) -> int:
+        """Compression threshold for a namespace, negative when disabled."""
+        if self.compression == COMPRESSION_NONE:
+            return -1
+        return self.namespace_thresholds.get(namespace, self.compression_threshold)
+
+    def encode(self, value: Any, namespace: Optional[str] = None) -> bytes:
+        """Serialize a value, compressing it if it is large enough for its namespace."""
+        dumps = SERIALIZERS[self.serializer][0]
+        try:
+            payload = dumps(value)
+        except Exception as e:
+            raise CodecError(f"Cannot serialize cache value: {e}") from e
+
+        compression = COMPRESSION_NONE
+        threshold = self.threshold_for(namespace)
+        if 0 <= threshold < len(payload):
+            compressed = COMPRESSORS[self.compression][0](payload)
+            # Incompressible payloads are stored as-is
+            if len(compressed) < len(payload):
+                payload = compressed
+                compression = self.compression
+
+        return bytes((make_header(self.serializer, compression),)) + payload
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        """Decode a framed value, or a legacy JSON value from earlier releases."""
+        if isinstance(data, str) or not data or data[0] >> VERSION_SHIFT != FORMAT_VERSION:
+            try:
+                return decode_legacy(data)
+            except Exception as e:
+                raise CodecError(f"Cannot decode legacy cache value: {e}") from e
+
+        header = data[0]
+        serializer = header & SERIALIZER_MASK
+        compression = (header & COMPRESSION_MASK) >> COMPRESSION_SHIFT
+        if serializer not in SERIALIZERS:
+            raise CodecError(f"Cache serializer {serializer} is not available")
+        if compression != COMPRESSION_NONE and compression not in COMPRESSORS:
+            raise CodecError(f"Cache compression {compression} is not available")
+
+        payload = data[1:]
+        try:
+            if compression != COMPRESSION_NONE:
+                payload = COMPRESSORS[compression][1](payload)
+            return SERIALIZERS[serializer][1](payload)
+        except Exception as e:
+            raise CodecError(f"Cannot decode cache value: {e}") from e
@@ -9,17 +9,28 @@ This module provides a comprehensive multi-layer caching system with:
 - Graceful degradation when cache is unavailable
 """
 
+import os
 import json
+import math
 import time
+import uuid
+import random
+import socket
+import fnmatch
 import logging
 import hashlib
 import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Union, Callable, Set
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from flask import current_app
 import redis
-from redis.exceptions import RedisError, ConnectionError
+from redis.exceptions import RedisError, ConnectionError, ResponseError
+
+from .cache_codecs import CacheCodec, CodecError
 
 
 logger = logging.getLogger(__name__)
@@ -39,14 +50,32 @@ class CacheMetrics:
     hit_rate: float = 0.0
     memory_usage_bytes: int = 0
     keys_count: int = 0
+    bytes_written: int = 0  # Encoded payload bytes sent to Redis
+    bytes_read: int = 0  # Encoded payload bytes received from Redis
+    l1_hits: int = 0  # Served from this worker's in-process cache
+    l1_misses: int = 0
+    l2_hits: int = 0  # Served from Redis
+    l2_misses: int = 0
+    l1_hit_rate: float = 0.0
+    l2_hit_rate: float = 0.0
+    invalidations_published: int = 0
+    invalidations_received: int = 0
+    stale_hits: int = 0  # Expired values served while another caller refreshes
+    early_refreshes: int = 0  # Probabilistic refreshes before expiry
+    coalesced_requests: int = 0  # Misses served by another caller's computation
+    lock_timeouts: int = 0  # Gave up waiting for another caller and recomputed
     
     def update_hit_rate(self):
-        """Update the hit rate based on hits and misses."""
+        """Update the hit rates based on hits and misses."""
         self.total_requests = self.hits + self.misses
         if self.total_requests > 0:
             self.hit_rate = self.hits / self.total_requests
         else:
             self.hit_rate = 0.0
+        l1_lookups = self.l1_hits + self.l1_misses
+        self.l1_hit_rate = self.l1_hits / l1_lookups if l1_lookups else 0.0
+        l2_lookups = self.l2_hits + self.l2_misses
+        self.l2_hit_rate = self.l2_hits / l2_lookups if l2_lookups else 0.0
 
 
 @dataclass
@@ -58,9 +87,24 @@ class CacheConfig:
     key_prefix: str = "chordme"
     compression_enabled: bool = True
     compression_threshold: int = 1024  # bytes
+    compression_algorithm: str = "lz4"  # "lz4", "zlib"
+    serializer: str = "msgpack"  # "msgpack", "json"
+    namespace_compression_thresholds: Dict[str, int] = field(default_factory=dict)  # -1 disables
     warm_cache_on_startup: bool = True
     invalidation_strategy: str = "smart"  # "smart", "manual", "time_based"
     cluster_mode: bool = False
+    fallback_max_entries: int = 10000  # Bound for the in-memory fallback LRU
+    l1_enabled: bool = True  # Per-worker LRU in front of Redis
+    l1_ttl: int = 30  # Upper bound on how long a worker serves a value without Redis
+    l1_namespace_max_entries: int = 1000  # Default per-namespace L1 budget
+    l1_namespace_budgets: Dict[str, int] = field(default_factory=dict)  # 0 disables L1
+    invalidation_channel: str = "cache:invalidations"  # Redis pub/sub channel for L1 eviction
+    stale_ttl: int = 60  # get_or_set serves expired values this long while one caller refreshes
+    early_refresh_beta: float = 0.0  # XFetch beta for get_or_set; 0 disables, 1 is typical
+    lock_timeout: int = 10  # Seconds a worker may hold a recompute lock
+    lock_wait_timeout: float = 5.0  # Seconds to wait for another worker's computation
+    lock_poll_interval: float = 0.05
+    scan_batch_size: int = 500  # Keys per SCAN/UNLINK round trip during invalidation
     
     
 class CacheInvalidationStrategy:
@@ -71,16 +115,181 @@ class CacheInvalidationStrategy:
     SMART = "smart"  # Based on content changes
     
 
+def digest_key(data: Any) -> str:
+    """
+    Stable cache key for structured data.
+    
+    Unlike the built-in hash(), the digest is identical in every process, so
+    all workers share the same Redis entries.
+    """
+    payload = json.dumps(data, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe, TTL-aware in-process cache bounded by entry count."""
+    
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the live value for key, or None if missing or expired."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item["expires_at"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item["value"]
+    
+    def set(self, key: str, value: Any, ttl: int, tags: Optional[List[str]] = None):
+        """Store a value, evicting the least recently used entries over the bound."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = {
+                "value": value,
+                "expires_at": time.time() + ttl,
+                "tags": tags or []
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries.keys())
+    
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class NamespacedLRUCache:
+    """
+    In-process LRU partitioned by namespace.
+    
+    Each namespace gets its own entry budget, so a burst of one-off keys in
+    one namespace (e.g. search pages) cannot evict hot entries of another.
+    """
+    
+    def __init__(self, default_max_entries: int = 1000,
+                 budgets: Optional[Dict[str, int]] = None):
+        self.default_max_entries = default_max_entries
+        self.budgets = dict(budgets or {})
+        self._partitions: Dict[str, LRUCache] = {}
+        self._lock = threading.Lock()
+    
+    def _partition(self, namespace: Optional[str]) -> LRUCache:
+        name = namespace or ""
+        partition = self._partitions.get(name)
+        if partition is None:
+            with self._lock:
+                partition = self._partitions.get(name)
+                if partition is None:
+                    partition = LRUCache(self.budgets.get(name, self.default_max_entries))
+                    self._partitions[name] = partition
+        return partition
+    
+    def get(self, namespace: Optional[str], key: str) -> Optional[Any]:
+        return self._partition(namespace).get(key)
+    
+    def set(self, namespace: Optional[str], key: str, value: Any, ttl: int):
+        self._partition(namespace).set(key, value, ttl)
+    
+    def delete(self, key: str) -> bool:
+        """Delete a full cache key from whichever namespace holds it."""
+        deleted = False
+        for partition in list(self._partitions.values()):
+            deleted = partition.delete(key) or deleted
+        return deleted
+    
+    def delete_matching(self, pattern: str) -> int:
+        """Delete every key matching a Redis-style glob pattern."""
+        deleted = 0
+        for partition in list(self._partitions.values()):
+            for key in partition.keys():
+                if fnmatch.fnmatchcase(key, pattern) and partition.delete(key):
+                    deleted += 1
+        return deleted
+    
+    def clear(self):
+        for partition in list(self._partitions.values()):
+            partition.clear()
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name or "default": {
+                "entries": len(partition),
+                "max_entries": partition.max_entries,
+                "evictions": partition.evictions
+            }
+            for name, partition in list(self._partitions.items())
+        }
+    
+    def __len__(self) -> int:
+        return sum(len(partition) for partition in list(self._partitions.values()))
+
+
+ENTRY_MARKER = "__cache_entry__"
+
+# Deletes the lock only if it still holds our token, so an expired lock
+# re-acquired by another worker is never released by the previous holder
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
 class CacheService:
     """Advanced Redis-based caching service with multi-layer support."""
     
     def __init__(self, config: Optional[CacheConfig] = None):
         self.config = config or CacheConfig()
         self.redis_client: Optional[redis.Redis] = None
-        self.fallback_cache: Dict[str, Any] = {}  # In-memory fallback
+        self.fallback_cache = LRUCache(self.config.fallback_max_entries)  # In-memory fallback
         self.metrics = CacheMetrics()
-        self._tags_to_keys: Dict[str, Set[str]] = {}  # For tag-based invalidation
+        self.codec = CacheCodec(
+            serializer=self.config.serializer,
+            compression=self.config.compression_algorithm if self.config.compression_enabled else "none",
+            compression_threshold=self.config.compression_threshold,
+            namespace_thresholds=self.config.namespace_compression_thresholds
+        )
+        # Tag index for the fallback cache; Redis entries are indexed in Redis
+        self._tags_to_keys: Dict[str, Set[str]] = {}
+        self._keys_to_tags: Dict[str, Set[str]] = {}
         self._warmup_keys: Set[str] = set()
+        # L1 in front of Redis; only used while Redis is the source of truth
+        self.l1_cache: Optional[NamespacedLRUCache] = None
+        if self.config.l1_enabled:
+            self.l1_cache = NamespacedLRUCache(
+                self.config.l1_namespace_max_entries,
+                self.config.l1_namespace_budgets
+            )
+        self._subscriber_lock = threading.Lock()
+        self._subscriber_pid: Optional[int] = None
+        self._subscriber_thread = None
+        self._instance_id = f"{socket.gethostname()}:{id(self)}"
+        self._key_locks: Dict[str, List[Any]] = {}  # cache key -> [lock, users]
+        self._key_locks_guard = threading.Lock()
         
         self._init_redis()
         
@@ -95,7 +304,7 @@ class CacheService:
             if redis_url:
                 self.redis_client = redis.from_url(
                     redis_url,
-                    decode_responses=True,
+                    decode_responses=False,  # Values are framed binary payloads
                     socket_timeout=5,
                     socket_connect_timeout=5,
                     retry_on_timeout=True,
@@ -147,76 +356,64 @@ class CacheService:
         parts.append(key)
         return ":".join(parts)
     
-    def _serialize_value(self, value: Any) -> str:
-        """Serialize value for cache storage with optional compression."""
+    def _serialize_value(self, value: Any, namespace: Optional[str] = None) -> bytes:
+        """Encode value for cache storage with the configured codec."""
         try:
-            serialized = json.dumps(value, default=str)
-            
-            if (self.config.compression_enabled and 
-                len(serialized) > self.config.compression_threshold):
-                try:
-                    import gzip
-                    compressed = gzip.compress(serialized.encode())
-                    return json.dumps({
-                        "_compressed": True,
-                        "_data": compressed.hex()
-                    })
-                except Exception:
-                    # Fall back to uncompressed if compression fails
-                    pass
-                    
-            return serialized
-            
-        except Exception as e:
+            return self.codec.encode(value, namespace)
+        except CodecError as e:
             logger.error(f"Value serialization failed: {e}")
             raise
     
-    def _deserialize_value(self, serialized: str) -> Any:
-        """Deserialize value from cache storage."""
+    def _deserialize_value(self, serialized: Union[bytes, str]) -> Any:
+        """Decode value from cache storage, including values in the legacy JSON format."""
         try:
-            data = json.loads(serialized)
-            
-            # Check if compressed
-            if isinstance(data, dict) and data.get("_compressed"):
-                import gzip
-                compressed_data = bytes.fromhex(data["_data"])
-                decompressed = gzip.decompress(compressed_data).decode()
-                return json.loads(decompressed)
-                
-            return data
-            
-        except Exception as e:
+            return self.codec.decode(serialized)
+        except CodecError as e:
             logger.error(f"Value deserialization failed: {e}")
             raise
     
     def get(self, key: str, namespace: Optional[str] = None) -> Optional[Any]:
         """Get value from cache with fallback support."""
+        return self._unwrap_entry(self._get_stored(key, namespace))[0]
+    
+    def _get_stored(self, key: str, namespace: Optional[str] = None) -> Optional[Any]:
+        """Get the stored value, which may be a get_or_set entry envelope."""
         start_time = time.time()
         cache_key = self._make_key(key, namespace)
         
         try:
-            # Try Redis first
+            # Try Redis first, behind this worker's L1
             if self.redis_client:
+                use_l1 = self._l1_active()
+                if use_l1:
+                    value = self.l1_cache.get(namespace, cache_key)
+                    if value is not None:
+                        self.metrics.hits += 1
+                        self.metrics.l1_hits += 1
+                        self._update_response_time(start_time)
+                        return self._deserialize_value(value)
+                    self.metrics.l1_misses += 1
                 try:
                     value = self.redis_client.get(cache_key)
                     if value is not None:
                         self.metrics.hits += 1
+                        self.metrics.l2_hits += 1
+                        self.metrics.bytes_read += len(value)
+                        if use_l1:
+                            self.l1_cache.set(namespace, cache_key, value, self.config.l1_ttl)
                         self._update_response_time(start_time)
                         return self._deserialize_value(value)
+                    self.metrics.l2_misses += 1
                 except RedisError as e:
                     logger.warning(f"Redis get failed for key {cache_key}: {e}")
                     self.metrics.errors += 1
             
             # Fallback to in-memory cache
-            if cache_key in self.fallback_cache:
-                cached_item = self.fallback_cache[cache_key]
-                if cached_item["expires_at"] > time.time():
-                    self.metrics.hits += 1
-                    self._update_response_time(start_time)
-                    return cached_item["value"]
-                else:
-                    # Expired, remove it
-                    del self.fallback_cache[cache_key]
+            value = self.fallback_cache.get(cache_key)
+            if value is not None:
+                self.metrics.hits += 1
+                self._update_response_time(start_time)
+                return value
             
             self.metrics.misses += 1
             self._update_response_time(start_time)
@@ -237,26 +434,31 @@ class CacheService:
         ttl = min(ttl, self.config.max_ttl)  # Enforce max TTL
         
         try:
-            serialized = self._serialize_value(value)
-            
             # Try Redis first
             if self.redis_client:
+                serialized = self._serialize_value(value, namespace)
                 try:
-                    result = self.redis_client.setex(cache_key, ttl, serialized)
+                    # The entry and its tag index are written in one round trip
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    pipe.setex(cache_key, ttl, serialized)
+                    self._queue_tag_index(pipe, cache_key, tags, ttl)
+                    result = pipe.execute()[0]
                     if result:
                         self.metrics.sets += 1
-                        self._handle_tags(cache_key, tags)
+                        self.metrics.bytes_written += len(serialized)
+                        if self._l1_active():
+                            # Other workers may hold the previous value
+                            self.l1_cache.set(namespace, cache_key, serialized,
+                                              min(ttl, self.config.l1_ttl))
+                            self._publish_invalidation(keys=[cache_key])
                         return True
                 except RedisError as e:
                     logger.warning(f"Redis set failed for key {cache_key}: {e}")
                     self.metrics.errors += 1
             
             # Fallback to in-memory cache
-            self.fallback_cache[cache_key] = {
-                "value": value,
-                "expires_at": time.time() + ttl,
-                "tags": tags or []
-            }
+            self.fallback_cache.set(cache_key, value, ttl, tags)
+            self.metrics.evictions = self.fallback_cache.evictions
             self.metrics.sets += 1
             self._handle_tags(cache_key, tags)
             return True
@@ -269,10 +471,18 @@ class CacheService:
     def delete(self, key: str, namespace: Optional[str] = None) -> bool:
         """Delete value from cache."""
         cache_key = self._make_key(key, namespace)
-        
+        deleted = self._delete_cache_key(cache_key)
+        self._publish_invalidation(keys=[cache_key])
+        return deleted
+    
+    def _delete_cache_key(self, cache_key: str) -> bool:
+        """Delete a fully prefixed key from every layer of this worker."""
         try:
             deleted = False
             
+            if self.l1_cache is not None:
+                self.l1_cache.delete(cache_key)
+            
             # Try Redis first
             if self.redis_client:
                 try:
@@ -283,8 +493,7 @@ class CacheService:
                     self.metrics.errors += 1
             
             # Also remove from fallback cache
-            if cache_key in self.fallback_cache:
-                del self.fallback_cache[cache_key]
+            if self.fallback_cache.delete(cache_key):
                 deleted = True
             
             if deleted:
@@ -298,24 +507,224 @@ class CacheService:
             self.metrics.errors += 1
             return False
     
+    def get_many(self, keys: List[str], namespace: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get several values in one round trip.
+        
+        Keys missing from the cache are absent from the result, so callers
+        can load just those from the database.
+        """
+        start_time = time.time()
+        cache_keys = {key: self._make_key(key, namespace) for key in dict.fromkeys(keys)}
+        found: Dict[str, Any] = {}
+        
+        try:
+            pending = list(cache_keys)
+            
+            # Try Redis first, behind this worker's L1
+            if self.redis_client and pending:
+                use_l1 = self._l1_active()
+                if use_l1:
+                    remaining = []
+                    for key in pending:
+                        payload = self.l1_cache.get(namespace, cache_keys[key])
+                        if payload is not None and self._decode_into(found, key, payload):
+                            self.metrics.l1_hits += 1
+                        else:
+                            self.metrics.l1_misses += 1
+                            remaining.append(key)
+                    pending = remaining
+                
+                if pending:
+                    try:
+                        values = self.redis_client.mget([cache_keys[key] for key in pending])
+                        remaining = []
+                        for key, value in zip(pending, values):
+                            if value is not None and self._decode_into(found, key, value):
+                                self.metrics.l2_hits += 1
+                                self.metrics.bytes_read += len(value)
+                                if use_l1:
+                                    self.l1_cache.set(namespace, cache_keys[key], value, self.config.l1_ttl)
+                            else:
+                                self.metrics.l2_misses += 1
+                                remaining.append(key)
+                        pending = remaining
+                    except RedisError as e:
+                        logger.warning(f"Redis mget failed for {len(pending)} keys: {e}")
+                        self.metrics.errors += 1
+            
+            # Fallback to in-memory cache
+            for key in pending:
+                value = self.fallback_cache.get(cache_keys[key])
+                if value is not None:
+                    found[key] = self._unwrap_entry(value)[0]
+            
+            self.metrics.hits += len(found)
+            self.metrics.misses += len(cache_keys) - len(found)
+            self._update_response_time(start_time)
+            return found
+            
+        except Exception as e:
+            logger.error(f"Cache get_many failed for {len(cache_keys)} keys: {e}")
+            self.metrics.errors += 1
+            return {}
+        finally:
+            self.metrics.update_hit_rate()
+    
+    def _decode_into(self, found: Dict[str, Any], key: str, payload: bytes) -> bool:
+        """Decode one payload of a batch; a corrupt entry counts as a miss."""
+        try:
+            found[key] = self._unwrap_entry(self._deserialize_value(payload))[0]
+            return True
+        except CodecError:
+            return False
+    
+    def set_many(self, mapping: Dict[str, Any], ttl: Optional[int] = None,
+                 namespace: Optional[str] = None, tags: Optional[List[str]] = None) -> bool:
+        """Set several values with one pipelined round trip."""
+        if not mapping:
+            return True
+        ttl = ttl or self.config.default_ttl
+        ttl = min(ttl, self.config.max_ttl)  # Enforce max TTL
+        
+        try:
+            # Try Redis first
+            if self.redis_client:
+                payloads = {
+                    self._make_key(key, namespace): self._serialize_value(value, namespace)
+                    for key, value in mapping.items()
+                }
+                try:
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    for cache_key, payload in payloads.items():
+                        pipe.setex(cache_key, ttl, payload)
+                        self._queue_tag_index(pipe, cache_key, tags, ttl)
+                    pipe.execute()
+                    self.metrics.sets += len(payloads)
+                    self.metrics.bytes_written += sum(len(payload) for payload in payloads.values())
+                    if self._l1_active():
+                        for cache_key, payload in payloads.items():
+                            self.l1_cache.set(namespace, cache_key, payload, min(ttl, self.config.l1_ttl))
+                        self._publish_invalidation(keys=list(payloads))
+                    return True
+                except RedisError as e:
+                    logger.warning(f"Redis set_many failed for {len(payloads)} keys: {e}")
+                    self.metrics.errors += 1
+            
+            # Fallback to in-memory cache
+            for key, value in mapping.items():
+                cache_key = self._make_key(key, namespace)
+                self.fallback_cache.set(cache_key, value, ttl, tags)
+                self._handle_tags(cache_key, tags)
+            self.metrics.evictions = self.fallback_cache.evictions
+            self.metrics.sets += len(mapping)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Cache set_many failed for {len(mapping)} keys: {e}")
+            self.metrics.errors += 1
+            return False
+    
+    def delete_many(self, keys: List[str], namespace: Optional[str] = None) -> int:
+        """Delete several values; returns how many existed."""
+        cache_keys = [self._make_key(key, namespace) for key in dict.fromkeys(keys)]
+        if not cache_keys:
+            return 0
+        deleted = 0
+        
+        try:
+            if self.l1_cache is not None:
+                for cache_key in cache_keys:
+                    self.l1_cache.delete(cache_key)
+            
+            # Try Redis first
+            if self.redis_client:
+                try:
+                    deleted += self.redis_client.unlink(*cache_keys)
+                    self._remove_redis_tag_entries(cache_keys)
+                except RedisError as e:
+                    logger.warning(f"Redis delete_many failed for {len(cache_keys)} keys: {e}")
+                    self.metrics.errors += 1
+            
+            # Also remove from fallback cache
+            for cache_key in cache_keys:
+                if self.fallback_cache.delete(cache_key):
+                    deleted += 1
+                self._remove_local_key_from_tags(cache_key)
+            
+            self.metrics.deletes += deleted
+            self._publish_invalidation(keys=cache_keys)
+            return deleted
+            
+        except Exception as e:
+            logger.error(f"Cache delete_many failed for {len(cache_keys)} keys: {e}")
+            self.metrics.errors += 1
+            return deleted
+    
+    def get_or_load_many(self, ids: List[Any], loader: Callable[[List[Any]], Dict[Any, Any]],
+                         key_func: Callable[[Any], str] = str, ttl: Optional[int] = None,
+                         namespace: Optional[str] = None,
+                         tags: Optional[List[str]] = None) -> Dict[Any, Any]:
+        """
+        Assemble per-item values from cache fragments, loading only the misses.
+        
+        Args:
+            ids: Item identifiers, e.g. (id, updated_at) pairs so that edited
+                rows get new keys instead of needing invalidation
+            loader: Called once with the missing ids; returns {id: value}
+            key_func: Maps an id to its cache key
+            
+        Returns:
+            {id: value} for every id that was cached or returned by loader
+        """
+        keys = {item_id: key_func(item_id) for item_id in ids}
+        cached = self.get_many(list(keys.values()), namespace)
+        
+        result = {}
+        missing = []
+        for item_id, key in keys.items():
+            if key in cached:
+                result[item_id] = cached[key]
+            else:
+                missing.append(item_id)
+        
+        if missing:
+            loaded = loader(missing) or {}
+            self.set_many({keys[item_id]: value for item_id, value in loaded.items() if item_id in keys},
+                          ttl, namespace, tags)
+            result.update(loaded)
+        
+        return result
+    
     def invalidate_by_tags(self, tags: List[str]) -> int:
-        """Invalidate all cache entries with specified tags."""
+        """Invalidate all cache entries with specified tags, whichever worker wrote them."""
         invalidated_count = 0
+        invalidated_keys: List[str] = []
         
-        for tag in tags:
-            if tag in self._tags_to_keys:
-                keys_to_delete = list(self._tags_to_keys[tag])
-                for cache_key in keys_to_delete:
-                    # Extract original key and namespace
-                    key_parts = cache_key.split(":", 2)
-                    if len(key_parts) >= 2:
-                        key = key_parts[-1]
-                        namespace = key_parts[-2] if len(key_parts) > 2 else None
-                        if self.delete(key, namespace):
-                            invalidated_count += 1
-                
-                # Clear the tag mapping
-                del self._tags_to_keys[tag]
+        for tag in dict.fromkeys(tags):
+            if self.redis_client:
+                try:
+                    keys, deleted = self._invalidate_redis_tag(tag)
+                    invalidated_keys.extend(keys)
+                    invalidated_count += deleted
+                except RedisError as e:
+                    logger.warning(f"Redis tag invalidation failed for tag {tag}: {e}")
+                    self.metrics.errors += 1
+            
+            # Entries written to the fallback cache while Redis was down
+            for cache_key in self._tags_to_keys.pop(tag, set()):
+                invalidated_keys.append(cache_key)
+                if self.fallback_cache.delete(cache_key):
+                    invalidated_count += 1
+                self._remove_local_key_from_tags(cache_key)
+        
+        if self.l1_cache is not None:
+            for cache_key in invalidated_keys:
+                self.l1_cache.delete(cache_key)
+        self.metrics.deletes += invalidated_count
+        
+        # One message evicts every key from the other workers' L1
+        self._publish_invalidation(keys=invalidated_keys)
         
         logger.info(f"Invalidated {invalidated_count} cache entries for tags: {tags}")
         return invalidated_count
@@ -326,21 +735,26 @@ class CacheService:
         invalidated_count = 0
         
         try:
-            # Try Redis pattern deletion
+            # Try Redis pattern deletion; SCAN walks the keyspace incrementally
+            # instead of blocking the server like KEYS
             if self.redis_client:
                 try:
-                    keys = self.redis_client.keys(pattern_key)
-                    if keys:
-                        deleted = self.redis_client.delete(*keys)
-                        invalidated_count += deleted
+                    scan = self.redis_client.scan_iter(match=pattern_key, count=self.config.scan_batch_size)
+                    for batch in self._batched(scan):
+                        invalidated_count += self.redis_client.unlink(*batch)
                 except RedisError as e:
                     logger.warning(f"Redis pattern delete failed: {e}")
             
             # Also clear from fallback cache
-            keys_to_delete = [k for k in self.fallback_cache.keys() if k.startswith(pattern_key.replace("*", ""))]
+            keys_to_delete = [k for k in self.fallback_cache.keys() if fnmatch.fnmatchcase(k, pattern_key)]
             for key in keys_to_delete:
-                del self.fallback_cache[key]
-                invalidated_count += 1
+                if self.fallback_cache.delete(key):
+                    invalidated_count += 1
+                self._remove_local_key_from_tags(key)
+            
+            if self.l1_cache is not None:
+                self.l1_cache.delete_matching(pattern_key)
+            self._publish_invalidation(pattern=pattern_key)
             
             logger.info(f"Invalidated {invalidated_count} cache entries for pattern: {pattern}")
             return invalidated_count
@@ -366,29 +780,185 @@ class CacheService:
     
     def get_or_set(self, key: str, value_func: Callable[[], Any], 
                    ttl: Optional[int] = None, namespace: Optional[str] = None,
-                   tags: Optional[List[str]] = None) -> Any:
-        """Get value from cache or compute and cache it."""
-        cached_value = self.get(key, namespace)
-        if cached_value is not None:
-            return cached_value
+                   tags: Optional[List[str]] = None, stale_ttl: Optional[int] = None,
+                   early_refresh_beta: Optional[float] = None) -> Any:
+        """
+        Get value from cache or compute and cache it.
         
-        try:
-            value = value_func()
-            self.set(key, value, ttl, namespace, tags)
+        Concurrent misses on one key are coalesced: a per-key lock within the
+        worker and a short Redis lock across workers let a single caller run
+        value_func while the others wait for its result. For stale_ttl seconds
+        after expiry the previous value keeps being served while one caller
+        refreshes it, and with early_refresh_beta > 0 callers refresh
+        probabilistically before expiry (XFetch) so hot keys do not all
+        expire at the same moment.
+        """
+        ttl = ttl or self.config.default_ttl
+        stale_ttl = self.config.stale_ttl if stale_ttl is None else stale_ttl
+        beta = self.config.early_refresh_beta if early_refresh_beta is None else early_refresh_beta
+        
+        value, expires_at, delta = self._unwrap_entry(self._get_stored(key, namespace))
+        if value is not None:
+            if expires_at is None:
+                return value  # Stored by set(), no refresh metadata
+            now = time.time()
+            if now < expires_at:
+                if not self._should_refresh_early(now, expires_at, delta, beta):
+                    return value
+                refreshing_early = True
+            else:
+                refreshing_early = False
+            
+            # Only one caller refreshes; everyone else keeps the current value
+            refreshed = self._refresh_if_unlocked(key, value_func, ttl, namespace, tags, stale_ttl)
+            if refreshed is not None:
+                if refreshing_early:
+                    self.metrics.early_refreshes += 1
+                return refreshed
+            if not refreshing_early:
+                self.metrics.stale_hits += 1
             return value
+        
+        try:
+            return self._compute_single_flight(key, value_func, ttl, namespace, tags, stale_ttl)
         except Exception as e:
             logger.error(f"Get-or-set failed for key {key}: {e}")
             raise
     
+    def _should_refresh_early(self, now: float, expires_at: float, delta: float, beta: float) -> bool:
+        """XFetch: refresh with a probability that grows as expiry nears and with recompute cost."""
+        if beta <= 0 or delta <= 0:
+            return False
+        return now - delta * beta * math.log(1.0 - random.random()) >= expires_at
+    
+    def _compute_and_store(self, key: str, value_func: Callable[[], Any], ttl: int,
+                           namespace: Optional[str], tags: Optional[List[str]],
+                           stale_ttl: int) -> Any:
+        """Run value_func and store its result with refresh metadata."""
+        started = time.time()
+        value = value_func()
+        finished = time.time()
+        entry = {
+            ENTRY_MARKER: 1,
+            "value": value,
+            "expires_at": finished + ttl,
+            "delta": finished - started
+        }
+        self.set(key, entry, ttl + max(stale_ttl, 0), namespace, tags)
+        return value
+    
+    def _compute_single_flight(self, key: str, value_func: Callable[[], Any], ttl: int,
+                               namespace: Optional[str], tags: Optional[List[str]],
+                               stale_ttl: int) -> Any:
+        """Compute a missing value once, letting concurrent callers share the result."""
+        cache_key = self._make_key(key, namespace)
+        deadline = time.time() + self.config.lock_wait_timeout
+        
+        with self._local_lock(cache_key, self.config.lock_wait_timeout) as acquired:
+            if acquired:
+                # Another thread may have filled the key while we waited
+                value = self.get(key, namespace)
+                if value is not None:
+                    self.metrics.coalesced_requests += 1
+                    return value
+                
+                token = self._acquire_distributed_lock(cache_key)
+                if token is not None:
+                    try:
+                        return self._compute_and_store(key, value_func, ttl, namespace, tags, stale_ttl)
+                    finally:
+                        self._release_distributed_lock(cache_key, token)
+                
+                # Another worker is computing the value
+                while time.time() < deadline:
+                    time.sleep(self.config.lock_poll_interval)
+                    value = self.get(key, namespace)
+                    if value is not None:
+                        self.metrics.coalesced_requests += 1
+                        return value
+            
+            # Do not fail the request because the other computation is slow
+            self.metrics.lock_timeouts += 1
+            return self._compute_and_store(key, value_func, ttl, namespace, tags, stale_ttl)
+    
+    def _refresh_if_unlocked(self, key: str, value_func: Callable[[], Any], ttl: int,
+                             namespace: Optional[str], tags: Optional[List[str]],
+                             stale_ttl: int) -> Optional[Any]:
+        """Refresh a value unless another caller already is; returns None if skipped."""
+        cache_key = self._make_key(key, namespace)
+        with self._local_lock(cache_key, 0) as acquired:
+            if not acquired:
+                return None
+            token = self._acquire_distributed_lock(cache_key)
+            if token is None:
+                return None
+            try:
+                return self._compute_and_store(key, value_func, ttl, namespace, tags, stale_ttl)
+            except Exception as e:
+                # The stale value is still better than an error
+                logger.error(f"Cache refresh failed for key {key}: {e}")
+                return None
+            finally:
+                self._release_distributed_lock(cache_key, token)
+    
+    @contextmanager
+    def _local_lock(self, cache_key: str, timeout: float):
+        """Per-key lock within this worker; yields whether it was acquired."""
+        with self._key_locks_guard:
+            holder = self._key_locks.setdefault(cache_key, [threading.Lock(), 0])
+            holder[1] += 1
+        lock = holder[0]
+        acquired = lock.acquire(timeout=timeout) if timeout > 0 else lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+            with self._key_locks_guard:
+                holder[1] -= 1
+                if holder[1] == 0:
+                    self._key_locks.pop(cache_key, None)
+    
+    def _acquire_distributed_lock(self, cache_key: str) -> Optional[str]:
+        """
+        Take the short-lived recompute lock shared by all workers.
+        
+        Returns a token to release it with, or None if another worker holds
+        it. Without Redis there are no other workers to coordinate with.
+        """
+        token = uuid.uuid4().hex
+        if not self.redis_client:
+            return token
+        try:
+            if self.redis_client.set(f"{cache_key}:lock", token, nx=True, ex=self.config.lock_timeout):
+                return token
+            return None
+        except RedisError as e:
+            logger.warning(f"Cache lock failed for key {cache_key}: {e}")
+            self.metrics.errors += 1
+            return token
+    
+    def _release_distributed_lock(self, cache_key: str, token: str):
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, f"{cache_key}:lock", token)
+        except RedisError as e:
+            # The lock expires on its own after lock_timeout
+            logger.warning(f"Cache lock release failed for key {cache_key}: {e}")
+    
+    @staticmethod
+    def _unwrap_entry(stored: Any):
+        """Split a stored value into (value, expires_at, delta); plain values have no metadata."""
+        if isinstance(stored, dict) and stored.get(ENTRY_MARKER):
+            return stored.get("value"), stored.get("expires_at"), stored.get("delta", 0.0)
+        return stored, None, 0.0
+    
     def clear_all(self, namespace: Optional[str] = None) -> bool:
         """Clear all cache entries, optionally for a specific namespace."""
         try:
-            if namespace:
-                pattern = f"{self.config.key_prefix}:{namespace}:*"
-            else:
-                pattern = f"{self.config.key_prefix}:*"
-            
-            return self.invalidate_pattern(pattern) >= 0
+            # invalidate_pattern() adds the key prefix and namespace
+            return self.invalidate_pattern("*", namespace) >= 0
             
         except Exception as e:
             logger.error(f"Clear all failed: {e}")
@@ -415,6 +985,9 @@ class CacheService:
             metrics_dict = asdict(self.metrics)
             metrics_dict.update(redis_info)
             metrics_dict["fallback_cache_size"] = len(self.fallback_cache)
+            if self.l1_cache is not None:
+                metrics_dict["l1_cache_size"] = len(self.l1_cache)
+                metrics_dict["l1_namespaces"] = self.l1_cache.stats()
             metrics_dict["tags_count"] = len(self._tags_to_keys)
             
             return metrics_dict
@@ -444,25 +1017,190 @@ class CacheService:
         
         return health
     
+    def _l1_active(self) -> bool:
+        """
+        Whether reads may be served from this worker's L1.
+        
+        L1 entries are only safe while the worker hears invalidations from the
+        others, so the subscriber is (re)started here, including after a fork.
+        """
+        if self.l1_cache is None or not self.redis_client:
+            return False
+        if self._subscriber_pid != os.getpid():
+            self._start_invalidation_subscriber()
+        return self._subscriber_pid == os.getpid()
+    
+    def _start_invalidation_subscriber(self):
+        """Subscribe to the invalidation channel in a background thread."""
+        with self._subscriber_lock:
+            if self._subscriber_pid == os.getpid():
+                return
+            # A forked worker inherits stale entries but not the parent's thread
+            self.l1_cache.clear()
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self.config.invalidation_channel: self._handle_invalidation_message})
+                self._subscriber_thread = pubsub.run_in_thread(
+                    sleep_time=1.0,
+                    daemon=True,
+                    exception_handler=self._handle_subscriber_error
+                )
+                self._subscriber_pid = os.getpid()
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscriber failed to start, L1 disabled: {e}")
+    
+    def _handle_subscriber_error(self, error, pubsub, thread):
+        """Drop L1 when the subscription breaks, since invalidations may have been missed."""
+        logger.warning(f"Cache invalidation subscriber stopped: {error}")
+        thread.stop()
+        try:
+            pubsub.close()
+        except Exception:
+            pass
+        self._subscriber_pid = None
+        self.l1_cache.clear()
+    
+    def _publish_invalidation(self, keys: Optional[List[str]] = None, pattern: Optional[str] = None):
+        """Tell the other workers to evict keys from their L1."""
+        if self.l1_cache is None or not self.redis_client or not (keys or pattern):
+            return
+        message = {"origin": self._origin()}
+        if keys:
+            message["keys"] = keys
+        if pattern:
+            message["pattern"] = pattern
+        try:
+            self.redis_client.publish(self.config.invalidation_channel, json.dumps(message))
+            self.metrics.invalidations_published += 1
+        except RedisError as e:
+            logger.warning(f"Cache invalidation publish failed: {e}")
+            self.metrics.errors += 1
+    
+    def _handle_invalidation_message(self, message: Dict[str, Any]):
+        """Evict keys named by an invalidation message from this worker's L1."""
+        try:
+            payload = json.loads(message["data"])
+        except (TypeError, ValueError, KeyError):
+            logger.warning("Ignoring malformed cache invalidation message")
+            return
+        if payload.get("origin") == self._origin():
+            return  # Already evicted locally
+        self.metrics.invalidations_received += 1
+        for cache_key in payload.get("keys", []):
+            self.l1_cache.delete(cache_key)
+        if payload.get("pattern"):
+            self.l1_cache.delete_matching(payload["pattern"])
+    
+    def _origin(self) -> str:
+        # The pid is read on every call because workers may fork after init
+        return f"{self._instance_id}:{os.getpid()}"
+    
+    def _tag_key(self, tag: str) -> str:
+        """Redis set holding the cache keys tagged with tag."""
+        return f"{self.config.key_prefix}:_tag:{tag}"
+    
+    def _key_tags_key(self, cache_key: str) -> str:
+        """Redis set holding the tags of a cache key (reverse index)."""
+        return f"{self.config.key_prefix}:_keytags:{cache_key}"
+    
+    def _queue_tag_index(self, pipe, cache_key: str, tags: Optional[List[str]], ttl: int):
+        """
+        Queue the tag index updates for an entry on a Redis pipeline.
+        
+        Tag sets expire max_ttl after their last write, which no member can
+        outlive, so abandoned sets never accumulate. The reverse index lives
+        exactly as long as the entry.
+        """
+        if not tags:
+            return
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            pipe.sadd(tag_key, cache_key)
+            pipe.expire(tag_key, self.config.max_ttl)
+        key_tags_key = self._key_tags_key(cache_key)
+        pipe.sadd(key_tags_key, *tags)
+        pipe.expire(key_tags_key, ttl)
+    
+    def _invalidate_redis_tag(self, tag: str):
+        """Delete every Redis entry tagged with tag; returns (keys, deleted count)."""
+        tag_key = self._tag_key(tag)
+        # Claim the current members atomically; entries tagged from now on
+        # start a fresh set and are not lost by deleting this one
+        claimed_key = f"{tag_key}:invalidating:{uuid.uuid4().hex}"
+        try:
+            self.redis_client.rename(tag_key, claimed_key)
+        except ResponseError:
+            return [], 0  # No entries carry this tag
+        
+        keys: List[str] = []
+        deleted = 0
+        try:
+            members = self.redis_client.sscan_iter(claimed_key, count=self.config.scan_batch_size)
+            for batch in self._batched(members):
+                batch = [member.decode() if isinstance(member, bytes) else member for member in batch]
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.unlink(*batch)
+                pipe.unlink(*[self._key_tags_key(cache_key) for cache_key in batch])
+                deleted += pipe.execute()[0]
+                keys.extend(batch)
+        finally:
+            self.redis_client.unlink(claimed_key)
+        return keys, deleted
+    
+    def _batched(self, iterable):
+        """Yield lists of up to scan_batch_size items."""
+        batch = []
+        for item in iterable:
+            batch.append(item)
+            if len(batch) >= self.config.scan_batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
     def _handle_tags(self, cache_key: str, tags: Optional[List[str]]):
-        """Handle tag associations for cache invalidation."""
+        """Handle tag associations for entries in the fallback cache."""
         if tags:
             for tag in tags:
                 if tag not in self._tags_to_keys:
                     self._tags_to_keys[tag] = set()
                 self._tags_to_keys[tag].add(cache_key)
+            self._keys_to_tags.setdefault(cache_key, set()).update(tags)
     
     def _remove_key_from_tags(self, cache_key: str):
-        """Remove key from all tag associations."""
-        tags_to_remove = []
-        for tag, keys in self._tags_to_keys.items():
-            if cache_key in keys:
-                keys.remove(cache_key)
-                if not keys:  # No more keys for this tag
-                    tags_to_remove.append(tag)
+        """Remove key from its tag associations, via the reverse index."""
+        self._remove_local_key_from_tags(cache_key)
+        
+        if self.redis_client:
+            try:
+                self._remove_redis_tag_entries([cache_key])
+            except RedisError as e:
+                # Stale members are harmless and expire with their tag set
+                logger.warning(f"Redis tag cleanup failed for key {cache_key}: {e}")
+    
+    def _remove_redis_tag_entries(self, cache_keys: List[str]):
+        """Drop deleted keys from their Redis tag sets in two round trips."""
+        key_tags_keys = [self._key_tags_key(cache_key) for cache_key in cache_keys]
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key_tags_key in key_tags_keys:
+            pipe.smembers(key_tags_key)
+        tag_sets = pipe.execute()
         
-        for tag in tags_to_remove:
-            del self._tags_to_keys[tag]
+        pipe = self.redis_client.pipeline(transaction=False)
+        for cache_key, tags in zip(cache_keys, tag_sets):
+            for tag in tags or ():
+                tag = tag.decode() if isinstance(tag, bytes) else tag
+                pipe.srem(self._tag_key(tag), cache_key)
+        pipe.unlink(*key_tags_keys)
+        pipe.execute()
+    
+    def _remove_local_key_from_tags(self, cache_key: str):
+        for tag in self._keys_to_tags.pop(cache_key, set()):
+            keys = self._tags_to_keys.get(tag)
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:  # No more keys for this tag
+                    del self._tags_to_keys[tag]
     
     def _update_response_time(self, start_time: float):
         """Update average response time metric."""
@@ -496,8 +1234,9 @@ def get_cache_service() -> CacheService:
 
 
 def cached(ttl: int = 3600, namespace: Optional[str] = None, 
-           tags: Optional[List[str]] = None, key_func: Optional[Callable] = None):
-    """Decorator for caching function results."""
+           tags: Optional[List[str]] = None, key_func: Optional[Callable] = None,
+           stale_ttl: Optional[int] = None, early_refresh_beta: Optional[float] = None):
+    """Decorator for caching function results, with get_or_set stampede protection."""
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
@@ -515,7 +1254,8 @@ def cached(ttl: int = 3600, namespace: Optional[str] = None,
             def compute_value():
                 return func(*args, **kwargs)
             
-            return cache.get_or_set(cache_key, compute_value, ttl, namespace, tags)
+            return cache.get_or_set(cache_key, compute_value, ttl, namespace, tags,
+                                    stale_ttl=stale_ttl, early_refresh_beta=early_refresh_beta)
         
         return wrapper
     return decorator
\ No newline at end of file
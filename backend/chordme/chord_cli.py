@@ -102,7 +102,69 @@ def chord_stats():
         click.echo(f"❌ Error retrieving chord statistics: {str(e)}")
 
 
+@click.command()
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Number of songs scored per vectorized batch.')
+@click.option('--overwrite', is_flag=True,
+              help='Replace keys that are already set on songs.')
+@click.option('--min-confidence', default=0.5, show_default=True,
+              help='Minimum confidence required to store a detected key.')
+@click.option('--dry-run', is_flag=True,
+              help='Report detected keys without writing them.')
+@with_appcontext
+def detect_song_keys(batch_size, overwrite, min_confidence, dry_run):
+    """Detect and backfill Song.song_key for the whole library."""
+    from .models import db, Song
+    from .chordpro_utils import detect_key_signatures
+    
+    stats = {'scanned': 0, 'updated': 0, 'low_confidence': 0}
+    last_id = 0
+    
+    try:
+        while True:
+            query = Song.query.filter(Song.id > last_id, Song.is_deleted.isnot(True))
+            if not overwrite:
+                query = query.filter(db.or_(Song.song_key.is_(None), Song.song_key == ''))
+            songs = query.order_by(Song.id).limit(batch_size).all()
+            
+            if not songs:
+                break
+            
+            results = detect_key_signatures([song.content for song in songs])
+            
+            for song, result in zip(songs, results):
+                if result['confidence'] < min_confidence:
+                    stats['low_confidence'] += 1
+                    continue
+                if song.song_key != result['detected_key']:
+                    stats['updated'] += 1
+                    if not dry_run:
+                        song.song_key = result['detected_key']
+            
+            stats['scanned'] += len(songs)
+            last_id = songs[-1].id
+            
+            if dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+            db.session.expunge_all()
+            click.echo(f"   Processed {stats['scanned']} songs...")
+        
+        action = "Would update" if dry_run else "Updated"
+        click.echo("\n🎼 Key Detection Summary:")
+        click.echo(f"   Songs scanned: {stats['scanned']}")
+        click.echo(f"   {action}: {stats['updated']}")
+        click.echo(f"   Below confidence threshold: {stats['low_confidence']}")
+        
+    except Exception as e:
+        db.session.rollback()
+        click.echo(f"❌ Error during key detection: {str(e)}")
+        exit(1)
+
+
 def init_app(app):
     """Initialize CLI commands with the Flask app."""
     app.cli.add_command(populate_chords)
-    app.cli.add_command(chord_stats)
\ No newline at end of file
+    app.cli.add_command(chord_stats)
+    app.cli.add_command(detect_song_keys)
\ No newline at end of file
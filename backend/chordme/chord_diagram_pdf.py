@@ -4,6 +4,7 @@ Converts chord definitions to visual diagrams embedded in PDF output.
 """
 
 from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
 from reportlab.graphics import renderPDF
 from reportlab.graphics.shapes import Drawing, Group, Line, Circle, String
 from reportlab.lib.units import inch
@@ -11,8 +12,26 @@ from reportlab.lib.colors import black, white, Color
 from reportlab.graphics.charts.textlabels import Label
 import re
 import json
+import threading
 from dataclasses import dataclass
 
+DIAGRAM_CACHE_SIZE = 512  # Chord diagrams kept per thread
+
+# Shapes of each chord diagram keyed by (instrument, name, definition, width,
+# height), one cache per thread: the renderer sets and deletes ``_parent`` on
+# every shape it draws, so shapes are shared by the documents a thread
+# renders one after another but never between threads. Each use wraps them in
+# its own Drawing.
+_diagram_caches = threading.local()
+_diagram_cache_generation = 0  # bumped to clear every thread's cache
+
+
+def _thread_diagram_cache() -> 'OrderedDict[Tuple, Optional[Tuple]]':
+    if getattr(_diagram_caches, 'generation', None) != _diagram_cache_generation:
+        _diagram_caches.generation = _diagram_cache_generation
+        _diagram_caches.cache = OrderedDict()
+    return _diagram_caches.cache
+
 
 @dataclass
 class ChordPosition:
@@ -271,6 +290,46 @@ class ChordDiagramGenerator:
             chord.name = chord_name
             
         return self.create_diagram_drawing(chord)
+    
+    def get_chord_diagram(self, chord_definition: str, chord_name: str = None,
+                          instrument: str = 'guitar') -> Optional[Drawing]:
+        """
+        Cached version of ``generate_chord_diagram_pdf_element``: each chord is
+        drawn once per thread and size, and every call gets a new Drawing
+        holding the thread's shapes. The Drawing is a flowable that ReportLab
+        binds to the document and canvas it is drawn on, so it is never
+        shared; the shapes must not be modified.
+        """
+        cache = _thread_diagram_cache()
+        key = (instrument, chord_name, chord_definition, self.width, self.height)
+        if key in cache:
+            cache.move_to_end(key)
+            shapes = cache[key]
+        else:
+            drawing = self.generate_chord_diagram_pdf_element(chord_definition, chord_name, instrument)
+            shapes = cache[key] = tuple(drawing.contents) if drawing is not None else None
+            while len(cache) > DIAGRAM_CACHE_SIZE:
+                cache.popitem(last=False)
+        
+        if shapes is None:
+            return None
+        return Drawing(self.width, self.height, *shapes)
+
+
+def warm_chord_diagrams(width: float = 1.2 * inch, height: float = 1.5 * inch) -> int:
+    """Draw every common chord for every instrument in the calling thread; returns the number drawn."""
+    generator = ChordDiagramGenerator(width, height)
+    count = 0
+    for instrument, chords in COMMON_CHORDS.items():
+        for chord_name, definition in chords.items():
+            generator.get_chord_diagram(definition, chord_name, instrument)
+            count += 1
+    return count
+
+
+def clear_chord_diagram_cache():
+    global _diagram_cache_generation
+    _diagram_cache_generation += 1
 
 
 def create_chord_diagram_for_pdf(chord_definition: str, chord_name: str = None, 
@@ -6,8 +6,11 @@ supporting various chord formats and notations.
 """
 
 import re
+import functools
 from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+
+from .chordpro_parser import parse_chordpro
 
 
 @dataclass
@@ -88,8 +91,30 @@ class ChordRecognitionEngine:
     }
     
     def parse_chord(self, input_chord: str) -> ParsedChord:
-        """Parse a chord notation into its components"""
-        original = input_chord.strip()
+        """
+        Parse a chord notation into its components.
+        
+        Parses are memoized per chord spelling; each call returns its own
+        copy, so callers may modify the result.
+        """
+        return _copy_parsed_chord(_parse_chord_cached(input_chord.strip()))
+    
+    def parse_cache_info(self) -> Dict[str, int]:
+        """Return hit/miss statistics for the chord parse cache"""
+        info = _parse_chord_cached.cache_info()
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'max_size': info.maxsize
+        }
+    
+    def clear_parse_cache(self):
+        """Drop all memoized chord parses"""
+        _parse_chord_cached.cache_clear()
+    
+    def _parse_stripped_chord(self, original: str) -> ParsedChord:
+        """Parse a stripped chord notation"""
         errors = []
         
         if not original:
@@ -124,7 +149,7 @@ class ChordRecognitionEngine:
     
     def is_valid_chord(self, chord: str) -> bool:
         """Validate if a chord notation is valid"""
-        return self.parse_chord(chord).is_valid
+        return _parse_chord_cached(chord.strip()).is_valid
     
     def get_enharmonic_equivalents(self, note: str) -> List[str]:
         """Get all possible enharmonic equivalents for a note"""
@@ -225,17 +250,7 @@ class ChordRecognitionEngine:
     
     def extract_chords_from_content(self, content: str) -> List[ParsedChord]:
         """Extract chords from ChordPro content"""
-        chord_pattern = re.compile(r'\[([^\]]+)\]')
-        chords = []
-        unique_chords = set()
-        
-        for match in chord_pattern.finditer(content):
-            chord_name = match.group(1).strip()
-            if chord_name and chord_name not in unique_chords:
-                chords.append(chord_name)
-                unique_chords.add(chord_name)
-        
-        return self.parse_chords(chords)
+        return self.parse_chords(list(parse_chordpro(content).unique_chords))
     
     def validate_chordpro_content(self, content: str) -> Dict[str, Any]:
         """Validate ChordPro content and return detailed analysis"""
@@ -276,6 +291,26 @@ class ChordRecognitionEngine:
 chord_recognition_engine = ChordRecognitionEngine()
 
 
+# Number of distinct chord spellings kept by the parse cache
+PARSE_CACHE_SIZE = 2048
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_chord_cached(original: str) -> ParsedChord:
+    """Parse a stripped chord notation (memoized; never hand the result out directly)"""
+    return chord_recognition_engine._parse_stripped_chord(original)
+
+
+def _copy_parsed_chord(parsed: ParsedChord) -> ParsedChord:
+    """Copy a cached parse, including its mutable components and lists"""
+    return replace(
+        parsed,
+        components=replace(parsed.components),
+        enharmonic_equivalents=list(parsed.enharmonic_equivalents),
+        errors=list(parsed.errors) if parsed.errors is not None else None
+    )
+
+
 # Legacy compatibility functions
 def is_valid_chord(chord: str) -> bool:
     """Legacy compatibility function for chord validation"""
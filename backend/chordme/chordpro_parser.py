@@ -0,0 +1,287 @@
+"""
+Single-pass ChordPro parser with content-hash memoization.
+
+This module turns ChordPro text into a compact, immutable song AST
+(directives, sections, lines and chord positions) in one linear pass over
+the content. Parsed songs are kept in a bounded LRU cache keyed by a digest
+of the content, so validation, key detection, chord recognition, music
+analysis and PDF rendering all share a single parse of the same song.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+# Inline markup patterns, applied to one line at a time
+DIRECTIVE_PATTERN = re.compile(r'\{([^}]+)\}')
+CHORD_PATTERN = re.compile(r'\[([^\]]+)\]')
+
+# Section directives and their short ChordPro aliases
+SECTION_START_ALIASES = {'soc': 'chorus', 'sov': 'verse', 'sob': 'bridge', 'sot': 'tab'}
+SECTION_END_ALIASES = {'eoc': 'chorus', 'eov': 'verse', 'eob': 'bridge', 'eot': 'tab'}
+
+DEFAULT_CACHE_SIZE = 512
+
+
+@dataclass(frozen=True)
+class ChordToken:
+    """A chord occurrence within a line."""
+    name: str  # Raw text between the brackets
+    column: int  # Offset of the opening bracket in the stripped line
+    position: int  # Offset in the lyrics once chord markup is removed
+
+
+@dataclass(frozen=True)
+class Directive:
+    """A ChordPro directive such as {title: Song} or {start_of_chorus}."""
+    raw: str  # Text between the braces
+    name: str
+    value: Optional[str]  # None for directives without a value
+    line_index: int
+
+
+@dataclass(frozen=True)
+class SongLine:
+    """A single source line with its markup already tokenized."""
+    index: int
+    raw: str
+    text: str  # Stripped line
+    directive: Optional[Directive]  # Set when the whole line is a directive
+    chords: Tuple[ChordToken, ...]
+    lyrics: str  # Stripped line with chord markup removed
+
+    @property
+    def is_blank(self) -> bool:
+        return not self.text
+
+
+@dataclass(frozen=True)
+class Section:
+    """A {start_of_*} ... {end_of_*} block."""
+    section_type: str
+    label: Optional[str]  # Parameter of the start directive, e.g. "1" or "Verse 1"
+    start_line: int
+    end_line: int
+    closed: bool  # False when the block ran to the next section or end of song
+
+
+@dataclass(frozen=True)
+class SongAST:
+    """Immutable parse tree of a ChordPro song."""
+    content_hash: str
+    lines: Tuple[SongLine, ...]
+    directives: Tuple[Directive, ...]
+    sections: Tuple[Section, ...]
+    chords: Tuple[str, ...]  # Stripped chord names in order of appearance
+    unique_chords: Tuple[str, ...]  # Distinct chord names in order of first appearance
+
+    def get_directive(self, name: str) -> Optional[Directive]:
+        """Return the first directive with the given name (case-insensitive)."""
+        name = name.lower()
+        for directive in self.directives:
+            if directive.name.lower() == name:
+                return directive
+        return None
+
+    def get_directive_value(self, name: str) -> Optional[str]:
+        """Return the value of the first directive with the given name."""
+        directive = self.get_directive(name)
+        return directive.value if directive else None
+
+    def section_lines(self, section: Section) -> Tuple[SongLine, ...]:
+        """Return the lines enclosed by a section, excluding its delimiters."""
+        end = section.end_line if section.closed else section.end_line + 1
+        return self.lines[section.start_line + 1:end]
+
+
+def content_hash(content: str) -> str:
+    """Stable digest of song content used as the parse cache key."""
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _parse_directive(body: str, line_index: int) -> Directive:
+    if ':' in body:
+        name, value = body.split(':', 1)
+        return Directive(raw=body, name=name.strip(), value=value.strip(), line_index=line_index)
+    return Directive(raw=body, name=body.strip(), value=None, line_index=line_index)
+
+
+def _section_boundary(directive: Directive) -> Tuple[Optional[str], Optional[str]]:
+    """Classify a directive as a section start or end, returning (kind, section_type)."""
+    name = directive.name.lower()
+    if name.startswith('start_of_'):
+        return 'start', name[len('start_of_'):]
+    if name.startswith('end_of_'):
+        return 'end', name[len('end_of_'):]
+    if name in SECTION_START_ALIASES:
+        return 'start', SECTION_START_ALIASES[name]
+    if name in SECTION_END_ALIASES:
+        return 'end', SECTION_END_ALIASES[name]
+    return None, None
+
+
+def _tokenize_line(text: str) -> Tuple[Tuple[ChordToken, ...], str]:
+    """Split a stripped line into chord tokens and plain lyrics."""
+    if '[' not in text:
+        return (), text
+
+    tokens = []
+    lyric_parts = []
+    last_end = 0
+    removed = 0
+    for match in CHORD_PATTERN.finditer(text):
+        start, end = match.span()
+        lyric_parts.append(text[last_end:start])
+        tokens.append(ChordToken(name=match.group(1), column=start, position=start - removed))
+        removed += end - start
+        last_end = end
+    lyric_parts.append(text[last_end:])
+    return tuple(tokens), ''.join(lyric_parts)
+
+
+def _build_ast(content: str, digest: str) -> SongAST:
+    lines = []
+    directives = []
+    sections = []
+    chords = []
+    seen_chords = set()
+    unique_chords = []
+    open_section = None
+
+    for index, raw in enumerate(content.split('\n')):
+        text = raw.strip()
+        line_directive = None
+
+        if '{' in text:
+            for match in DIRECTIVE_PATTERN.finditer(text):
+                directives.append(_parse_directive(match.group(1), index))
+            if text.startswith('{') and text.endswith('}'):
+                line_directive = _parse_directive(text[1:-1], index)
+
+        line_chords, lyrics = _tokenize_line(text)
+        for token in line_chords:
+            name = token.name.strip()
+            if name:
+                chords.append(name)
+                if name not in seen_chords:
+                    seen_chords.add(name)
+                    unique_chords.append(name)
+
+        if line_directive is not None:
+            kind, section_type = _section_boundary(line_directive)
+            if kind == 'start':
+                if open_section is not None:
+                    sections.append(Section(open_section[0], open_section[1],
+                                            open_section[2], index - 1, False))
+                open_section = (section_type, line_directive.value, index)
+            elif kind == 'end' and open_section is not None:
+                sections.append(Section(open_section[0], open_section[1],
+                                        open_section[2], index, True))
+                open_section = None
+
+        lines.append(SongLine(
+            index=index,
+            raw=raw,
+            text=text,
+            directive=line_directive,
+            chords=line_chords,
+            lyrics=lyrics,
+        ))
+
+    if open_section is not None:
+        sections.append(Section(open_section[0], open_section[1],
+                                open_section[2], len(lines) - 1, False))
+
+    return SongAST(
+        content_hash=digest,
+        lines=tuple(lines),
+        directives=tuple(directives),
+        sections=tuple(sections),
+        chords=tuple(chords),
+        unique_chords=tuple(unique_chords),
+    )
+
+
+class ParseCache:
+    """Thread-safe bounded LRU of parsed songs keyed by content hash."""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, SongAST]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[SongAST]:
+        with self._lock:
+            ast = self._entries.get(digest)
+            if ast is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return ast
+
+    def put(self, ast: SongAST):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[ast.content_hash] = ast
+            self._entries.move_to_end(ast.content_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+# Global parse cache shared by all ChordPro consumers in the process
+parse_cache = ParseCache()
+
+
+def parse_chordpro(content: Optional[str]) -> SongAST:
+    """
+    Parse ChordPro content into a cached, immutable song AST.
+
+    Args:
+        content: ChordPro formatted content
+
+    Returns:
+        SongAST: The parsed song, shared with any other caller that parsed
+        identical content
+    """
+    content = content or ''
+    digest = content_hash(content)
+    ast = parse_cache.get(digest)
+    if ast is None:
+        ast = _build_ast(content, digest)
+        parse_cache.put(ast)
+    return ast
+
+
+def clear_parse_cache():
+    """Drop all memoized parses."""
+    parse_cache.clear()
+
+
+def get_parse_cache_info() -> Dict[str, Any]:
+    """Return size and hit statistics for the parse cache."""
+    return parse_cache.info()
@@ -7,7 +7,18 @@ can help validate and parse ChordPro content.
 """
 
 import re
-from typing import Dict, List, Optional, Tuple
+import functools
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .chordpro_parser import parse_chordpro, CHORD_PATTERN
+
+# NumPy is only needed for batch key detection
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
 
 
 class ChordProValidator:
@@ -75,22 +86,12 @@ class ChordProValidator:
         """
         directives = {}
         
-        # Pattern to match {directive: value} or {directive}
-        pattern = r'\{([^}]+)\}'
-        
-        for match in re.finditer(pattern, content):
-            directive_full = match.group(1)
-            
-            if ':' in directive_full:
-                # Directive with value
-                parts = directive_full.split(':', 1)
-                if len(parts) == 2:
-                    key = parts[0].strip()
-                    value = parts[1].strip()
-                    directives[key] = value
+        for directive in parse_chordpro(content).directives:
+            if directive.value is not None:
+                directives[directive.name] = directive.value
             else:
                 # Directive without value (like {start_of_verse})
-                directives[directive_full.strip()] = True
+                directives[directive.name] = True
         
         return directives
     
@@ -105,16 +106,7 @@ class ChordProValidator:
         Returns:
             list: List of unique chords found
         """
-        # Pattern to match [chord] notations
-        pattern = r'\[([^\]]+)\]'
-        
-        chords = set()
-        for match in re.finditer(pattern, content):
-            chord = match.group(1).strip()
-            if chord:  # Skip empty chord notations
-                chords.add(chord)
-        
-        return sorted(list(chords))
+        return sorted(set(parse_chordpro(content).chords))
     
     @staticmethod
     def validate_content(content: str) -> Tuple[bool, List[str]]:
@@ -234,14 +226,14 @@ class ChordProValidator:
         if not content:
             return []
             
-        lines = content.split('\n')
         sections = []
         current_section = None
         current_content = []
         order_index = 0
         
-        for line in lines:
-            stripped = line.strip()
+        for song_line in parse_chordpro(content).lines:
+            line = song_line.raw
+            stripped = song_line.text
             
             # Check for section start directive
             if stripped.startswith('{start_of_'):
@@ -395,6 +387,31 @@ CIRCLE_OF_FIFTHS = {
     'Gb': -6, 'Ebm': -6,
 }
 
+# Major scale diatonic pattern used for key detection
+MAJOR_DIATONIC_PATTERN = [
+    {'interval': 0, 'quality': 'major', 'weight': 3.0},    # I - tonic
+    {'interval': 2, 'quality': 'minor', 'weight': 1.0},    # ii
+    {'interval': 4, 'quality': 'minor', 'weight': 1.0},    # iii
+    {'interval': 5, 'quality': 'major', 'weight': 2.0},    # IV - subdominant
+    {'interval': 7, 'quality': 'major', 'weight': 2.5},    # V - dominant
+    {'interval': 9, 'quality': 'minor', 'weight': 1.5},    # vi
+    {'interval': 11, 'quality': 'diminished', 'weight': 0.5} # vii°
+]
+
+# Minor scale diatonic pattern used for key detection
+MINOR_DIATONIC_PATTERN = [
+    {'interval': 0, 'quality': 'minor', 'weight': 3.0},    # i - tonic
+    {'interval': 2, 'quality': 'diminished', 'weight': 0.5}, # ii°
+    {'interval': 3, 'quality': 'major', 'weight': 1.5},    # III
+    {'interval': 5, 'quality': 'minor', 'weight': 2.0},    # iv - subdominant
+    {'interval': 7, 'quality': 'minor', 'weight': 2.0},    # v
+    {'interval': 8, 'quality': 'major', 'weight': 1.5},    # VI
+    {'interval': 10, 'quality': 'major', 'weight': 1.0}    # VII
+]
+
+# Key directive values accepted by extract_key_signature
+KEY_SIGNATURE_PATTERN = re.compile(r'^[A-G][#b]?m?$', re.IGNORECASE)
+
 # Latin notation to American notation mapping
 LATIN_TO_AMERICAN = {
     'Do': 'C',
@@ -569,6 +586,9 @@ def transpose_chord_with_key(
     """
     Enhanced transpose chord with key signature awareness and notation system support.
     
+    Results are memoized per (chord, semitones, enharmonic preference,
+    notation system), so repeated chords cost a single lookup.
+    
     Args:
         chord: The chord string
         semitones: Number of semitones to transpose
@@ -578,31 +598,85 @@ def transpose_chord_with_key(
     Returns:
         str: The transposed chord
     """
-    if not chord or not ChordProValidator.is_valid_chord(chord):
-        return chord  # Return unchanged if invalid
-
-    if semitones == 0:
+    if not chord or semitones == 0:
         return chord  # No transposition needed
 
-    # Ensure semitones are within reasonable range
-    semitones = ((semitones % 12) + 12) % 12
-    if semitones > 6:
-        semitones = semitones - 12  # Use shorter path on circle
+    return _transpose_chord_cached(
+        chord, semitones % 12, _prefers_flats(key_signature), notation_system
+    )
+
+
+class ChordSymbol(NamedTuple):
+    """Interned, immutable parse of a chord spelling used for transposition."""
+    root: str
+    modifiers: str
+    bass_note: Optional[str]
+    is_slash_chord: bool
+    is_valid: bool
 
+
+# Number of distinct chord spellings and transpositions kept in memory
+CHORD_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=CHORD_CACHE_SIZE)
+def intern_chord(chord: str) -> ChordSymbol:
+    """
+    Parse a chord spelling once and reuse the result.
+    
+    Args:
+        chord: The chord string
+        
+    Returns:
+        ChordSymbol: Parsed components and validity of the chord
+    """
     parsed = parse_chord_enhanced(chord)
-    root = parsed['root']
-    modifiers = parsed['modifiers']
-    bass_note = parsed['bass_note']
-    is_slash_chord = parsed['is_slash_chord']
+    return ChordSymbol(
+        root=parsed['root'],
+        modifiers=parsed['modifiers'],
+        bass_note=parsed['bass_note'],
+        is_slash_chord=parsed['is_slash_chord'],
+        is_valid=bool(chord) and ChordProValidator.is_valid_chord(chord),
+    )
+
+
+def _prefers_flats(key_signature: Optional[str]) -> bool:
+    """Whether a key signature calls for flat spellings."""
+    return CIRCLE_OF_FIFTHS.get(key_signature, 0) < 0 if key_signature else False
+
+
+@functools.lru_cache(maxsize=None)
+def _transposition_table(semitones: int, prefer_flats: bool) -> Dict[str, str]:
+    """Precomputed note -> transposed note table for one interval and spelling."""
+    target_scale = CHROMATIC_SCALE_FLATS if prefer_flats else CHROMATIC_SCALE
+    table = {}
+    for index, note in enumerate(CHROMATIC_SCALE):
+        table[note] = target_scale[(index + semitones) % 12]
+    for flat, sharp in ENHARMONIC_MAP.items():
+        table[flat] = table[sharp]
+    return table
+
+
+@functools.lru_cache(maxsize=CHORD_CACHE_SIZE)
+def _transpose_chord_cached(
+    chord: str,
+    semitones: int,
+    prefer_flats: bool,
+    notation_system: str
+) -> str:
+    """Transpose an interned chord by 0-11 semitones (memoized)."""
+    symbol = intern_chord(chord)
+    if not symbol.is_valid:
+        return chord  # Return unchanged if invalid
 
-    # Transpose root note
-    transposed_root = transpose_note(root, semitones, key_signature)
+    table = _transposition_table(semitones, prefer_flats)
+
+    # Transpose root note, leaving unknown roots unchanged
+    result = table.get(symbol.root, symbol.root) + symbol.modifiers
     
     # Handle slash chords - transpose bass note as well
-    result = transposed_root + modifiers
-    if is_slash_chord and bass_note:
-        transposed_bass = transpose_note(bass_note, semitones, key_signature)
-        result += '/' + transposed_bass
+    if symbol.is_slash_chord and symbol.bass_note:
+        result += '/' + table.get(symbol.bass_note, symbol.bass_note)
 
     # Convert notation system if needed
     if notation_system == 'latin':
@@ -611,6 +685,26 @@ def transpose_chord_with_key(
     return result
 
 
+def get_chord_cache_info() -> Dict[str, Dict[str, int]]:
+    """Return hit/miss statistics for chord interning and transposition caches."""
+    stats = {}
+    for name, cached_func in (('intern', intern_chord), ('transpose', _transpose_chord_cached)):
+        info = cached_func.cache_info()
+        stats[name] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'max_size': info.maxsize
+        }
+    return stats
+
+
+def clear_chord_caches():
+    """Drop all memoized chord parses and transpositions."""
+    intern_chord.cache_clear()
+    _transpose_chord_cached.cache_clear()
+
+
 def transpose_note(note: str, semitones: int, key_signature: str = None) -> str:
     """
     Transpose a single note by semitones with key signature awareness.
@@ -719,20 +813,23 @@ def transpose_chordpro_content_with_key(
     # Auto-detect key signature if not provided
     detected_key = key_signature or extract_key_signature(content)
 
-    # Regular expression to find chord notation in ChordPro format [ChordName]
-    chord_pattern = re.compile(r'\[([^\]]+)\]')
+    # One lookup per distinct chord; repeats hit the per-song table
+    transposed_chords = {}
 
     def transpose_match(match):
         chord_name = match.group(1)
-        transposed_chord = transpose_chord_with_key(
-            chord_name, 
-            semitones, 
-            detected_key,
-            notation_system
-        )
-        return f'[{transposed_chord}]'
+        transposed = transposed_chords.get(chord_name)
+        if transposed is None:
+            transposed = '[' + transpose_chord_with_key(
+                chord_name, 
+                semitones, 
+                detected_key,
+                notation_system
+            ) + ']'
+            transposed_chords[chord_name] = transposed
+        return transposed
 
-    return chord_pattern.sub(transpose_match, content)
+    return CHORD_PATTERN.sub(transpose_match, content)
 
 
 def extract_key_signature(content: str) -> str:
@@ -745,9 +842,15 @@ def extract_key_signature(content: str) -> str:
     Returns:
         str: The key signature if found, None otherwise
     """
-    key_pattern = re.compile(r'\{key\s*:\s*([A-G][#b]?m?)\s*\}', re.IGNORECASE)
-    match = key_pattern.search(content)
-    return match.group(1).strip() if match else None
+    if not content:
+        return None
+    
+    for directive in parse_chordpro(content).directives:
+        if directive.value is None or directive.raw[:1].isspace():
+            continue
+        if directive.name.lower() == 'key' and KEY_SIGNATURE_PATTERN.match(directive.value):
+            return directive.value
+    return None
 
 
 def transpose_chord_intelligent(
@@ -940,22 +1043,12 @@ def detect_key_signature(content: str) -> Dict:
     # First check if there's a manual key signature
     manual_key = extract_key_signature(content)
     if manual_key:
-        return {
-            'detected_key': manual_key,
-            'confidence': 1.0,
-            'is_minor': 'm' in manual_key.lower(),
-            'alternative_keys': []
-        }
+        return _manual_key_detection(manual_key)
     
     # Extract all chords from the content
     chords = _extract_chords_from_content(content)
     if not chords:
-        return {
-            'detected_key': 'C',
-            'confidence': 0.0,
-            'is_minor': False,
-            'alternative_keys': []
-        }
+        return _format_key_detection([])
     
     # Analyze chord frequencies
     chord_frequency = _analyze_chord_frequency(chords)
@@ -967,6 +1060,104 @@ def detect_key_signature(content: str) -> Dict:
     sorted_keys = sorted(key_probabilities.items(), key=lambda x: x[1], reverse=True)
     sorted_keys = [(k, v) for k, v in sorted_keys if v > 0]  # Only include keys with positive scores
     
+    return _format_key_detection(sorted_keys)
+
+
+def detect_key_signatures(contents: List[str]) -> List[Dict]:
+    """
+    Detect key signatures for a batch of songs in one vectorized pass.
+    
+    Each song's chord roots are reduced to a 12-bin pitch-class histogram and
+    the whole batch is scored against the 24x12 key profile matrix with a
+    single matrix multiplication. Results match detect_key_signature().
+    
+    Args:
+        contents: List of ChordPro formatted contents
+        
+    Returns:
+        list: Key detection results, in the same order as contents
+    """
+    results: List[Optional[Dict]] = [None] * len(contents)
+    pending = []
+    histograms = []
+    totals = []
+    
+    for index, content in enumerate(contents):
+        content = content or ''
+        manual_key = extract_key_signature(content)
+        if manual_key:
+            results[index] = _manual_key_detection(manual_key)
+            continue
+        
+        counts, total = chord_root_histogram(content)
+        if total == 0:
+            results[index] = _format_key_detection([])
+            continue
+        
+        pending.append(index)
+        histograms.append(counts)
+        totals.append(total)
+    
+    if not pending:
+        return results
+    
+    if not NUMPY_AVAILABLE:
+        for index in pending:
+            results[index] = detect_key_signature(contents[index])
+        return results
+    
+    # (songs x 12) @ (12 x 24) -> (songs x 24), normalized like _calculate_key_probabilities
+    scores = np.asarray(histograms, dtype=np.float64) @ KEY_PROFILE_MATRIX.T
+    probabilities = scores / (np.asarray(totals, dtype=np.float64)[:, None] * 3.0)
+    ranking = np.argsort(-probabilities, axis=1, kind='stable')[:, :4]
+    
+    for row, index in enumerate(pending):
+        sorted_keys = [
+            (KEY_PROFILE_KEYS[column], float(probabilities[row, column]))
+            for column in ranking[row]
+            if probabilities[row, column] > 0
+        ]
+        results[index] = _format_key_detection(sorted_keys)
+    
+    return results
+
+
+def chord_root_histogram(content: str) -> Tuple[List[int], int]:
+    """
+    Count chord roots per pitch class.
+    
+    Args:
+        content: ChordPro formatted content
+        
+    Returns:
+        tuple: (12-bin counts indexed like CHROMATIC_SCALE, total chord roots)
+    """
+    counts = [0] * 12
+    total = 0
+    
+    for chord in _extract_chords_from_content(content):
+        root = _extract_chord_root(chord)
+        if root:
+            total += 1
+            pitch_class = PITCH_CLASS_INDEX.get(ENHARMONIC_MAP.get(root, root))
+            if pitch_class is not None:
+                counts[pitch_class] += 1
+    
+    return counts, total
+
+
+def _manual_key_detection(manual_key: str) -> Dict:
+    """Build a detection result for a key declared with {key: ...}."""
+    return {
+        'detected_key': manual_key,
+        'confidence': 1.0,
+        'is_minor': 'm' in manual_key.lower(),
+        'alternative_keys': []
+    }
+
+
+def _format_key_detection(sorted_keys: List[Tuple[str, float]]) -> Dict:
+    """Build a detection result from keys sorted by descending probability."""
     if not sorted_keys:
         return {
             'detected_key': 'C',
@@ -995,15 +1186,7 @@ def detect_key_signature(content: str) -> Dict:
 
 def _extract_chords_from_content(content: str) -> List[str]:
     """Extract chord names from ChordPro content."""
-    chord_pattern = re.compile(r'\[([^\]]+)\]')
-    chords = []
-    
-    for match in chord_pattern.finditer(content):
-        chord = match.group(1).strip()
-        if _is_valid_chord_simple(chord):
-            chords.append(chord)
-    
-    return chords
+    return [chord for chord in parse_chordpro(content).chords if _is_valid_chord_simple(chord)]
 
 
 def _is_valid_chord_simple(chord: str) -> bool:
@@ -1051,28 +1234,6 @@ def _calculate_key_probabilities(chord_frequency: Dict[str, int]) -> Dict[str, f
     if total_chords == 0:
         return key_probabilities
     
-    # Major scale diatonic pattern
-    major_diatonic_pattern = [
-        {'interval': 0, 'quality': 'major', 'weight': 3.0},    # I - tonic
-        {'interval': 2, 'quality': 'minor', 'weight': 1.0},    # ii
-        {'interval': 4, 'quality': 'minor', 'weight': 1.0},    # iii  
-        {'interval': 5, 'quality': 'major', 'weight': 2.0},    # IV - subdominant
-        {'interval': 7, 'quality': 'major', 'weight': 2.5},    # V - dominant
-        {'interval': 9, 'quality': 'minor', 'weight': 1.5},    # vi
-        {'interval': 11, 'quality': 'diminished', 'weight': 0.5} # vii°
-    ]
-    
-    # Minor scale diatonic pattern
-    minor_diatonic_pattern = [
-        {'interval': 0, 'quality': 'minor', 'weight': 3.0},    # i - tonic
-        {'interval': 2, 'quality': 'diminished', 'weight': 0.5}, # ii°
-        {'interval': 3, 'quality': 'major', 'weight': 1.5},    # III
-        {'interval': 5, 'quality': 'minor', 'weight': 2.0},    # iv - subdominant
-        {'interval': 7, 'quality': 'minor', 'weight': 2.0},    # v
-        {'interval': 8, 'quality': 'major', 'weight': 1.5},    # VI
-        {'interval': 10, 'quality': 'major', 'weight': 1.0}    # VII
-    ]
-    
     for key in CIRCLE_OF_FIFTHS.keys():
         is_minor_key = 'm' in key.lower()
         root_note = key[:-1] if is_minor_key else key
@@ -1083,7 +1244,7 @@ def _calculate_key_probabilities(chord_frequency: Dict[str, int]) -> Dict[str, f
         except ValueError:
             continue
         
-        pattern = minor_diatonic_pattern if is_minor_key else major_diatonic_pattern
+        pattern = MINOR_DIATONIC_PATTERN if is_minor_key else MAJOR_DIATONIC_PATTERN
         score = 0.0
         
         for chord_info in pattern:
@@ -1101,4 +1262,30 @@ def _calculate_key_probabilities(chord_frequency: Dict[str, int]) -> Dict[str, f
         if total_chords > 0:
             key_probabilities[key] = score / (total_chords * 3.0)  # Divide by max possible weight
     
-    return key_probabilities
\ No newline at end of file
+    return key_probabilities
+
+
+def _build_key_profile_matrix():
+    """Build the 24x12 matrix of diatonic weights, one row per key in KEY_PROFILE_KEYS."""
+    matrix = np.zeros((len(KEY_PROFILE_KEYS), 12), dtype=np.float64)
+    
+    for row, key in enumerate(KEY_PROFILE_KEYS):
+        is_minor_key = 'm' in key.lower()
+        root_note = key[:-1] if is_minor_key else key
+        root_index = PITCH_CLASS_INDEX[ENHARMONIC_MAP.get(root_note, root_note)]
+        pattern = MINOR_DIATONIC_PATTERN if is_minor_key else MAJOR_DIATONIC_PATTERN
+        
+        for chord_info in pattern:
+            matrix[row, (root_index + chord_info['interval']) % 12] = chord_info['weight']
+    
+    return matrix
+
+
+# Keys scored by key detection, in the same order as _calculate_key_probabilities
+KEY_PROFILE_KEYS = list(CIRCLE_OF_FIFTHS.keys())
+
+# Pitch class index for each sharp-spelled note
+PITCH_CLASS_INDEX = {note: index for index, note in enumerate(CHROMATIC_SCALE)}
+
+# Precomputed key profiles for detect_key_signatures()
+KEY_PROFILE_MATRIX = _build_key_profile_matrix() if NUMPY_AVAILABLE else None
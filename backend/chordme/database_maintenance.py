@@ -20,6 +20,11 @@ from flask import current_app
 from . import db
 from .database_performance import db_performance
 from .database_indexing import db_index_optimizer
+from .item_similarity import song_neighbor_index
+from .trending import trending_engine
+from .song_features import sync_song_feature_store
+from .version_store import version_store
+from .song_shares import sync_song_shares
 
 logger = logging.getLogger(__name__)
 
@@ -129,6 +134,61 @@ class DatabaseMaintenanceManager:
             frequency_hours=72,  # Every 3 days
             task_function=self._vacuum_analyze_postgresql
         ))
+        
+        # Item-item collaborative filtering neighbours
+        self.register_task(MaintenanceTask(
+            name="rebuild_song_neighbors",
+            description="Recompute collaborative filtering neighbours of every song",
+            frequency_hours=24,  # Daily
+            task_function=self._rebuild_song_neighbors
+        ))
+        
+        self.register_task(MaintenanceTask(
+            name="update_song_neighbors",
+            description="Merge new song interactions into collaborative filtering neighbours",
+            frequency_hours=1,  # Hourly
+            task_function=self._update_song_neighbors
+        ))
+        
+        # Music discovery feature store; runs at scheduler start to build it
+        self.register_task(MaintenanceTask(
+            name="sync_song_features",
+            description="Build the in-memory song feature store or catch up with other workers' writes",
+            frequency_hours=1,  # Hourly
+            next_run=datetime.utcnow(),
+            task_function=self._sync_song_features
+        ))
+        
+        # Trending leaderboards
+        self.register_task(MaintenanceTask(
+            name="prune_trending",
+            description="Drop inactive songs from trending leaderboards and expired engagement buckets",
+            frequency_hours=1,  # Hourly
+            task_function=self._prune_trending
+        ))
+        
+        self.register_task(MaintenanceTask(
+            name="rebuild_trending",
+            description="Recompute trending leaderboards from engagement buckets",
+            frequency_hours=24,  # Daily
+            task_function=self._rebuild_trending
+        ))
+        
+        # Song version history
+        self.register_task(MaintenanceTask(
+            name="compact_song_versions",
+            description="Re-encode full-text song versions as keyframes and deltas",
+            frequency_hours=24,  # Daily
+            task_function=self._compact_song_versions
+        ))
+        
+        # Normalized song shares
+        self.register_task(MaintenanceTask(
+            name="sync_song_shares",
+            description="Backfill song_shares from the JSON sharing columns and repair drift",
+            frequency_hours=24,  # Daily
+            task_function=self._sync_song_shares
+        ))
     
     def register_task(self, task: MaintenanceTask):
         """Register a maintenance task."""
@@ -498,6 +558,41 @@ class DatabaseMaintenanceManager:
         
         return results
     
+    def _rebuild_song_neighbors(self) -> Dict[str, Any]:
+        """Recompute the song_neighbors table from all interactions."""
+        with self.app.app_context():
+            return song_neighbor_index.rebuild(db.session)
+    
+    def _update_song_neighbors(self) -> Dict[str, Any]:
+        """Patch the song_neighbors table with interactions since the last run."""
+        with self.app.app_context():
+            return song_neighbor_index.update(db.session)
+    
+    def _sync_song_features(self) -> Dict[str, Any]:
+        """Build or sync this process's song feature store."""
+        with self.app.app_context():
+            return sync_song_feature_store()
+    
+    def _prune_trending(self) -> Dict[str, Any]:
+        """Prune trending leaderboards and engagement buckets."""
+        with self.app.app_context():
+            return trending_engine.prune()
+    
+    def _rebuild_trending(self) -> Dict[str, Any]:
+        """Recompute trending leaderboards from engagement buckets."""
+        with self.app.app_context():
+            return trending_engine.rebuild()
+    
+    def _compact_song_versions(self) -> Dict[str, Any]:
+        """Compact legacy full-text song versions."""
+        with self.app.app_context():
+            return version_store.compact_legacy()
+    
+    def _sync_song_shares(self) -> Dict[str, Any]:
+        """Sync song_shares with the JSON sharing columns."""
+        with self.app.app_context():
+            return sync_song_shares()
+    
     def _register_cli_commands(self, app):
         """Register CLI commands for maintenance management."""
         @app.cli.command()
@@ -25,6 +25,7 @@ from .models import (
     db, User, Song, Setlist, SetlistSong, SetlistPerformance,
     PerformanceSession, PerformanceEvent, ProblemSection, PerformanceAnalytics
 )
+from .trending import record_engagement
 
 logger = logging.getLogger(__name__)
 
@@ -70,6 +71,12 @@ class EnhancedPerformanceAnalyticsService:
         db.session.add(session)
         db.session.commit()
         
+        if song_id:
+            song = Song.query.get(song_id)
+            if song:
+                record_engagement(song_id, 'performance' if session_type == 'performance' else 'practice',
+                                  genre=song.genre)
+        
         logger.info(f"Started performance session {session.id} for user {user_id}")
         return session.id
     
@@ -12,13 +12,15 @@ import hashlib
 import json
 import logging
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional, Union, Callable
+from typing import Any, Dict, List, Optional, Union, Callable
 from functools import wraps
 
 from flask import request, Response, jsonify, make_response, g
 from werkzeug.http import parse_cache_control_header, generate_etag
 
-from .cache_service import get_cache_service
+from sqlalchemy import func as sql_func
+
+from .cache_service import digest_key, get_cache_service
 
 logger = logging.getLogger(__name__)
 
@@ -81,8 +83,22 @@ class ETagManager:
         
         return current_etag in client_etags or '*' in client_etags
     
+    def not_modified_response(self, etag: str, max_age: int = 3600,
+                              additional_headers: Optional[Dict] = None,
+                              private: bool = False) -> Response:
+        """Create a 304 response carrying the same validators and caching headers as a 200."""
+        response = make_response('', 304)
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = f'{"private" if private else "public"}, max-age={max_age}'
+        response.headers['Vary'] = 'Accept-Encoding'
+        if additional_headers:
+            for key, value in additional_headers.items():
+                response.headers[key] = value
+        return response
+    
     def create_cached_response(self, data: Any, etag: Optional[str] = None,
-                             max_age: int = 3600, additional_headers: Optional[Dict] = None) -> Response:
+                             max_age: int = 3600, additional_headers: Optional[Dict] = None,
+                             private: bool = False) -> Response:
         """
         Create a response with appropriate caching headers.
         
@@ -91,6 +107,7 @@ class ETagManager:
             etag: ETag for the response (generated if not provided)
             max_age: Cache max age in seconds
             additional_headers: Additional headers to include
+            private: Mark the response as cacheable by the client only
             
         Returns:
             Flask Response object with caching headers
@@ -100,9 +117,7 @@ class ETagManager:
         
         # Check if client has current version
         if self.check_if_none_match(etag):
-            response = make_response('', 304)
-            response.headers['ETag'] = etag
-            return response
+            return self.not_modified_response(etag, max_age, additional_headers, private)
         
         # Create full response
         from flask import Response
@@ -132,7 +147,7 @@ class ETagManager:
         
         # Set caching headers
         response.headers['ETag'] = etag
-        response.headers['Cache-Control'] = f'public, max-age={max_age}'
+        response.headers['Cache-Control'] = f'{"private" if private else "public"}, max-age={max_age}'
         response.headers['Vary'] = 'Accept-Encoding'
         
         # Add additional headers if provided
@@ -143,7 +158,8 @@ class ETagManager:
         return response
     
     def cache_response(self, key: str, data: Any, ttl: int = 3600,
-                      namespace: str = "api_responses", tags: Optional[list] = None) -> str:
+                      namespace: str = "api_responses", tags: Optional[list] = None,
+                      etag: Optional[str] = None) -> str:
         """
         Cache response data and return ETag.
         
@@ -153,11 +169,13 @@ class ETagManager:
             ttl: Time to live in seconds
             namespace: Cache namespace
             tags: Cache tags for invalidation
+            etag: Precomputed ETag; hashed from the data if not provided
             
         Returns:
             ETag for the cached data
         """
-        etag = self.generate_etag(data)
+        if etag is None:
+            etag = self.generate_etag(data)
         
         # Cache both the data and the ETag
         cache_data = {
@@ -189,42 +207,72 @@ etag_manager = ETagManager()
 
 def etag_cached(ttl: int = 3600, key_func: Optional[Callable] = None,
                max_age: Optional[int] = None, tags: Optional[list] = None,
-               namespace: str = "api_responses"):
+               namespace: str = "api_responses",
+               version_func: Optional[Callable[..., Optional[str]]] = None,
+               vary: Optional[List[str]] = None):
     """
     Decorator for API endpoints with ETag caching support.
     
+    Cache keys include the authenticated principal and the values of the
+    vary request headers, so one user is never served another user's
+    response. Only 200 responses are cached.
+    
+    version_func is called with the view arguments and returns a validator
+    for the rows behind the response, e.g. from generate_query_etag(), or
+    None to bypass the cache. The ETag is derived from it instead of from
+    the body, so If-None-Match is answered with 304, and cached bodies are
+    revalidated, without running the view or loading any rows.
+    
     Args:
         ttl: Server-side cache TTL in seconds
         key_func: Function to generate cache key from request
         max_age: Client-side cache max-age (defaults to ttl)
         tags: Cache tags for invalidation
         namespace: Cache namespace
+        version_func: Cheap row-version validator for the response
+        vary: Request headers that select between response variants
     """
+    vary_headers = list(vary or [])
+    
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         def wrapper(*args, **kwargs):
+            principal = getattr(g, 'current_user_id', None)
+            
             # Generate cache key
             if key_func:
-                cache_key = key_func(*args, **kwargs)
+                base_key = key_func(*args, **kwargs)
             else:
-                cache_key = f"{func.__name__}:{request.full_path}"
+                base_key = request.full_path
+            variant = [request.headers.get(header, '') for header in vary_headers]
+            cache_key = f"{func.__name__}:{digest_key([base_key, principal, variant])}"
+            
+            # Per-user responses must not be stored by shared caches
+            private = principal is not None
+            response_vary = ['Accept-Encoding'] + vary_headers + (['Authorization'] if private else [])
+            headers = {'Vary': ', '.join(response_vary)}
+            client_max_age = max_age or ttl
+            
+            etag = None
+            if version_func:
+                version = version_func(*args, **kwargs)
+                if version is None:
+                    return func(*args, **kwargs)
+                etag = etag_manager.generate_etag(version, {'key': cache_key})
+                if etag_manager.check_if_none_match(etag):
+                    return etag_manager.not_modified_response(etag, client_max_age, headers, private)
             
             # Try to get from cache first
             cached_response = etag_manager.get_cached_response(cache_key, namespace)
             
-            if cached_response:
-                # Check if client has current version
-                etag = cached_response['etag']
-                if etag_manager.check_if_none_match(etag):
-                    response = make_response('', 304)
-                    response.headers['ETag'] = etag
-                    return response
-                
-                # Return cached data with ETag
+            if cached_response and (etag is None or cached_response['etag'] == etag):
+                # Return cached data with ETag (304 if the client has it)
                 return etag_manager.create_cached_response(
-                    cached_response['data'], 
-                    etag,
-                    max_age or ttl
+                    cached_response['data'],
+                    cached_response['etag'],
+                    client_max_age,
+                    headers,
+                    private
                 )
             
             # Execute function and cache result
@@ -237,6 +285,8 @@ def etag_cached(ttl: int = 3600, key_func: Optional[Callable] = None,
             elif isinstance(result, tuple):
                 # Function returned (data, status_code) tuple
                 data, status_code = result
+                if status_code != 200:
+                    return result
                 # If data is a Response object, extract its JSON content
                 if isinstance(data, Response):
                     try:
@@ -251,10 +301,10 @@ def etag_cached(ttl: int = 3600, key_func: Optional[Callable] = None,
                 status_code = 200
             
             # Cache the response
-            etag = etag_manager.cache_response(cache_key, data, ttl, namespace, tags)
+            etag = etag_manager.cache_response(cache_key, data, ttl, namespace, tags, etag)
             
             # Create response with caching headers
-            response = etag_manager.create_cached_response(data, etag, max_age or ttl)
+            response = etag_manager.create_cached_response(data, etag, client_max_age, headers, private)
             response.status_code = status_code
             
             return response
@@ -373,13 +423,43 @@ def generate_collection_etag(items: list, last_modified: Optional[datetime] = No
     """Generate ETag for a collection of items."""
     additional_data = {}
     if last_modified:
-        additional_data['last_modified'] = last_modified.isoformat()
+        additional_data['last_modified'] = (
+            last_modified.isoformat() if hasattr(last_modified, 'isoformat') else str(last_modified)
+        )
     
     return etag_manager.generate_etag(items, additional_data)
 
 
+def generate_query_etag(query, model_class, extra_aggregates=()) -> str:
+    """
+    Generate ETag for the rows a query selects from their version metadata.
+    
+    A single aggregate statement reads the row count, a checksum of the ids
+    and the latest updated_at, so no row bodies are loaded or serialized.
+    extra_aggregates are read by the same statement and folded in, for
+    columns that change without touching updated_at.
+    """
+    count, id_sum, last_modified, *extra = query.with_entities(
+        sql_func.count(model_class.id),
+        sql_func.coalesce(sql_func.sum(model_class.id), 0),
+        sql_func.max(model_class.updated_at),
+        *extra_aggregates
+    ).order_by(None).one()
+    
+    items = [model_class.__tablename__, count, int(id_sum)]
+    if extra:
+        items.append([value.isoformat() if hasattr(value, 'isoformat') else value for value in extra])
+    return generate_collection_etag(items, last_modified)
+
+
 def generate_model_etag(model_instance, include_relationships: bool = False) -> str:
-    """Generate ETag for a model instance."""
+    """Generate ETag for a model instance, from its key and updated_at when it has one."""
+    updated_at = getattr(model_instance, 'updated_at', None)
+    if updated_at and hasattr(model_instance, '__table__'):
+        # Row version is enough; avoid serializing the instance
+        primary_key = [getattr(model_instance, c.name) for c in model_instance.__table__.primary_key.columns]
+        return generate_collection_etag([model_instance.__table__.name, primary_key], updated_at)
+    
     if hasattr(model_instance, 'to_dict'):
         data = model_instance.to_dict()
     else:
@@ -387,12 +467,7 @@ def generate_model_etag(model_instance, include_relationships: bool = False) ->
         data = {c.name: getattr(model_instance, c.name) 
                 for c in model_instance.__table__.columns}
     
-    # Include last modified timestamp if available
-    additional_data = {}
-    if hasattr(model_instance, 'updated_at') and model_instance.updated_at:
-        additional_data['updated_at'] = model_instance.updated_at.isoformat()
-    
-    return etag_manager.generate_etag(data, additional_data)
+    return etag_manager.generate_etag(data)
 
 
 # Pre-configured decorators for common use cases
@@ -402,9 +477,9 @@ def cache_api_response(ttl: int = 3600, tags: Optional[list] = None):
     return etag_cached(ttl=ttl, tags=tags)
 
 
-def cache_song_response(ttl: int = 7200):
+def cache_song_response(ttl: int = 7200, version_func: Optional[Callable[..., Optional[str]]] = None):
     """Cache song-related API responses."""
-    return etag_cached(ttl=ttl, tags=['songs'], namespace="song_api")
+    return etag_cached(ttl=ttl, tags=['songs'], namespace="song_api", version_func=version_func)
 
 
 def cache_user_response(ttl: int = 3600):
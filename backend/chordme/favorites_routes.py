@@ -16,6 +16,8 @@ from .models import UserFavorite, Song, User
 from .utils import auth_required, validate_request_size, sanitize_input
 from .rate_limiter import rate_limit
 from .security_headers import security_headers
+from .song_counters import song_counters
+from .trending import record_engagement
 import logging
 
 # Create favorites blueprint
@@ -97,6 +99,10 @@ def toggle_song_favorite(song_id):
         
         db.session.commit()
         
+        song_counters.add_favorite(song_id, 1 if is_favorited else -1)
+        if is_favorited:
+            record_engagement(song_id, 'favorite', genre=song.genre)
+        
         # Get updated favorite count
         favorite_count = UserFavorite.query.filter_by(song_id=song_id).count()
         
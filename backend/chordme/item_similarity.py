@@ -0,0 +1,324 @@
+"""
+Offline item-item collaborative filtering for music discovery.
+
+Collaborative recommendations used to compare the requesting user with every
+other user, loading each user's song history on the request path. Instead, a
+background job builds a sparse user x song interaction matrix from implicit
+feedback, computes the cosine neighbours of every song and stores the best
+ones in the ``song_neighbors`` table (database/migrations/007_song_neighbors.sql).
+Requests then only read the neighbours of the user's own songs.
+
+Interactions and their weights (summed per user and song, then log-dampened):
+
+- favorite: 3.0
+- song played in a recorded setlist performance or a performance session: 2.0
+- practice or rehearsal session on the song: 1.0
+- song added to one of the user's setlists: 1.0
+
+The matrix is held in memory as NumPy CSR (by user) and CSC (by song) arrays
+between runs. The incremental job only loads interactions created since the
+previous run, merges them and recomputes the neighbours of the songs whose
+co-occurrences changed. Removed interactions (unfavorites, deleted setlists)
+and the scores other songs hold towards a changed song are corrected by the
+daily full rebuild. Without NumPy both jobs are skipped and the table keeps
+whatever it holds.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from sqlalchemy import func
+
+from .models import (
+    PerformanceSession, Setlist, SetlistPerformance, SetlistPerformanceSong, SetlistSong,
+    SongNeighbor, UserFavorite
+)
+
+logger = logging.getLogger(__name__)
+
+
+INTERACTION_WEIGHTS = {
+    'favorite': 3.0,
+    'performance': 2.0,
+    'practice': 1.0,
+    'setlist': 1.0,
+}
+NEIGHBORS_PER_SONG = 50
+MIN_SIMILARITY = 0.01
+# Users with huge libraries only contribute their strongest interactions, which
+# bounds the cost of a song's neighbour computation
+MAX_SONGS_PER_USER = 500
+LOAD_BATCH_SIZE = 10000
+WRITE_BATCH_SIZE = 1000
+
+Neighbor = Tuple[int, float, int]  # (neighbor song id, cosine similarity, co-occurrences)
+
+
+def _ragged_indices(starts: 'np.ndarray', lengths: 'np.ndarray') -> 'np.ndarray':
+    """Concatenation of ``range(start, start + length)`` for each pair."""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+class InteractionMatrix:
+    """
+    Sparse user x song matrix of implicit feedback.
+
+    Args:
+        users: User id of each interaction
+        songs: Song id of each interaction
+        weights: Weight of each interaction; duplicates of a (user, song)
+            pair are summed
+        max_songs_per_user: Strongest songs kept per user
+    """
+
+    def __init__(self, users: Iterable[int], songs: Iterable[int], weights: Iterable[float],
+                 max_songs_per_user: int = MAX_SONGS_PER_USER):
+        users = np.asarray(users, np.int64)
+        songs = np.asarray(songs, np.int64)
+        weights = np.asarray(weights, np.float64)
+        self.max_songs_per_user = max_songs_per_user
+
+        order = np.lexsort((songs, users))
+        users, songs, weights = users[order], songs[order], weights[order]
+        if len(users):
+            first = np.ones(len(users), bool)
+            first[1:] = (users[1:] != users[:-1]) | (songs[1:] != songs[:-1])
+            starts = np.flatnonzero(first)
+            users, songs, weights = users[starts], songs[starts], np.add.reduceat(weights, starts)
+        # Summed raw weights, kept so later interactions can be merged in
+        self.interactions = (users, songs, weights)
+
+        values = np.log1p(weights)
+        keep = self._strongest_per_user(users, values)
+        users, songs, values = users[keep], songs[keep], values[keep]
+
+        self.user_ids, user_index = np.unique(users, return_inverse=True)
+        self.song_ids, song_index = np.unique(songs, return_inverse=True)
+        # CSR by user: interactions are already sorted by user
+        self.user_ptr = np.searchsorted(user_index, np.arange(len(self.user_ids) + 1))
+        self.user_songs = song_index
+        self.user_values = values
+        # CSC by song
+        by_song = np.argsort(song_index, kind='stable')
+        self.song_ptr = np.searchsorted(song_index[by_song], np.arange(len(self.song_ids) + 1))
+        self.song_users = user_index[by_song]
+        self.song_values = values[by_song]
+        self.norms = np.sqrt(np.bincount(song_index, weights=values ** 2, minlength=len(self.song_ids)))
+
+    def _strongest_per_user(self, users: 'np.ndarray', values: 'np.ndarray') -> 'np.ndarray':
+        if not len(users):
+            return np.zeros(0, np.int64)
+        order = np.lexsort((-values, users))
+        boundaries = np.flatnonzero(np.r_[True, users[order][1:] != users[order][:-1]])
+        counts = np.diff(np.r_[boundaries, len(users)])
+        rank = np.arange(len(users)) - np.repeat(boundaries, counts)
+        return np.sort(order[rank < self.max_songs_per_user])
+
+    def __len__(self) -> int:
+        return len(self.user_songs)
+
+    def merge(self, users: Iterable[int], songs: Iterable[int], weights: Iterable[float]) -> 'InteractionMatrix':
+        """Return a new matrix with additional interactions."""
+        current_users, current_songs, current_weights = self.interactions
+        return InteractionMatrix(
+            np.concatenate([current_users, np.asarray(users, np.int64)]),
+            np.concatenate([current_songs, np.asarray(songs, np.int64)]),
+            np.concatenate([current_weights, np.asarray(weights, np.float64)]),
+            self.max_songs_per_user
+        )
+
+    def _index(self, ids: 'np.ndarray', id_value: int) -> Optional[int]:
+        position = int(np.searchsorted(ids, id_value))
+        if position < len(ids) and ids[position] == id_value:
+            return position
+        return None
+
+    def songs_of_users(self, user_ids: Iterable[int]) -> 'np.ndarray':
+        """Song ids the given users interacted with."""
+        positions = [self._index(self.user_ids, user_id) for user_id in user_ids]
+        positions = np.array([p for p in positions if p is not None], np.int64)
+        if not len(positions):
+            return np.zeros(0, np.int64)
+        starts = self.user_ptr[positions]
+        lengths = self.user_ptr[positions + 1] - starts
+        return np.unique(self.song_ids[self.user_songs[_ragged_indices(starts, lengths)]])
+
+    def neighbors(self, song_id: int, limit: int = NEIGHBORS_PER_SONG,
+                  min_similarity: float = MIN_SIMILARITY) -> List[Neighbor]:
+        """Songs with the highest cosine similarity to ``song_id``, best first."""
+        song = self._index(self.song_ids, song_id)
+        if song is None or self.norms[song] == 0:
+            return []
+
+        users = self.song_users[self.song_ptr[song]:self.song_ptr[song + 1]]
+        user_weights = self.song_values[self.song_ptr[song]:self.song_ptr[song + 1]]
+        starts = self.user_ptr[users]
+        lengths = self.user_ptr[users + 1] - starts
+        positions = _ragged_indices(starts, lengths)
+        # Dot products with every song co-occurring with this one
+        others, inverse = np.unique(self.user_songs[positions], return_inverse=True)
+        products = self.user_values[positions] * np.repeat(user_weights, lengths)
+        dots = np.bincount(inverse, weights=products, minlength=len(others))
+        counts = np.bincount(inverse, minlength=len(others))
+
+        scores = dots / (self.norms[song] * self.norms[others])
+        keep = (others != song) & (scores >= min_similarity)
+        others, scores, counts = others[keep], scores[keep], counts[keep]
+        if len(others) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            others, scores, counts = others[top], scores[top], counts[top]
+        ids = self.song_ids[others]
+        order = np.lexsort((ids, -scores))
+        return [(int(ids[i]), float(scores[i]), int(counts[i])) for i in order]
+
+
+def load_interactions(session, since=None) -> Tuple[List[int], List[int], List[float], Any]:
+    """
+    Load interaction events with column-only queries.
+
+    Args:
+        session: SQLAlchemy session
+        since: Only load interactions created after this timestamp
+
+    Returns:
+        (users, songs, weights, latest created_at) of the loaded interactions
+    """
+    performed_by = func.coalesce(SetlistPerformance.performed_by, Setlist.user_id)
+    sources = [
+        (session.query(UserFavorite.user_id, UserFavorite.song_id, UserFavorite.created_at),
+         UserFavorite.created_at, lambda row: INTERACTION_WEIGHTS['favorite']),
+        (session.query(PerformanceSession.user_id, PerformanceSession.song_id,
+                       PerformanceSession.created_at, PerformanceSession.session_type)
+         .filter(PerformanceSession.song_id.isnot(None)),
+         PerformanceSession.created_at,
+         lambda row: INTERACTION_WEIGHTS['performance' if row[3] == 'performance' else 'practice']),
+        (session.query(performed_by, SetlistSong.song_id, SetlistPerformanceSong.created_at)
+         .join(SetlistSong, SetlistPerformanceSong.setlist_song_id == SetlistSong.id)
+         .join(SetlistPerformance, SetlistPerformanceSong.performance_id == SetlistPerformance.id)
+         .join(Setlist, SetlistPerformance.setlist_id == Setlist.id)
+         .filter(SetlistPerformanceSong.was_performed != False),
+         SetlistPerformanceSong.created_at, lambda row: INTERACTION_WEIGHTS['performance']),
+        (session.query(Setlist.user_id, SetlistSong.song_id, SetlistSong.created_at)
+         .join(Setlist, SetlistSong.setlist_id == Setlist.id)
+         .filter(Setlist.is_deleted == False),
+         SetlistSong.created_at, lambda row: INTERACTION_WEIGHTS['setlist']),
+    ]
+
+    users, songs, weights = [], [], []
+    latest = since
+    for query, created_at, weight in sources:
+        if since is not None:
+            query = query.filter(created_at > since)
+        for row in query.yield_per(LOAD_BATCH_SIZE):
+            if row[0] is None or row[1] is None:
+                continue
+            users.append(row[0])
+            songs.append(row[1])
+            weights.append(weight(row))
+            if row[2] is not None and (latest is None or row[2] > latest):
+                latest = row[2]
+    return users, songs, weights, latest
+
+
+def write_song_neighbors(session, neighbors: Dict[int, List[Neighbor]], replace_all: bool = False):
+    """Replace the stored neighbours of the given songs, or of all songs."""
+    table = SongNeighbor.__table__
+    if replace_all:
+        session.execute(table.delete())
+    else:
+        song_ids = list(neighbors)
+        for start in range(0, len(song_ids), WRITE_BATCH_SIZE):
+            session.execute(table.delete().where(table.c.song_id.in_(song_ids[start:start + WRITE_BATCH_SIZE])))
+
+    batch = []
+    for song_id, rows in neighbors.items():
+        for neighbor_id, score, co_occurrences in rows:
+            batch.append({'song_id': song_id, 'neighbor_id': neighbor_id, 'score': score,
+                          'co_occurrences': co_occurrences})
+            if len(batch) >= WRITE_BATCH_SIZE:
+                session.execute(table.insert(), batch)
+                batch = []
+    if batch:
+        session.execute(table.insert(), batch)
+    session.commit()
+
+
+class SongNeighborIndex:
+    """
+    Maintains the ``song_neighbors`` table.
+
+    Args:
+        neighbors_per_song: Neighbours stored per song
+        min_similarity: Smallest cosine similarity worth storing
+    """
+
+    def __init__(self, neighbors_per_song: int = NEIGHBORS_PER_SONG,
+                 min_similarity: float = MIN_SIMILARITY):
+        self.neighbors_per_song = neighbors_per_song
+        self.min_similarity = min_similarity
+        self.matrix: Optional[InteractionMatrix] = None
+        self.watermark = None
+        self._lock = threading.Lock()
+
+    def _compute(self, song_ids: Iterable[int]) -> Iterator[Tuple[int, List[Neighbor]]]:
+        for song_id in song_ids:
+            yield int(song_id), self.matrix.neighbors(song_id, self.neighbors_per_song, self.min_similarity)
+
+    def rebuild(self, session) -> Dict[str, Any]:
+        """Recompute the neighbours of every song from all interactions."""
+        if not NUMPY_AVAILABLE:
+            return {'skipped': 'numpy is not installed'}
+        with self._lock:
+            started = time.time()
+            users, songs, weights, latest = load_interactions(session)
+            self.matrix = InteractionMatrix(users, songs, weights)
+            neighbors = dict(self._compute(self.matrix.song_ids))
+            write_song_neighbors(session, neighbors, replace_all=True)
+            self.watermark = latest
+            details = {
+                'interactions': len(self.matrix),
+                'songs': len(neighbors),
+                'neighbors': sum(len(rows) for rows in neighbors.values()),
+                'duration_seconds': round(time.time() - started, 3),
+            }
+            logger.info(f"Rebuilt song neighbours: {details}")
+            return details
+
+    def update(self, session) -> Dict[str, Any]:
+        """Merge interactions created since the last run and patch the affected songs."""
+        if self.matrix is None:
+            return self.rebuild(session)
+
+        with self._lock:
+            started = time.time()
+            users, songs, weights, latest = load_interactions(session, since=self.watermark)
+            if not users:
+                return {'interactions': 0, 'songs': 0}
+            self.matrix = self.matrix.merge(users, songs, weights)
+            # Co-occurrences changed between the new songs and everything their users touched
+            affected = np.union1d(np.unique(np.asarray(songs, np.int64)),
+                                  self.matrix.songs_of_users(set(users)))
+            neighbors = dict(self._compute(affected))
+            write_song_neighbors(session, neighbors)
+            self.watermark = latest
+            details = {
+                'interactions': len(users),
+                'songs': len(neighbors),
+                'duration_seconds': round(time.time() - started, 3),
+            }
+            logger.info(f"Updated song neighbours: {details}")
+            return details
+
+
+# Global instance
+song_neighbor_index = SongNeighborIndex()
@@ -1,4 +1,5 @@
 from . import db
+from .song_search import apply_text_search, register_search_index
 from datetime import datetime, UTC
 from flask import current_app
 import bcrypt
@@ -386,6 +387,36 @@ class Song(db.Model):
         permission = self.get_user_permission(user_id)
         return permission == 'admin'
     
+    @classmethod
+    def shared_to(cls, user_id, levels=None):
+        """SQL condition matching songs explicitly shared with a user.
+        
+        Answered from the song_shares index; the SQL counterpart of is_shared_with_user.
+        
+        Args:
+            user_id (int): The ID of the user
+            levels (list): Only match shares with one of these permission levels
+            
+        Returns:
+            ColumnElement: Condition for a WHERE clause
+        """
+        shared = db.select(SongShare.song_id).where(SongShare.user_id == user_id)
+        if levels:
+            shared = shared.where(SongShare.level.in_(levels))
+        return cls.id.in_(shared)
+    
+    @classmethod
+    def accessible_to(cls, user_id):
+        """SQL condition matching songs a user can access; the SQL counterpart of can_user_access.
+        
+        Args:
+            user_id (int): The ID of the user
+            
+        Returns:
+            ColumnElement: Condition for a WHERE clause
+        """
+        return db.or_(cls.user_id == user_id, cls.share_settings == 'public', cls.shared_to(user_id))
+    
     def soft_delete(self):
         """Soft delete the song."""
         self.is_deleted = True
@@ -407,9 +438,9 @@ class Song(db.Model):
         self.archived_at = None
     
     def increment_view_count(self):
-        """Increment the view count and update last accessed time."""
-        self.view_count = (self.view_count or 0) + 1
-        self.last_accessed = utc_now()
+        """Count a view; view_count and last_accessed are written behind in batches."""
+        from .song_counters import song_counters
+        song_counters.increment_view(self.id)
     
     def add_tag(self, tag):
         """Add a tag to this song."""
@@ -436,7 +467,8 @@ class Song(db.Model):
                language='en', tags=None, categories=None, min_tempo=None, 
                max_tempo=None, time_signature=None, user_id=None, include_public=True, 
                include_deleted=False, include_archived=False, date_from=None, date_to=None,
-               date_field='created_at', limit=50, offset=0):
+               date_field='created_at', limit=50, offset=0, with_relevance=False,
+               with_total=False, after=None, include_shared=False):
         """
         Enhanced search for songs with various filters including date ranges.
         
@@ -460,6 +492,13 @@ class Song(db.Model):
             date_field (str): Date field to filter on ('created_at' or 'updated_at')
             limit (int): Maximum number of results
             offset (int): Offset for pagination
+            with_relevance (bool): Return (Song, relevance_score) rows instead of songs;
+                relevance_score is None when the search is not ranked
+            with_total (bool): Also return the total match count in every row
+                (COUNT(*) OVER ()), saving a separate count query
+            after (list): Keyset cursor, the sort key of the last row of the previous
+                page as returned by search_sort_key(); replaces offset
+            include_shared (bool): Also include songs shared with user_id
             
         Returns:
             Query: SQLAlchemy query object
@@ -474,24 +513,19 @@ class Song(db.Model):
         
         # User and visibility filters
         if user_id:
+            visible = [cls.user_id == user_id]
             if include_public:
-                base_query = base_query.filter(
-                    db.or_(cls.user_id == user_id, cls.is_public == True)
-                )
-            else:
-                base_query = base_query.filter(cls.user_id == user_id)
+                visible.append(cls.is_public == True)
+            if include_shared:
+                visible.append(cls.shared_to(user_id))
+            base_query = base_query.filter(db.or_(*visible))
         elif include_public:
             base_query = base_query.filter(cls.is_public == True)
         
-        # Text search
+        # Text search (full-text index when available, substring match otherwise)
+        relevance = None
         if query:
-            search_filter = db.or_(
-                cls.title.ilike(f'%{query}%'),
-                cls.artist.ilike(f'%{query}%'),
-                cls.lyrics.ilike(f'%{query}%'),
-                cls.content.ilike(f'%{query}%')
-            )
-            base_query = base_query.filter(search_filter)
+            base_query, relevance = apply_text_search(base_query, cls, query, db.engine)
         
         # Metadata filters
         if genre:
@@ -529,11 +563,28 @@ class Song(db.Model):
         if categories:
             base_query = base_query.join(cls.categories).filter(Category.name.in_(categories))
         
-        # Order by relevance, view count, and creation date
-        base_query = base_query.order_by(
-            cls.view_count.desc(),
-            cls.created_at.desc()
-        )
+        # Order by relevance, view count, and creation date, with id as tie-breaker
+        # so that keyset pagination is stable. A NULL view count would make the
+        # keyset comparison NULL, so it sorts as 0 like in search_sort_key
+        sort_keys = [db.func.coalesce(cls.view_count, 0), cls.created_at, cls.id]
+        if relevance is not None:
+            sort_keys.insert(0, relevance)
+        
+        # Keyset pagination: continue strictly after the previous page's last row
+        if after is not None:
+            if len(after) != len(sort_keys):
+                raise ValueError('Search cursor does not match the search ordering')
+            bounds = [db.literal(value, key.type)
+                      for key, value in zip(sort_keys, after)]
+            base_query = base_query.filter(db.tuple_(*sort_keys) < db.tuple_(*bounds))
+        
+        base_query = base_query.order_by(*[key.desc() for key in sort_keys])
+        
+        if with_relevance:
+            score = relevance if relevance is not None else db.null()
+            base_query = base_query.add_columns(score.label('relevance_score'))
+        if with_total:
+            base_query = base_query.add_columns(db.func.count().over().label('total_count'))
         
         # Apply pagination
         if limit:
@@ -543,10 +594,104 @@ class Song(db.Model):
         
         return base_query
     
+    @staticmethod
+    def search_sort_key(song, relevance_score=None):
+        """
+        Sort key of a search result, used as the keyset cursor for the next page.
+        
+        Args:
+            song (Song): Search result
+            relevance_score (float): Relevance returned with the result, None when
+                the search was not ranked
+            
+        Returns:
+            list: Values matching the ORDER BY of Song.search
+        """
+        key = [song.view_count or 0, song.created_at, song.id]
+        if relevance_score is not None:
+            key.insert(0, relevance_score)
+        return key
+    
     def __repr__(self):
         return f'<Song {self.title}>'
 
 
+register_search_index(Song.__table__)
+
+
+class SongShare(db.Model):
+    """A song shared with a user, normalized from Song.shared_with and Song.permissions.
+    
+    Rows are written alongside the JSON columns (see chordme.song_shares) so
+    visibility can be checked in SQL and "shared with me" is an index lookup.
+    """
+    __tablename__ = 'song_shares'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    song_id = db.Column(db.Integer, db.ForeignKey('songs.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    level = db.Column(db.String(10), nullable=False, default='read')  # 'read', 'edit', 'admin'
+    created_at = db.Column(db.DateTime, default=utc_now)
+    
+    __table_args__ = (
+        db.UniqueConstraint('song_id', 'user_id', name='unique_song_share'),
+        db.Index('idx_song_shares_user_song', 'user_id', 'song_id'),
+        db.Index('idx_song_shares_user_level', 'user_id', 'level', 'song_id'),
+    )
+    
+    def to_dict(self):
+        """Convert share to dictionary."""
+        return {
+            'song_id': self.song_id,
+            'user_id': self.user_id,
+            'level': self.level,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<SongShare song:{self.song_id} user:{self.user_id} {self.level}>'
+
+
+class SecurityAuditEvent(db.Model):
+    """A security audit event written in batches by the audit pipeline's database sink.
+
+    user_id is deliberately not a foreign key so the audit trail outlives the
+    users it mentions.
+    """
+    __tablename__ = 'security_audit_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False, default=utc_now)
+    event_type = db.Column(db.String(100), nullable=False)
+    severity = db.Column(db.String(10), nullable=False, default='INFO')
+    user_id = db.Column(db.Integer)
+    ip_address = db.Column(db.String(45))
+    user_agent = db.Column(db.String(500))
+    details = db.Column(db.JSON)
+
+    __table_args__ = (
+        db.Index('idx_security_audit_events_timestamp', 'timestamp'),
+        db.Index('idx_security_audit_events_user', 'user_id', 'timestamp'),
+        db.Index('idx_security_audit_events_type', 'event_type', 'timestamp'),
+    )
+
+    def to_dict(self):
+        """Convert audit event to dictionary."""
+        return {
+            'id': self.id,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'event_type': self.event_type,
+            'severity': self.severity,
+            'user_id': self.user_id,
+            'ip_address': self.ip_address,
+            'user_agent': self.user_agent,
+            'details': self.details
+        }
+
+    def __repr__(self):
+        return f'<SecurityAuditEvent {self.event_type} user:{self.user_id} {self.severity}>'
+
+
 class Tag(db.Model):
     __tablename__ = 'tags'
     
@@ -655,6 +800,81 @@ class UserFavorite(db.Model):
         return f'<UserFavorite user:{self.user_id} song:{self.song_id}>'
 
 
+class SongNeighbor(db.Model):
+    """Precomputed item-item collaborative filtering neighbour of a song."""
+    __tablename__ = 'song_neighbors'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    song_id = db.Column(db.Integer, db.ForeignKey('songs.id', ondelete='CASCADE'), nullable=False)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('songs.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)  # Cosine similarity of the interaction vectors
+    co_occurrences = db.Column(db.Integer, nullable=False, default=0)  # Users who interacted with both
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
+    
+    __table_args__ = (db.UniqueConstraint('song_id', 'neighbor_id', name='unique_song_neighbor'),)
+    
+    def to_dict(self):
+        """Convert neighbour to dictionary."""
+        return {
+            'song_id': self.song_id,
+            'neighbor_id': self.neighbor_id,
+            'score': self.score,
+            'co_occurrences': self.co_occurrences,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<SongNeighbor song:{self.song_id} neighbor:{self.neighbor_id} score:{self.score:.3f}>'
+
+
+class SongEngagementBucket(db.Model):
+    """Engagement events of a song within one hour or one day."""
+    __tablename__ = 'song_engagement_buckets'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    song_id = db.Column(db.Integer, db.ForeignKey('songs.id', ondelete='CASCADE'), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # 'hour', 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)  # Naive UTC
+    views = db.Column(db.Integer, nullable=False, default=0)
+    favorites = db.Column(db.Integer, nullable=False, default=0)
+    practices = db.Column(db.Integer, nullable=False, default=0)
+    performances = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('song_id', 'granularity', 'bucket_start', name='unique_song_engagement_bucket'),)
+    
+    def to_dict(self):
+        """Convert bucket to dictionary."""
+        return {
+            'song_id': self.song_id,
+            'granularity': self.granularity,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'views': self.views,
+            'favorites': self.favorites,
+            'practices': self.practices,
+            'performances': self.performances
+        }
+    
+    def __repr__(self):
+        return f'<SongEngagementBucket song:{self.song_id} {self.granularity}:{self.bucket_start}>'
+
+
+class SongTrendingScore(db.Model):
+    """Decayed trending score of a song on one leaderboard (SQL fallback for Redis sorted sets)."""
+    __tablename__ = 'song_trending_scores'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    timeframe = db.Column(db.String(10), nullable=False)  # '1d', '7d', '30d'
+    scope = db.Column(db.String(120), nullable=False)  # 'all' or 'genre:<name>'
+    song_id = db.Column(db.Integer, db.ForeignKey('songs.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)  # Log-space score, see chordme.trending
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
+    
+    __table_args__ = (db.UniqueConstraint('timeframe', 'scope', 'song_id', name='unique_song_trending_score'),)
+    
+    def __repr__(self):
+        return f'<SongTrendingScore {self.timeframe}:{self.scope} song:{self.song_id}>'
+
+
 # Junction tables for many-to-many relationships
 song_tags = db.Table('song_tags',
     db.Column('id', db.Integer, primary_key=True),
@@ -681,7 +901,12 @@ class SongVersion(db.Model):
     version_number = db.Column(db.Integer, nullable=False)
     title = db.Column(db.String(255), nullable=False)
     artist = db.Column(db.String(255))
-    content = db.Column(db.Text, nullable=False)
+    # Full text of versions written before delta compression; see version_store
+    legacy_content = db.deferred(db.Column('content', db.Text))
+    payload = db.deferred(db.Column(db.LargeBinary))  # Compressed keyframe or delta
+    keyframe_number = db.Column(db.Integer)  # Version number of the keyframe this version is replayed from
+    content_hash = db.Column(db.String(64))
+    content_size = db.Column(db.Integer)
     lyrics = db.Column(db.Text)  # Extracted lyrics
     chords_used = db.Column(db.JSON)  # Array of chords used
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Changed from user_id
@@ -702,21 +927,39 @@ class SongVersion(db.Model):
         self.version_number = version_number
         self.title = title
         self.artist = artist
-        self.content = content
+        if content is not None:
+            self.content = content
         # Support both created_by and user_id for backward compatibility
         self.created_by = created_by or user_id
         self.version_note = version_note
         self.is_major_version = is_major_version
     
-    def to_dict(self):
-        """Convert song version to dictionary."""
-        return {
+    @property
+    def content(self):
+        """Full content, reconstructed from the keyframe and deltas."""
+        from .version_store import version_store
+        return version_store.content_of(self)
+    
+    @content.setter
+    def content(self, value):
+        """Store content as a keyframe."""
+        from .version_store import version_store
+        version_store.encode(self, value)
+    
+    @property
+    def is_keyframe(self):
+        """Whether this version stores its full content."""
+        return self.keyframe_number is None or self.keyframe_number == self.version_number
+    
+    def to_dict(self, include_content=True):
+        """Convert song version to dictionary; listings skip the content."""
+        result = {
             'id': self.id,
             'song_id': self.song_id,
             'version_number': self.version_number,
             'title': self.title,
             'artist': self.artist,
-            'content': self.content,
+            'content_size': self.content_size,
             'lyrics': self.lyrics,
             'chords_used': self.chords_used,
             'created_by': self.created_by,
@@ -725,6 +968,9 @@ class SongVersion(db.Model):
             'is_major_version': self.is_major_version,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+        if include_content:
+            result['content'] = self.content
+        return result
     
     # Backward compatibility property
     @property
@@ -757,6 +1003,9 @@ db.Index('idx_tags_is_system', Tag.is_system)
 db.Index('idx_categories_name', Category.name)
 db.Index('idx_categories_is_system', Category.is_system)
 db.Index('idx_user_favorites_user_song', UserFavorite.user_id, UserFavorite.song_id)
+db.Index('idx_song_neighbors_song_score', SongNeighbor.song_id, SongNeighbor.score)
+db.Index('idx_song_engagement_buckets_window', SongEngagementBucket.granularity, SongEngagementBucket.bucket_start)
+db.Index('idx_song_trending_scores_rank', SongTrendingScore.timeframe, SongTrendingScore.scope, SongTrendingScore.score)
 # Note: JSON field indexing may vary by database. SQLite has limited JSON index support.
 
 
@@ -3836,7 +4085,7 @@ class ForumThread(db.Model):
     
     # Activity tracking
     last_activity_at = db.Column(db.DateTime, default=utc_now)
-    last_post_id = db.Column(db.Integer, db.ForeignKey('forum_posts.id'), nullable=True)
+    last_post_id = db.Column(db.Integer, db.ForeignKey('forum_posts.id', use_alter=True, name='fk_forum_threads_last_post'), nullable=True)
     
     created_at = db.Column(db.DateTime, default=utc_now)
     updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
@@ -10,6 +10,10 @@ from flask import Blueprint, jsonify, current_app, g
 from functools import wraps
 from typing import Dict, Any, List
 from .logging_config import StructuredLogger
+from .song_counters import song_counters
+from .pdf_artifact_cache import pdf_artifact_cache
+from .pdf_job_progress import pdf_job_progress
+from .audit_pipeline import audit_pipeline
 
 # Create monitoring blueprint
 monitoring_bp = Blueprint('monitoring', __name__, url_prefix='/api/v1/monitoring')
@@ -257,7 +261,11 @@ def get_metrics():
         response = {
             'status': 'success',
             'timestamp': datetime.now(UTC).isoformat(),
-            'metrics': metrics_summary
+            'metrics': metrics_summary,
+            'song_counters': song_counters.get_stats(),
+            'pdf_artifact_cache': pdf_artifact_cache.get_stats(),
+            'pdf_job_progress': pdf_job_progress.get_stats(),
+            'audit_pipeline': audit_pipeline.get_stats()
         }
         
         monitor_logger.info(
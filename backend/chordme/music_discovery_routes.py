@@ -447,6 +447,10 @@ def get_trending_songs():
         type: integer
         default: 20
         description: Maximum number of trending songs to return (max 50)
+      - name: genre
+        in: query
+        type: string
+        description: Only return songs trending within this genre
     responses:
       200:
         description: Trending songs retrieved successfully
@@ -485,6 +489,9 @@ def get_trending_songs():
                         type: integer
                       favorite_count:
                         type: integer
+                      recent_activity:
+                        type: object
+                        description: Views, favorites, practices and performances within the timeframe
                       trend_explanation:
                         type: string
                 trending_factors:
@@ -512,6 +519,7 @@ def get_trending_songs():
         user_id = get_current_user_id()
         timeframe = request.args.get('timeframe', '7d')
         limit = min(int(request.args.get('limit', 20)), 50)  # Cap at 50
+        genre = request.args.get('genre') or None
         
         if timeframe not in ['1d', '7d', '30d']:
             return jsonify({
@@ -520,7 +528,7 @@ def get_trending_songs():
             }), 400
         
         trending_data = MusicDiscoveryService.get_trending_songs(
-            user_id, timeframe=timeframe, limit=limit
+            user_id, timeframe=timeframe, limit=limit, genre=genre
         )
         
         return jsonify({
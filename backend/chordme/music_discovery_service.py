@@ -18,11 +18,16 @@ import logging
 import math
 from typing import Dict, List, Any, Optional, Tuple, Set
 
-from .models import db, Song, User, Setlist, SetlistSong, SetlistPerformance
+from .models import db, Song, User, Setlist, SetlistSong, SetlistPerformance, SongNeighbor
 from .analytics_service import PerformanceAnalyticsService
+from .song_features import get_song_feature_store
+from .trending import TIMEFRAMES, genre_scope, trending_engine
 
 logger = logging.getLogger(__name__)
 
+# Extra feature store matches hydrated in case some were deleted or unshared meanwhile
+HYDRATION_MARGIN = 10
+
 
 class MusicDiscoveryService:
     """Service for music discovery and recommendation features."""
@@ -145,24 +150,14 @@ class MusicDiscoveryService:
             Dictionary containing artist songs and exploration data
         """
         # Get songs by the artist that user can access
-        artist_songs_query = Song.query.filter(
+        # Access control and popularity order (view count and favorite count) run in SQL
+        songs = Song.query.filter(
             Song.artist.ilike(f'%{artist}%'),
-            Song.is_deleted == False
-        )
-        
-        # Apply access controls
-        accessible_songs = []
-        for song in artist_songs_query.all():
-            if song.can_user_access(user_id):
-                accessible_songs.append(song)
-        
-        # Sort by popularity (view count and favorite count)
-        accessible_songs.sort(
-            key=lambda s: (s.favorite_count or 0) + (s.view_count or 0),
-            reverse=True
-        )
-        
-        songs = accessible_songs[:limit]
+            Song.is_deleted == False,
+            Song.accessible_to(user_id)
+        ).order_by(
+            desc(MusicDiscoveryService._popularity()), Song.id
+        ).limit(limit).all()
         
         # Analyze artist characteristics
         genres = [song.genre for song in songs if song.genre]
@@ -206,24 +201,14 @@ class MusicDiscoveryService:
             Dictionary containing genre songs and characteristics
         """
         # Get songs in the genre that user can access
-        genre_songs_query = Song.query.filter(
+        # Access control and popularity order (view count and favorite count) run in SQL
+        songs = Song.query.filter(
             Song.genre.ilike(f'%{genre}%'),
-            Song.is_deleted == False
-        )
-        
-        # Apply access controls
-        accessible_songs = []
-        for song in genre_songs_query.all():
-            if song.can_user_access(user_id):
-                accessible_songs.append(song)
-        
-        # Sort by popularity and diversity
-        accessible_songs.sort(
-            key=lambda s: (s.favorite_count or 0) + (s.view_count or 0),
-            reverse=True
-        )
-        
-        songs = accessible_songs[:limit]
+            Song.is_deleted == False,
+            Song.accessible_to(user_id)
+        ).order_by(
+            desc(MusicDiscoveryService._popularity()), Song.id
+        ).limit(limit).all()
         
         # Analyze genre characteristics
         artists = [song.artist for song in songs if song.artist]
@@ -252,7 +237,8 @@ class MusicDiscoveryService:
         }
     
     @staticmethod
-    def get_trending_songs(user_id: int, timeframe: str = '7d', limit: int = 20) -> Dict[str, Any]:
+    def get_trending_songs(user_id: int, timeframe: str = '7d', limit: int = 20,
+                           genre: Optional[str] = None) -> Dict[str, Any]:
         """
         Get trending songs based on community activity.
         
@@ -260,27 +246,22 @@ class MusicDiscoveryService:
             user_id: ID of the requesting user
             timeframe: Time period for trending analysis ('1d', '7d', '30d')
             limit: Maximum number of trending songs to return
+            genre: Optional genre to restrict the leaderboard to
             
         Returns:
             Dictionary containing trending songs and analysis
         """
-        # Calculate date range
+        if timeframe not in TIMEFRAMES:
+            timeframe = '7d'  # Default to 7 days
         now = datetime.now(UTC)
-        if timeframe == '1d':
-            start_date = now - timedelta(days=1)
-        elif timeframe == '7d':
-            start_date = now - timedelta(days=7)
-        elif timeframe == '30d':
-            start_date = now - timedelta(days=30)
-        else:
-            start_date = now - timedelta(days=7)  # Default to 7 days
+        start_date = now - TIMEFRAMES[timeframe].window
         
-        # Get song activity in the timeframe
+        # Read the precomputed leaderboard for the timeframe
         trending_data = MusicDiscoveryService._calculate_trending_scores(
-            start_date, now, user_id, limit
+            timeframe, user_id, limit, genre
         )
         
-        return {
+        result = {
             'timeframe': timeframe,
             'period': {
                 'start_date': start_date.isoformat(),
@@ -288,13 +269,16 @@ class MusicDiscoveryService:
             },
             'trending_songs': trending_data,
             'trending_factors': [
-                'Recent view count increases',
-                'New favorites and shares',
-                'Performance frequency',
-                'Community engagement'
+                'Recent views',
+                'New favorites',
+                'Practice and performance frequency',
+                'Recent activity weighs more than older activity'
             ],
             'generated_at': now.isoformat()
         }
+        if genre:
+            result['genre'] = genre
+        return result
     
     @staticmethod
     def _get_user_song_history(user_id: int) -> List[Dict[str, Any]]:
@@ -333,17 +317,26 @@ class MusicDiscoveryService:
         # Analyze user's music preferences
         user_preferences = MusicDiscoveryService._analyze_user_preferences(user_songs)
         
-        # Find songs with similar characteristics
-        similar_songs = Song.query.filter(
-            Song.is_deleted == False,
-            Song.user_id != user_id  # Exclude user's own songs
-        ).all()
-        
-        recommendations = []
         user_song_ids = {item['song'].id for item in user_songs}
+        store = get_song_feature_store()
+        if store is not None:
+            # Score the whole catalogue in one vectorized pass, then hydrate only the winners
+            matches = store.match_preferences(
+                user_preferences, user_id, limit + HYDRATION_MARGIN,
+                exclude_ids=user_song_ids, threshold=0.3  # Minimum similarity threshold
+            )
+            candidates = MusicDiscoveryService._load_accessible_songs([song_id for song_id, _ in matches], user_id)
+        else:
+            # Feature store not built yet: score every song the user can see
+            candidates = Song.query.filter(
+                Song.is_deleted == False,
+                Song.user_id != user_id,
+                Song.accessible_to(user_id)
+            ).all()
         
-        for song in similar_songs:
-            if not song.can_user_access(user_id) or song.id in user_song_ids:
+        recommendations = []
+        for song in candidates:
+            if song.user_id == user_id or song.id in user_song_ids:
                 continue
             
             similarity_score = MusicDiscoveryService._calculate_content_similarity(
@@ -373,33 +366,34 @@ class MusicDiscoveryService:
         if not user_songs:
             return []
         
-        # Find users with similar music taste
-        similar_users = MusicDiscoveryService._find_similar_users(user_id, user_songs)
-        
-        recommendations = []
         user_song_ids = {item['song'].id for item in user_songs}
         
-        # Get songs liked by similar users
-        for similar_user_id, similarity_score in similar_users:
-            similar_user_songs = MusicDiscoveryService._get_user_song_history(similar_user_id)
+        # Item-item neighbours of the user's songs, precomputed by chordme.item_similarity
+        total_score = func.sum(SongNeighbor.score)
+        candidates = db.session.query(SongNeighbor.neighbor_id, total_score).filter(
+            SongNeighbor.song_id.in_(user_song_ids),
+            ~SongNeighbor.neighbor_id.in_(user_song_ids)
+        ).group_by(SongNeighbor.neighbor_id).order_by(
+            desc(total_score), SongNeighbor.neighbor_id
+        ).limit(limit + HYDRATION_MARGIN).all()
+        scores = {neighbor_id: score for neighbor_id, score in candidates}
+        
+        recommendations = []
+        for song in MusicDiscoveryService._load_accessible_songs(list(scores), user_id):
+            if song.user_id == user_id:
+                continue
+            
+            relevance_score = min(scores[song.id], 1.0) * 0.8  # Weight by summed item similarity
             
-            for song_item in similar_user_songs:
-                song = song_item['song']
-                if (song.id not in user_song_ids and 
-                    song.can_user_access(user_id) and 
-                    song.user_id != user_id):
-                    
-                    relevance_score = similarity_score * 0.8  # Weight by user similarity
-                    
-                    recommendations.append({
-                        'song_id': song.id,
-                        'title': song.title,
-                        'artist': song.artist,
-                        'genre': song.genre,
-                        'relevance_score': relevance_score,
-                        'explanation': f'Users with similar taste also enjoyed this song',
-                        'recommendation_type': 'collaborative'
-                    })
+            recommendations.append({
+                'song_id': song.id,
+                'title': song.title,
+                'artist': song.artist,
+                'genre': song.genre,
+                'relevance_score': relevance_score,
+                'explanation': f'Users with similar taste also enjoyed this song',
+                'recommendation_type': 'collaborative'
+            })
         
         # Sort by relevance and limit
         recommendations.sort(key=lambda x: x['relevance_score'], reverse=True)
@@ -408,15 +402,22 @@ class MusicDiscoveryService:
     @staticmethod
     def _find_similar_by_features(reference_song: Song, user_id: int, limit: int) -> List[Dict[str, Any]]:
         """Find songs similar to reference song based on audio features."""
-        similar_songs = Song.query.filter(
-            Song.is_deleted == False,
-            Song.id != reference_song.id
-        ).all()
+        store = get_song_feature_store()
+        if store is not None:
+            matches = store.similar_to(reference_song, user_id, limit + HYDRATION_MARGIN, threshold=0.4)
+            candidates = MusicDiscoveryService._load_accessible_songs([song_id for song_id, _ in matches], user_id)
+        else:
+            # Feature store not built yet: score every song the user can see
+            candidates = Song.query.filter(
+                Song.is_deleted == False,
+                Song.id != reference_song.id,
+                Song.accessible_to(user_id)
+            ).all()
         
         similarities = []
         
-        for song in similar_songs:
-            if not song.can_user_access(user_id):
+        for song in candidates:
+            if song.id == reference_song.id:
                 continue
             
             similarity_score = MusicDiscoveryService._calculate_feature_similarity(
@@ -439,6 +440,23 @@ class MusicDiscoveryService:
         similarities.sort(key=lambda x: x['similarity_score'], reverse=True)
         return similarities[:limit]
     
+    @staticmethod
+    def _popularity():
+        """SQL popularity of a song: favorites plus views."""
+        return func.coalesce(Song.favorite_count, 0) + func.coalesce(Song.view_count, 0)
+    
+    @staticmethod
+    def _load_accessible_songs(song_ids: List[int], user_id: int) -> List[Song]:
+        """Hydrate feature store matches, re-checking rows the store may not have caught up with."""
+        if not song_ids:
+            return []
+        songs = {song.id: song for song in Song.query.filter(
+            Song.id.in_(song_ids),
+            Song.is_deleted == False,
+            Song.accessible_to(user_id)
+        )}
+        return [songs[song_id] for song_id in song_ids if song_id in songs]
+    
     @staticmethod
     def _calculate_feature_similarity(song1: Song, song2: Song) -> float:
         """Calculate similarity between two songs based on features."""
@@ -541,54 +559,28 @@ class MusicDiscoveryService:
         
         return similarity_score / factors if factors > 0 else 0.0
     
-    @staticmethod
-    def _find_similar_users(user_id: int, user_songs: List[Dict]) -> List[Tuple[int, float]]:
-        """Find users with similar music taste."""
-        user_song_ids = {item['song'].id for item in user_songs}
-        
-        # Get all other users and their songs
-        other_users = User.query.filter(User.id != user_id).all()
-        similar_users = []
-        
-        for other_user in other_users:
-            other_user_songs = MusicDiscoveryService._get_user_song_history(other_user.id)
-            other_song_ids = {item['song'].id for item in other_user_songs}
-            
-            # Calculate Jaccard similarity
-            intersection = len(user_song_ids.intersection(other_song_ids))
-            union = len(user_song_ids.union(other_song_ids))
-            
-            if union > 0:
-                similarity = intersection / union
-                if similarity > 0.1:  # Minimum similarity threshold
-                    similar_users.append((other_user.id, similarity))
-        
-        # Sort by similarity
-        similar_users.sort(key=lambda x: x[1], reverse=True)
-        return similar_users[:10]  # Return top 10 similar users
-    
     @staticmethod
     def _get_popular_recommendations(user_id: int, limit: int) -> Dict[str, Any]:
         """Get popular song recommendations for new users."""
         # Get most popular songs (by view count and favorite count)
         popular_songs = Song.query.filter(
-            Song.is_deleted == False
+            Song.is_deleted == False,
+            Song.accessible_to(user_id)
         ).order_by(
-            desc(Song.favorite_count + Song.view_count)
+            desc(MusicDiscoveryService._popularity()), Song.id
         ).limit(limit).all()
         
         recommendations = []
         for song in popular_songs:
-            if song.can_user_access(user_id):
-                recommendations.append({
-                    'song_id': song.id,
-                    'title': song.title,
-                    'artist': song.artist,
-                    'genre': song.genre,
-                    'relevance_score': 0.8,  # High score for popular songs
-                    'explanation': 'Popular among the community',
-                    'recommendation_type': 'popular'
-                })
+            recommendations.append({
+                'song_id': song.id,
+                'title': song.title,
+                'artist': song.artist,
+                'genre': song.genre,
+                'relevance_score': 0.8,  # High score for popular songs
+                'explanation': 'Popular among the community',
+                'recommendation_type': 'popular'
+            })
         
         return {
             'user_id': user_id,
@@ -605,65 +597,49 @@ class MusicDiscoveryService:
         }
     
     @staticmethod
-    def _calculate_trending_scores(start_date: datetime, end_date: datetime, 
-                                  user_id: int, limit: int) -> List[Dict[str, Any]]:
-        """Calculate trending scores for songs in the given timeframe."""
-        # For now, use view count and favorite count as trending indicators
-        # In a real implementation, this would track activity changes over time
-        
-        trending_songs = Song.query.filter(
-            Song.is_deleted == False,
-            Song.updated_at >= start_date.replace(tzinfo=None)  # Convert to naive datetime
-        ).order_by(
-            desc(Song.view_count + Song.favorite_count)
-        ).limit(limit * 2).all()  # Get more than needed for filtering
+    def _calculate_trending_scores(timeframe: str, user_id: int, limit: int,
+                                   genre: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Read trending songs from the decayed leaderboard of the timeframe."""
+        # Read extra entries in case some are private, deleted or changed genre
+        leaders = trending_engine.top(timeframe, limit * 2 + HYDRATION_MARGIN, genre)
+        scores = dict(leaders)
+        songs = MusicDiscoveryService._load_accessible_songs(list(scores), user_id)
+        if genre:
+            songs = [song for song in songs if genre_scope(song.genre) == genre_scope(genre)]
+        songs = songs[:limit]
+        activity = trending_engine.window_counts([song.id for song in songs], timeframe)
         
         trending_data = []
-        for song in trending_songs:
-            if song.can_user_access(user_id):
-                # Calculate simple trending score
-                song_updated = song.updated_at or song.created_at
-                if song_updated:
-                    days_since_update = (end_date.replace(tzinfo=None) - song_updated).days + 1
-                else:
-                    days_since_update = 1
-                trending_score = (song.view_count + song.favorite_count) / days_since_update
-                
-                trending_data.append({
-                    'song_id': song.id,
-                    'title': song.title,
-                    'artist': song.artist,
-                    'genre': song.genre,
-                    'trending_score': trending_score,
-                    'view_count': song.view_count,
-                    'favorite_count': song.favorite_count,
-                    'trend_explanation': 'Recent community activity and engagement'
-                })
-        
-        # Sort by trending score
-        trending_data.sort(key=lambda x: x['trending_score'], reverse=True)
-        return trending_data[:limit]
+        for song in songs:
+            trending_data.append({
+                'song_id': song.id,
+                'title': song.title,
+                'artist': song.artist,
+                'genre': song.genre,
+                'trending_score': round(scores[song.id], 4),
+                'view_count': song.view_count,
+                'favorite_count': song.favorite_count,
+                'recent_activity': activity.get(song.id, {}),
+                'trend_explanation': 'Recent community activity and engagement'
+            })
+        
+        return trending_data
     
     @staticmethod
     def _find_related_artists(artist: str, primary_genre: Optional[str], user_id: int) -> List[str]:
         """Find artists related to the given artist."""
-        related_query = Song.query.filter(
+        # Unique artists of accessible songs, without loading the songs
+        related_query = db.session.query(distinct(Song.artist)).filter(
             Song.artist != artist,
-            Song.is_deleted == False
+            Song.artist != '',
+            Song.is_deleted == False,
+            Song.accessible_to(user_id)
         )
         
         if primary_genre:
             related_query = related_query.filter(Song.genre.ilike(f'%{primary_genre}%'))
         
-        related_songs = related_query.all()
-        
-        # Filter for accessible songs and get unique artists
-        related_artists = set()
-        for song in related_songs:
-            if song.can_user_access(user_id) and song.artist:
-                related_artists.add(song.artist)
-        
-        return list(related_artists)[:10]  # Return up to 10 related artists
+        return [row[0] for row in related_query.limit(10)]  # Return up to 10 related artists
     
     @staticmethod
     def _generate_content_explanation(song: Song, user_preferences: Dict) -> str:
@@ -0,0 +1,264 @@
+"""
+Content-addressed cache of rendered PDF artifacts.
+
+A rendered PDF is fully determined by the songs that go into it, the
+generator arguments (template, paper size, orientation, fonts, colours,
+diagram options, ...), the template definition and the generator version.
+``artifact_key`` digests exactly those inputs, and ``PDFArtifactCache``
+keeps the rendered bytes on local disk under that digest, so re-exporting
+an unchanged song or setlist becomes a file read. The cache is bounded by
+total size and evicts least recently used artifacts.
+
+Several processes may share the directory. Each keeps its own size index,
+so the bound is enforced per process, and an artifact evicted by another
+process is simply treated as a miss.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from . import __version__
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump when a change to the PDF generator alters its output for the same inputs
+GENERATOR_VERSION = 1
+
+
+def _template_fingerprint(template_name: Optional[str]) -> Optional[str]:
+    """Digest of a template definition, so editing a custom template invalidates its artifacts."""
+    from .pdf_templates import get_template
+    template = get_template(template_name or 'classic')
+    if template is None:
+        return None
+    return hashlib.sha256(template.to_json().encode('utf-8')).hexdigest()
+
+
+def artifact_key(kind: str, songs: List[Dict[str, Any]], render_options: Dict[str, Any]) -> str:
+    """
+    Content address of a rendered PDF.
+
+    Args:
+        kind: What is rendered, e.g. 'song' or 'songbook'
+        songs: The 'title', 'artist' and 'content' of each song, in order
+        render_options: The keyword arguments passed to the PDF generator
+    """
+    material = {
+        'generator': [__version__, GENERATOR_VERSION],
+        'kind': kind,
+        'songs': [[song.get('title'), song.get('artist'), song.get('content')] for song in songs],
+        'options': render_options,
+        'template': _template_fingerprint(render_options.get('template_name')),
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class PDFArtifactCache:
+    """Size-bounded LRU store of rendered PDFs on local disk."""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.app = None
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._enabled = True
+        self._index: 'OrderedDict[str, int]' = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'errors': 0}
+
+    def init_app(self, app):
+        """Configure the cache directory and size bound from the Flask app."""
+        self.app = app
+        self.max_bytes = int(app.config.get('PDF_ARTIFACT_CACHE_MAX_BYTES', self.max_bytes))
+        self.directory = app.config.get('PDF_ARTIFACT_CACHE_DIR') or \
+            os.path.join(app.instance_path, 'cache', 'pdf_artifacts')
+        with self._lock:
+            self._index.clear()
+            self._total_bytes = 0
+            self._loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        """Whether lookups and stores are on; follows PDF_ARTIFACT_CACHE_ENABLED on each use."""
+        if self.app is not None and not self.app.config.get('PDF_ARTIFACT_CACHE_ENABLED', True):
+            return False
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value: bool):
+        self._enabled = value
+
+    def _active(self) -> bool:
+        return bool(self.enabled and self.directory)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def _load_index(self):
+        """Index artifacts already on disk, oldest access first. Called with the lock held."""
+        if self._loaded:
+            return
+        self._loaded = True
+        entries = []
+        if self.directory and os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith('.pdf'):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def _forget(self, key: str):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return a cached artifact, or None on a miss."""
+        if not self._active():
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Access time for LRU order across restarts
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(key)
+                self.stats['misses'] += 1
+            return None
+        except OSError as e:
+            logger.warning(f"Failed to read PDF artifact {key}: {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+                self.stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self._index[key] = len(data)
+                self._total_bytes += len(data)
+            self._index.move_to_end(key)
+            self.stats['hits'] += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store an artifact and evict the least recently used ones over the size bound."""
+        if not self._active() or len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial artifact
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to store PDF artifact {key}: {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+            return
+
+        with self._lock:
+            self._load_index()
+            self._forget(key)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self.stats['stores'] += 1
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, size = self._index.popitem(last=False)
+                self._total_bytes -= size
+                evicted.append(old_key)
+            self.stats['evictions'] += len(evicted)
+
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """Return the cached artifact for ``key``, rendering and storing it on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def get_or_submit(self, key: str, submit: Callable[[], Future]) -> Future:
+        """
+        Like ``get_or_render`` for asynchronous renders: returns a completed
+        future on a hit, otherwise the future from ``submit``, whose result is
+        stored when it succeeds.
+        """
+        data = self.get(key)
+        if data is not None:
+            future = Future()
+            future.set_result(data)
+            return future
+
+        def store(done: Future):
+            if not done.cancelled() and done.exception() is None:
+                self.put(key, done.result())
+
+        future = submit()
+        future.add_done_callback(store)
+        return future
+
+    def clear(self):
+        """Delete every cached artifact."""
+        with self._lock:
+            self._load_index()
+            keys = list(self._index)
+            self._index.clear()
+            self._total_bytes = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load_index()
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+                'entries': len(self._index),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'enabled': self.enabled
+            }
+
+
+def cached_song_pdf(content: str, title: Optional[str] = None, artist: Optional[str] = None, **options) -> bytes:
+    """``generate_song_pdf`` through the artifact cache."""
+    from .pdf_generator import generate_song_pdf
+    key = artifact_key('song', [{'title': title, 'artist': artist, 'content': content}], options)
+    return pdf_artifact_cache.get_or_render(
+        key, lambda: generate_song_pdf(content=content, title=title, artist=artist, **options))
+
+
+# Global instance
+pdf_artifact_cache = PDFArtifactCache()
@@ -16,13 +16,23 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.graphics import renderPDF
 from reportlab.graphics.shapes import Drawing
 
+from collections import OrderedDict
 from io import BytesIO
+import copy
+import json
+import logging
 import re
+import threading
 from typing import Dict, List, Tuple, Optional, Set
 
 from .pdf_template_schema import PDFTemplateConfig, FontConfig
 from .pdf_templates import get_template, get_template_manager
 from .chord_diagram_pdf import ChordDiagramGenerator, create_chord_diagram_for_pdf
+from .chordpro_parser import parse_chordpro
+
+logger = logging.getLogger(__name__)
+
+GENERATOR_POOL_SIZE = 32  # Prepared generator configurations kept per process
 
 
 class ChordProPDFGenerator:
@@ -77,9 +87,12 @@ class ChordProPDFGenerator:
             self.template = template
         elif template_name:
             self.template = get_template(template_name)
+        self.source_template = self.template
         
-        # Override template with custom options if provided
+        # Override template with custom options if provided, on a copy so the
+        # shared template is left as it is
         if self.template and (colors or margins or font_size != 11):
+            self.template = copy.deepcopy(self.template)
             self._customize_template()
         
         # Chord diagram settings
@@ -316,7 +329,7 @@ class ChordProPDFGenerator:
         Returns:
             Dictionary with parsed song data
         """
-        lines = content.split('\n')
+        song = parse_chordpro(content)
         parsed_data = {
             'title': None,
             'artist': None,
@@ -327,12 +340,10 @@ class ChordProPDFGenerator:
         
         current_section = {'type': 'verse', 'lines': []}
         
-        for line in lines:
-            line = line.strip()
-            
+        for song_line in song.lines:
             # Parse directives
-            if line.startswith('{') and line.endswith('}'):
-                directive_full = line[1:-1]
+            if song_line.directive is not None:
+                directive_full = song_line.directive.raw
                 directive_lower = directive_full.lower()
                 
                 if directive_lower.startswith('title:') or directive_lower.startswith('t:'):
@@ -366,11 +377,13 @@ class ChordProPDFGenerator:
                     current_section = {'type': 'verse', 'lines': []}
             
             # Parse chord and lyric lines
-            elif line:
-                chord_line, lyric_line = self._parse_chord_line(line)
+            elif song_line.text:
                 current_section['lines'].append({
-                    'chords': chord_line,
-                    'lyrics': lyric_line
+                    'chords': [
+                        {'chord': token.name, 'position': token.position}
+                        for token in song_line.chords
+                    ],
+                    'lyrics': song_line.lyrics
                 })
         
         # Add final section if it has content
@@ -714,7 +727,7 @@ class ChordProPDFGenerator:
             
             if chord_def:
                 # Create chord diagram
-                diagram = self.chord_diagram_generator.generate_chord_diagram_pdf_element(
+                diagram = self.chord_diagram_generator.get_chord_diagram(
                     chord_def, chord_name, self.diagram_instrument
                 )
                 
@@ -1070,6 +1083,58 @@ class ChordProPDFGenerator:
 
 
 
+# Prepared generators keyed by their options
+_generator_pool: 'OrderedDict[str, ChordProPDFGenerator]' = OrderedDict()
+_generator_pool_lock = threading.Lock()
+
+
+def get_pdf_generator(**options) -> ChordProPDFGenerator:
+    """
+    Return a generator for the given ``ChordProPDFGenerator`` options.
+    
+    A generator is not modified after it is built, so one instance per
+    configuration is kept per process and shared instead of reloading the
+    template and rebuilding its styles for every song. An instance is
+    rebuilt when its named template has been replaced since.
+    """
+    key = json.dumps(options, sort_keys=True, default=str)
+    template_name = options.get('template_name')
+    with _generator_pool_lock:
+        generator = _generator_pool.get(key)
+        if generator is not None and (not template_name or
+                                      generator.source_template is get_template(template_name)):
+            _generator_pool.move_to_end(key)
+            return generator
+    
+    generator = ChordProPDFGenerator(**options)
+    with _generator_pool_lock:
+        _generator_pool[key] = generator
+        _generator_pool.move_to_end(key)
+        while len(_generator_pool) > GENERATOR_POOL_SIZE:
+            _generator_pool.popitem(last=False)
+    return generator
+
+
+def clear_generator_pool():
+    with _generator_pool_lock:
+        _generator_pool.clear()
+
+
+def warm_pdf_generators():
+    """
+    Prepare the generators for the default export options of each template,
+    and the common chord diagrams. Runs when a PDF render process starts so
+    its first jobs do not pay for the setup.
+    """
+    from .chord_diagram_pdf import warm_chord_diagrams
+    try:
+        for template_name in get_template_manager().get_template_names()[:GENERATOR_POOL_SIZE]:
+            get_pdf_generator(**export_job_options({'template': template_name}))
+        warm_chord_diagrams()
+    except Exception as e:
+        logger.warning(f"Failed to warm PDF generators: {e}")
+
+
 def generate_song_pdf(content: str, title: str = None, artist: str = None, 
                      paper_size: str = 'a4', orientation: str = 'portrait',
                      template_name: str = None, include_chord_diagrams: bool = False,
@@ -1109,7 +1174,7 @@ def generate_song_pdf(content: str, title: str = None, artist: str = None,
     if colors is None:
         colors = {'title': '#000000', 'artist': '#555555', 'chords': '#333333', 'lyrics': '#000000'}
     
-    generator = ChordProPDFGenerator(
+    generator = get_pdf_generator(
         paper_size=paper_size, 
         orientation=orientation,
         template_name=template_name,
@@ -1124,4 +1189,36 @@ def generate_song_pdf(content: str, title: str = None, artist: str = None,
         margins=margins,
         colors=colors
     )
-    return generator.generate_pdf(content, title=title, artist=artist)
\ No newline at end of file
+    return generator.generate_pdf(content, title=title, artist=artist)
+
+
+def export_job_options(options: Dict) -> Dict:
+    """Map the export options stored on a PDF export job to generator arguments."""
+    return {
+        'paper_size': options.get('paper_size', 'a4'),
+        'orientation': options.get('orientation', 'portrait'),
+        'template_name': options.get('template', 'classic'),
+        'include_chord_diagrams': options.get('chord_diagrams', False),
+        'diagram_instrument': options.get('instrument', 'guitar'),
+        'font_size': options.get('font_size', 11),
+        'quality': options.get('quality', 'standard'),
+        'header': options.get('header', ''),
+        'footer': options.get('footer', ''),
+        'margins': options.get('margins', {}),
+        'colors': options.get('colors', {})
+    }
+
+
+def render_song_pdf(song: Dict, options: Dict) -> bytes:
+    """
+    Render one song of an export job. Runs in the PDF render processes, so
+    it only takes plain data: a dict with 'title', 'artist' and 'content'.
+    """
+    return generate_song_pdf(content=song['content'], title=song['title'], artist=song.get('artist'),
+                             **export_job_options(options))
+
+
+def render_multi_song_pdf(songs: List[Dict], options: Dict) -> bytes:
+    """Render a songbook of several songs for an export job in the PDF render processes."""
+    generator = get_pdf_generator(**export_job_options(options))
+    return generator.create_multi_song_pdf(songs=songs, include_toc=options.get('include_toc', True))
@@ -4,38 +4,297 @@ PDF Export Job Management System
 Handles asynchronous PDF generation with progress tracking, error handling,
 and temporary file cleanup. Provides a simple background job system without
 requiring external job queue dependencies.
+
+Jobs are run by ``PDFJobScheduler``: a fixed number of job threads take jobs
+from a priority queue (single songs before songbooks before batches) with a
+per-user cap on running jobs, and hand the CPU-bound rendering to a process
+pool sized to the machine's cores. Rendered PDFs go through the artifact
+cache, so songs and songbooks that were exported before with the same
+options are not rendered again.
 """
 
 import os
+import heapq
+import itertools
+import multiprocessing
 import threading
 import time
 import tempfile
 import logging
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import Callable, Deque, Iterable, Iterator, List, Dict, Optional, Any, Tuple
+
+from sqlalchemy import inspect, select, update
 
 from . import db, app
 from .models import PDFExportJob, Song, User, utc_now
-from .pdf_generator import generate_song_pdf, ChordProPDFGenerator
-from .permission_helpers import check_song_permission
+from .pdf_artifact_cache import artifact_key, pdf_artifact_cache
+from .pdf_job_progress import pdf_job_progress
+from .pdf_generator import export_job_options
+from .permission_helpers import check_song_permission, resolve_song_permissions, first_denied_song
+from .streaming_archive import iter_songs, write_zip
+from pdf_render_worker import render_song_pdf, render_multi_song_pdf, warm_pdf_generators
 
 logger = logging.getLogger(__name__)
 
+# Lower runs first
+JOB_PRIORITIES = {'single': 0, 'multi_song': 1, 'batch': 2}
+
+CANCEL_POLL_SECONDS = 0.2  # How often a job waiting on a render checks for cancellation
+DEFAULT_CANCEL_SYNC_INTERVAL = 2.0  # seconds between checks for jobs cancelled by other processes
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+
+class PDFJobScheduler:
+    """
+    Bounded, prioritised executor for PDF export jobs.
+    
+    ``workers`` threads run jobs; each job renders through ``render`` or
+    ``render_ordered``, which submit to a shared process pool of
+    ``render_processes`` workers (0 renders inline on the job thread).
+    Cancelling a job stops it at its next render: queued renders are
+    dropped and the job raises ``JobCancelled``.
+    """
+    
+    def __init__(self, run_job: Callable[[int, threading.Event], None], workers: int = 4,
+                 render_processes: Optional[int] = None, max_jobs_per_user: int = 2):
+        self._run_job = run_job
+        self.workers = max(1, workers)
+        self.render_processes = (os.cpu_count() or 1) if render_processes is None else render_processes
+        self.max_jobs_per_user = max(1, max_jobs_per_user)
+        
+        self._queue: List[Tuple[int, int, int, int]] = []  # (priority, sequence, job_id, user_id)
+        self._deferred: Dict[int, Deque[Tuple[int, int, int, int]]] = defaultdict(deque)
+        self._running: Counter = Counter()
+        self._cancel_events: Dict[int, threading.Event] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._shutdown = False
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+    
+    # Queue
+    
+    def submit(self, job_id: int, user_id: int, job_type: str):
+        """Queue a job to run once a job thread and a slot for its user are free."""
+        with self._condition:
+            if job_id in self._cancel_events:
+                return  # already queued or running
+            self._cancel_events[job_id] = threading.Event()
+            heapq.heappush(self._queue, (JOB_PRIORITIES.get(job_type, len(JOB_PRIORITIES)),
+                                         next(self._sequence), job_id, user_id))
+            self.stats['submitted'] += 1
+            self._start_threads()
+            self._condition.notify()
+    
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job; returns False if the job is unknown."""
+        with self._condition:
+            event = self._cancel_events.get(job_id)
+            if event is None:
+                return False
+            event.set()
+            self._condition.notify_all()
+            return True
+    
+    def active_jobs(self) -> List[int]:
+        """Ids of the jobs queued or running on this scheduler."""
+        with self._condition:
+            return list(self._cancel_events)
+    
+    def _start_threads(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, daemon=True,
+                                      name=f"PDFJobWorker-{len(self._threads)}")
+            self._threads.append(thread)
+            thread.start()
+    
+    def _next_job(self) -> Optional[Tuple[int, int, int, int]]:
+        """Pop the most urgent runnable job. Called with the condition held."""
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            job_id, user_id = entry[2], entry[3]
+            event = self._cancel_events.get(job_id)
+            if event is None:
+                continue  # stale entry of a job that already finished
+            if event.is_set():
+                del self._cancel_events[job_id]
+                self.stats['cancelled'] += 1
+                continue
+            if self._running[user_id] >= self.max_jobs_per_user:
+                self._deferred[user_id].append(entry)
+                continue
+            self._running[user_id] += 1
+            return entry
+        return None
+    
+    def _worker(self):
+        while True:
+            with self._condition:
+                entry = self._next_job()
+                while entry is None and not self._shutdown:
+                    self._condition.wait()
+                    entry = self._next_job()
+                if entry is None:
+                    return
+                job_id, user_id = entry[2], entry[3]
+                cancel_event = self._cancel_events[job_id]
+            
+            outcome = 'completed'
+            try:
+                self._run_job(job_id, cancel_event)
+                if cancel_event.is_set():
+                    outcome = 'cancelled'
+            except Exception as e:
+                outcome = 'failed'
+                logger.error(f"PDF job {job_id} crashed: {e}")
+            finally:
+                with self._condition:
+                    self.stats[outcome] += 1
+                    self._cancel_events.pop(job_id, None)
+                    self._running[user_id] -= 1
+                    if self._running[user_id] <= 0:
+                        del self._running[user_id]
+                    # Jobs held back by the per-user cap compete again
+                    for deferred in self._deferred.pop(user_id, ()):
+                        heapq.heappush(self._queue, deferred)
+                    self._condition.notify_all()
+    
+    # Rendering
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._condition:
+            if self._executor is None:
+                # Spawned rather than forked: the app process runs many threads.
+                # The entry points live in pdf_render_worker so the render
+                # processes do not import chordme/__init__ and boot the app.
+                self._executor = ProcessPoolExecutor(max_workers=self.render_processes,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=warm_pdf_generators)
+            return self._executor
+    
+    def render(self, fn: Callable, *args) -> Future:
+        """Run ``fn(*args)`` in the render process pool."""
+        if self.render_processes <= 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._get_executor().submit(fn, *args)
+    
+    def wait(self, future: Future, cancel_event: Optional[threading.Event] = None):
+        """Wait for a render, raising ``JobCancelled`` as soon as the job is cancelled."""
+        while not future.done():
+            if cancel_event is not None and cancel_event.is_set():
+                future.cancel()
+                raise JobCancelled()
+            wait([future], timeout=CANCEL_POLL_SECONDS)
+        if cancel_event is not None and cancel_event.is_set():
+            raise JobCancelled()
+        return future
+    
+    def render_ordered(self, fn: Callable, calls: Iterable[Tuple[Any, tuple]],
+                       cancel_event: Optional[threading.Event] = None,
+                       window: Optional[int] = None,
+                       submit: Optional[Callable[..., Future]] = None) -> Iterator[Tuple[Any, Future]]:
+        """
+        Fan ``(key, args)`` calls of ``fn`` out across the process pool and
+        yield ``(key, future)`` in call order once each is done. At most
+        ``window`` renders are in flight, so results never pile up.
+        ``submit(fn, *args)`` replaces ``render`` for starting each call.
+        """
+        submit = submit or self.render
+        window = window or 2 * max(1, self.render_processes)
+        calls = iter(calls)
+        pending: Deque[Tuple[Any, Future]] = deque()
+        try:
+            while True:
+                while len(pending) < window:
+                    call = next(calls, None)
+                    if call is None:
+                        break
+                    key, args = call
+                    pending.append((key, submit(fn, *args)))
+                if not pending:
+                    return
+                key, future = pending.popleft()
+                yield key, self.wait(future, cancel_event)
+        finally:
+            for _, future in pending:
+                future.cancel()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                **self.stats,
+                'queued': len(self._queue) + sum(len(entries) for entries in self._deferred.values()),
+                'running': sum(self._running.values()),
+                'workers': self.workers,
+                'render_processes': self.render_processes,
+                'max_jobs_per_user': self.max_jobs_per_user
+            }
+    
+    def shutdown(self, wait_for_jobs: bool = False):
+        with self._condition:
+            self._shutdown = True
+            for event in self._cancel_events.values():
+                event.set()
+            self._condition.notify_all()
+            executor, self._executor = self._executor, None
+        if wait_for_jobs:
+            for thread in self._threads:
+                thread.join(timeout=5)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
 
 class PDFJobManager:
     """
     Manages asynchronous PDF generation jobs with progress tracking and cleanup.
-    Uses threading for simplicity - in production, consider using Celery or similar.
+    Jobs run on a PDFJobScheduler configured from PDF_JOB_WORKERS,
+    PDF_RENDER_PROCESSES and PDF_MAX_JOBS_PER_USER. Progress is reported to
+    pdf_job_progress; the job row is written on state changes.
+    
+    A job may be cancelled through another worker or instance, so every
+    PDF_CANCEL_SYNC_INTERVAL seconds the jobs table is checked for cancelled
+    jobs among those running here. State changes are conditional on the state
+    the job left the row in, so a committed cancel is never overwritten.
     """
     
     def __init__(self):
         self.temp_dir = None
         self.cleanup_thread = None
+        self.cancel_sync_thread = None
         self.shutdown_event = threading.Event()
+        self._scheduler = None
+        self._scheduler_lock = threading.Lock()
         self._setup_temp_directory()
         self._start_cleanup_thread()
     
+    @property
+    def scheduler(self) -> PDFJobScheduler:
+        """The job scheduler, created from the app config on first use."""
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                self._scheduler = PDFJobScheduler(
+                    self._process_job,
+                    workers=int(app.config.get('PDF_JOB_WORKERS', 4)),
+                    render_processes=app.config.get('PDF_RENDER_PROCESSES'),
+                    max_jobs_per_user=int(app.config.get('PDF_MAX_JOBS_PER_USER', 2))
+                )
+                self._start_cancel_sync_thread(
+                    float(app.config.get('PDF_CANCEL_SYNC_INTERVAL', DEFAULT_CANCEL_SYNC_INTERVAL)))
+            return self._scheduler
+    
     def _setup_temp_directory(self):
         """Create temporary directory for PDF files."""
         try:
@@ -73,6 +332,66 @@ class PDFJobManager:
                 logger.error(f"Error in cleanup worker: {e}")
                 self.shutdown_event.wait(300)  # Wait 5 minutes on error
     
+    def _start_cancel_sync_thread(self, interval: float):
+        """Start background thread for picking up jobs cancelled by other processes."""
+        self.cancel_sync_thread = threading.Thread(
+            target=self._cancel_sync_worker,
+            args=(interval,),
+            daemon=True,
+            name="PDFCancelSyncWorker"
+        )
+        self.cancel_sync_thread.start()
+    
+    def _cancel_sync_worker(self, interval: float):
+        """Background worker to stop jobs whose row was cancelled elsewhere."""
+        while not self.shutdown_event.wait(interval):
+            try:
+                self._sync_cancellations()
+            except Exception as e:
+                logger.error(f"Error syncing PDF job cancellations: {e}")
+    
+    def _sync_cancellations(self) -> List[int]:
+        """Cancel the local jobs whose row is cancelled; returns their ids."""
+        scheduler = self._scheduler
+        job_ids = scheduler.active_jobs() if scheduler is not None else []
+        if not job_ids:
+            return []
+        with app.app_context():
+            cancelled = db.session.execute(
+                select(PDFExportJob.id).where(PDFExportJob.id.in_(job_ids),
+                                              PDFExportJob.status == 'cancelled')
+            ).scalars().all()
+        for job_id in cancelled:
+            scheduler.cancel(job_id)
+            logger.info(f"Stopping PDF job {job_id}, cancelled by another process")
+        return cancelled
+    
+    def _commit_state(self, job: PDFExportJob, expected_status: str) -> bool:
+        """
+        Commit the job's pending changes only if its row still has
+        ``expected_status``. Returns False, and reloads the job, if the row
+        moved on in the meantime (e.g. it was cancelled).
+        """
+        state = inspect(job)
+        changed = (state.attrs[column.key] for column in state.mapper.column_attrs)
+        values = {getattr(PDFExportJob, attr.key): attr.value
+                  for attr in changed if attr.history.has_changes()}
+        # Drop the pending changes so the flush does not write them unconditionally
+        db.session.expire(job)
+        updated = True
+        if values:
+            result = db.session.execute(
+                update(PDFExportJob)
+                .where(PDFExportJob.id == job.id, PDFExportJob.status == expected_status)
+                .values(values)
+                .execution_options(synchronize_session=False)
+            )
+            updated = result.rowcount == 1
+        db.session.commit()
+        if not updated:
+            logger.info(f"PDF job {job.id} is {job.status}; dropped its {values.get(PDFExportJob.status)} state")
+        return updated
+    
     def _cleanup_expired_files(self):
         """Clean up expired PDF files and database records."""
         try:
@@ -121,51 +440,85 @@ class PDFJobManager:
         return job
     
     def start_job_async(self, job_id: int):
-        """Start processing a job asynchronously."""
-        thread = threading.Thread(
-            target=self._process_job,
-            args=(job_id,),
-            daemon=True,
-            name=f"PDFJob-{job_id}"
-        )
-        thread.start()
-        logger.info(f"Started async processing for job {job_id}")
+        """Queue a job on the scheduler."""
+        job = db.session.get(PDFExportJob, job_id)
+        if not job:
+            logger.error(f"Job {job_id} not found")
+            return
+        self.scheduler.submit(job.id, job.user_id, job.job_type)
+        logger.info(f"Queued async processing for job {job_id}")
     
-    def _process_job(self, job_id: int):
-        """Process a PDF export job in background thread."""
+    def _process_job(self, job_id: int, cancel_event: Optional[threading.Event] = None):
+        """Process a PDF export job on a scheduler thread."""
+        cancel_event = cancel_event or threading.Event()
         try:
             with app.app_context():
-                job = PDFExportJob.query.get(job_id)
+                job = db.session.get(PDFExportJob, job_id)
                 if not job:
                     logger.error(f"Job {job_id} not found")
                     return
+                if job.status == 'cancelled':
+                    return
                 
+                queued_status = job.status
                 job.update_progress(status='processing')
-                db.session.commit()
+                if not self._commit_state(job, queued_status):
+                    return
+                pdf_job_progress.transition(job)
                 
-                if job.job_type == 'single':
-                    self._process_single_song_job(job)
-                elif job.job_type == 'batch':
-                    self._process_batch_job(job)
-                elif job.job_type == 'multi_song':
-                    self._process_multi_song_job(job)
-                else:
-                    job.mark_error(f"Unknown job type: {job.job_type}")
+                try:
+                    if job.job_type == 'single':
+                        self._process_single_song_job(job, cancel_event)
+                    elif job.job_type == 'batch':
+                        self._process_batch_job(job, cancel_event)
+                    elif job.job_type == 'multi_song':
+                        self._process_multi_song_job(job, cancel_event)
+                    else:
+                        job.mark_error(f"Unknown job type: {job.job_type}")
+                except JobCancelled:
+                    job.update_progress(status='cancelled')
+                    logger.info(f"Stopped cancelled PDF job {job_id}")
                 
-                db.session.commit()
+                pdf_job_progress.apply(job)
+                output_file_path = job.output_file_path
+                if not self._commit_state(job, 'processing') and output_file_path \
+                        and os.path.exists(output_file_path):
+                    os.remove(output_file_path)
+                pdf_job_progress.transition(job)
                 
         except Exception as e:
             logger.error(f"Error processing job {job_id}: {e}")
             try:
                 with app.app_context():
-                    job = PDFExportJob.query.get(job_id)
+                    job = db.session.get(PDFExportJob, job_id)
                     if job:
                         job.mark_error(f"Processing error: {str(e)}")
-                        db.session.commit()
+                        self._commit_state(job, 'processing')
+                        pdf_job_progress.transition(job)
             except:
                 pass
     
-    def _process_single_song_job(self, job: PDFExportJob):
+    def _render_pdf(self, fn: Callable, payload, options: Dict) -> Future:
+        """Render ``fn(payload, options)`` unless the artifact cache already holds the result."""
+        if fn is render_multi_song_pdf:
+            key = artifact_key('songbook', payload, {**export_job_options(options),
+                                                     'include_toc': options.get('include_toc', True)})
+        else:
+            key = artifact_key('song', [payload], export_job_options(options))
+        return pdf_artifact_cache.get_or_submit(key, lambda: self.scheduler.render(fn, payload, options))
+    
+    def _check_song_permissions(self, job: PDFExportJob) -> bool:
+        """Check the job's user can read every song; marks the job failed if not."""
+        denied_id = first_denied_song(resolve_song_permissions(job.song_ids, job.user_id, 'read'))
+        if denied_id is not None:
+            job.mark_error(f"Song {denied_id} not found or access denied")
+            return False
+        
+        # Verification phase done (5-15%)
+        pdf_job_progress.update(job, progress=15)
+        return True
+    
+    def _process_single_song_job(self, job: PDFExportJob, cancel_event: threading.Event):
         """Process a single song PDF export job."""
         if not job.song_ids:
             job.mark_error("No song ID provided for single song export")
@@ -181,31 +534,20 @@ class PDFJobManager:
         
         try:
             # Update progress
-            job.update_progress(progress=10)
-            db.session.commit()
+            pdf_job_progress.update(job, progress=10)
             
             # Generate PDF
             options = job.export_options
-            pdf_bytes = generate_song_pdf(
-                content=song.content,
-                title=options.get('title') or song.title,
-                artist=options.get('artist'),
-                paper_size=options.get('paper_size', 'a4'),
-                orientation=options.get('orientation', 'portrait'),
-                template_name=options.get('template', 'classic'),
-                include_chord_diagrams=options.get('chord_diagrams', False),
-                diagram_instrument=options.get('instrument', 'guitar'),
-                font_size=options.get('font_size', 11),
-                quality=options.get('quality', 'standard'),
-                header=options.get('header', ''),
-                footer=options.get('footer', ''),
-                margins=options.get('margins', {}),
-                colors=options.get('colors', {})
-            )
+            song_data = {
+                'title': options.get('title') or song.title,
+                'artist': options.get('artist'),
+                'content': song.content
+            }
+            future = self._render_pdf(render_song_pdf, song_data, options)
+            pdf_bytes = self.scheduler.wait(future, cancel_event).result()
             
             # Update progress
-            job.update_progress(progress=80)
-            db.session.commit()
+            pdf_job_progress.update(job, progress=80)
             
             # Save file
             filename = self._create_safe_filename(song.title, 'pdf')
@@ -218,155 +560,94 @@ class PDFJobManager:
             job.mark_completed(file_path, filename, len(pdf_bytes))
             logger.info(f"Completed single song PDF job {job.id}")
             
+        except JobCancelled:
+            raise
         except Exception as e:
             job.mark_error(f"PDF generation failed: {str(e)}")
             logger.error(f"Single song PDF job {job.id} failed: {e}")
     
-    def _process_batch_job(self, job: PDFExportJob):
+    def _process_batch_job(self, job: PDFExportJob, cancel_event: threading.Event):
         """Process a batch PDF export job (multiple PDFs in ZIP)."""
-        import zipfile
-        from io import BytesIO
-        
         if not job.song_ids:
             job.mark_error("No song IDs provided for batch export")
             return
         
+        zip_path = None
         try:
-            job.update_progress(progress=5)
-            db.session.commit()
+            pdf_job_progress.update(job, progress=5)
             
             # Verify all songs exist and user has access
-            songs = []
-            for i, song_id in enumerate(job.song_ids):
-                song, has_permission = check_song_permission(song_id, job.user_id, 'read')
-                if not song or not has_permission:
-                    job.mark_error(f"Song {song_id} not found or access denied")
-                    return
-                songs.append(song)
-                
-                # Update progress for verification phase (5-15%)
-                progress = 5 + int((i / len(job.song_ids)) * 10)
-                job.update_progress(progress=progress)
-                db.session.commit()
-            
-            # Create ZIP file
-            zip_filename = f"songs_export_{job.id}.zip"
-            zip_path = os.path.join(self.temp_dir, zip_filename)
-            
+            if not self._check_song_permissions(job):
+                return
+            song_ids = list(job.song_ids)
             options = job.export_options
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for i, song in enumerate(songs):
+            
+            def song_pdfs():
+                # Songs are fanned out across the render processes and each
+                # PDF is written to the ZIP in order as soon as it is ready
+                calls = ((song, ({'title': song.title, 'artist': song.artist, 'content': song.content}, options))
+                         for song in iter_songs(song_ids))
+                rendered = self.scheduler.render_ordered(render_song_pdf, calls, cancel_event,
+                                                         submit=self._render_pdf)
+                for i, (song, future) in enumerate(rendered):
                     try:
-                        # Generate PDF for this song
-                        pdf_bytes = generate_song_pdf(
-                            content=song.content,
-                            title=song.title,
-                            artist=getattr(song, 'artist', None),
-                            paper_size=options.get('paper_size', 'a4'),
-                            orientation=options.get('orientation', 'portrait'),
-                            template_name=options.get('template', 'classic'),
-                            include_chord_diagrams=options.get('chord_diagrams', False),
-                            diagram_instrument=options.get('instrument', 'guitar'),
-                            font_size=options.get('font_size', 11),
-                            quality=options.get('quality', 'standard'),
-                            header=options.get('header', ''),
-                            footer=options.get('footer', ''),
-                            margins=options.get('margins', {}),
-                            colors=options.get('colors', {})
-                        )
-                        
                         # Add to ZIP
-                        pdf_filename = self._create_safe_filename(song.title, 'pdf')
-                        zip_file.writestr(pdf_filename, pdf_bytes)
-                        
-                        # Update progress (15-90%)
-                        progress = 15 + int(((i + 1) / len(songs)) * 75)
-                        job.update_progress(processed_count=i + 1, progress=progress)
-                        db.session.commit()
+                        yield self._create_safe_filename(song.title, 'pdf'), future.result()
                         
                     except Exception as e:
                         logger.error(f"Failed to generate PDF for song {song.id}: {e}")
                         # Add error file to ZIP
                         error_content = f"Error generating PDF for '{song.title}': {str(e)}"
-                        error_filename = f"ERROR-{song.title[:30]}.txt"
-                        zip_file.writestr(error_filename, error_content.encode('utf-8'))
+                        yield f"ERROR-{song.title[:30]}.txt", error_content.encode('utf-8')
+                    
+                    # Update progress (15-90%)
+                    progress = 15 + int(((i + 1) / len(song_ids)) * 75)
+                    pdf_job_progress.update(job, processed_count=i + 1, progress=progress)
             
-            # Get file size
-            file_size = os.path.getsize(zip_path)
+            # Write the ZIP file
+            zip_filename = f"songs_export_{job.id}.zip"
+            zip_path = os.path.join(self.temp_dir, zip_filename)
+            file_size = write_zip(song_pdfs(), zip_path)
             
             # Complete job
+            pdf_job_progress.apply(job)
             job.mark_completed(zip_path, zip_filename, file_size)
-            logger.info(f"Completed batch PDF job {job.id} with {len(songs)} songs")
+            logger.info(f"Completed batch PDF job {job.id} with {len(song_ids)} songs")
             
+        except JobCancelled:
+            if zip_path and os.path.exists(zip_path):
+                os.remove(zip_path)
+            raise
         except Exception as e:
             job.mark_error(f"Batch export failed: {str(e)}")
             logger.error(f"Batch PDF job {job.id} failed: {e}")
     
-    def _process_multi_song_job(self, job: PDFExportJob):
+    def _process_multi_song_job(self, job: PDFExportJob, cancel_event: threading.Event):
         """Process a multi-song PDF export job (single PDF with multiple songs)."""
         if not job.song_ids:
             job.mark_error("No song IDs provided for multi-song export")
             return
         
         try:
-            job.update_progress(progress=5)
-            db.session.commit()
+            pdf_job_progress.update(job, progress=5)
             
             # Verify all songs exist and user has access
-            songs = []
-            for i, song_id in enumerate(job.song_ids):
-                song, has_permission = check_song_permission(song_id, job.user_id, 'read')
-                if not song or not has_permission:
-                    job.mark_error(f"Song {song_id} not found or access denied")
-                    return
-                songs.append(song)
-                
-                # Update progress for verification phase (5-15%)
-                progress = 5 + int((i / len(job.song_ids)) * 10)
-                job.update_progress(progress=progress)
-                db.session.commit()
+            if not self._check_song_permissions(job):
+                return
             
             # Prepare songs data for multi-song PDF
-            songs_data = []
-            for song in songs:
-                songs_data.append({
-                    'title': song.title,
-                    'content': song.content,
-                    'artist': getattr(song, 'artist', None)
-                })
+            songs_data = [{'title': song.title, 'content': song.content, 'artist': song.artist}
+                          for song in iter_songs(list(job.song_ids))]
             
             # Update progress
-            job.update_progress(progress=20)
-            db.session.commit()
+            pdf_job_progress.update(job, progress=30)
             
             # Generate multi-song PDF
-            options = job.export_options
-            generator = ChordProPDFGenerator(
-                paper_size=options.get('paper_size', 'a4'),
-                orientation=options.get('orientation', 'portrait'),
-                template_name=options.get('template', 'classic'),
-                include_chord_diagrams=options.get('chord_diagrams', False),
-                diagram_instrument=options.get('instrument', 'guitar'),
-                font_size=options.get('font_size', 11),
-                quality=options.get('quality', 'standard'),
-                header=options.get('header', ''),
-                footer=options.get('footer', ''),
-                margins=options.get('margins', {}),
-                colors=options.get('colors', {})
-            )
-            
-            # Update progress
-            job.update_progress(progress=30)
-            db.session.commit()
-            
-            pdf_bytes = generator.create_multi_song_pdf(
-                songs=songs_data,
-                include_toc=options.get('include_toc', True)
-            )
+            future = self._render_pdf(render_multi_song_pdf, songs_data, job.export_options)
+            pdf_bytes = self.scheduler.wait(future, cancel_event).result()
             
             # Update progress
-            job.update_progress(progress=90)
-            db.session.commit()
+            pdf_job_progress.update(job, progress=90)
             
             # Save file
             filename = f"multi_song_export_{job.id}.pdf"
@@ -377,8 +658,10 @@ class PDFJobManager:
             
             # Complete job
             job.mark_completed(file_path, filename, len(pdf_bytes))
-            logger.info(f"Completed multi-song PDF job {job.id} with {len(songs)} songs")
+            logger.info(f"Completed multi-song PDF job {job.id} with {len(songs_data)} songs")
             
+        except JobCancelled:
+            raise
         except Exception as e:
             job.mark_error(f"Multi-song export failed: {str(e)}")
             logger.error(f"Multi-song PDF job {job.id} failed: {e}")
@@ -401,11 +684,14 @@ class PDFJobManager:
                                  .limit(limit).all()
     
     def cancel_job(self, job_id: int) -> bool:
-        """Cancel a job if possible."""
+        """Cancel a job if possible, stopping it if it is already running."""
         job = PDFExportJob.query.get(job_id)
         if job and job.can_be_cancelled():
             job.update_progress(status='cancelled')
             db.session.commit()
+            pdf_job_progress.transition(job)
+            if self._scheduler is not None:
+                self._scheduler.cancel(job_id)
             return True
         return False
     
@@ -420,8 +706,12 @@ class PDFJobManager:
     def shutdown(self):
         """Shutdown the job manager."""
         self.shutdown_event.set()
+        if self._scheduler is not None:
+            self._scheduler.shutdown()
         if self.cleanup_thread:
             self.cleanup_thread.join(timeout=5)
+        if self.cancel_sync_thread:
+            self.cancel_sync_thread.join(timeout=5)
 
 
 # Global instance
@@ -0,0 +1,160 @@
+"""
+Out-of-band progress reporting for PDF export jobs.
+
+Jobs used to commit their ``pdf_export_jobs`` row after every permission
+check and every rendered song, while clients polled the same row. Progress
+now goes to a channel instead:
+
+- the latest state of each running job is held in this process, and in
+  Redis when the cache service has a connection, so the status endpoint can
+  answer from any worker without reading the jobs table
+- every change is pushed to the job owner's Socket.IO sessions as a
+  ``pdf_job_progress`` event
+- the row itself is written only on state transitions (processing,
+  completed, failed, cancelled) and at most every
+  ``PDF_PROGRESS_DB_INTERVAL`` seconds while the job runs, so it stays a
+  coarse fallback for clients that poll an instance without the live state
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_INTERVAL = 5.0  # seconds between progress writes to the jobs table
+REDIS_TTL = 3600  # seconds a running job's state is kept in Redis
+PROGRESS_EVENT = 'pdf_job_progress'
+PUSHED_FIELDS = ('id', 'job_type', 'status', 'progress', 'processed_count', 'total_count', 'error_message')
+
+
+class PDFJobProgressChannel:
+    """Holds and publishes the live progress of running PDF export jobs."""
+
+    def __init__(self, db_interval: float = DEFAULT_DB_INTERVAL):
+        self.db_interval = db_interval
+        self._states: Dict[int, Dict[str, Any]] = {}
+        self._last_db_write: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {'updates': 0, 'db_writes': 0, 'pushes': 0, 'push_errors': 0}
+
+    def init_app(self, app):
+        """Configure the progress write interval from the Flask app."""
+        self.db_interval = float(app.config.get('PDF_PROGRESS_DB_INTERVAL', self.db_interval))
+
+    # Redis helpers
+
+    def _redis(self):
+        from .cache_service import get_cache_service
+        try:
+            return get_cache_service().redis_client
+        except Exception as e:
+            logger.warning(f"Cache service unavailable for PDF job progress: {e}")
+            return None
+
+    def _key(self, job_id: int) -> str:
+        from .cache_service import get_cache_service
+        return f"{get_cache_service().config.key_prefix}:pdf_job_progress:{job_id}"
+
+    # Publishing
+
+    def _publish(self, state: Dict[str, Any]):
+        job_id = state['id']
+        with self._lock:
+            if state['status'] in ('pending', 'processing'):
+                self._states[job_id] = state
+            else:
+                self._states.pop(job_id, None)
+                self._last_db_write.pop(job_id, None)
+
+        client = self._redis()
+        if client is not None:
+            try:
+                if state['status'] in ('pending', 'processing'):
+                    client.setex(self._key(job_id), REDIS_TTL, json.dumps(state))
+                else:
+                    client.delete(self._key(job_id))
+            except Exception as e:
+                logger.warning(f"Failed to store progress of PDF job {job_id} in Redis: {e}")
+
+        from .websocket_server import websocket_server
+        try:
+            websocket_server.emit_to_user(state['user_id'], PROGRESS_EVENT,
+                                          {field: state.get(field) for field in PUSHED_FIELDS})
+            self.stats['pushes'] += 1
+        except Exception as e:
+            self.stats['push_errors'] += 1
+            logger.debug(f"Failed to push progress of PDF job {job_id}: {e}")
+
+    def transition(self, job):
+        """Publish a job's state after a state change has been committed to its row."""
+        with self._lock:
+            self._last_db_write[job.id] = time.monotonic()
+        self._publish(job.to_dict(include_details=True))
+
+    def update(self, job, processed_count: Optional[int] = None, progress: Optional[int] = None):
+        """
+        Report progress of a running job. The job row is updated and committed
+        only if ``db_interval`` seconds have passed since its last write.
+        """
+        from . import db
+        now = time.monotonic()
+        with self._lock:
+            due = now - self._last_db_write.get(job.id, 0.0) >= self.db_interval
+            state = dict(self._states.get(job.id) or job.to_dict(include_details=True))
+            self.stats['updates'] += 1
+
+        if due:
+            job.update_progress(processed_count=processed_count, progress=progress)
+            db.session.commit()
+            with self._lock:
+                self._last_db_write[job.id] = now
+                self.stats['db_writes'] += 1
+            state.update(progress=job.progress, processed_count=job.processed_count)
+        else:
+            if processed_count is not None:
+                state['processed_count'] = processed_count
+                if state.get('total_count'):
+                    state['progress'] = min(100, int((processed_count / state['total_count']) * 100))
+            if progress is not None:
+                state['progress'] = min(100, max(0, progress))
+        self._publish(state)
+
+    def apply(self, job):
+        """Copy the reported progress onto the job row before its final state is committed."""
+        with self._lock:
+            state = self._states.get(job.id)
+        if state is None:
+            return
+        job.processed_count = state['processed_count']
+        if not job.is_finished():
+            job.progress = state['progress']
+
+    # Reading
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """The live state of a running job, or None if it is not running."""
+        with self._lock:
+            state = self._states.get(job_id)
+            if state is not None:
+                return dict(state)
+
+        client = self._redis()
+        if client is not None:
+            try:
+                data = client.get(self._key(job_id))
+                if data:
+                    return json.loads(data)
+            except Exception as e:
+                logger.warning(f"Failed to read progress of PDF job {job_id} from Redis: {e}")
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, 'running_jobs': len(self._states), 'db_interval': self.db_interval}
+
+
+# Global instance
+pdf_job_progress = PDFJobProgressChannel()
@@ -2,9 +2,11 @@
 Permission checking helpers and audit logging for collaborative song editing.
 """
 
-from flask import g, request, current_app
+from flask import g, request, current_app, has_request_context
 from functools import wraps
+from sqlalchemy.orm import load_only
 from .models import Song
+from .audit_pipeline import audit_pipeline
 from .utils import create_error_response
 import logging
 import json
@@ -57,38 +59,56 @@ class SecurityAuditLogger:
             user_id (int): User ID involved
             ip_address (str): IP address
             severity (str): Event severity (INFO, WARNING, ERROR, CRITICAL)
+        
+        Returns the entry at once; it is written by the audit pipeline
+        (chordme.audit_pipeline), or synchronously when that is disabled.
         """
         log_entry = {
             'timestamp': datetime.now(UTC).isoformat(),
             'event_type': event_type,
             'user_id': user_id or getattr(g, 'current_user_id', None),
-            'ip_address': ip_address or getattr(request, 'remote_addr', None),
-            'user_agent': request.headers.get('User-Agent', '') if request else '',
+            'ip_address': ip_address or (request.remote_addr if has_request_context() else None),
+            'user_agent': request.headers.get('User-Agent', '') if has_request_context() else '',
             'details': details,
             'severity': severity
         }
         
-        # Log with appropriate level
-        log_message = f"SECURITY_AUDIT: {event_type} | User: {log_entry['user_id']} | IP: {log_entry['ip_address']} | Details: {json.dumps(details)}"
-        
-        if severity == 'CRITICAL':
-            logger.critical(log_message)
-        elif severity == 'ERROR':
-            logger.error(log_message)
-        elif severity == 'WARNING':
-            logger.warning(log_message)
-        else:
-            logger.info(log_message)
-        
-        # Also log to application logger for centralized monitoring
-        current_app.logger.info(f"AUDIT: {json.dumps(log_entry)}")
-        
-        # Log to structured logger if available
-        if hasattr(current_app, 'logger_structured'):
-            current_app.logger_structured.audit(event_type, details, severity)
+        # The request thread only enqueues; the audit pipeline writes in the background
+        if not audit_pipeline.submit(log_entry):
+            SecurityAuditLogger.write_log_entries([log_entry], current_app)
         
         return log_entry
 
+    @staticmethod
+    def write_log_entries(entries, app):
+        """
+        Write audit entries to the security, application and structured loggers.
+        
+        Args:
+            entries (list): Entries built by log_security_event
+            app: Flask application whose loggers receive the entries
+        """
+        structured = getattr(app, 'logger_structured', None)
+        for log_entry in entries:
+            severity = log_entry['severity']
+            log_message = f"SECURITY_AUDIT: {log_entry['event_type']} | User: {log_entry['user_id']} | IP: {log_entry['ip_address']} | Details: {json.dumps(log_entry['details'])}"
+            
+            if severity == 'CRITICAL':
+                logger.critical(log_message)
+            elif severity == 'ERROR':
+                logger.error(log_message)
+            elif severity == 'WARNING':
+                logger.warning(log_message)
+            else:
+                logger.info(log_message)
+            
+            # Also log to application logger for centralized monitoring
+            app.logger.info(f"AUDIT: {json.dumps(log_entry)}")
+            
+            # Log to structured logger if available
+            if structured is not None:
+                structured.audit(log_entry['event_type'], log_entry['details'], severity)
+
     @staticmethod
     def log_access_attempt(song_id, permission_level, granted, user_id=None, details=None):
         """Log song access attempts."""
@@ -104,6 +124,36 @@ class SecurityAuditLogger:
             severity='WARNING' if not granted else 'INFO'
         )
 
+    @staticmethod
+    def log_bulk_access_attempt(permission_level, granted_ids, denied, user_id=None):
+        """
+        Log the outcome of checking many songs at once as a single event.
+        
+        Args:
+            permission_level (str): Permission level checked
+            granted_ids (list): IDs of songs the user holds the permission on
+            denied (dict): Song ID -> reason for every song that was refused
+            user_id (int): User ID involved
+        """
+        if any(reason.startswith('insufficient_') for reason in denied.values()):
+            severity = 'CRITICAL'
+        elif denied:
+            severity = 'WARNING'
+        else:
+            severity = 'INFO'
+        return SecurityAuditLogger.log_security_event(
+            'BULK_SONG_ACCESS_ATTEMPT',
+            {
+                'permission_level': permission_level,
+                'requested_count': len(granted_ids) + len(denied),
+                'granted_count': len(granted_ids),
+                'granted_song_ids': list(granted_ids),
+                'denied': {str(song_id): reason for song_id, reason in denied.items()}
+            },
+            user_id=user_id,
+            severity=severity
+        )
+
     @staticmethod
     def log_permission_bypass_attempt(song_id, attempted_action, user_id=None, details=None):
         """Log attempts to bypass permission checks."""
@@ -239,6 +289,79 @@ def check_song_permission(song_id, user_id, permission_level='read'):
     return song, has_permission
 
 
+# Songs loaded per permission query; keeps IN lists within database parameter limits
+PERMISSION_BATCH_SIZE = 500
+
+
+def resolve_song_permissions(song_ids, user_id, permission_level='read'):
+    """
+    Check a user's permission on many songs with one query per
+    PERMISSION_BATCH_SIZE songs and a single audit event.
+    
+    Applies the same rules as check_song_permission. The returned songs
+    only have their permission columns, title and artist loaded; other
+    columns load on first access.
+    
+    Args:
+        song_ids (list): IDs of the songs
+        user_id (int): ID of the user
+        permission_level (str): Required permission level ('read', 'edit', 'admin')
+        
+    Returns:
+        dict: song_id -> (song_object, has_permission), with (None, False)
+        for songs that were not found or are not accessible
+    """
+    unique_ids = list(dict.fromkeys(song_ids))
+    songs = {}
+    for start in range(0, len(unique_ids), PERMISSION_BATCH_SIZE):
+        batch = unique_ids[start:start + PERMISSION_BATCH_SIZE]
+        query = Song.query.options(load_only(
+            Song.id, Song.user_id, Song.title, Song.artist,
+            Song.share_settings, Song.shared_with, Song.permissions
+        )).filter(Song.id.in_(batch))
+        songs.update((song.id, song) for song in query)
+    
+    results = {}
+    granted, denied = [], {}
+    for song_id in unique_ids:
+        song = songs.get(song_id)
+        if song is None:
+            results[song_id] = (None, False)
+            denied[song_id] = 'song_not_found'
+            continue
+        if not song.can_user_access(user_id):
+            results[song_id] = (None, False)  # Pretend the song doesn't exist
+            denied[song_id] = 'no_access_permission'
+            continue
+        
+        if permission_level == 'read':
+            has_permission = True
+        elif permission_level == 'edit':
+            has_permission = song.can_user_edit(user_id)
+        elif permission_level == 'admin':
+            has_permission = song.can_user_manage(user_id)
+        else:
+            has_permission = False
+        
+        results[song_id] = (song, has_permission)
+        if has_permission:
+            granted.append(song_id)
+        else:
+            denied[song_id] = f'insufficient_{permission_level}_permission'
+    
+    if unique_ids:
+        SecurityAuditLogger.log_bulk_access_attempt(permission_level, granted, denied, user_id)
+    return results
+
+
+def first_denied_song(permissions):
+    """Return the first song ID in a resolve_song_permissions result the user may not use, or None."""
+    for song_id, (song, has_permission) in permissions.items():
+        if not song or not has_permission:
+            return song_id
+    return None
+
+
 def log_sharing_activity(action, song_id, actor_user_id, target_user_id=None, permission_level=None, details=None):
     """
     Log sharing and permission change activities for audit purposes.
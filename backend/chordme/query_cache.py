@@ -62,6 +62,7 @@ class QueryCacheManager:
         
         for model_name in model_names:
             tags_to_invalidate.append(f"model:{model_name}")
+        if tags_to_invalidate:
             # Also invalidate general queries tag
             tags_to_invalidate.append("queries")
         
@@ -83,15 +84,20 @@ query_cache_manager = QueryCacheManager()
 
 def cache_query(ttl: int = 3600, key_prefix: Optional[str] = None, 
                 model_names: Optional[List[str]] = None,
-                namespace: str = "queries"):
+                namespace: str = "queries", stale_ttl: Optional[int] = None,
+                early_refresh_beta: Optional[float] = None):
     """
     Decorator for caching database query results.
     
+    Concurrent misses run the query once; see CacheService.get_or_set.
+    
     Args:
         ttl: Time to live in seconds
         key_prefix: Custom prefix for cache key
         model_names: List of model names this query depends on for invalidation
         namespace: Cache namespace
+        stale_ttl: Seconds an expired result is served while one caller refreshes it
+        early_refresh_beta: XFetch beta for probabilistic early refresh (0 disables)
     """
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
@@ -113,7 +119,8 @@ def cache_query(ttl: int = 3600, key_prefix: Optional[str] = None,
                 # Convert SQLAlchemy objects to serializable format if needed
                 return _serialize_query_result(result)
             
-            return cache.get_or_set(cache_key, execute_query, ttl, namespace, tags)
+            return cache.get_or_set(cache_key, execute_query, ttl, namespace, tags,
+                                    stale_ttl=stale_ttl, early_refresh_beta=early_refresh_beta)
         
         return wrapper
     return decorator
@@ -164,6 +171,50 @@ def warm_query_cache(func: Callable, *args, **kwargs) -> bool:
         return False
 
 
+def cached_model_dicts(model_class, versions: List[tuple], serializer: Optional[Callable] = None,
+                       ttl: int = 3600, namespace: str = "fragments") -> List[Dict[str, Any]]:
+    """
+    Serialize model rows through per-row cache fragments.
+    
+    Fragments are keyed by row id and updated_at, so an edited row simply
+    gets a new key and list pages never need invalidating. All fragments
+    are read in one round trip and only the missing rows are loaded.
+    
+    Args:
+        model_class: The SQLAlchemy model class
+        versions: (id, updated_at) pairs in response order, typically from a
+            query over just those two columns; any further values, such as
+            columns that change without touching updated_at, join the key
+        serializer: Converts a loaded row to a dict, defaults to to_dict()
+        ttl: Time to live in seconds
+        namespace: Cache namespace
+    
+    Returns:
+        Row dicts in the order of versions; rows deleted meanwhile are skipped
+    """
+    serialize = serializer or (lambda row: row.to_dict())
+    model_name = model_class.__name__.lower()
+    versions = [tuple(version) for version in versions]
+    
+    def fragment_key(version):
+        row_id, updated_at, *extra = version
+        key = f"{model_name}:{row_id}:{updated_at.isoformat() if updated_at else ''}"
+        for value in extra:
+            key += f":{value.isoformat() if hasattr(value, 'isoformat') else value}"
+        return key
+    
+    def load_rows(missing):
+        by_id = {version[0]: version for version in missing}
+        rows = model_class.query.filter(model_class.id.in_(list(by_id))).all()
+        return {by_id[row.id]: serialize(row) for row in rows}
+    
+    fragments = get_cache_service().get_or_load_many(
+        versions, load_rows, fragment_key, ttl, namespace
+    )
+    # Copies, so callers can annotate rows without touching cached fragments
+    return [dict(fragments[version]) for version in versions if version in fragments]
+
+
 def invalidate_query_cache(model_names: List[str]):
     """
     Manually invalidate cache for specific models.
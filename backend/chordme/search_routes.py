@@ -19,102 +19,31 @@ from . import db
 from .utils import auth_required, validate_request_size, sanitize_input
 from .rate_limiter import rate_limit
 from .security_headers import security_headers
+from .cache_service import digest_key, get_cache_service
+from .song_search import (
+    parse_search_query, search_fingerprint, encode_search_cursor, decode_search_cursor
+)
 import logging
 
 # Create search blueprint
 search_bp = Blueprint('search', __name__)
 
-# Simple in-memory cache for search results (in production, use Redis)
-search_cache = {}
+# Search results are cached in the shared CacheService under stable digest
+# keys. Its per-worker L1 is evicted over pub/sub, so a committed transaction
+# touching songs, tags or categories drops them in every worker.
 CACHE_TTL = 300  # 5 minutes
+CACHE_NAMESPACE = 'search'
+INVALIDATING_MODELS = {'Song', 'Tag', 'Category'}
+CACHE_TAGS = ['search'] + [f'model:{model}' for model in sorted(INVALIDATING_MODELS)]
 
 def get_cached_result(cache_key):
-    """Get cached search result if not expired"""
-    if cache_key in search_cache:
-        result, timestamp = search_cache[cache_key]
-        if time.time() - timestamp < CACHE_TTL:
-            return result
-        else:
-            del search_cache[cache_key]
-    return None
+    """Get cached search result from the shared cache"""
+    return get_cache_service().get(cache_key, namespace=CACHE_NAMESPACE)
 
 def cache_result(cache_key, result):
-    """Cache search result with timestamp"""
-    search_cache[cache_key] = (result, time.time())
-    
-    # Simple cache cleanup - remove old entries
-    if len(search_cache) > 1000:  # Limit cache size
-        current_time = time.time()
-        expired_keys = [k for k, (_, ts) in search_cache.items() if current_time - ts > CACHE_TTL]
-        for k in expired_keys:
-            del search_cache[k]
-
-def parse_search_query(query):
-    """Parse search query to identify special operators and syntax"""
-    if not query:
-        return {
-            'original': '',
-            'phrases': [],
-            'and_terms': [],
-            'or_terms': [],
-            'not_terms': [],
-            'has_operators': False
-        }
-    
-    result = {
-        'original': query,
-        'phrases': [],
-        'and_terms': [],
-        'or_terms': [],
-        'not_terms': [],
-        'has_operators': False
-    }
-    
-    # Extract quoted phrases
-    phrases = re.findall(r'"([^"]+)"', query)
-    result['phrases'] = phrases
-    
-    # Remove phrases from query for further parsing
-    clean_query = re.sub(r'"[^"]+"', '', query)
-    
-    # Split into terms
-    terms = clean_query.split()
-    
-    current_terms = []
-    i = 0
-    while i < len(terms):
-        term = terms[i].strip()
-        
-        if term.upper() == 'AND':
-            result['has_operators'] = True
-            i += 1
-            continue
-        elif term.upper() == 'OR':
-            result['has_operators'] = True
-            if current_terms:
-                result['or_terms'].extend(current_terms)
-                current_terms = []
-            i += 1
-            continue
-        elif term.upper() == 'NOT' and i + 1 < len(terms):
-            result['has_operators'] = True
-            result['not_terms'].append(terms[i + 1])
-            i += 2
-            continue
-        elif term.startswith('-'):
-            result['has_operators'] = True
-            result['not_terms'].append(term[1:])
-        elif term.startswith('+'):
-            current_terms.append(term[1:])
-        else:
-            current_terms.append(term)
-        
-        i += 1
-    
-    # Add remaining terms as AND terms
-    result['and_terms'].extend(current_terms)
-    
-    return result
+    """Cache search result in the shared cache"""
+    get_cache_service().set(cache_key, result, ttl=CACHE_TTL,
+                            namespace=CACHE_NAMESPACE, tags=CACHE_TAGS)
 
 def highlight_text(text, query_terms, max_length=200):
     """Highlight search terms in text with context"""
@@ -226,6 +155,13 @@ def highlight_text(text, query_terms, max_length=200):
             'default': True,
             'description': 'Include public songs in results'
         },
+        {
+            'name': 'include_shared',
+            'in': 'query',
+            'type': 'boolean',
+            'default': False,
+            'description': 'Include songs shared with you in results'
+        },
         {
             'name': 'limit',
             'in': 'query',
@@ -241,6 +177,12 @@ def highlight_text(text, query_terms, max_length=200):
             'default': 0,
             'description': 'Results offset for pagination'
         },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Opaque next_cursor from the previous page; replaces offset'
+        },
         {
             'name': 'enable_cache',
             'in': 'query',
@@ -286,6 +228,8 @@ def highlight_text(text, query_terms, max_length=200):
                         }
                     },
                     'total_count': {'type': 'integer'},
+                    'next_cursor': {'type': 'string', 'description': 'Cursor for the next page, null on the last page'},
+                    'from_cache': {'type': 'boolean', 'description': 'Whether the response was served from cache'},
                     'search_time_ms': {'type': 'integer'},
                     'query_info': {
                         'type': 'object',
@@ -323,8 +267,10 @@ def search_songs():
         min_tempo = request.args.get('min_tempo', type=int)
         max_tempo = request.args.get('max_tempo', type=int)
         include_public = request.args.get('include_public', 'true').lower() == 'true'
+        include_shared = request.args.get('include_shared', 'false').lower() == 'true'
         limit = min(request.args.get('limit', 20, type=int), 100)
         offset = max(request.args.get('offset', 0, type=int), 0)
+        cursor = request.args.get('cursor', '').strip()
         enable_cache = request.args.get('enable_cache', 'true').lower() == 'true'
         
         # Date range parameters
@@ -361,41 +307,54 @@ def search_songs():
         if date_field not in ['created_at', 'updated_at']:
             return jsonify({'error': 'Invalid date_field. Must be created_at or updated_at'}), 400
             
+        # Parameters that define the result set (cursors are bound to them)
+        search_params = {
+            'query': query,
+            'genre': genre,
+            'song_key': song_key,
+            'difficulty': difficulty,
+            'language': language,
+            'time_signature': time_signature,
+            'tags': tags,
+            'categories': categories,
+            'min_tempo': min_tempo,
+            'max_tempo': max_tempo,
+            'date_from': date_from_str,
+            'date_to': date_to_str,
+            'date_field': date_field,
+            'include_public': include_public,
+            'include_shared': include_shared,
+            'user_id': str(g.current_user_id)
+        }
+        fingerprint = search_fingerprint(search_params)
+        
+        # Keyset pagination: a cursor replaces offset and carries the total forward
+        after = None
+        cursor_total = None
+        if cursor:
+            try:
+                after, cursor_total = decode_search_cursor(cursor, fingerprint)
+            except ValueError as e:
+                return jsonify({'error': f'Invalid cursor: {e}'}), 400
+            offset = 0
+        
         # Create cache key for this search
         cache_key = None
         if enable_cache:
-            cache_params = {
-                'query': query,
-                'genre': genre,
-                'song_key': song_key,
-                'difficulty': difficulty,
-                'language': language,
-                'time_signature': time_signature,
-                'tags': tags,
-                'categories': categories,
-                'min_tempo': min_tempo,
-                'max_tempo': max_tempo,
-                'date_from': date_from_str,
-                'date_to': date_to_str,
-                'date_field': date_field,
-                'include_public': include_public,
-                'limit': limit,
-                'offset': offset,
-                'user_id': str(g.current_user_id)
-            }
-            cache_key = str(hash(json.dumps(cache_params, sort_keys=True)))
+            cache_params = dict(search_params, limit=limit, offset=offset, cursor=cursor)
+            cache_key = digest_key(cache_params)
             
             # Try to get cached result
             cached_result = get_cached_result(cache_key)
             if cached_result:
-                return jsonify(cached_result), 200
+                return jsonify(dict(cached_result, from_cache=True)), 200
         
         # Parse search query
         parsed_query = parse_search_query(query)
         
         # Use Song model's enhanced search method
         from .models import Song
-        search_query = Song.search(
+        search_kwargs = dict(
             query=query if query else None,
             genre=genre if genre else None,
             song_key=song_key if song_key else None,
@@ -408,36 +367,44 @@ def search_songs():
             time_signature=time_signature if time_signature else None,
             user_id=g.current_user_id,
             include_public=include_public,
+            include_shared=include_shared,
             date_from=date_from,
             date_to=date_to,
-            date_field=date_field,
-            limit=limit,
-            offset=offset
+            date_field=date_field
         )
         
+        # Page and total count in a single statement
+        try:
+            search_query = Song.search(
+                **search_kwargs,
+                limit=limit,
+                offset=offset,
+                after=after,
+                with_relevance=True,
+                with_total=not cursor
+            )
+        except ValueError as e:
+            return jsonify({'error': f'Invalid cursor: {e}'}), 400
+        
         search_results_raw = search_query.all()
         
-        # Get total count for pagination (run without limit/offset)
-        count_query = Song.search(
-            query=query if query else None,
-            genre=genre if genre else None,
-            song_key=song_key if song_key else None,
-            difficulty=difficulty if difficulty else None,
-            language=language,
-            tags=tags,
-            categories=categories,
-            min_tempo=min_tempo,
-            max_tempo=max_tempo,
-            time_signature=time_signature if time_signature else None,
-            user_id=g.current_user_id,
-            include_public=include_public,
-            date_from=date_from,
-            date_to=date_to,
-            date_field=date_field,
-            limit=None,
-            offset=None
-        )
-        total_count = count_query.count()
+        # Total comes from the window count of the first page, or from the cursor
+        if cursor:
+            total_count = cursor_total
+        elif search_results_raw:
+            total_count = search_results_raw[0].total_count
+        elif offset:
+            # Offset past the last match: the window count has no row to ride on
+            total_count = Song.search(**search_kwargs, limit=None, offset=None).count()
+        else:
+            total_count = 0
+        
+        next_cursor = None
+        if len(search_results_raw) == limit:
+            last = search_results_raw[-1]
+            next_cursor = encode_search_cursor(
+                Song.search_sort_key(last[0], last.relevance_score), total_count, fingerprint
+            )
         
         # Process results and add highlighting
         processed_results = []
@@ -448,7 +415,8 @@ def search_songs():
             search_terms.extend(parsed_query['and_terms'])
             search_terms.extend(parsed_query['or_terms'])
         
-        for song in search_results_raw:
+        for row in search_results_raw:
+            song = row[0]
             result = {
                 'id': str(song.id),
                 'title': song.title,
@@ -463,7 +431,7 @@ def search_songs():
                 'favorite_count': song.favorite_count or 0,
                 'created_at': song.created_at.isoformat() if song.created_at else None,
                 'updated_at': song.updated_at.isoformat() if song.updated_at else None,
-                'relevance_score': 1.0,  # Basic relevance for now
+                'relevance_score': round(float(row.relevance_score), 6) if row.relevance_score is not None else 1.0,
                 'match_type': 'query_match',
                 'matched_fields': ['title', 'artist', 'content']  # Basic match fields
             }
@@ -490,7 +458,9 @@ def search_songs():
         response_data = {
             'results': processed_results,
             'total_count': total_count,
+            'next_cursor': next_cursor,
             'search_time_ms': search_time_ms,
+            'from_cache': False,
             'query_info': {
                 'original_query': query,
                 'parsed_query': parsed_query,
@@ -13,6 +13,7 @@ from chordme.models import (
     SetlistVersion, SetlistTemplate, SetlistPerformance, Song
 )
 from chordme.utils import verify_jwt_token, auth_required
+from chordme.query_cache import cached_model_dicts
 from chordme.error_codes import ERROR_CODES
 import logging
 
@@ -169,27 +170,38 @@ def list_setlists():
         # Get total count
         total = combined_query.count()
         
-        # Apply pagination
-        setlists = combined_query.order_by(sort_column).offset(offset).limit(limit).all()
+        # Apply pagination; setlist bodies come from cache fragments
+        versions = combined_query.order_by(sort_column).with_entities(
+            Setlist.id, Setlist.updated_at
+        ).offset(offset).limit(limit).all()
+        setlist_ids = [setlist_id for setlist_id, _ in versions]
+        
+        # Permission levels and collaborator counts for the whole page at once
+        permission_levels = dict(db.session.query(
+            SetlistCollaborator.setlist_id, SetlistCollaborator.permission_level
+        ).filter(
+            SetlistCollaborator.setlist_id.in_(setlist_ids),
+            SetlistCollaborator.user_id == user_id,
+            SetlistCollaborator.status == 'accepted'
+        ).all()) if setlist_ids else {}
+        collaborator_counts = dict(db.session.query(
+            SetlistCollaborator.setlist_id, db.func.count(SetlistCollaborator.id)
+        ).filter(
+            SetlistCollaborator.setlist_id.in_(setlist_ids),
+            SetlistCollaborator.status == 'accepted'
+        ).group_by(SetlistCollaborator.setlist_id).all()) if setlist_ids else {}
         
         # Format response
         setlist_data = []
-        for setlist in setlists:
-            data = setlist.to_dict()
-            
+        for data in cached_model_dicts(Setlist, versions):
             # Add permission level for current user
-            if setlist.user_id == user_id:
+            if data['user_id'] == user_id:
                 data['permission_level'] = 'owner'
             else:
-                collaborator = SetlistCollaborator.query.filter_by(
-                    setlist_id=setlist.id, user_id=user_id, status='accepted'
-                ).first()
-                data['permission_level'] = collaborator.permission_level if collaborator else 'view'
+                data['permission_level'] = permission_levels.get(data['id'], 'view')
             
             # Add collaborator count
-            data['collaborator_count'] = SetlistCollaborator.query.filter_by(
-                setlist_id=setlist.id, status='accepted'
-            ).count()
+            data['collaborator_count'] = collaborator_counts.get(data['id'], 0)
             
             setlist_data.append(data)
         
@@ -0,0 +1,437 @@
+"""
+Write-behind counters for song views and favorites.
+
+Counting a view used to update ``view_count`` and ``last_accessed`` on the
+song row itself, so every view of a popular song was another update of the
+same tuple. Views and favorite changes are now accumulated as deltas, either
+in this process or in Redis hashes (HINCRBY) when the cache service has a
+Redis connection, and a background thread applies them every
+``COUNTER_FLUSH_INTERVAL`` seconds with one batched statement:
+
+- PostgreSQL: ``UPDATE songs ... FROM (VALUES ...)``
+- other databases: a single executemany UPDATE
+
+Loss is bounded: in-process deltas are flushed every interval, as soon as
+``COUNTER_MAX_PENDING`` songs are pending and at interpreter exit; Redis
+deltas survive a worker crash, and a claimed batch whose worker died is
+picked up again by the next flush. The age of the oldest unflushed increment
+is reported as ``flush_lag_seconds`` in the monitoring metrics.
+
+Flushed views are also recorded as engagement events for trending.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, UTC
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import DateTime, Integer, bindparam, case, cast, column, func, select, update, values
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_FLUSH_INTERVAL = 5.0  # seconds
+DEFAULT_MAX_PENDING = 10000  # songs
+FLUSH_BATCH_SIZE = 1000
+# Claimed Redis batches older than this many flush intervals belong to a dead worker
+STALE_BATCH_INTERVALS = 10
+
+CLAIM_SCRIPT = """
+local claimed = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('exists', key) == 1 then
+        redis.call('rename', key, key .. ':flushing:' .. ARGV[1])
+        table.insert(claimed, key)
+    end
+end
+return claimed
+"""
+
+
+class CounterDelta:
+    """Pending changes to one song's counters."""
+    __slots__ = ('views', 'favorites', 'last_accessed')
+
+    def __init__(self, views: int = 0, favorites: int = 0, last_accessed: Optional[datetime] = None):
+        self.views = views
+        self.favorites = favorites
+        self.last_accessed = last_accessed
+
+    def merge(self, other: 'CounterDelta'):
+        self.views += other.views
+        self.favorites += other.favorites
+        if other.last_accessed and (self.last_accessed is None or other.last_accessed > self.last_accessed):
+            self.last_accessed = other.last_accessed
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def apply_counter_deltas(session, deltas: Dict[int, CounterDelta]) -> int:
+    """
+    Add counter deltas to the songs table in one statement per batch.
+
+    ``updated_at`` is left untouched so counters do not change row versions;
+    validators and cache keys that expose counts include
+    ``counter_version_columns()`` next to it.
+
+    Returns:
+        Number of songs updated
+    """
+    from .models import Song
+
+    table = Song.__table__
+    rows = [(song_id, delta.views, delta.favorites, delta.last_accessed)
+            for song_id, delta in deltas.items() if delta.views or delta.favorites or delta.last_accessed]
+    updated = 0
+    for start in range(0, len(rows), FLUSH_BATCH_SIZE):
+        batch = rows[start:start + FLUSH_BATCH_SIZE]
+        if session.get_bind().dialect.name == 'postgresql':
+            pending = values(
+                column('id', Integer), column('views', Integer), column('favorites', Integer),
+                column('last_accessed', DateTime), name='pending'
+            ).data(batch)
+            last_accessed = cast(pending.c.last_accessed, DateTime)
+            result = session.execute(update(table).where(table.c.id == pending.c.id).values(
+                view_count=func.coalesce(table.c.view_count, 0) + pending.c.views,
+                favorite_count=func.greatest(func.coalesce(table.c.favorite_count, 0) + pending.c.favorites, 0),
+                last_accessed=func.greatest(table.c.last_accessed, last_accessed),
+                updated_at=table.c.updated_at
+            ))
+            updated += result.rowcount
+        else:
+            favorite_count = func.coalesce(table.c.favorite_count, 0) + bindparam('favorites')
+            last_accessed = bindparam('last_accessed', type_=DateTime)
+            result = session.execute(update(table).where(table.c.id == bindparam('song_id')).values(
+                view_count=func.coalesce(table.c.view_count, 0) + bindparam('views'),
+                favorite_count=case((favorite_count < 0, 0), else_=favorite_count),
+                last_accessed=case(
+                    (last_accessed.is_(None), table.c.last_accessed),
+                    (table.c.last_accessed >= last_accessed, table.c.last_accessed),
+                    else_=last_accessed
+                ),
+                updated_at=table.c.updated_at
+            ), [{'song_id': song_id, 'views': views, 'favorites': favorites, 'last_accessed': accessed}
+                for song_id, views, favorites, accessed in batch])
+            updated += result.rowcount
+    return updated
+
+
+def counter_version_columns():
+    """Song counter columns, for cache keys that must change when counters are flushed."""
+    from .models import Song
+
+    return (Song.view_count, Song.favorite_count, Song.last_accessed)
+
+
+def counter_version_aggregates():
+    """Aggregates of the counter columns over a query's songs, for row-version validators."""
+    view_count, favorite_count, last_accessed = counter_version_columns()
+    return (func.coalesce(func.sum(view_count), 0), func.coalesce(func.sum(favorite_count), 0),
+            func.max(last_accessed))
+
+
+class SongCounterBuffer:
+    """
+    Buffers song view and favorite counter increments and flushes them in batches.
+
+    Args:
+        flush_interval: Seconds between background flushes
+        max_pending: Pending songs that trigger an immediate flush
+    """
+
+    def __init__(self, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        self.app = None
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[int, CounterDelta] = {}
+        self._oldest_pending: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._stop = threading.Event()
+        self._claim_script = None
+        self._claim_client = None
+        self.stats = {
+            'flushes': 0,
+            'failed_flushes': 0,
+            'flushed_songs': 0,
+            'last_flush_at': None,
+            'last_flush_duration_ms': None,
+        }
+
+    def init_app(self, app):
+        """Configure the buffer from the Flask app and flush it at exit."""
+        self.app = app
+        self.flush_interval = float(app.config.get('COUNTER_FLUSH_INTERVAL', self.flush_interval))
+        self.max_pending = int(app.config.get('COUNTER_MAX_PENDING', self.max_pending))
+        atexit.register(self._flush_at_exit)
+
+    # Redis helpers
+
+    def _redis(self):
+        from .cache_service import get_cache_service
+        try:
+            return get_cache_service().redis_client
+        except Exception as e:
+            logger.warning(f"Cache service unavailable for song counters: {e}")
+            return None
+
+    def _keys(self) -> Dict[str, str]:
+        from .cache_service import get_cache_service
+        prefix = f"{get_cache_service().config.key_prefix}:song_counters"
+        return {name: f"{prefix}:{name}" for name in ('views', 'favorites', 'last_accessed', 'oldest')}
+
+    # Recording
+
+    def increment_view(self, song_id: int, at: Optional[datetime] = None):
+        """Count one view of a song."""
+        self._add(song_id, CounterDelta(views=1, last_accessed=at or _now()))
+
+    def add_favorite(self, song_id: int, delta: int = 1):
+        """Count a favorite being added (1) or removed (-1)."""
+        self._add(song_id, CounterDelta(favorites=delta))
+
+    def _add(self, song_id: int, delta: CounterDelta):
+        client = self._redis()
+        if client is not None:
+            try:
+                keys = self._keys()
+                pipe = client.pipeline(transaction=False)
+                if delta.views:
+                    pipe.hincrby(keys['views'], song_id, delta.views)
+                if delta.favorites:
+                    pipe.hincrby(keys['favorites'], song_id, delta.favorites)
+                if delta.last_accessed:
+                    pipe.hset(keys['last_accessed'], song_id, delta.last_accessed.isoformat())
+                pipe.set(keys['oldest'], time.time(), nx=True)
+                pipe.execute()
+                self._ensure_thread()
+                return
+            except Exception as e:
+                logger.warning(f"Failed to buffer song counters in Redis, buffering locally: {e}")
+
+        with self._lock:
+            current = self._pending.get(song_id)
+            if current is None:
+                self._pending[song_id] = delta
+            else:
+                current.merge(delta)
+            if self._oldest_pending is None:
+                self._oldest_pending = time.time()
+            overflow = len(self._pending) >= self.max_pending
+        if overflow:
+            self.flush()
+        else:
+            self._ensure_thread()
+
+    # Flushing
+
+    def flush(self) -> Dict[str, Any]:
+        """Apply every pending delta to the database."""
+        with self._flush_lock:
+            started = time.time()
+            with self._lock:
+                local, self._pending = self._pending, {}
+                local_oldest, self._oldest_pending = self._oldest_pending, None
+
+            claimed: List[str] = []
+            # Copies, so a failed flush restores exactly the local deltas
+            deltas = {song_id: CounterDelta(delta.views, delta.favorites, delta.last_accessed)
+                      for song_id, delta in local.items()}
+            client = self._redis()
+            try:
+                if client is not None:
+                    claimed = self._claim_redis(client, deltas)
+                flushed = self._apply(deltas)
+            except Exception as e:
+                self._restore(local, local_oldest)
+                self.stats['failed_flushes'] += 1
+                logger.error(f"Failed to flush song counters: {e}")
+                return {'flushed_songs': 0, 'error': str(e)}
+
+            if claimed:
+                try:
+                    client.unlink(*claimed)
+                except Exception as e:
+                    logger.warning(f"Failed to delete flushed song counter batch: {e}")
+
+            self.stats['flushes'] += 1
+            self.stats['flushed_songs'] += flushed
+            self.stats['last_flush_at'] = datetime.now(UTC).isoformat()
+            self.stats['last_flush_duration_ms'] = round((time.time() - started) * 1000, 2)
+            self._record_trending(deltas)
+            return {'flushed_songs': flushed}
+
+    def _apply(self, deltas: Dict[int, CounterDelta]) -> int:
+        if not deltas:
+            return 0
+        from .models import db
+        try:
+            flushed = apply_counter_deltas(db.session, deltas)
+            db.session.commit()
+            return flushed
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _restore(self, local: Dict[int, CounterDelta], oldest: Optional[float]):
+        """Put deltas that failed to flush back in front of newer ones."""
+        with self._lock:
+            for song_id, delta in self._pending.items():
+                if song_id in local:
+                    local[song_id].merge(delta)
+                else:
+                    local[song_id] = delta
+            self._pending = local
+            if oldest is not None and (self._oldest_pending is None or oldest < self._oldest_pending):
+                self._oldest_pending = oldest
+
+    def _claim_redis(self, client, deltas: Dict[int, CounterDelta]) -> List[str]:
+        """Move the shared Redis deltas into a private batch and merge them into ``deltas``."""
+        keys = self._keys()
+        if self._claim_script is None or self._claim_client is not client:
+            self._claim_script = client.register_script(CLAIM_SCRIPT)
+            self._claim_client = client
+        batch = f"{int(time.time())}:{uuid.uuid4().hex}"
+        self._claim_script(keys=list(keys.values()), args=[batch])
+
+        # This batch plus any batch left behind by a worker that died mid-flush
+        stale_before = time.time() - self.flush_interval * STALE_BATCH_INTERVALS
+        batches = {batch}
+        for key in client.scan_iter(match=f"{keys['oldest']}:flushing:*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            claimed_at = key.rsplit(':flushing:', 1)[1]
+            if claimed_at != batch and float(claimed_at.split(':', 1)[0]) < stale_before:
+                batches.add(claimed_at)
+
+        claimed = []
+        for claimed_batch in sorted(batches):
+            pipe = client.pipeline(transaction=False)
+            for name in ('views', 'favorites', 'last_accessed'):
+                pipe.hgetall(f"{keys[name]}:flushing:{claimed_batch}")
+            views, favorites, accessed = pipe.execute()
+            for name, fields in (('views', views), ('favorites', favorites), ('last_accessed', accessed)):
+                for song_id, value in (fields or {}).items():
+                    value = value.decode() if isinstance(value, bytes) else value
+                    if name == 'last_accessed':
+                        delta = CounterDelta(last_accessed=datetime.fromisoformat(value))
+                    else:
+                        delta = CounterDelta(**{name: int(value)})
+                    deltas.setdefault(int(song_id), CounterDelta()).merge(delta)
+            claimed.extend(f"{key}:flushing:{claimed_batch}" for key in keys.values())
+        return claimed
+
+    def _record_trending(self, deltas: Dict[int, CounterDelta]):
+        viewed = {song_id: delta.views for song_id, delta in deltas.items() if delta.views > 0}
+        if not viewed:
+            return
+        try:
+            from .models import db, Song
+            from .trending import EngagementEvent, trending_engine
+            genres = dict(db.session.execute(
+                select(Song.id, Song.genre).where(Song.id.in_(list(viewed)))
+            ).all())
+            trending_engine.record_many(
+                EngagementEvent(song_id, 'view', count, genres.get(song_id))
+                for song_id, count in viewed.items() if song_id in genres
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record flushed views for trending: {e}")
+
+    # Background thread
+
+    def _ensure_thread(self):
+        if self.app is None or self.app.config.get('TESTING'):
+            return
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='song-counter-flush', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                logger.error(f"Error in song counter flush loop: {e}")
+
+    def stop(self):
+        """Stop the background flush thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _flush_at_exit(self):
+        self._stop.set()
+        with self._lock:
+            if not self._pending or self.app.config.get('TESTING'):
+                return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush song counters at exit: {e}")
+
+    # Metrics
+
+    def _oldest_redis_pending(self) -> Optional[float]:
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            value = client.get(self._keys()['oldest'])
+            return float(value) if value is not None else None
+        except Exception:
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counter buffer metrics, including the age of the oldest unflushed increment."""
+        with self._lock:
+            pending = len(self._pending)
+            oldest = self._oldest_pending
+        redis_oldest = self._oldest_redis_pending()
+        if redis_oldest is not None and (oldest is None or redis_oldest < oldest):
+            oldest = redis_oldest
+        return dict(
+            self.stats,
+            pending_songs=pending,
+            flush_lag_seconds=round(time.time() - oldest, 3) if oldest is not None else 0.0,
+            flush_interval_seconds=self.flush_interval,
+        )
+
+
+# Global instance
+song_counters = SongCounterBuffer()
+
+
+def count_song_view(func):
+    """Count a view of ``song_id`` whenever the wrapped endpoint serves the song (200 or 304)."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        if isinstance(result, tuple):
+            status_code = result[1] if len(result) > 1 and isinstance(result[1], int) else 200
+        else:
+            status_code = getattr(result, 'status_code', 200)
+        if status_code in (200, 304) and kwargs.get('song_id'):
+            try:
+                song_counters.increment_view(kwargs['song_id'])
+            except Exception as e:
+                logger.warning(f"Failed to count view of song {kwargs['song_id']}: {e}")
+        return result
+    return wrapper
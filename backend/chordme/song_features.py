@@ -0,0 +1,436 @@
+"""
+Column-oriented song feature store for music discovery.
+
+Similar-song and content-based recommendations used to hydrate every song in
+the catalogue as an ORM object and score it in Python on each request. The
+store below keeps what those scores need in NumPy arrays, one row per song:
+
+- int32 codes for genre (as stored and lowercased), key and difficulty, 0
+  when unknown; each kind has its own vocabulary of values seen so far
+- tempo, NaN when unknown, and a bitset of the features present
+- owner, an ``ACTIVE`` | ``PUBLIC`` bitset and a user -> rows index of explicit
+  shares, so access filtering is a mask that mirrors ``Song.can_user_access``
+
+Both discovery scores are a weighted sum of per-feature terms divided by the
+number of features present. A query turns each categorical term into a small
+table of scores per code, so scoring the catalogue is one gather per feature
+(``genre_scores[genre_codes] + key_scores[key_codes] + ...``) plus the tempo
+term, added in the same order as the row-by-row scores so the results are
+identical, and the top k come from ``np.argpartition``.
+
+The store is built and synced with writes from other workers by the
+``sync_song_features`` maintenance task, which also runs when the scheduler
+starts, and session hooks apply songs committed from this process. Until it
+is built, or without NumPy, callers score songs row by row. Callers hydrate
+and re-check the winning rows, so a briefly stale store can only cost recall,
+never leak a song.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models import Song
+
+logger = logging.getLogger(__name__)
+
+
+ACTIVE = 1
+PUBLIC = 2
+
+# Bits of the per-row presence bitset
+GENRE_PRESENT, KEY_PRESENT, TEMPO_PRESENT, DIFFICULTY_PRESENT = 1, 2, 4, 8
+# Divisor of a row's score by presence bitset: the features present in both
+# the row and the query, or 1 when there are none and the score is 0 anyway
+FACTOR_DIVISORS = [max(bin(bits).count('1'), 1) for bits in range(16)]
+
+# Code arrays and the vocabulary each one draws its codes from
+CODE_KINDS = {'genre_codes': 'genre', 'folded_genre_codes': 'folded_genre',
+              'key_codes': 'key', 'difficulty_codes': 'difficulty'}
+
+DIFFICULTY_LEVELS = {'easy': 1, 'medium': 2, 'hard': 3}
+DEFAULT_DIFFICULTY_LEVEL = 2
+
+# Weights of MusicDiscoveryService._calculate_feature_similarity
+FEATURE_WEIGHTS = {'genre': 0.4, 'key': 0.3, 'tempo': 0.2, 'difficulty': 0.1}
+# Weights of MusicDiscoveryService._calculate_content_similarity
+CONTENT_WEIGHTS = {'genre': 0.4, 'tempo': 0.3, 'key': 0.2, 'difficulty': 0.1}
+TEMPO_RANGE = 60.0
+
+FEATURE_COLUMNS = (
+    Song.id, Song.user_id, Song.genre, Song.song_key, Song.tempo, Song.difficulty,
+    Song.share_settings, Song.shared_with, Song.is_deleted, Song.updated_at,
+)
+BUILD_BATCH_SIZE = 5000
+PENDING_CHANGES_KEY = 'song_feature_changes'
+
+
+class SongFeatureStore:
+    """
+    In-memory feature arrays of the song catalogue.
+
+    Args:
+        initial_capacity: Rows allocated up front; the arrays double when full
+    """
+
+    # Per-row arrays and the value unused rows hold
+    ARRAYS = {'ids': (np.int64, 0), 'owners': (np.int64, 0), 'flags': (np.uint8, 0),
+              'presence': (np.uint8, 0), 'tempo': (np.float64, np.nan),
+              **{name: (np.int32, 0) for name in CODE_KINDS}} if NUMPY_AVAILABLE else {}
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._lock = threading.RLock()
+        self._built = False
+        self._watermark = None
+        self._allocate(initial_capacity)
+
+    def _allocate(self, capacity: int):
+        self._size = 0
+        self._rows: Dict[int, int] = {}
+        self._shared: Dict[Any, Set[int]] = {}
+        self._row_shares: Dict[int, Tuple[Any, ...]] = {}
+        # kind -> {value: code}; code 0 means unknown
+        self.vocabularies: Dict[str, Dict[Any, int]] = {kind: {} for kind in CODE_KINDS.values()}
+        for name, (dtype, fill) in self.ARRAYS.items():
+            setattr(self, name, np.full(capacity, fill, dtype))
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.flags[:self._size] & ACTIVE))
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    @property
+    def bytes_per_row(self) -> int:
+        """Array bytes each song takes, shares aside."""
+        return sum(getattr(self, name).itemsize for name in self.ARRAYS)
+
+    # Loading
+
+    def build(self, session):
+        """Load the whole catalogue with a column-only, batched query."""
+        with self._lock:
+            self._allocate(max(len(self.ids), 1024))
+            self._watermark = None
+            query = session.query(*FEATURE_COLUMNS).filter(Song.is_deleted == False)
+            for row in query.yield_per(BUILD_BATCH_SIZE):
+                self._apply_row(row)
+            self._built = True
+
+    def sync(self, session):
+        """Apply songs changed since the last build or sync, including soft deletes."""
+        with self._lock:
+            query = session.query(*FEATURE_COLUMNS)
+            if self._watermark is not None:
+                # >= so rows sharing the watermark timestamp are not skipped; reapplying is idempotent
+                query = query.filter(Song.updated_at >= self._watermark)
+            for row in query.yield_per(BUILD_BATCH_SIZE):
+                self._apply_row(row)
+
+    def upsert(self, song_id: int, owner_id: int, genre: Optional[str], song_key: Optional[str],
+               tempo: Optional[float], difficulty: Optional[str], share_settings: Optional[str],
+               shared_with: Optional[Iterable[Any]], is_deleted: bool = False):
+        """Insert or replace the features of one song."""
+        with self._lock:
+            if is_deleted:
+                self.discard(song_id)
+                return
+            row = self._rows.get(song_id)
+            if row is None:
+                row = self._rows[song_id] = self._next_row()
+            self.genre_codes[row] = self._code('genre', genre)
+            self.folded_genre_codes[row] = self._code('folded_genre', genre.lower() if genre else None)
+            self.key_codes[row] = self._code('key', song_key)
+            self.difficulty_codes[row] = self._code('difficulty', difficulty)
+            self.presence[row] = ((GENRE_PRESENT if genre else 0) | (KEY_PRESENT if song_key else 0) |
+                                  (TEMPO_PRESENT if tempo else 0) | (DIFFICULTY_PRESENT if difficulty else 0))
+            self.ids[row] = song_id
+            self.owners[row] = owner_id if owner_id is not None else -1
+            self.tempo[row] = tempo if tempo else np.nan
+            self.flags[row] = ACTIVE | (PUBLIC if share_settings == 'public' else 0)
+            self._set_shares(row, tuple(shared_with or ()))
+
+    def discard(self, song_id: int):
+        """Hide a deleted song; its row is reused if the id comes back."""
+        with self._lock:
+            row = self._rows.get(song_id)
+            if row is not None:
+                self.flags[row] = 0
+                self._set_shares(row, ())
+
+    def _apply_row(self, row):
+        (song_id, owner_id, genre, song_key, tempo, difficulty,
+         share_settings, shared_with, is_deleted, updated_at) = row
+        self.upsert(song_id, owner_id, genre, song_key, tempo, difficulty,
+                    share_settings, shared_with, bool(is_deleted))
+        if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    def _code(self, kind: str, value: Any) -> int:
+        if not value:
+            return 0
+        vocabulary = self.vocabularies[kind]
+        code = vocabulary.get(value)
+        if code is None:
+            code = vocabulary[value] = len(vocabulary) + 1
+        return code
+
+    def _next_row(self) -> int:
+        if self._size == len(self.ids):
+            capacity = len(self.ids) * 2
+            for name, (dtype, fill) in self.ARRAYS.items():
+                current = getattr(self, name)
+                grown = np.full(capacity, fill, dtype)
+                grown[:len(current)] = current
+                setattr(self, name, grown)
+        self._size += 1
+        return self._size - 1
+
+    def _set_shares(self, row: int, users: Tuple[Any, ...]):
+        for user in self._row_shares.pop(row, ()):
+            rows = self._shared.get(user)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._shared[user]
+        if users:
+            self._row_shares[row] = users
+            for user in users:
+                self._shared.setdefault(user, set()).add(row)
+
+    # Scoring
+
+    def _score_table(self, kind: str, scores: Dict[Any, float]) -> 'np.ndarray':
+        """Scores indexed by the codes of ``kind``; unknown values and code 0 score 0."""
+        vocabulary = self.vocabularies[kind]
+        table = np.zeros(len(vocabulary) + 1)
+        for value, score in scores.items():
+            code = vocabulary.get(value)
+            if code is not None:
+                table[code] = score
+        return table
+
+    def _feature_terms(self, song: Song) -> Tuple[int, List[Tuple[str, Optional['np.ndarray']]]]:
+        """Terms of MusicDiscoveryService._calculate_feature_similarity against ``song``, in its order."""
+        mask, terms = 0, []
+        if song.genre:
+            mask |= GENRE_PRESENT
+            terms.append(('folded_genre_codes', self._score_table(
+                'folded_genre', {song.genre.lower(): FEATURE_WEIGHTS['genre']})))
+        if song.song_key:
+            mask |= KEY_PRESENT
+            terms.append(('key_codes', self._score_table('key', {song.song_key: FEATURE_WEIGHTS['key']})))
+        if song.tempo:
+            mask |= TEMPO_PRESENT
+            terms.append(('tempo', None))
+        if song.difficulty:
+            mask |= DIFFICULTY_PRESENT
+            level = DIFFICULTY_LEVELS.get(song.difficulty, DEFAULT_DIFFICULTY_LEVEL)
+            terms.append(('difficulty_codes', self._score_table('difficulty', {
+                value: (1 - abs(DIFFICULTY_LEVELS.get(value, DEFAULT_DIFFICULTY_LEVEL) - level) / 2)
+                * FEATURE_WEIGHTS['difficulty']
+                for value in self.vocabularies['difficulty']
+            })))
+        return mask, terms
+
+    def _preference_terms(self, preferences: Dict[str, Any]) -> Tuple[int, List[Tuple[str, Optional['np.ndarray']]]]:
+        """Terms of MusicDiscoveryService._calculate_content_similarity for ``preferences``, in its order."""
+        mask, terms = 0, []
+        for name, kind, present, preference in (
+                ('genre', 'genre', GENRE_PRESENT, 'preferred_genres'),
+                ('tempo', None, TEMPO_PRESENT, 'average_tempo'),
+                ('key', 'key', KEY_PRESENT, 'preferred_keys'),
+                ('difficulty', 'difficulty', DIFFICULTY_PRESENT, 'preferred_difficulties')):
+            counts = preferences.get(preference)
+            if not counts:
+                continue
+            mask |= present
+            if kind is None:
+                terms.append(('tempo', None))
+                continue
+            total = sum(counts.values())
+            terms.append((f'{kind}_codes', self._score_table(
+                kind, {value: count / total * CONTENT_WEIGHTS[name] for value, count in counts.items()})))
+        return mask, terms
+
+    def similar_to(self, song: Song, user_id: int, limit: int,
+                   threshold: float = 0.4) -> List[Tuple[int, float]]:
+        """
+        Top songs by feature similarity to ``song`` that ``user_id`` may see.
+
+        Returns:
+            (song_id, score) pairs, best first
+        """
+        with self._lock:
+            mask, terms = self._feature_terms(song)
+            return self._top_k(mask, terms, song.tempo, FEATURE_WEIGHTS['tempo'],
+                               user_id, limit, threshold, exclude_ids=(song.id,))
+
+    def match_preferences(self, preferences: Dict[str, Any], user_id: int, limit: int,
+                          exclude_ids: Iterable[int] = (),
+                          threshold: float = 0.3) -> List[Tuple[int, float]]:
+        """
+        Top songs of other users by match with ``_analyze_user_preferences`` output.
+
+        Returns:
+            (song_id, score) pairs, best first
+        """
+        with self._lock:
+            mask, terms = self._preference_terms(preferences)
+            return self._top_k(mask, terms, preferences.get('average_tempo'), CONTENT_WEIGHTS['tempo'],
+                               user_id, limit, threshold, exclude_ids=exclude_ids, exclude_owner=True)
+
+    def _top_k(self, mask: int, terms: List[Tuple[str, Optional['np.ndarray']]],
+               tempo_reference: Optional[float], tempo_weight: float, user_id: int, limit: int,
+               threshold: float, exclude_ids: Iterable[int] = (),
+               exclude_owner: bool = False) -> List[Tuple[int, float]]:
+        if limit <= 0:
+            return []
+        size = self._size
+        ids, flags = self.ids[:size], self.flags[:size]
+
+        scores = np.zeros(size)
+        for name, table in terms:
+            if table is None:
+                # max(0, 1 - |tempo - reference| / 60) * weight, in place; fmax maps NaN to 0
+                tempo = self.tempo[:size] - tempo_reference
+                np.abs(tempo, out=tempo)
+                tempo /= TEMPO_RANGE
+                np.subtract(1, tempo, out=tempo)
+                np.fmax(tempo, 0.0, out=tempo)
+                tempo *= tempo_weight
+                scores += tempo
+            else:
+                # take() gathers from int32 codes without converting them to intp first
+                scores += np.take(table, getattr(self, name)[:size])
+        scores /= np.take(np.asarray(FACTOR_DIVISORS, np.float64), self.presence[:size] & mask)
+
+        owned = self.owners[:size] == user_id
+        eligible = (flags & ACTIVE) != 0
+        access = (flags & PUBLIC) != 0
+        if exclude_owner:
+            eligible &= ~owned
+        else:
+            access |= owned
+        shared = self._shared.get(user_id)
+        if shared:
+            access[np.fromiter(shared, np.int64, len(shared))] = True
+        eligible &= access
+        excluded = [self._rows[song_id] for song_id in exclude_ids if song_id in self._rows]
+        eligible[excluded] = False
+
+        candidates = np.flatnonzero(eligible & (scores > threshold))
+        if len(candidates) > limit:
+            kth = candidates[np.argpartition(-scores[candidates], limit - 1)[limit - 1]]
+            # Keep every row tied with the k-th so ties can be broken by id
+            candidates = candidates[scores[candidates] >= scores[kth]]
+        # Best first, ties in id order like the row-by-row implementation
+        best = candidates[np.lexsort((ids[candidates], -scores[candidates]))[:limit]]
+        return [(int(ids[row]), float(scores[row])) for row in best]
+
+
+_stores: Dict[str, SongFeatureStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_song_feature_store(session=None) -> Optional[SongFeatureStore]:
+    """Return the built feature store of the session's database, None until it is built."""
+    from .models import db
+
+    if not NUMPY_AVAILABLE:
+        return None
+    store = _store_for_session(session or db.session)
+    return store if store is not None and store.is_built else None
+
+
+def sync_song_feature_store(session=None) -> Dict[str, Any]:
+    """Build the feature store of the session's database, or catch up with songs changed since."""
+    from .models import db
+
+    if not NUMPY_AVAILABLE:
+        return {'skipped': 'numpy is not installed'}
+    session = session or db.session
+    key = str(session.get_bind().url)
+    with _stores_lock:
+        store = _stores.setdefault(key, SongFeatureStore())
+    started = time.perf_counter()
+    built = not store.is_built
+    if built:
+        store.build(session)
+    else:
+        store.sync(session)
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"{'Built' if built else 'Synced'} song feature store with {len(store)} songs in {duration_ms}ms")
+    return {'built': built, 'songs': len(store), 'duration_ms': duration_ms}
+
+
+def reset_song_feature_stores(url: Optional[str] = None):
+    """Drop built stores, for one database URL or all of them."""
+    with _stores_lock:
+        if url is None:
+            _stores.clear()
+        else:
+            _stores.pop(url, None)
+
+
+def _store_for_session(session) -> Optional[SongFeatureStore]:
+    try:
+        return _stores.get(str(session.get_bind().url))
+    except Exception:
+        return None
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_song_changes(session, flush_context):
+    """Capture flushed song features while the objects are still loaded."""
+    if not _stores:
+        return
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Song):
+            session.info.setdefault(PENDING_CHANGES_KEY, {})[obj.id] = (
+                obj.id, obj.user_id, obj.genre, obj.song_key, obj.tempo, obj.difficulty,
+                obj.share_settings, list(obj.shared_with or ()), bool(obj.is_deleted)
+            )
+    for obj in session.deleted:
+        if isinstance(obj, Song):
+            session.info.setdefault(PENDING_CHANGES_KEY, {})[obj.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_song_changes(session):
+    changes = session.info.pop(PENDING_CHANGES_KEY, None)
+    if not changes:
+        return
+    store = _store_for_session(session)
+    if store is None or not store.is_built:
+        return
+    for song_id, features in changes.items():
+        if features is None:
+            store.discard(song_id)
+        else:
+            store.upsert(*features)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_song_changes(session):
+    session.info.pop(PENDING_CHANGES_KEY, None)
+
+
+def _reset_on_schema_change(target, connection, **kw):
+    reset_song_feature_stores(str(connection.engine.url))
+
+
+event.listen(Song.__table__, 'after_create', _reset_on_schema_change)
+event.listen(Song.__table__, 'before_drop', _reset_on_schema_change)
@@ -0,0 +1,508 @@
+"""
+Full-text search engine for songs.
+
+Song.search used to filter with ILIKE '%q%' over title, artist, lyrics and the
+full ChordPro content, which forces a sequential scan of every visible song.
+This module plugs the database's native full-text index in instead:
+
+- PostgreSQL: a generated, weighted ``search_vector`` tsvector column with a
+  GIN index (database/migrations/006_song_fulltext_search.sql), ranked with
+  ``ts_rank``
+- SQLite: an external-content FTS5 table (``songs_fts``) kept in sync by
+  triggers, ranked with ``bm25``
+
+Both rank title matches above artist, lyrics and raw content matches. The
+boolean and phrase syntax understood by ``parse_search_query`` is compiled to
+the native operators of each engine. Databases without a full-text index fall
+back to the original substring filter.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Double, cast, column, event, func, literal_column, or_, select, table, text
+
+logger = logging.getLogger(__name__)
+
+
+SQLITE_FTS_TABLE = 'songs_fts'
+POSTGRES_VECTOR_COLUMN = 'search_vector'
+POSTGRES_TEXT_CONFIG = 'simple'
+
+# Per-field weights: title > artist > lyrics > raw ChordPro content
+SQLITE_BM25_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+POSTGRES_RANK_WEIGHTS = '{0.1, 0.2, 0.4, 1.0}'  # ts_rank order is {D, C, B, A}
+
+# Terms are reduced to word characters so user input can never inject
+# tsquery or FTS5 syntax
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def parse_search_query(query):
+    """Parse search query to identify special operators and syntax"""
+    if not query:
+        return {
+            'original': '',
+            'phrases': [],
+            'and_terms': [],
+            'or_terms': [],
+            'not_terms': [],
+            'has_operators': False
+        }
+
+    result = {
+        'original': query,
+        'phrases': [],
+        'and_terms': [],
+        'or_terms': [],
+        'not_terms': [],
+        'has_operators': False
+    }
+
+    # Extract quoted phrases
+    phrases = re.findall(r'"([^"]+)"', query)
+    result['phrases'] = phrases
+
+    # Remove phrases from query for further parsing
+    clean_query = re.sub(r'"[^"]+"', '', query)
+
+    # Split into terms
+    terms = clean_query.split()
+
+    current_terms = []
+    i = 0
+    while i < len(terms):
+        term = terms[i].strip()
+
+        if term.upper() == 'AND':
+            result['has_operators'] = True
+            i += 1
+            continue
+        elif term.upper() == 'OR':
+            result['has_operators'] = True
+            if current_terms:
+                result['or_terms'].extend(current_terms)
+                current_terms = []
+            i += 1
+            continue
+        elif term.upper() == 'NOT' and i + 1 < len(terms):
+            result['has_operators'] = True
+            result['not_terms'].append(terms[i + 1])
+            i += 2
+            continue
+        elif term.startswith('-'):
+            result['has_operators'] = True
+            result['not_terms'].append(term[1:])
+        elif term.startswith('+'):
+            current_terms.append(term[1:])
+        else:
+            current_terms.append(term)
+
+        i += 1
+
+    # Add remaining terms as AND terms
+    result['and_terms'].extend(current_terms)
+
+    return result
+
+
+@dataclass(frozen=True)
+class SearchUnit:
+    """A single term or phrase: consecutive tokens that must appear in order."""
+    tokens: Tuple[str, ...]
+    prefix: bool  # Bare terms match as prefixes, quoted phrases match exactly
+
+
+@dataclass
+class CompiledQuery:
+    """Engine-neutral boolean form of a parsed search query."""
+    required: List[SearchUnit] = field(default_factory=list)
+    any_of: List[SearchUnit] = field(default_factory=list)
+    excluded: List[SearchUnit] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.required or self.any_of or self.excluded)
+
+    @property
+    def has_positive(self) -> bool:
+        return bool(self.required or self.any_of)
+
+
+def _unit(term: str, prefix: bool) -> Optional[SearchUnit]:
+    tokens = tuple(token.lower() for token in TOKEN_PATTERN.findall(term))
+    return SearchUnit(tokens, prefix) if tokens else None
+
+
+def compile_search_query(parsed: Dict[str, Any]) -> CompiledQuery:
+    """
+    Turn the output of parse_search_query into an engine-neutral boolean query.
+
+    Quoted phrases and plain terms are required. When the query used OR, the
+    parser no longer knows how terms were grouped, so every unquoted term
+    becomes an alternative. NOT and '-' terms are excluded.
+    """
+    compiled = CompiledQuery()
+    for phrase in parsed.get('phrases', []):
+        unit = _unit(phrase, prefix=False)
+        if unit:
+            compiled.required.append(unit)
+
+    terms = [_unit(term, prefix=True) for term in parsed.get('and_terms', [])]
+    if parsed.get('or_terms'):
+        alternatives = [_unit(term, prefix=True) for term in parsed['or_terms']] + terms
+        compiled.any_of.extend(unit for unit in alternatives if unit)
+    else:
+        compiled.required.extend(unit for unit in terms if unit)
+
+    for term in parsed.get('not_terms', []):
+        unit = _unit(term, prefix=False)
+        if unit:
+            compiled.excluded.append(unit)
+    return compiled
+
+
+def to_tsquery(compiled: CompiledQuery) -> str:
+    """Render a compiled query with PostgreSQL tsquery operators (& | ! <->)."""
+    def render(unit: SearchUnit) -> str:
+        tokens = list(unit.tokens)
+        if unit.prefix:
+            tokens[-1] += ':*'
+        expression = ' <-> '.join(tokens)
+        return f'({expression})' if len(tokens) > 1 else expression
+
+    parts = [render(unit) for unit in compiled.required]
+    if compiled.any_of:
+        parts.append('(' + ' | '.join(render(unit) for unit in compiled.any_of) + ')')
+    parts.extend('!' + render(unit) for unit in compiled.excluded)
+    return ' & '.join(parts)
+
+
+def _fts5_unit(unit: SearchUnit) -> str:
+    phrase = '"' + ' '.join(unit.tokens) + '"'
+    return phrase + '*' if unit.prefix else phrase
+
+
+def to_fts5_match(compiled: CompiledQuery) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Render a compiled query as FTS5 MATCH expressions.
+
+    Returns:
+        tuple: (positive expression, exclusion expression). FTS5's NOT is a
+        binary operator, so exclusions are only folded into the positive
+        expression when there is one.
+    """
+    parts = [_fts5_unit(unit) for unit in compiled.required]
+    if compiled.any_of:
+        parts.append('(' + ' OR '.join(_fts5_unit(unit) for unit in compiled.any_of) + ')')
+    positive = ' AND '.join(parts) or None
+    excluded = ' OR '.join(_fts5_unit(unit) for unit in compiled.excluded) or None
+
+    if positive and excluded:
+        return f'{positive} NOT ({excluded})', None
+    return positive, excluded
+
+
+class SearchBackend:
+    """Substring search used when no full-text index is available."""
+
+    name = 'like'
+
+    def is_available(self, connection) -> bool:
+        return True
+
+    def apply(self, query, model, search_text: str):
+        """
+        Add a text filter to a Song query.
+
+        Returns:
+            tuple: (filtered query, relevance expression or None)
+        """
+        search_filter = or_(
+            model.title.ilike(f'%{search_text}%'),
+            model.artist.ilike(f'%{search_text}%'),
+            model.lyrics.ilike(f'%{search_text}%'),
+            model.content.ilike(f'%{search_text}%')
+        )
+        return query.filter(search_filter), None
+
+
+class PostgresFullTextBackend(SearchBackend):
+    """tsvector/GIN search ranked with weighted ts_rank."""
+
+    name = 'postgresql_tsvector'
+
+    def is_available(self, connection) -> bool:
+        row = connection.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'songs' AND column_name = :column"
+        ), {'column': POSTGRES_VECTOR_COLUMN}).first()
+        if row is None:
+            logger.warning("songs.search_vector is missing; apply migration "
+                           "006_song_fulltext_search.sql to enable full-text search")
+        return row is not None
+
+    def apply(self, query, model, search_text: str):
+        compiled = compile_search_query(parse_search_query(search_text))
+        if compiled.is_empty:
+            return super().apply(query, model, search_text)
+
+        vector = literal_column(f'{model.__tablename__}.{POSTGRES_VECTOR_COLUMN}')
+        ts_query = func.to_tsquery(POSTGRES_TEXT_CONFIG, to_tsquery(compiled))
+        query = query.filter(vector.op('@@')(ts_query))
+        if not compiled.has_positive:
+            return query, None
+        # ts_rank is float4; as float8 the rank round-trips through a keyset
+        # cursor exactly, so a page's last row does not sort below its own cursor
+        rank = cast(func.ts_rank(literal_column(f"'{POSTGRES_RANK_WEIGHTS}'::float4[]"), vector, ts_query), Double)
+        return query, rank
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """FTS5 search ranked with weighted bm25."""
+
+    name = 'sqlite_fts5'
+
+    def is_available(self, connection) -> bool:
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {'name': SQLITE_FTS_TABLE}).first()
+        if exists:
+            return True
+        songs = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'songs'"
+        )).first()
+        if not songs:
+            return False
+        # Database created before the index existed: build it now
+        if not install_sqlite_index(connection):
+            return False
+        rebuild_search_index(connection)
+        return True
+
+    def apply(self, query, model, search_text: str):
+        compiled = compile_search_query(parse_search_query(search_text))
+        if compiled.is_empty:
+            return super().apply(query, model, search_text)
+
+        positive, excluded = to_fts5_match(compiled)
+        fts = table(SQLITE_FTS_TABLE, column('rowid'), column(SQLITE_FTS_TABLE))
+        rank = None
+        if positive:
+            # Rank inside a derived table: bm25() cannot be evaluated by the outer
+            # query once it adds window functions or keyset predicates
+            matches = select(
+                fts.c.rowid.label('song_id'),
+                # bm25 scores are negative, lower is better
+                (-func.bm25(literal_column(SQLITE_FTS_TABLE), *SQLITE_BM25_WEIGHTS)).label('rank')
+            ).where(fts.c[SQLITE_FTS_TABLE].op('MATCH')(positive)).subquery('fts_matches')
+            query = query.join(matches, matches.c.song_id == model.id)
+            rank = matches.c.rank
+        if excluded:
+            exclusion = fts.select().with_only_columns(fts.c.rowid).where(
+                fts.c[SQLITE_FTS_TABLE].op('MATCH')(excluded)
+            )
+            query = query.filter(model.id.notin_(exclusion))
+        return query, rank
+
+
+BACKENDS = {
+    'postgresql': PostgresFullTextBackend,
+    'sqlite': SQLiteFTS5Backend,
+}
+
+_backend_cache: Dict[str, SearchBackend] = {}
+_backend_lock = threading.Lock()
+
+
+def get_search_backend(engine) -> SearchBackend:
+    """Return the best available search backend for an engine, detected once."""
+    key = str(engine.url)
+    backend = _backend_cache.get(key)
+    if backend is not None:
+        return backend
+
+    with _backend_lock:
+        backend = _backend_cache.get(key)
+        if backend is not None:
+            return backend
+        backend = SearchBackend()
+        backend_class = BACKENDS.get(engine.dialect.name)
+        if backend_class is not None:
+            candidate = backend_class()
+            try:
+                with engine.begin() as connection:
+                    if candidate.is_available(connection):
+                        backend = candidate
+            except Exception as e:
+                # Leave the cache empty so detection is retried on the next search
+                logger.warning(f"Full-text search detection failed, using substring search: {e}")
+                return backend
+        _backend_cache[key] = backend
+        logger.info(f"Song search backend for {engine.dialect.name}: {backend.name}")
+        return backend
+
+
+def reset_search_backend_cache():
+    """Forget detected backends, e.g. after applying a migration."""
+    with _backend_lock:
+        _backend_cache.clear()
+
+
+def apply_text_search(query, model, search_text: str, engine):
+    """
+    Filter a Song query by a search string using the engine's full-text index.
+
+    Returns:
+        tuple: (filtered query, relevance expression or None). Higher relevance
+        is better.
+    """
+    return get_search_backend(engine).apply(query, model, search_text)
+
+
+# Keyset cursors
+
+def search_fingerprint(params: Dict[str, Any]) -> str:
+    """Short digest of the search parameters a cursor was issued for."""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def encode_search_cursor(sort_key: List[Any], total_count: Optional[int], fingerprint: str) -> str:
+    """
+    Build an opaque cursor pointing after a search result.
+
+    Args:
+        sort_key: Song.search_sort_key() of the last result on the page
+        total_count: Total matches, carried forward so later pages skip counting
+        fingerprint: search_fingerprint() of the search parameters
+    """
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in sort_key]
+    payload = json.dumps({'k': values, 't': total_count, 'f': fingerprint}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_search_cursor(cursor: str, fingerprint: str) -> Tuple[List[Any], Optional[int]]:
+    """
+    Decode a cursor produced by encode_search_cursor.
+
+    Returns:
+        tuple: (sort key, total count)
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for another search
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = payload['k']
+        total_count = payload.get('t')
+        issued_for = payload.get('f')
+    except (ValueError, TypeError, KeyError, UnicodeError) as e:
+        raise ValueError('Malformed search cursor') from e
+
+    if issued_for != fingerprint:
+        raise ValueError('Search cursor was issued for a different search')
+    # Sort keys end with (view_count, created_at, id), optionally preceded by relevance
+    if not isinstance(values, list) or len(values) not in (3, 4):
+        raise ValueError('Malformed search cursor')
+    if not all(isinstance(value, (int, float)) for index, value in enumerate(values) if index != len(values) - 2):
+        raise ValueError('Malformed search cursor')
+    if total_count is not None and not isinstance(total_count, int):
+        raise ValueError('Malformed search cursor')
+
+    created_at = values[-2]
+    if created_at is not None:
+        try:
+            values[-2] = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError) as e:
+            raise ValueError('Malformed search cursor') from e
+    return values, total_count
+
+
+# SQLite index maintenance
+
+SQLITE_INDEX_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        title, artist, lyrics, content,
+        content='songs', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS songs_fts_after_insert AFTER INSERT ON songs BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, artist, lyrics, content)
+        VALUES (new.id, new.title, new.artist, new.lyrics, new.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS songs_fts_after_delete AFTER DELETE ON songs BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, artist, lyrics, content)
+        VALUES ('delete', old.id, old.title, old.artist, old.lyrics, old.content);
+    END""",
+    # Only reindex when searchable columns change, not on view/favorite counter bumps
+    f"""CREATE TRIGGER IF NOT EXISTS songs_fts_after_update
+        AFTER UPDATE OF title, artist, lyrics, content ON songs BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, artist, lyrics, content)
+        VALUES ('delete', old.id, old.title, old.artist, old.lyrics, old.content);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, artist, lyrics, content)
+        VALUES (new.id, new.title, new.artist, new.lyrics, new.content);
+    END""",
+)
+
+
+def install_sqlite_index(connection) -> bool:
+    """Create the FTS5 table and its sync triggers. Returns False without FTS5."""
+    try:
+        for statement in SQLITE_INDEX_DDL:
+            connection.execute(text(statement))
+        return True
+    except Exception as e:
+        logger.warning(f"SQLite FTS5 unavailable, song search will use substring matching: {e}")
+        return False
+
+
+def rebuild_search_index(connection):
+    """Repopulate the SQLite FTS5 table from the songs table."""
+    connection.execute(text(
+        f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')"
+    ))
+
+
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        install_sqlite_index(connection)
+    elif connection.dialect.name == 'postgresql':
+        # Mirrors migration 006 for databases built with db.create_all()
+        try:
+            with connection.begin_nested():
+                connection.execute(text(
+                    f"""ALTER TABLE songs ADD COLUMN IF NOT EXISTS {POSTGRES_VECTOR_COLUMN} tsvector
+                    GENERATED ALWAYS AS (
+                        setweight(to_tsvector('{POSTGRES_TEXT_CONFIG}', coalesce(title, '')), 'A') ||
+                        setweight(to_tsvector('{POSTGRES_TEXT_CONFIG}', coalesce(artist, '')), 'B') ||
+                        setweight(to_tsvector('{POSTGRES_TEXT_CONFIG}', coalesce(lyrics, '')), 'C') ||
+                        setweight(to_tsvector('{POSTGRES_TEXT_CONFIG}', coalesce(content, '')), 'D')
+                    ) STORED"""
+                ))
+                connection.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS idx_songs_search_vector "
+                    f"ON songs USING gin({POSTGRES_VECTOR_COLUMN})"
+                ))
+        except Exception as e:
+            logger.warning(f"Could not create songs.search_vector: {e}")
+
+
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        # Triggers are dropped together with the songs table
+        connection.execute(text(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}"))
+
+
+def register_search_index(songs_table):
+    """Create and drop the full-text index together with the songs table."""
+    event.listen(songs_table, 'after_create', _create_search_index)
+    event.listen(songs_table, 'before_drop', _drop_search_index)
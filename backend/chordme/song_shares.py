@@ -0,0 +1,147 @@
+"""
+Normalized song shares.
+
+``Song.shared_with`` (a JSON list of user ids) and ``Song.permissions`` (a
+JSON object of user id -> level) can only be evaluated in Python, so every
+visibility check needed the song loaded and there was no indexed way to find
+the songs shared with a user. The ``song_shares`` table holds one row per
+(song, user) share with its level, indexed by user, and backs the SQL
+predicates ``Song.shared_to`` and ``Song.accessible_to``.
+
+During the transition the JSON columns stay the source of truth:
+
+- whenever a song whose sharing columns changed is flushed, its rows are
+  rewritten from them in the same transaction (dual-write), whichever code
+  path changed them
+- ``sync_song_shares`` backfills the table from the JSON columns and repairs
+  drift from bulk updates that bypass the session; it runs as the
+  ``sync_song_shares`` maintenance task
+
+A user id in ``shared_with`` becomes a row with the level from
+``permissions``, or 'read' when there is none. Email addresses and ids of
+users that do not exist are skipped, as they never granted access.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .models import db, Song, SongShare, User, utc_now
+
+logger = logging.getLogger(__name__)
+
+SHARE_LEVELS = ('read', 'edit', 'admin')
+SYNC_BATCH_SIZE = 1000
+SHARING_COLUMNS = ('shared_with', 'permissions')
+
+
+def shares_from_json(shared_with: Optional[Iterable[Any]],
+                     permissions: Optional[Dict[str, Any]]) -> Dict[int, str]:
+    """The user id -> level shares described by a song's sharing columns."""
+    permissions = permissions or {}
+    shares = {}
+    for user_id in shared_with or ():
+        if isinstance(user_id, int) and not isinstance(user_id, bool):
+            level = permissions.get(str(user_id))
+            shares[user_id] = level if level in SHARE_LEVELS else 'read'
+    return shares
+
+
+def write_song_shares(connection, songs: Dict[int, Dict[int, str]]) -> Dict[str, int]:
+    """
+    Make the rows of each song match its shares, keeping unchanged rows.
+
+    Args:
+        connection: Connection or session to execute on
+        songs: Song id -> (user id -> level) for every song to rewrite
+    """
+    stats = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    if not songs:
+        return stats
+    table = SongShare.__table__
+
+    user_ids = {user_id for shares in songs.values() for user_id in shares}
+    existing_users = set()
+    if user_ids:
+        existing_users = {row[0] for row in connection.execute(
+            db.select(User.__table__.c.id).where(User.__table__.c.id.in_(user_ids)))}
+
+    current: Dict[int, Dict[int, str]] = {}
+    for song_id, user_id, level in connection.execute(
+            db.select(table.c.song_id, table.c.user_id, table.c.level)
+            .where(table.c.song_id.in_(list(songs)))):
+        current.setdefault(song_id, {})[user_id] = level
+
+    inserts, deletes = [], []
+    for song_id, shares in songs.items():
+        wanted = {user_id: level for user_id, level in shares.items() if user_id in existing_users}
+        have = current.get(song_id, {})
+        for user_id in have.keys() - wanted.keys():
+            deletes.append((song_id, user_id))
+        for user_id, level in wanted.items():
+            if user_id not in have:
+                inserts.append({'song_id': song_id, 'user_id': user_id, 'level': level,
+                                'created_at': utc_now()})
+            elif have[user_id] != level:
+                connection.execute(table.update().where(
+                    table.c.song_id == song_id, table.c.user_id == user_id).values(level=level))
+                stats['updated'] += 1
+
+    for song_id, user_id in deletes:
+        connection.execute(table.delete().where(table.c.song_id == song_id, table.c.user_id == user_id))
+    if inserts:
+        connection.execute(table.insert(), inserts)
+    stats['inserted'] = len(inserts)
+    stats['deleted'] = len(deletes)
+    return stats
+
+
+def sync_song_shares(batch_size: int = SYNC_BATCH_SIZE) -> Dict[str, int]:
+    """Backfill song_shares from the JSON sharing columns of every song and repair drift."""
+    stats = {'scanned': 0, 'inserted': 0, 'updated': 0, 'deleted': 0}
+    last_id = 0
+    while True:
+        rows = db.session.query(Song.id, Song.shared_with, Song.permissions).filter(
+            Song.id > last_id
+        ).order_by(Song.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        changes = write_song_shares(db.session.connection(), {
+            song_id: shares_from_json(shared_with, permissions)
+            for song_id, shared_with, permissions in rows
+        })
+        db.session.commit()
+        stats['scanned'] += len(rows)
+        for key, count in changes.items():
+            stats[key] += count
+    logger.info(f"Synced song shares: {stats}")
+    return stats
+
+
+def _sharing_changed(song: Song) -> bool:
+    state = inspect(song)
+    return any(state.attrs[column].history.has_changes() for column in SHARING_COLUMNS)
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_flushed_shares(session, flush_context):
+    """Dual-write the shares of songs whose sharing columns were flushed."""
+    songs = {}
+    for obj in session.new:
+        if isinstance(obj, Song) and (obj.shared_with or obj.permissions):
+            songs[obj.id] = shares_from_json(obj.shared_with, obj.permissions)
+    for obj in session.dirty:
+        if isinstance(obj, Song) and _sharing_changed(obj):
+            songs[obj.id] = shares_from_json(obj.shared_with, obj.permissions)
+    deleted: List[int] = [obj.id for obj in session.deleted if isinstance(obj, Song)]
+    if not songs and not deleted:
+        return
+
+    connection = session.connection()
+    if deleted:
+        table = SongShare.__table__
+        connection.execute(table.delete().where(table.c.song_id.in_(deleted)))
+    write_song_shares(connection, songs)
@@ -0,0 +1,464 @@
+"""
+Time-decayed trending engine for music discovery.
+
+Engagement events (views, favorites, practice and performance sessions) are
+counted per song in hourly and daily buckets (``song_engagement_buckets``) and
+folded into exponentially decayed scores kept as ready-made leaderboards per
+timeframe and per genre. Reading the top k songs of a leaderboard is a range
+read instead of a scan over the songs table.
+
+Scores are stored in log space relative to a fixed epoch::
+
+    score = log(sum(weight * exp(rate * (event_time - EPOCH))))
+
+so an older score never has to be rewritten as time passes: every song decays
+by the same factor, and the order of a leaderboard only changes when a new
+event arrives. The decayed value at time t is ``exp(score - rate * (t - EPOCH))``.
+
+Leaderboards live in Redis sorted sets when the cache service has a Redis
+connection, otherwise in the ``song_trending_scores`` table. Buckets are always
+written to the database; the daily rebuild recomputes every leaderboard from
+them, which repairs a flushed Redis and corrects songs whose genre changed.
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Song, SongEngagementBucket, SongTrendingScore
+
+logger = logging.getLogger(__name__)
+
+
+EVENT_WEIGHTS = {
+    'view': 1.0,
+    'practice': 2.0,
+    'performance': 3.0,
+    'favorite': 5.0,
+}
+EVENT_COLUMNS = {
+    'view': 'views',
+    'practice': 'practices',
+    'performance': 'performances',
+    'favorite': 'favorites',
+}
+EPOCH = datetime(2024, 1, 1)
+GLOBAL_SCOPE = 'all'
+LEADERBOARD_SIZE = 1000
+BUCKET_RETENTION = {
+    'hour': timedelta(days=2),
+    'day': timedelta(days=31),
+}
+WRITE_BATCH_SIZE = 1000
+
+# Members are trimmed from a leaderboard once their decayed score drops below
+# this, i.e. a single view one full window ago (every window is four half-lives)
+PRUNE_SCORE = 2 ** -4
+
+UPDATE_SCORES_SCRIPT = """
+local size = tonumber(ARGV[1])
+for i = 2, #ARGV, 2 do
+    local member = ARGV[i]
+    local score = tonumber(ARGV[i + 1])
+    local current = redis.call('zscore', KEYS[1], member)
+    if current then
+        current = tonumber(current)
+        local high = math.max(current, score)
+        score = high + math.log(1 + math.exp(math.min(current, score) - high))
+    end
+    redis.call('zadd', KEYS[1], score, member)
+end
+redis.call('zremrangebyrank', KEYS[1], 0, -(size + 1))
+return redis.call('zcard', KEYS[1])
+"""
+
+
+@dataclass(frozen=True)
+class Timeframe:
+    """A trending leaderboard: its window, decay half-life and bucket granularity."""
+    name: str
+    window: timedelta
+    half_life: timedelta
+    granularity: str
+
+    @property
+    def rate(self) -> float:
+        return math.log(2) / self.half_life.total_seconds()
+
+    def log_score(self, weight: float, at: datetime) -> float:
+        return math.log(weight) + self.rate * (at - EPOCH).total_seconds()
+
+    def decayed(self, score: float, now: datetime) -> float:
+        return math.exp(score - self.rate * (now - EPOCH).total_seconds())
+
+    def prune_threshold(self, now: datetime) -> float:
+        return self.log_score(PRUNE_SCORE, now)
+
+
+TIMEFRAMES = {
+    '1d': Timeframe('1d', timedelta(days=1), timedelta(hours=6), 'hour'),
+    '7d': Timeframe('7d', timedelta(days=7), timedelta(hours=42), 'day'),
+    '30d': Timeframe('30d', timedelta(days=30), timedelta(hours=180), 'day'),
+}
+
+
+@dataclass
+class EngagementEvent:
+    """One or more engagement events of the same type on a song."""
+    song_id: int
+    event: str
+    count: int = 1
+    genre: Optional[str] = None
+    at: Optional[datetime] = None
+
+
+def _utc_naive(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.now(UTC).replace(tzinfo=None)
+    if value.tzinfo is not None:
+        return value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(at: datetime, granularity: str) -> datetime:
+    """Start of the hour or day bucket containing ``at``."""
+    if granularity == 'hour':
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def window_start(timeframe: Timeframe, now: datetime) -> datetime:
+    """First bucket counted in the window of ``timeframe`` ending at ``now``."""
+    step = timedelta(hours=1) if timeframe.granularity == 'hour' else timedelta(days=1)
+    return bucket_start(now, timeframe.granularity) - timeframe.window + step
+
+
+def genre_scope(genre: Optional[str]) -> Optional[str]:
+    """Leaderboard scope of a genre, or None for songs without one."""
+    if not genre or not genre.strip():
+        return None
+    return f"genre:{genre.strip().lower()}"
+
+
+def _logaddexp(a: float, b: float) -> float:
+    high = max(a, b)
+    return high + math.log1p(math.exp(min(a, b) - high))
+
+
+class TrendingEngine:
+    """
+    Records engagement events and serves decayed top-N leaderboards.
+
+    Args:
+        leaderboard_size: Songs kept per Redis leaderboard
+    """
+
+    def __init__(self, leaderboard_size: int = LEADERBOARD_SIZE):
+        self.leaderboard_size = leaderboard_size
+        self._script = None
+        self._script_client = None
+
+    def _redis(self):
+        from .cache_service import get_cache_service
+        try:
+            return get_cache_service().redis_client
+        except Exception as e:
+            logger.warning(f"Cache service unavailable for trending: {e}")
+            return None
+
+    def _redis_key(self, timeframe: str, scope: str) -> str:
+        from .cache_service import get_cache_service
+        return f"{get_cache_service().config.key_prefix}:trending:{timeframe}:{scope}"
+
+    def _update_script(self, client):
+        if self._script is None or self._script_client is not client:
+            self._script = client.register_script(UPDATE_SCORES_SCRIPT)
+            self._script_client = client
+        return self._script
+
+    # Recording
+
+    def record(self, song_id: int, event: str, count: int = 1, genre: Optional[str] = None,
+               at: Optional[datetime] = None):
+        """Record ``count`` events of one type on a song."""
+        self.record_many([EngagementEvent(song_id, event, count, genre, at)])
+
+    def record_many(self, events: Iterable[EngagementEvent]) -> int:
+        """
+        Record a batch of engagement events.
+
+        Bucket counts are written and committed in one transaction;
+        leaderboard increments are combined per song before they are applied.
+
+        Returns:
+            Number of events recorded
+        """
+        buckets: Dict[Tuple[int, str, datetime], Dict[str, int]] = {}
+        scores: Dict[Tuple[str, str], Dict[int, float]] = {}
+        recorded = 0
+        for item in events:
+            if item.event not in EVENT_WEIGHTS or item.count <= 0:
+                continue
+            at = _utc_naive(item.at)
+            column = EVENT_COLUMNS[item.event]
+            for granularity in BUCKET_RETENTION:
+                counts = buckets.setdefault((item.song_id, granularity, bucket_start(at, granularity)), {})
+                counts[column] = counts.get(column, 0) + item.count
+            scopes = [GLOBAL_SCOPE]
+            if genre_scope(item.genre):
+                scopes.append(genre_scope(item.genre))
+            for timeframe in TIMEFRAMES.values():
+                increment = timeframe.log_score(EVENT_WEIGHTS[item.event] * item.count, at)
+                for scope in scopes:
+                    board = scores.setdefault((timeframe.name, scope), {})
+                    current = board.get(item.song_id)
+                    board[item.song_id] = increment if current is None else _logaddexp(current, increment)
+            recorded += item.count
+        if not recorded:
+            return 0
+
+        client = self._redis()
+        try:
+            self._write_buckets(db.session, buckets)
+            if client is None:
+                self._write_sql_scores(db.session, scores)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if client is not None:
+            self._write_redis_scores(client, scores)
+        return recorded
+
+    def _write_buckets(self, session, buckets: Dict[Tuple[int, str, datetime], Dict[str, int]]):
+        table = SongEngagementBucket.__table__
+        for (song_id, granularity, start), counts in buckets.items():
+            match = and_(table.c.song_id == song_id, table.c.granularity == granularity,
+                         table.c.bucket_start == start)
+            increments = {column: table.c[column] + value for column, value in counts.items()}
+            if session.execute(table.update().where(match).values(**increments)).rowcount:
+                continue
+            try:
+                with session.begin_nested():
+                    session.execute(table.insert().values(song_id=song_id, granularity=granularity,
+                                                       bucket_start=start, **counts))
+            except IntegrityError:
+                # Another writer created the bucket first
+                session.execute(table.update().where(match).values(**increments))
+
+    def _write_sql_scores(self, session, scores: Dict[Tuple[str, str], Dict[int, float]]):
+        table = SongTrendingScore.__table__
+        now = datetime.now(UTC)
+        for (timeframe, scope), board in scores.items():
+            existing = dict(session.execute(
+                select(table.c.song_id, table.c.score).where(
+                    table.c.timeframe == timeframe, table.c.scope == scope,
+                    table.c.song_id.in_(list(board))
+                ).with_for_update()
+            ).all())
+            for song_id, increment in board.items():
+                if song_id in existing:
+                    session.execute(table.update().where(
+                        table.c.timeframe == timeframe, table.c.scope == scope, table.c.song_id == song_id
+                    ).values(score=_logaddexp(existing[song_id], increment), updated_at=now))
+                else:
+                    session.execute(table.insert().values(timeframe=timeframe, scope=scope, song_id=song_id,
+                                                       score=increment, updated_at=now))
+
+    def _write_redis_scores(self, client, scores: Dict[Tuple[str, str], Dict[int, float]]):
+        try:
+            script = self._update_script(client)
+            pipe = client.pipeline(transaction=False)
+            for (timeframe, scope), board in scores.items():
+                args = [self.leaderboard_size]
+                for song_id, increment in board.items():
+                    args.extend([song_id, repr(increment)])
+                script(keys=[self._redis_key(timeframe, scope)], args=args, client=pipe)
+            pipe.execute()
+        except Exception as e:
+            # Buckets are already stored; the next rebuild restores the leaderboards
+            logger.warning(f"Failed to update trending leaderboards in Redis: {e}")
+
+    # Reading
+
+    def top(self, timeframe: str, limit: int, genre: Optional[str] = None,
+            now: Optional[datetime] = None) -> List[Tuple[int, float]]:
+        """
+        Highest-scoring songs of a leaderboard.
+
+        Args:
+            timeframe: One of TIMEFRAMES
+            limit: Number of songs to return
+            genre: Restrict to the leaderboard of this genre
+            now: Time the decayed scores are evaluated at
+
+        Returns:
+            (song id, decayed score) pairs, best first
+        """
+        spec = TIMEFRAMES[timeframe]
+        scope = genre_scope(genre) if genre else GLOBAL_SCOPE
+        if scope is None or limit <= 0:
+            return []
+        now = _utc_naive(now)
+
+        client = self._redis()
+        if client is not None:
+            try:
+                rows = client.zrevrange(self._redis_key(timeframe, scope), 0, limit - 1, withscores=True)
+                return [(int(member), spec.decayed(score, now)) for member, score in rows]
+            except Exception as e:
+                logger.warning(f"Failed to read trending leaderboard from Redis: {e}")
+                return [(song_id, spec.decayed(score, now))
+                        for song_id, score in self._bucket_scores(spec, scope, now, limit)]
+
+        table = SongTrendingScore.__table__
+        rows = db.session.execute(
+            select(table.c.song_id, table.c.score).where(
+                table.c.timeframe == timeframe, table.c.scope == scope,
+                table.c.score >= spec.prune_threshold(now)
+            ).order_by(table.c.score.desc(), table.c.song_id).limit(limit)
+        ).all()
+        return [(song_id, spec.decayed(score, now)) for song_id, score in rows]
+
+    def window_counts(self, song_ids: Iterable[int], timeframe: str,
+                      now: Optional[datetime] = None) -> Dict[int, Dict[str, int]]:
+        """Event counts of the given songs within the window of ``timeframe``."""
+        song_ids = list(song_ids)
+        if not song_ids:
+            return {}
+        spec = TIMEFRAMES[timeframe]
+        columns = list(EVENT_COLUMNS.values())
+        table = SongEngagementBucket.__table__
+        rows = db.session.execute(
+            select(table.c.song_id, *[func.sum(table.c[column]) for column in columns]).where(
+                table.c.song_id.in_(song_ids), table.c.granularity == spec.granularity,
+                table.c.bucket_start >= window_start(spec, _utc_naive(now))
+            ).group_by(table.c.song_id)
+        ).all()
+        return {row[0]: {column: int(value or 0) for column, value in zip(columns, row[1:])} for row in rows}
+
+    def _bucket_scores(self, spec: Timeframe, scope: str, now: datetime,
+                       limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Recompute log scores of one leaderboard from the engagement buckets."""
+        return self._all_bucket_scores(spec, now, scopes={scope}, limit=limit).get(scope, [])
+
+    def _all_bucket_scores(self, spec: Timeframe, now: datetime, scopes=None,
+                           limit: Optional[int] = None) -> Dict[str, List[Tuple[int, float]]]:
+        table = SongEngagementBucket.__table__
+        step = timedelta(hours=1) if spec.granularity == 'hour' else timedelta(days=1)
+        query = select(table.c.song_id, Song.genre, table.c.bucket_start,
+                       *[table.c[column] for column in EVENT_COLUMNS.values()]).join(
+            Song, Song.id == table.c.song_id
+        ).where(table.c.granularity == spec.granularity,
+                table.c.bucket_start >= window_start(spec, now),
+                Song.is_deleted == False)
+
+        boards: Dict[str, Dict[int, float]] = {}
+        for row in db.session.execute(query).yield_per(WRITE_BATCH_SIZE):
+            weight = sum(EVENT_WEIGHTS[event] * (count or 0)
+                         for event, count in zip(EVENT_COLUMNS, row[3:]))
+            if weight <= 0:
+                continue
+            # Events are assumed to sit in the middle of their bucket
+            score = spec.log_score(weight, min(row[2] + step / 2, now))
+            for scope in (GLOBAL_SCOPE, genre_scope(row[1])):
+                if scope is None or (scopes is not None and scope not in scopes):
+                    continue
+                board = boards.setdefault(scope, {})
+                current = board.get(row[0])
+                board[row[0]] = score if current is None else _logaddexp(current, score)
+
+        threshold = spec.prune_threshold(now)
+        result = {}
+        for scope, board in boards.items():
+            ranked = sorted(((song_id, score) for song_id, score in board.items() if score >= threshold),
+                            key=lambda item: (-item[1], item[0]))
+            result[scope] = ranked[:limit or self.leaderboard_size]
+        return result
+
+    # Maintenance
+
+    def rebuild(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Recompute every leaderboard from the engagement buckets."""
+        now = _utc_naive(now)
+        client = self._redis()
+        details = {'backend': 'redis' if client is not None else 'sql', 'leaderboards': 0, 'entries': 0}
+        for spec in TIMEFRAMES.values():
+            boards = self._all_bucket_scores(spec, now)
+            if client is not None:
+                self._replace_redis_leaderboards(client, spec, boards)
+            else:
+                self._replace_sql_leaderboards(spec, boards)
+            details['leaderboards'] += len(boards)
+            details['entries'] += sum(len(board) for board in boards.values())
+        logger.info(f"Rebuilt trending leaderboards: {details}")
+        return details
+
+    def _replace_redis_leaderboards(self, client, spec: Timeframe, boards: Dict[str, List[Tuple[int, float]]]):
+        pattern = self._redis_key(spec.name, '*')
+        stale = {key.decode() if isinstance(key, bytes) else key for key in client.scan_iter(match=pattern)}
+        pipe = client.pipeline(transaction=False)
+        for scope, board in boards.items():
+            key = self._redis_key(spec.name, scope)
+            stale.discard(key)
+            if board:
+                # Build aside and swap in, so readers never see a partial leaderboard
+                pipe.zadd(f"{key}:rebuild", {str(song_id): score for song_id, score in board})
+                pipe.rename(f"{key}:rebuild", key)
+        if stale:
+            pipe.unlink(*stale)
+        pipe.execute()
+
+    def _replace_sql_leaderboards(self, spec: Timeframe, boards: Dict[str, List[Tuple[int, float]]]):
+        table = SongTrendingScore.__table__
+        now = datetime.now(UTC)
+        rows = [{'timeframe': spec.name, 'scope': scope, 'song_id': song_id, 'score': score, 'updated_at': now}
+                for scope, board in boards.items() for song_id, score in board]
+        db.session.execute(table.delete().where(table.c.timeframe == spec.name))
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            db.session.execute(table.insert(), rows[start:start + WRITE_BATCH_SIZE])
+        db.session.commit()
+
+    def prune(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Drop songs that fell out of their leaderboards and expired buckets."""
+        now = _utc_naive(now)
+        details = {'pruned_entries': 0, 'deleted_buckets': 0}
+        client = self._redis()
+        if client is not None:
+            for spec in TIMEFRAMES.values():
+                for key in client.scan_iter(match=self._redis_key(spec.name, '*')):
+                    details['pruned_entries'] += client.zremrangebyscore(
+                        key, '-inf', f"({spec.prune_threshold(now)!r}"
+                    )
+
+        scores = SongTrendingScore.__table__
+        buckets = SongEngagementBucket.__table__
+        if client is None:
+            for spec in TIMEFRAMES.values():
+                details['pruned_entries'] += db.session.execute(scores.delete().where(
+                    scores.c.timeframe == spec.name, scores.c.score < spec.prune_threshold(now)
+                )).rowcount
+        for granularity, retention in BUCKET_RETENTION.items():
+            details['deleted_buckets'] += db.session.execute(buckets.delete().where(
+                buckets.c.granularity == granularity, buckets.c.bucket_start < now - retention
+            )).rowcount
+        db.session.commit()
+        logger.info(f"Pruned trending data: {details}")
+        return details
+
+
+# Global instance
+trending_engine = TrendingEngine()
+
+
+def record_engagement(song_id: int, event: str, count: int = 1, genre: Optional[str] = None):
+    """Record engagement on a song without letting a failure reach the caller."""
+    try:
+        trending_engine.record(song_id, event, count, genre)
+    except Exception as e:
+        logger.warning(f"Failed to record {event} engagement for song {song_id}: {e}")
@@ -0,0 +1,292 @@
+"""
+Delta-compressed storage for song version history.
+
+Every ``keyframe_interval`` versions of a song a full copy of the content is
+stored (a keyframe); the versions in between store a line-level diff against
+the version before them. Both are zlib compressed. Content is reconstructed
+on demand by replaying the diffs from the nearest keyframe, and reconstructed
+texts are kept in a small LRU cache keyed by their content hash, which stays
+valid because versions are never modified.
+
+Rows written before this scheme keep their full text in the legacy
+``content`` column until ``compact`` re-encodes them.
+"""
+
+import difflib
+import hashlib
+import json
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+from sqlalchemy.orm import load_only
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEYFRAME_INTERVAL = 20
+DEFAULT_CACHE_SIZE = 256
+ZLIB_LEVEL = 6  # Versions are written once and read rarely, so favour size
+
+# A delta is a list of operations applied to the lines of the previous version:
+# a positive int copies that many lines, a negative int skips that many lines
+# and a list of strings inserts those lines.
+DeltaOp = Union[int, List[str]]
+
+
+class VersionStorageError(ValueError):
+    """Raised when a stored version cannot be reconstructed."""
+
+
+def content_hash(content: str) -> str:
+    """SHA-256 hex digest identifying a version's content."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode('utf-8'), ZLIB_LEVEL)
+
+
+def decompress_text(payload: bytes) -> str:
+    return zlib.decompress(payload).decode('utf-8')
+
+
+def diff_lines(old: str, new: str) -> List[DeltaOp]:
+    """Line-level delta turning ``old`` into ``new``."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops: List[DeltaOp] = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append(new_lines[j1:j2])
+    return ops
+
+
+def apply_delta(old: str, ops: List[DeltaOp]) -> str:
+    """Apply a delta produced by ``diff_lines`` to ``old``."""
+    old_lines = old.splitlines(keepends=True)
+    result: List[str] = []
+    position = 0
+    for op in ops:
+        if isinstance(op, list):
+            result.extend(op)
+        elif op > 0:
+            if position + op > len(old_lines):
+                raise VersionStorageError("Delta copies past the end of its base version")
+            result.extend(old_lines[position:position + op])
+            position += op
+        else:
+            position -= op
+    if position != len(old_lines):
+        raise VersionStorageError("Delta does not consume its base version")
+    return ''.join(result)
+
+
+def encode_delta(old: str, new: str) -> bytes:
+    return zlib.compress(json.dumps(diff_lines(old, new), separators=(',', ':')).encode('utf-8'), ZLIB_LEVEL)
+
+
+def decode_delta(payload: bytes) -> List[DeltaOp]:
+    return json.loads(zlib.decompress(payload))
+
+
+class VersionStore:
+    """Writes and reconstructs delta-compressed song versions."""
+
+    def __init__(self, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        self.keyframe_interval = keyframe_interval
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'cache_hits': 0, 'cache_misses': 0, 'deltas_applied': 0, 'skipped_snapshots': 0}
+
+    def init_app(self, app):
+        """Configure keyframe spacing and cache size from the Flask app."""
+        self.keyframe_interval = max(1, int(app.config.get('SONG_VERSION_KEYFRAME_INTERVAL', self.keyframe_interval)))
+        self.cache_size = int(app.config.get('SONG_VERSION_CACHE_SIZE', self.cache_size))
+
+    # Cache
+
+    def _cached(self, digest: Optional[str]) -> Optional[str]:
+        if not digest:
+            return None
+        with self._lock:
+            content = self._cache.get(digest)
+            if content is not None:
+                self._cache.move_to_end(digest)
+            return content
+
+    def _remember(self, digest: str, content: str):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[digest] = content
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    # Writing
+
+    def encode(self, version, content: str, base: Optional[str] = None, keyframe_number: Optional[int] = None):
+        """
+        Store ``content`` on ``version``, as a delta against ``base`` (the
+        content of the previous version) when given, otherwise as a keyframe.
+        """
+        digest = content_hash(content)
+        if base is None:
+            version.keyframe_number = version.version_number
+            version.payload = compress_text(content)
+        else:
+            version.keyframe_number = keyframe_number
+            version.payload = encode_delta(base, content)
+        version.legacy_content = None
+        version.content_hash = digest
+        version.content_size = len(content)
+        self._remember(digest, content)
+
+    def latest(self, song_id: int):
+        """The newest version of a song, without its content."""
+        from .models import SongVersion
+        return SongVersion.query.options(load_only(
+            SongVersion.id, SongVersion.song_id, SongVersion.version_number, SongVersion.title,
+            SongVersion.content_hash, SongVersion.keyframe_number
+        )).filter_by(song_id=song_id).order_by(SongVersion.version_number.desc()).first()
+
+    def snapshot(self, song, user_id: int, version_note: Optional[str] = None):
+        """
+        Add a version capturing the song's current title and content to the
+        session. Returns None without writing when the newest version already
+        holds exactly this state.
+        """
+        from .models import SongVersion
+        content = song.content or ''
+        digest = content_hash(content)
+        latest = self.latest(song.id)
+        if latest is not None and latest.content_hash == digest and latest.title == song.title:
+            self.stats['skipped_snapshots'] += 1
+            return None
+
+        version = SongVersion(
+            song_id=song.id,
+            version_number=latest.version_number + 1 if latest else 1,
+            title=song.title,
+            content=None,
+            created_by=user_id,
+            version_note=version_note
+        )
+        if (latest is not None and latest.keyframe_number is not None
+                and version.version_number - latest.keyframe_number < self.keyframe_interval):
+            self.encode(version, content, base=self.content_of(latest), keyframe_number=latest.keyframe_number)
+        else:
+            self.encode(version, content)
+        db.session.add(version)
+        return version
+
+    # Reading
+
+    def content_of(self, version) -> str:
+        """Reconstruct the full content of a version."""
+        from .models import SongVersion
+        if version.content_hash is None:
+            return version.legacy_content
+
+        cached = self._cached(version.content_hash)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+        self.stats['cache_misses'] += 1
+
+        if version.keyframe_number == version.version_number:
+            content = decompress_text(version.payload)
+            self._remember(version.content_hash, content)
+            return content
+
+        chain = SongVersion.query.options(load_only(
+            SongVersion.version_number, SongVersion.keyframe_number,
+            SongVersion.content_hash, SongVersion.payload
+        )).filter(
+            SongVersion.song_id == version.song_id,
+            SongVersion.version_number >= version.keyframe_number,
+            SongVersion.version_number <= version.version_number
+        ).order_by(SongVersion.version_number).all()
+
+        expected = version.version_number - version.keyframe_number + 1
+        if len(chain) != expected or chain[0].keyframe_number != chain[0].version_number:
+            raise VersionStorageError(
+                f"Version {version.version_number} of song {version.song_id} has a broken delta chain"
+            )
+
+        # Start from the newest version already in the cache, if any
+        start, content = 0, None
+        for index in range(len(chain) - 1, -1, -1):
+            content = self._cached(chain[index].content_hash)
+            if content is not None:
+                start = index
+                break
+        if content is None:
+            content = decompress_text(chain[0].payload)
+
+        for row in chain[start + 1:]:
+            content = apply_delta(content, decode_delta(row.payload))
+            self.stats['deltas_applied'] += 1
+            self._remember(row.content_hash, content)
+
+        if content_hash(content) != version.content_hash:
+            raise VersionStorageError(
+                f"Version {version.version_number} of song {version.song_id} does not match its content hash"
+            )
+        return content
+
+    # Maintenance
+
+    def compact(self, song_id: int) -> Dict[str, Any]:
+        """Re-encode a song's legacy full-text versions as keyframes and deltas."""
+        from .models import SongVersion
+        versions = SongVersion.query.filter_by(song_id=song_id).order_by(SongVersion.version_number).all()
+        if all(version.content_hash is not None for version in versions):
+            return {'versions': 0}
+
+        contents = [self.content_of(version) for version in versions]
+        previous, keyframe_number = None, None
+        for version, content in zip(versions, contents):
+            if keyframe_number is None or version.version_number - keyframe_number >= self.keyframe_interval:
+                self.encode(version, content)
+                keyframe_number = version.version_number
+            else:
+                self.encode(version, content, base=previous, keyframe_number=keyframe_number)
+            previous = content
+        db.session.commit()
+        return {'versions': len(versions)}
+
+    def compact_legacy(self, batch_size: int = 100) -> Dict[str, Any]:
+        """Compact up to ``batch_size`` songs that still have legacy versions."""
+        from .models import SongVersion
+        song_ids = [row[0] for row in db.session.query(SongVersion.song_id)
+                    .filter(SongVersion.content_hash.is_(None))
+                    .distinct().limit(batch_size).all()]
+        compacted = 0
+        for song_id in song_ids:
+            try:
+                compacted += self.compact(song_id)['versions']
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to compact versions of song {song_id}: {e}")
+        return {'songs': len(song_ids), 'versions': compacted}
+
+
+# Global instance
+version_store = VersionStore()
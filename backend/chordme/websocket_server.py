@@ -14,6 +14,9 @@ from .rate_limiter import rate_limiter
 # Setup logging
 logger = logging.getLogger(__name__)
 
+# Private room every authenticated session of a user joins, for server pushes
+USER_ROOM_PREFIX = 'user:'
+
 class WebSocketServer:
     """WebSocket server with Socket.IO for real-time collaboration."""
     
@@ -240,6 +243,8 @@ class WebSocketServer:
                     'email': payload.get('email', ''),
                 })
                 
+                join_room(self.user_room(payload['user_id']))
+                
                 emit('authenticated', {
                     'message': 'Successfully authenticated',
                     'user_id': payload['user_id']
@@ -274,7 +279,8 @@ class WebSocketServer:
             room_id = data['room_id']
             
             # Validate room_id format (should be song ID)
-            if not room_id or not isinstance(room_id, str) or len(room_id) > 50:
+            if (not room_id or not isinstance(room_id, str) or len(room_id) > 50
+                    or room_id.startswith(USER_ROOM_PREFIX)):
                 emit('error', {'message': 'Invalid room ID'})
                 return
             
@@ -465,6 +471,16 @@ class WebSocketServer:
         emit('room_left', {'room_id': room_id})
         logger.info(f"User {user_id} left room {room_id}")
     
+    @staticmethod
+    def user_room(user_id) -> str:
+        return f"{USER_ROOM_PREFIX}{user_id}"
+    
+    def emit_to_user(self, user_id, event: str, data: Dict[str, Any]):
+        """Push an event to every authenticated session of a user, on any instance."""
+        if self.socketio is None:
+            return
+        self.socketio.emit(event, data, room=self.user_room(user_id))
+    
     def get_room_participants(self, room_id: str) -> Set[str]:
         """Get the set of participants in a room."""
         return self.room_participants.get(room_id, set())
@@ -96,6 +96,37 @@ CACHE_WARM_ON_STARTUP = os.environ.get('CACHE_WARM_ON_STARTUP', 'True').lower()
 CACHE_INVALIDATION_STRATEGY = os.environ.get('CACHE_INVALIDATION_STRATEGY', 'smart')  # smart, manual, time_based
 CACHE_CLUSTER_MODE = os.environ.get('CACHE_CLUSTER_MODE', 'False').lower() == 'true'
 
+# Write-behind song view/favorite counters
+COUNTER_FLUSH_INTERVAL = float(os.environ.get('COUNTER_FLUSH_INTERVAL', 5.0))  # seconds between batched flushes
+COUNTER_MAX_PENDING = int(os.environ.get('COUNTER_MAX_PENDING', 10000))  # pending songs that force a flush
+
+# Delta-compressed song version history
+SONG_VERSION_KEYFRAME_INTERVAL = int(os.environ.get('SONG_VERSION_KEYFRAME_INTERVAL', 20))  # versions per full copy
+SONG_VERSION_CACHE_SIZE = int(os.environ.get('SONG_VERSION_CACHE_SIZE', 256))  # reconstructed versions kept in memory
+
+# Asynchronous PDF export jobs
+PDF_JOB_WORKERS = int(os.environ.get('PDF_JOB_WORKERS', 4))  # jobs running at once
+PDF_RENDER_PROCESSES = int(os.environ.get('PDF_RENDER_PROCESSES', os.cpu_count() or 1))  # 0 renders on the job threads
+PDF_MAX_JOBS_PER_USER = int(os.environ.get('PDF_MAX_JOBS_PER_USER', 2))  # running jobs per user; the rest wait
+PDF_PROGRESS_DB_INTERVAL = float(os.environ.get('PDF_PROGRESS_DB_INTERVAL', 5.0))  # seconds between progress writes to the job row
+PDF_CANCEL_SYNC_INTERVAL = float(os.environ.get('PDF_CANCEL_SYNC_INTERVAL', 2.0))  # seconds between checks for jobs cancelled by other processes
+
+# Content-addressed cache of rendered PDFs
+PDF_ARTIFACT_CACHE_ENABLED = os.environ.get('PDF_ARTIFACT_CACHE_ENABLED', 'True').lower() == 'true'
+PDF_ARTIFACT_CACHE_DIR = os.environ.get('PDF_ARTIFACT_CACHE_DIR')  # defaults to <instance>/cache/pdf_artifacts
+PDF_ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get('PDF_ARTIFACT_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # evicts LRU beyond this
+
+# Asynchronous security audit log pipeline
+AUDIT_PIPELINE_ENABLED = os.environ.get('AUDIT_PIPELINE_ENABLED', 'True').lower() == 'true'  # False writes on the request thread
+AUDIT_SINKS = os.environ.get('AUDIT_SINKS', 'log')  # comma-separated: log, file, database
+AUDIT_LOG_FILE = os.environ.get('AUDIT_LOG_FILE')  # JSON lines file for the file sink
+AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))  # queued entries before the overflow policy applies
+AUDIT_OVERFLOW_POLICY = os.environ.get('AUDIT_OVERFLOW_POLICY', 'sample')  # sample, drop, block
+AUDIT_SAMPLE_RATE = int(os.environ.get('AUDIT_SAMPLE_RATE', 10))  # keep one in N INFO events while sampling
+AUDIT_BLOCK_TIMEOUT = float(os.environ.get('AUDIT_BLOCK_TIMEOUT', 0.1))  # seconds a request waits for space under 'block'
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))  # entries written at once
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))  # seconds the writer waits to fill a batch
+
 # Base URL for redirects and metadata
 BASE_URL = os.environ.get('BASE_URL', 'http://localhost:5000')
 
@@ -0,0 +1,44 @@
+"""
+Entry points of the PDF render processes used by chordme.pdf_job_manager.
+
+Render processes are spawned, and a spawned process imports the module of
+every function it runs. Importing any module under ``chordme`` first runs
+chordme/__init__.py, which boots the whole Flask app, imports every route
+module and starts its background threads: the maintenance scheduler, the
+audit pipeline and the counter flushers. This module therefore lives outside
+the package. In a render process it registers ``chordme`` as a bare package
+before importing the PDF generator, so only the PDF modules and ReportLab
+are loaded. In the app process ``chordme`` is already imported and is used
+as is.
+"""
+
+import os
+import sys
+import types
+from typing import Dict, List
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chordme')
+
+
+def _pdf_generator():
+    if 'chordme' not in sys.modules:
+        package = types.ModuleType('chordme')
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules['chordme'] = package
+    from chordme import pdf_generator
+    return pdf_generator
+
+
+def warm_pdf_generators():
+    """Render process initializer; see chordme.pdf_generator.warm_pdf_generators."""
+    _pdf_generator().warm_pdf_generators()
+
+
+def render_song_pdf(song: Dict, options: Dict) -> bytes:
+    """Render one song of an export job; see chordme.pdf_generator.render_song_pdf."""
+    return _pdf_generator().render_song_pdf(song, options)
+
+
+def render_multi_song_pdf(songs: List[Dict], options: Dict) -> bytes:
+    """Render a songbook of an export job; see chordme.pdf_generator.render_multi_song_pdf."""
+    return _pdf_generator().render_multi_song_pdf(songs, options)
@@ -1,8 +1,12 @@
-from chordme.api import *
-from chordme import app
-from chordme.websocket_server import websocket_server
 import os
 
+# Spawned PDF render processes re-import this script as __mp_main__; they must
+# not boot the app (see pdf_render_worker).
+if __name__ != '__mp_main__':
+    from chordme.api import *
+    from chordme import app
+    from chordme.websocket_server import websocket_server
+
 if __name__ == '__main__':
     # Get configuration from environment variables
     debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() in ('true', '1', 'yes', 'on')
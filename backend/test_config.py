@@ -7,3 +7,4 @@ JWT_SECRET_KEY = 'test-jwt-secret-key'
 JWT_EXPIRATION_DELTA = 3600
 TESTING = True
 WTF_CSRF_ENABLED = False
+PDF_ARTIFACT_CACHE_ENABLED = False
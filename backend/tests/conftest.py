@@ -11,6 +11,14 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 
+@pytest.fixture(autouse=True, scope='session')
+def disable_pdf_artifact_cache():
+    """Keep test renders, often from a mocked generator, out of the instance PDF cache."""
+    from chordme import app
+    app.config['PDF_ARTIFACT_CACHE_ENABLED'] = False
+    yield
+
+
 @pytest.fixture
 def app():
     """Create a test app instance using the real application."""
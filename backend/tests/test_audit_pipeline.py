@@ -0,0 +1,168 @@
+"""
+Tests for the asynchronous, batched security audit log pipeline.
+"""
+
+import json
+import logging
+import threading
+from unittest.mock import patch
+
+from chordme import db
+from chordme.audit_pipeline import AuditLogPipeline, DatabaseAuditSink, FileAuditSink
+from chordme.models import SecurityAuditEvent
+from chordme.permission_helpers import SecurityAuditLogger
+
+
+class RecordingSink:
+    """Collects written batches, optionally holding the writer until released."""
+
+    def __init__(self, hold=False):
+        self.batches = []
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def write(self, entries):
+        self.release.wait(5)
+        self.batches.append(list(entries))
+
+
+def entry(n, severity='INFO'):
+    return {'timestamp': '2026-01-01T00:00:00+00:00', 'event_type': f'EVENT_{n}', 'user_id': n,
+            'ip_address': '10.0.0.1', 'user_agent': 'test', 'details': {'n': n}, 'severity': severity}
+
+
+def blocked_pipeline(**options):
+    """A pipeline whose writer holds its first entry, so the queue fills up."""
+    sink = RecordingSink(hold=True)
+    pipeline = AuditLogPipeline(sinks=[sink], batch_size=1, flush_interval=0, **options)
+    pipeline.submit(entry(0))
+    while pipeline._queue.qsize():
+        pass
+    return pipeline, sink
+
+
+class TestAuditLogPipeline:
+    """Test batching, overflow policies and shutdown."""
+
+    def test_entries_are_written_in_batches(self):
+        sink = RecordingSink()
+        pipeline = AuditLogPipeline(sinks=[sink], batch_size=4, flush_interval=5)
+        for n in range(10):
+            assert pipeline.submit(entry(n))
+        assert pipeline.flush()
+
+        assert [e['event_type'] for batch in sink.batches for e in batch] == [f'EVENT_{n}' for n in range(10)]
+        assert all(len(batch) <= 4 for batch in sink.batches)
+        stats = pipeline.get_stats()
+        assert (stats['enqueued'], stats['written'], stats['dropped']) == (10, 10, 0)
+        pipeline.shutdown()
+
+    def test_drop_policy(self):
+        pipeline, sink = blocked_pipeline(queue_size=2, overflow_policy='drop')
+        for n in range(1, 6):
+            pipeline.submit(entry(n))
+
+        stats = pipeline.get_stats()
+        assert (stats['enqueued'], stats['dropped'], stats['queue_depth']) == (3, 3, 2)
+        assert stats['high_water'] == 2
+        sink.release.set()
+        pipeline.shutdown()
+        assert [batch[0]['user_id'] for batch in sink.batches] == [0, 1, 2]
+
+    def test_sample_policy_keeps_severe_events(self):
+        pipeline, sink = blocked_pipeline(queue_size=10, overflow_policy='sample', sample_rate=3)
+        for n in range(1, 9):
+            pipeline.submit(entry(n))
+        for n in range(9, 21):
+            pipeline.submit(entry(n, 'INFO' if n % 2 else 'CRITICAL'))
+
+        stats = pipeline.get_stats()
+        assert stats['sampled_out'] == 4
+        assert stats['dropped'] == 6
+        sink.release.set()
+        pipeline.shutdown()
+        written = [e for batch in sink.batches for e in batch]
+        assert [e['user_id'] for e in written if e['severity'] == 'CRITICAL'] == [10, 12]
+        assert len(written) == 11
+
+    def test_block_policy_waits_then_drops(self):
+        pipeline, sink = blocked_pipeline(queue_size=1, overflow_policy='block', block_timeout=0.01)
+        pipeline.submit(entry(1))
+        pipeline.submit(entry(2))
+
+        stats = pipeline.get_stats()
+        assert (stats['blocked'], stats['dropped']) == (1, 1)
+        assert stats['blocked_seconds'] > 0
+        sink.release.set()
+        pipeline.shutdown()
+
+    def test_shutdown_writes_queued_entries(self):
+        sink = RecordingSink()
+        pipeline = AuditLogPipeline(sinks=[sink], batch_size=100, flush_interval=60)
+        for n in range(5):
+            pipeline.submit(entry(n))
+        pipeline.shutdown()
+
+        assert sum(len(batch) for batch in sink.batches) == 5
+        assert not pipeline._writer_alive()
+
+    def test_failing_sink_does_not_stop_others(self):
+        class FailingSink:
+            def write(self, entries):
+                raise IOError('disk full')
+
+        sink = RecordingSink()
+        pipeline = AuditLogPipeline(sinks=[FailingSink(), sink])
+        pipeline.submit(entry(1))
+        pipeline.shutdown()
+
+        assert len(sink.batches) == 1
+        assert pipeline.get_stats()['failed_batches'] == 1
+
+
+class TestAuditSinks:
+    """Test the file and database sinks."""
+
+    def test_file_sink_appends_json_lines(self, tmp_path):
+        path = tmp_path / 'audit.log'
+        sink = FileAuditSink(str(path))
+        sink.write([entry(1), entry(2)])
+        sink.write([entry(3, 'CRITICAL')])
+
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [line['user_id'] for line in lines] == [1, 2, 3]
+        assert lines[2]['severity'] == 'CRITICAL'
+
+    def test_database_sink_inserts_batch(self, client):
+        DatabaseAuditSink().write([entry(1), entry(2, 'WARNING')])
+
+        events = SecurityAuditEvent.query.order_by(SecurityAuditEvent.id).all()
+        assert [(e.event_type, e.severity, e.details) for e in events] == \
+            [('EVENT_1', 'INFO', {'n': 1}), ('EVENT_2', 'WARNING', {'n': 2})]
+        SecurityAuditEvent.query.delete()
+        db.session.commit()
+
+
+class TestSecurityAuditLoggerSubmission:
+    """Test the request thread only enqueues when the pipeline is active."""
+
+    def test_event_is_enqueued_not_written(self, app):
+        sink = RecordingSink()
+        pipeline = AuditLogPipeline(sinks=[sink])
+        with app.test_request_context(environ_base={'REMOTE_ADDR': '10.1.2.3'}), \
+                patch('chordme.permission_helpers.audit_pipeline', pipeline), \
+                patch.object(SecurityAuditLogger, 'write_log_entries') as write_log_entries:
+            result = SecurityAuditLogger.log_security_event('QUEUED', {'a': 1}, user_id=7)
+            write_log_entries.assert_not_called()
+        pipeline.shutdown()
+
+        assert result['ip_address'] == '10.1.2.3'
+        assert sink.batches == [[result]]
+
+    def test_disabled_pipeline_writes_synchronously(self, app, caplog):
+        with app.app_context(), caplog.at_level(logging.INFO):
+            result = SecurityAuditLogger.log_security_event('NO_REQUEST', {'a': 1}, user_id=7)
+
+        assert result['ip_address'] is None
+        assert 'SECURITY_AUDIT: NO_REQUEST | User: 7' in caplog.text
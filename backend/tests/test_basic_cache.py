@@ -202,6 +202,519 @@ class TestBasicCacheService:
         assert cache_service.get("key2", namespace="ns1") is None
         assert cache_service.get("key3", namespace="ns2") is None
 
+    
+    def test_lru_cache_is_bounded(self):
+        """Test that the in-memory LRU evicts least recently used entries."""
+        from chordme.cache_service import LRUCache
+        cache = LRUCache(max_entries=3)
+        
+        for i in range(3):
+            cache.set(f"key{i}", i + 1, ttl=60)
+        cache.get("key0")  # Refresh key0 so key1 is the oldest
+        cache.set("key3", 4, ttl=60)
+        
+        assert len(cache) == 3
+        assert cache.get("key1") is None
+        assert cache.get("key0") == 1
+        assert cache.evictions == 1
+    
+    def test_lru_cache_expires_entries(self):
+        """Test that the in-memory LRU honours TTLs."""
+        from chordme.cache_service import LRUCache
+        cache = LRUCache(max_entries=3)
+        
+        cache.set("key", "value", ttl=60)
+        with patch('chordme.cache_service.time.time', return_value=time.time() + 61):
+            assert cache.get("key") is None
+        assert len(cache) == 0
+    
+    def test_digest_key_is_stable(self):
+        """Test that digest keys ignore dict ordering and are process independent."""
+        from chordme.cache_service import digest_key
+        
+        first = digest_key({"query": "grace", "tags": ["a", "b"], "limit": 20})
+        second = digest_key({"limit": 20, "tags": ["a", "b"], "query": "grace"})
+        
+        assert first == second
+        assert first == digest_key({"query": "grace", "tags": ["a", "b"], "limit": 20})
+        assert first != digest_key({"query": "grace", "tags": ["b", "a"], "limit": 20})
+        assert len(first) == 32
+
+
+
+class FakeRedisBus:
+    """Minimal shared Redis stand-in: a key space plus pub/sub delivered inline."""
+    
+    def __init__(self):
+        self.store = {}
+        self.subscribers = {}
+        self.expirations = {}
+        self.gets = 0
+        self.scans = 0
+    
+    def client(self):
+        return FakeRedisClient(self)
+
+
+class FakeRedisClient:
+    def __init__(self, bus):
+        self.bus = bus
+    
+    def get(self, key):
+        self.bus.gets += 1
+        return self.bus.store.get(key)
+    
+    def mget(self, keys):
+        self.bus.gets += 1
+        return [self.bus.store.get(key) for key in keys]
+    
+    def setex(self, key, ttl, value):
+        self.bus.store[key] = value
+        return True
+    
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.bus.store:
+            return None
+        self.bus.store[key] = value
+        return True
+    
+    def eval(self, script, numkeys, key, token):
+        # Compare-and-delete lock release
+        if self.bus.store.get(key) == token:
+            del self.bus.store[key]
+            return 1
+        return 0
+    
+    def delete(self, *keys):
+        return sum(self.bus.store.pop(key, None) is not None for key in keys)
+    
+    def unlink(self, *keys):
+        return self.delete(*keys)
+    
+    def expire(self, key, ttl):
+        self.bus.expirations[key] = ttl
+        return key in self.bus.store
+    
+    def scan_iter(self, match=None, count=None):
+        import fnmatch
+        self.bus.scans += 1
+        return iter([key for key in list(self.bus.store) if fnmatch.fnmatchcase(key, match)])
+    
+    def keys(self, pattern):
+        raise AssertionError("KEYS blocks Redis")
+    
+    def sadd(self, key, *members):
+        existing = self.bus.store.setdefault(key, set())
+        before = len(existing)
+        existing.update(m.encode() for m in members)
+        return len(existing) - before
+    
+    def srem(self, key, *members):
+        existing = self.bus.store.get(key, set())
+        removed = sum(m.encode() in existing for m in members)
+        existing.difference_update(m.encode() for m in members)
+        if not existing:
+            self.bus.store.pop(key, None)
+        return removed
+    
+    def smembers(self, key):
+        return set(self.bus.store.get(key, set()))
+    
+    def sscan_iter(self, key, count=None):
+        return iter(list(self.bus.store.get(key, set())))
+    
+    def rename(self, key, new_key):
+        from redis.exceptions import ResponseError
+        if key not in self.bus.store:
+            raise ResponseError("no such key")
+        self.bus.store[new_key] = self.bus.store.pop(key)
+        return True
+    
+    def pipeline(self, transaction=True):
+        client = self
+        
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+            
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+            
+            def execute(self):
+                return [getattr(client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+        
+        return Pipeline()
+    
+    def info(self):
+        return {}
+    
+    def publish(self, channel, message):
+        for handler in self.bus.subscribers.get(channel, []):
+            handler({"type": "message", "channel": channel, "data": message.encode()})
+        return len(self.bus.subscribers.get(channel, []))
+    
+    def pubsub(self, **kwargs):
+        bus = self.bus
+        
+        class PubSub:
+            def subscribe(self, **handlers):
+                for channel, handler in handlers.items():
+                    bus.subscribers.setdefault(channel, []).append(handler)
+            
+            def run_in_thread(self, **kwargs):
+                return MagicMock()
+        
+        return PubSub()
+
+
+class TestTwoTierCache:
+    """Test the per-worker L1 in front of a shared Redis L2."""
+    
+    @pytest.fixture
+    def bus(self):
+        return FakeRedisBus()
+    
+    def make_worker(self, bus, **overrides):
+        from chordme.cache_service import CacheService
+        config = CacheConfig(key_prefix="test", warm_cache_on_startup=False, **overrides)
+        config.enabled = False  # Skip connecting; the shared client is attached below
+        worker = CacheService(config)
+        worker.redis_client = bus.client()
+        return worker
+    
+    def test_l1_serves_repeated_reads(self, bus):
+        worker = self.make_worker(bus)
+        worker.set("popular", [1, 2, 3], namespace="songs")
+        
+        for _ in range(5):
+            assert worker.get("popular", namespace="songs") == [1, 2, 3]
+        
+        assert bus.gets == 0
+        assert worker.metrics.l1_hits == 5
+    
+    def test_l2_hit_populates_l1(self, bus):
+        writer = self.make_worker(bus)
+        reader = self.make_worker(bus)
+        writer.set("popular", {"id": 1}, namespace="songs")
+        
+        assert reader.get("popular", namespace="songs") == {"id": 1}
+        assert reader.get("popular", namespace="songs") == {"id": 1}
+        
+        metrics = reader.get_metrics()
+        assert bus.gets == 1
+        assert metrics["l2_hits"] == 1
+        assert metrics["l1_hits"] == 1
+        assert metrics["l1_hit_rate"] == 0.5
+        assert metrics["l2_hit_rate"] == 1.0
+    
+    def test_l1_values_are_not_shared_objects(self, bus):
+        worker = self.make_worker(bus)
+        worker.set("song", {"title": "Grace"})
+        
+        worker.get("song")["title"] = "Changed"
+        
+        assert worker.get("song") == {"title": "Grace"}
+    
+    def test_delete_evicts_other_workers(self, bus):
+        first = self.make_worker(bus)
+        second = self.make_worker(bus)
+        first.set("song:1", "v1")
+        assert second.get("song:1") == "v1"
+        
+        first.delete("song:1")
+        
+        assert second.get("song:1") is None
+        assert second.metrics.invalidations_received == 1
+    
+    def test_set_evicts_stale_copies(self, bus):
+        first = self.make_worker(bus)
+        second = self.make_worker(bus)
+        first.set("song:1", "v1")
+        assert second.get("song:1") == "v1"
+        
+        first.set("song:1", "v2")
+        
+        assert second.get("song:1") == "v2"
+    
+    def test_tag_and_pattern_invalidation_evict_other_workers(self, bus):
+        first = self.make_worker(bus)
+        second = self.make_worker(bus)
+        first.set("a", 1, namespace="songs", tags=["song_list"])
+        first.set("b", 2, namespace="songs")
+        assert second.get("a", namespace="songs") == 1
+        assert second.get("b", namespace="songs") == 2
+        
+        first.invalidate_by_tags(["song_list"])
+        assert second.get("a", namespace="songs") is None
+        assert second.get("b", namespace="songs") == 2
+        
+        first.clear_all(namespace="songs")
+        assert second.get("b", namespace="songs") is None
+    
+    def test_namespace_budgets(self, bus):
+        worker = self.make_worker(bus, l1_namespace_max_entries=2,
+                                  l1_namespace_budgets={"search": 1, "health": 0})
+        for i in range(3):
+            worker.set(f"s{i}", i, namespace="search")
+            worker.set(f"p{i}", i, namespace="songs")
+        worker.set("ping", "ok", namespace="health")
+        
+        stats = worker.l1_cache.stats()
+        assert stats["search"]["entries"] == 1
+        assert stats["songs"]["entries"] == 2
+        assert stats["health"]["entries"] == 0
+        # Entries evicted from L1 are still served by Redis
+        assert worker.get("s0", namespace="search") == 0
+    
+    def test_l1_entries_expire(self, bus):
+        worker = self.make_worker(bus, l1_ttl=5)
+        worker.set("song", "v1")
+        bus.store[worker._make_key("song")] = worker._serialize_value("v2")
+        
+        assert worker.get("song") == "v1"
+        with patch('chordme.cache_service.time.time', return_value=time.time() + 6):
+            assert worker.get("song") == "v2"
+    
+    def test_fallback_cache_unused_while_redis_is_up(self, bus):
+        worker = self.make_worker(bus)
+        worker.set("song", "v1")
+        
+        assert len(worker.fallback_cache) == 0
+
+    
+    def test_tags_are_shared_between_workers(self, bus):
+        first = self.make_worker(bus)
+        second = self.make_worker(bus)
+        first.set("a", 1, namespace="songs", tags=["model:Song"])
+        first.set("b", 2, namespace="songs", tags=["model:Song", "queries"])
+        first.set("c", 3, namespace="songs", tags=["model:User"])
+        
+        assert second.invalidate_by_tags(["model:Song"]) == 2
+        
+        assert first.get("a", namespace="songs") is None
+        assert first.get("b", namespace="songs") is None
+        assert first.get("c", namespace="songs") == 3
+        assert "test:_tag:model:Song" not in bus.store
+        assert "test:_keytags:test:songs:b" not in bus.store
+    
+    def test_tag_index_ttls_are_bounded(self, bus):
+        worker = self.make_worker(bus, max_ttl=3600)
+        worker.set("a", 1, ttl=60, tags=["queries"])
+        
+        assert bus.expirations["test:_tag:queries"] == 3600
+        assert bus.expirations["test:_keytags:test:a"] == 60
+    
+    def test_delete_uses_reverse_index(self, bus):
+        worker = self.make_worker(bus)
+        worker.set("a", 1, tags=["queries", "model:Song"])
+        worker.set("b", 2, tags=["queries"])
+        
+        worker.delete("a")
+        
+        assert bus.store["test:_tag:queries"] == {b"test:b"}
+        assert "test:_tag:model:Song" not in bus.store
+        assert "test:_keytags:test:a" not in bus.store
+    
+    def test_pattern_invalidation_scans_in_batches(self, bus):
+        worker = self.make_worker(bus, scan_batch_size=2)
+        for i in range(5):
+            worker.set(f"list:{i}", i, namespace="songs")
+        worker.set("other", 1, namespace="songs")
+        
+        assert worker.invalidate_pattern("list:*", namespace="songs") == 5
+        
+        assert bus.scans == 1
+        assert worker.get("other", namespace="songs") == 1
+
+
+class TestStampedeProtection:
+    """Test single-flight, stale-while-revalidate and early refresh in get_or_set."""
+    
+    def make_service(self, bus=None, **overrides):
+        from chordme.cache_service import CacheService
+        config = CacheConfig(key_prefix="test", warm_cache_on_startup=False, **overrides)
+        config.enabled = False
+        service = CacheService(config)
+        if bus is not None:
+            service.redis_client = bus.client()
+        return service
+    
+    def test_concurrent_misses_compute_once(self):
+        import threading
+        service = self.make_service()
+        calls = []
+        
+        def expensive():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"songs": [1, 2]}
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(service.get_or_set("popular", expensive)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(calls) == 1
+        assert results == [{"songs": [1, 2]}] * 8
+        assert service.metrics.coalesced_requests == 7
+    
+    def test_waits_for_other_worker(self):
+        import threading
+        bus = FakeRedisBus()
+        first = self.make_service(bus, lock_wait_timeout=2.0, lock_poll_interval=0.01)
+        second = self.make_service(bus)
+        bus.store["test:popular:lock"] = "other-worker"
+        
+        def other_worker_finishes():
+            time.sleep(0.1)
+            second.set("popular", "computed elsewhere")
+        
+        thread = threading.Thread(target=other_worker_finishes)
+        thread.start()
+        result = first.get_or_set("popular", lambda: pytest.fail("should not recompute"))
+        thread.join()
+        
+        assert result == "computed elsewhere"
+        assert first.metrics.coalesced_requests == 1
+    
+    def test_lock_wait_timeout_recomputes(self):
+        bus = FakeRedisBus()
+        service = self.make_service(bus, lock_wait_timeout=0.05, lock_poll_interval=0.01)
+        bus.store["test:popular:lock"] = "stuck-worker"
+        
+        assert service.get_or_set("popular", lambda: "fresh") == "fresh"
+        assert service.metrics.lock_timeouts == 1
+    
+    def test_stale_value_served_while_refreshing_elsewhere(self):
+        bus = FakeRedisBus()
+        service = self.make_service(bus, l1_enabled=False)
+        service.get_or_set("popular", lambda: "v1", ttl=10, stale_ttl=60)
+        bus.store["test:popular:lock"] = "other-worker"
+        
+        with patch('chordme.cache_service.time.time', return_value=time.time() + 20):
+            assert service.get_or_set("popular", lambda: "v2", ttl=10) == "v1"
+        assert service.metrics.stale_hits == 1
+        
+        del bus.store["test:popular:lock"]
+        with patch('chordme.cache_service.time.time', return_value=time.time() + 20):
+            assert service.get_or_set("popular", lambda: "v2", ttl=10) == "v2"
+        assert service.get("popular") == "v2"
+    
+    def test_failed_refresh_serves_stale_value(self):
+        service = self.make_service()
+        service.get_or_set("popular", lambda: "v1", ttl=10, stale_ttl=60)
+        
+        def broken():
+            raise RuntimeError("database down")
+        
+        with patch('chordme.cache_service.time.time', return_value=time.time() + 20):
+            assert service.get_or_set("popular", broken, ttl=10) == "v1"
+    
+    def test_early_refresh(self):
+        service = self.make_service()
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.01)
+            return len(calls)
+        
+        service.get_or_set("popular", compute, ttl=60)
+        assert service.get_or_set("popular", compute, ttl=60, early_refresh_beta=0) == 1
+        
+        # A huge beta makes a refresh certain long before expiry
+        assert service.get_or_set("popular", compute, ttl=60, early_refresh_beta=1e6) == 2
+        assert service.metrics.early_refreshes == 1
+    
+    def test_plain_values_are_not_wrapped(self):
+        service = self.make_service()
+        service.set("song", {"title": "Grace"})
+        
+        assert service.get_or_set("song", lambda: pytest.fail("cached")) == {"title": "Grace"}
+        service.get_or_set("other", lambda: {"title": "Hymn"})
+        assert service.get("other") == {"title": "Hymn"}
+
+
+class TestBatchOperations:
+    """Test get_many/set_many/delete_many and the per-item loader."""
+    
+    @pytest.fixture
+    def bus(self):
+        return FakeRedisBus()
+    
+    def make_service(self, bus=None, **overrides):
+        from chordme.cache_service import CacheService
+        config = CacheConfig(key_prefix="test", warm_cache_on_startup=False, **overrides)
+        config.enabled = False
+        service = CacheService(config)
+        if bus is not None:
+            service.redis_client = bus.client()
+        return service
+    
+    def test_get_many_returns_partial_hits_in_one_round_trip(self, bus):
+        service = self.make_service(bus, l1_enabled=False)
+        service.set_many({f"song:{i}": {"id": i} for i in range(0, 50, 2)}, namespace="songs")
+        
+        found = service.get_many([f"song:{i}" for i in range(50)], namespace="songs")
+        
+        assert bus.gets == 1
+        assert sorted(found) == sorted(f"song:{i}" for i in range(0, 50, 2))
+        assert found["song:4"] == {"id": 4}
+        assert service.metrics.hits == 25
+        assert service.metrics.misses == 25
+    
+    def test_get_many_prefers_l1(self, bus):
+        service = self.make_service(bus)
+        service.set_many({"a": 1, "b": 2})
+        bus.store["test:c"] = service._serialize_value(3)
+        
+        assert service.get_many(["a", "b", "c"]) == {"a": 1, "b": 2, "c": 3}
+        assert service.metrics.l1_hits == 2
+        assert service.metrics.l2_hits == 1
+    
+    def test_set_many_indexes_tags(self, bus):
+        service = self.make_service(bus)
+        service.set_many({"a": 1, "b": 2}, tags=["model:Song"])
+        
+        assert service.invalidate_by_tags(["model:Song"]) == 2
+        assert service.get_many(["a", "b"]) == {}
+    
+    def test_delete_many(self, bus):
+        service = self.make_service(bus)
+        service.set_many({"a": 1, "b": 2, "c": 3}, tags=["queries"])
+        
+        assert service.delete_many(["a", "b", "missing"]) == 2
+        
+        assert service.get_many(["a", "b", "c"]) == {"c": 3}
+        assert bus.store["test:_tag:queries"] == {b"test:c"}
+    
+    def test_fallback_batch_operations(self):
+        service = self.make_service()
+        service.set_many({"a": 1, "b": 2}, tags=["queries"])
+        
+        assert service.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+        assert service.delete_many(["a"]) == 1
+        assert service.invalidate_by_tags(["queries"]) == 1
+    
+    def test_get_or_load_many_loads_only_misses(self, bus):
+        service = self.make_service(bus)
+        loads = []
+        
+        def loader(ids):
+            loads.append(sorted(ids))
+            return {item_id: {"id": item_id} for item_id in ids if item_id != 99}
+        
+        first = service.get_or_load_many([1, 2, 3], loader, key_func=lambda i: f"song:{i}")
+        second = service.get_or_load_many([2, 3, 4, 99], loader, key_func=lambda i: f"song:{i}")
+        
+        assert first == {1: {"id": 1}, 2: {"id": 2}, 3: {"id": 3}}
+        assert second == {2: {"id": 2}, 3: {"id": 3}, 4: {"id": 4}}
+        assert loads == [[1, 2, 3], [4, 99]]
 
 if __name__ == "__main__":
     # Simple test runner
@@ -0,0 +1,107 @@
+"""
+Tests for the binary cache value codecs.
+"""
+
+import gzip
+import json
+import pytest
+from datetime import datetime
+
+from chordme.cache_codecs import (
+    CacheCodec, CodecError, COMPRESSION_NONE, COMPRESSION_ZLIB, FORMAT_VERSION,
+    LZ4_AVAILABLE, MSGPACK_AVAILABLE, SERIALIZER_JSON, decode_legacy
+)
+
+
+SONG_LIST = [
+    {
+        'id': i,
+        'title': f'Song {i}',
+        'artist': 'Traditional',
+        'content': '{title: Amazing Grace}\n[G]Amazing [C]grace how [G]sweet the sound\n' * 8,
+        'tags': ['hymn', 'classic'],
+    }
+    for i in range(20)
+]
+
+
+def legacy_encode(value, threshold=1024):
+    """The JSON/gzip-hex format written by earlier releases."""
+    serialized = json.dumps(value, default=str)
+    if len(serialized) > threshold:
+        return json.dumps({"_compressed": True, "_data": gzip.compress(serialized.encode()).hex()})
+    return serialized
+
+
+class TestCacheCodec:
+    """Test framing, compression and legacy compatibility."""
+
+    @pytest.mark.parametrize('serializer', ['json', 'msgpack'])
+    @pytest.mark.parametrize('compression', ['none', 'zlib', 'lz4'])
+    def test_round_trip(self, serializer, compression):
+        codec = CacheCodec(serializer=serializer, compression=compression, compression_threshold=64)
+
+        for value in (SONG_LIST, {'count': 3, 'ok': True, 'ratio': 0.5}, 'text', 42, None, []):
+            assert codec.decode(codec.encode(value)) == value
+
+    def test_header_byte(self):
+        codec = CacheCodec(serializer='json', compression='zlib', compression_threshold=64)
+
+        small = codec.encode({'a': 1})
+        large = codec.encode(SONG_LIST)
+
+        assert small[0] >> 6 == FORMAT_VERSION
+        assert small[0] & 0x0F == SERIALIZER_JSON
+        assert (small[0] >> 4) & 0x03 == COMPRESSION_NONE
+        assert (large[0] >> 4) & 0x03 == COMPRESSION_ZLIB
+
+    def test_compression_shrinks_song_payloads(self):
+        codec = CacheCodec()
+        legacy = legacy_encode(SONG_LIST).encode()
+
+        encoded = codec.encode(SONG_LIST)
+
+        assert len(encoded) * 1.5 < len(legacy)
+
+    def test_namespace_threshold(self):
+        codec = CacheCodec(serializer='json', compression='zlib', compression_threshold=64,
+                           namespace_thresholds={'songs': 100000, 'health': -1})
+
+        assert (codec.encode(SONG_LIST)[0] >> 4) & 0x03 == COMPRESSION_ZLIB
+        assert (codec.encode(SONG_LIST, namespace='songs')[0] >> 4) & 0x03 == COMPRESSION_NONE
+        assert (codec.encode(SONG_LIST, namespace='health')[0] >> 4) & 0x03 == COMPRESSION_NONE
+
+    def test_datetimes_are_stringified(self):
+        codec = CacheCodec()
+        moment = datetime(2024, 5, 1, 10, 30)
+
+        assert codec.decode(codec.encode({'at': moment})) == {'at': moment.isoformat()}
+
+    @pytest.mark.parametrize('value', [SONG_LIST, {'a': 1}, 'text', 7])
+    def test_reads_legacy_values(self, value):
+        codec = CacheCodec()
+        legacy = legacy_encode(value)
+
+        assert codec.decode(legacy) == value
+        assert codec.decode(legacy.encode()) == value
+        assert decode_legacy(legacy) == value
+
+    def test_corrupt_value_raises(self):
+        codec = CacheCodec(compression='zlib')
+        encoded = bytearray(codec.encode(SONG_LIST))
+        encoded[5:15] = b'\x00' * 10
+
+        with pytest.raises(CodecError):
+            codec.decode(bytes(encoded))
+
+    def test_unknown_codec_names(self):
+        with pytest.raises(ValueError):
+            CacheCodec(serializer='pickle')
+        with pytest.raises(ValueError):
+            CacheCodec(compression='brotli')
+
+    def test_optional_dependencies_detected(self):
+        codec = CacheCodec()
+
+        assert (codec.serializer == SERIALIZER_JSON) is not MSGPACK_AVAILABLE
+        assert (codec.compression == COMPRESSION_ZLIB) is not LZ4_AVAILABLE
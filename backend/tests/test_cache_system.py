@@ -11,13 +11,14 @@ This module tests:
 """
 
 import pytest
+from flask import g
 import json
 import time
 from unittest.mock import patch, MagicMock, call
 from datetime import datetime, timedelta
 
 from chordme.cache_service import CacheService, CacheConfig, CacheMetrics
-from chordme.etag_cache import ETagManager, etag_cached
+from chordme.etag_cache import ETagManager, etag_cached, generate_query_etag, generate_model_etag
 from chordme.query_cache import cache_query, QueryCacheManager
 from chordme import db
 from chordme.models import User, Song
@@ -280,6 +281,97 @@ class TestETagCache:
             assert call_count == 1  # Should not increment
 
 
+
+class TestVersionedETagCache:
+    """Test principal-aware response caching with row-version ETags."""
+    
+    def make_view(self, versions, namespace):
+        calls = []
+        
+        @etag_cached(ttl=300, namespace=namespace, version_func=lambda: versions[-1], vary=['Accept-Language'])
+        def view():
+            calls.append(1)
+            return {"user": g.current_user_id, "call": len(calls)}, 200
+        
+        return view, calls
+    
+    def request(self, app, view, user_id, **headers):
+        with app.test_request_context('/api/v1/things', headers=headers):
+            g.current_user_id = user_id
+            return view()
+    
+    def test_not_modified_before_view_runs(self, app):
+        view, calls = self.make_view(["v1"], "etag_test_304")
+        
+        first = self.request(app, view, 1)
+        second = self.request(app, view, 1, **{'If-None-Match': first.headers['ETag']})
+        
+        assert first.status_code == 200
+        assert second.status_code == 304
+        assert second.headers['ETag'] == first.headers['ETag']
+        assert len(calls) == 1
+    
+    def test_keys_include_principal_and_vary_headers(self, app):
+        view, calls = self.make_view(["v1"], "etag_test_principal")
+        
+        alice = self.request(app, view, 1)
+        bob = self.request(app, view, 2)
+        alice_es = self.request(app, view, 1, **{'Accept-Language': 'es'})
+        
+        assert alice.get_json()["data"]["user"] == 1
+        assert bob.get_json()["data"]["user"] == 2
+        assert len(calls) == 3
+        assert alice.headers['ETag'] != bob.headers['ETag'] != alice_es.headers['ETag']
+        assert alice.headers['Cache-Control'].startswith('private')
+        assert 'Authorization' in alice.headers['Vary']
+        assert 'Accept-Language' in alice.headers['Vary']
+    
+    def test_version_change_refreshes_cached_body(self, app):
+        versions = ["v1"]
+        view, calls = self.make_view(versions, "etag_test_version")
+        
+        first = self.request(app, view, 1)
+        assert self.request(app, view, 1).get_json()["data"]["call"] == 1
+        
+        versions.append("v2")
+        refreshed = self.request(app, view, 1, **{'If-None-Match': first.headers['ETag']})
+        
+        assert refreshed.status_code == 200
+        assert refreshed.get_json()["data"]["call"] == 2
+        assert refreshed.headers['ETag'] != first.headers['ETag']
+    
+    def test_errors_are_not_cached(self, app):
+        calls = []
+        
+        @etag_cached(ttl=300, namespace="etag_test_errors")
+        def view():
+            calls.append(1)
+            return {"error": "not found"}, 404
+        
+        assert self.request(app, view, 1)[1] == 404
+        assert self.request(app, view, 1)[1] == 404
+        assert len(calls) == 2
+    
+    def test_query_etag_tracks_row_versions(self, app):
+        user = User(email="etag@example.com", password="Password123!")
+        db.session.add(user)
+        db.session.commit()
+        song = Song(title="Grace", user_id=user.id, content="[G]Amazing")
+        db.session.add(song)
+        db.session.commit()
+        query = Song.query.filter(Song.user_id == user.id)
+        
+        first = generate_query_etag(query, Song)
+        model_etag = generate_model_etag(song)
+        assert generate_query_etag(query, Song) == first
+        
+        song.title = "Amazing Grace"
+        song.updated_at = song.updated_at + timedelta(seconds=1)
+        db.session.commit()
+        
+        assert generate_query_etag(query, Song) != first
+        assert generate_model_etag(song) != model_etag
+
 class TestQueryCache:
     """Test database query result caching."""
     
@@ -3,10 +3,13 @@ Unit tests for chord diagram PDF generation functionality.
 """
 
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 from chordme.chord_diagram_pdf import (
     ChordDiagramGenerator, ChordPosition, ChordDiagram,
-    create_chord_diagram_for_pdf, COMMON_CHORDS
+    create_chord_diagram_for_pdf, COMMON_CHORDS, warm_chord_diagrams, clear_chord_diagram_cache
 )
+from chordme.pdf_generator import generate_song_pdf
 from reportlab.graphics.shapes import Drawing
 
 
@@ -253,6 +256,62 @@ class TestConvenienceFunction:
         assert drawing is None
 
 
+class TestSharedDiagrams:
+    """Test the per-process cache of chord diagram shapes."""
+    
+    def setup_method(self):
+        clear_chord_diagram_cache()
+    
+    def test_chord_is_drawn_once_and_wrapped_per_use(self):
+        """Test a chord is drawn once per thread, instrument and size, its shapes shared by fresh Drawings."""
+        generator = ChordDiagramGenerator()
+        with patch.object(ChordDiagramGenerator, 'create_diagram_drawing', autospec=True,
+                          side_effect=ChordDiagramGenerator.create_diagram_drawing) as draw:
+            drawing = generator.get_chord_diagram('x32010', 'C', 'guitar')
+            again = ChordDiagramGenerator().get_chord_diagram('x32010', 'C', 'guitar')
+            ukulele = generator.get_chord_diagram('0003', 'C', 'ukulele')
+            wide = ChordDiagramGenerator(width=100).get_chord_diagram('x32010', 'C', 'guitar')
+        
+        assert isinstance(drawing, Drawing)
+        assert draw.call_count == 3
+        assert again is not drawing
+        assert again.contents is not drawing.contents
+        assert len(again.contents) == len(drawing.contents)
+        assert all(shape is shared for shape, shared in zip(again.contents, drawing.contents))
+        assert ukulele.contents[0] is not drawing.contents[0]
+        assert wide.width == 100 and wide.contents[0] is not drawing.contents[0]
+        
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            other_thread = pool.submit(generator.get_chord_diagram, 'x32010', 'C', 'guitar').result()
+        assert other_thread.contents[0] is not drawing.contents[0]
+    
+    def test_invalid_definitions_are_cached_as_missing(self):
+        """Test unparseable chords return None."""
+        generator = ChordDiagramGenerator()
+        assert generator.get_chord_diagram('invalid', 'X') is None
+        assert generator.get_chord_diagram('invalid', 'X') is None
+    
+    def test_warm_draws_common_chords(self):
+        """Test warming draws every common chord."""
+        assert warm_chord_diagrams() == sum(len(chords) for chords in COMMON_CHORDS.values())
+        with patch.object(ChordDiagramGenerator, 'create_diagram_drawing') as draw:
+            drawing = ChordDiagramGenerator().get_chord_diagram(COMMON_CHORDS['guitar']['G'], 'G', 'guitar')
+        assert isinstance(drawing, Drawing)
+        draw.assert_not_called()
+    
+    def test_concurrent_documents_with_diagrams(self):
+        """Test documents rendered at once on several threads each get their own diagrams."""
+        content = '[C]One [G]two [Am]three [F]four'
+        
+        def render(_):
+            return generate_song_pdf(content, title='Threads', include_chord_diagrams=True)
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            pdfs = list(pool.map(render, range(32)))
+        
+        assert all(pdf.startswith(b'%PDF') for pdf in pdfs)
+
+
 class TestCommonChords:
     """Test cases for common chord definitions."""
     
@@ -313,6 +313,42 @@ class TestChordRecognitionEngine:
                 f"Chord {chord} should have quality {expected_quality}, got {result.quality}"
 
 
+class TestParseCache:
+    """Test memoization of chord parsing"""
+    
+    def setup_method(self):
+        self.engine = ChordRecognitionEngine()
+        self.engine.clear_parse_cache()
+    
+    def test_repeated_parse_returns_cached_result(self):
+        """Test that identical spellings are parsed only once"""
+        first = self.engine.parse_chord('F#m7')
+        second = self.engine.parse_chord(' F#m7 ')
+        
+        assert first == second
+        info = self.engine.parse_cache_info()
+        assert info['misses'] == 1
+        assert info['hits'] == 1
+    
+    def test_invalid_chords_are_cached(self):
+        """Test that invalid chords are memoized with their errors"""
+        result = self.engine.parse_chord('Xyz')
+        
+        assert not result.is_valid
+        assert self.engine.parse_chord('Xyz') == result
+        assert self.engine.parse_cache_info()['hits'] == 1
+    
+    def test_cached_results_are_independent_copies(self):
+        """Test that mutating a returned parse does not affect later parses"""
+        first = self.engine.parse_chord('C#m')
+        first.components.root = 'X'
+        first.enharmonic_equivalents.append('X')
+        
+        second = self.engine.parse_chord('C#m')
+        assert second.components.root == 'C'
+        assert second.enharmonic_equivalents == ['Db']
+
+
 class TestLegacyCompatibility:
     """Test legacy compatibility functions"""
     
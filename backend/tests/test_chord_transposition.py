@@ -12,7 +12,10 @@ from chordme.chordpro_utils import (
     transpose_chordpro_content_with_key,
     convert_notation,
     extract_key_signature,
-    parse_chord_enhanced
+    parse_chord_enhanced,
+    intern_chord,
+    get_chord_cache_info,
+    clear_chord_caches
 )
 
 
@@ -390,4 +393,47 @@ class TestEnhancedChordTransposition:
         assert result['root'] == 'C'
         assert result['modifiers'] == ''
         assert result['bass_note'] == 'E'
-        assert result['is_slash_chord'] is True
\ No newline at end of file
+        assert result['is_slash_chord'] is True
+
+
+class TestChordTranspositionCache:
+    """Test chord interning and memoized transposition."""
+    
+    def setup_method(self):
+        clear_chord_caches()
+    
+    def test_intern_chord(self):
+        """Test that chord spellings are parsed once and shared."""
+        symbol = intern_chord('Am7/G')
+        assert symbol.root == 'A'
+        assert symbol.modifiers == 'm7'
+        assert symbol.bass_note == 'G'
+        assert symbol.is_slash_chord is True
+        assert symbol.is_valid is True
+        
+        assert intern_chord('Am7/G') is symbol
+        assert intern_chord('Xyz').is_valid is False
+    
+    def test_repeated_transpositions_hit_cache(self):
+        """Test that repeated chord transpositions are served from cache."""
+        assert transpose_chord_with_key('Bb', 2, 'F') == 'C'
+        assert transpose_chord_with_key('Bb', 2, 'F') == 'C'
+        assert transpose_chord_with_key('Bb', 14, 'F') == 'C'
+        
+        stats = get_chord_cache_info()
+        assert stats['transpose']['misses'] == 1
+        assert stats['transpose']['hits'] == 2
+    
+    def test_enharmonic_preference_is_part_of_cache_key(self):
+        """Test that flat and sharp keys get separate cached results."""
+        assert transpose_chord_with_key('C', 1, 'F') == 'Db'
+        assert transpose_chord_with_key('C', 1, 'G') == 'C#'
+        assert transpose_chord_with_key('C', 1, 'G', 'latin') == 'C#'
+    
+    def test_content_transposition_looks_up_each_distinct_chord_once(self):
+        """Test that songs cost one transposition per distinct chord."""
+        content = '[C]Hello [G]world\n' * 50
+        result = transpose_chordpro_content_with_key(content, 2)
+        
+        assert result == '[D]Hello [A]world\n' * 50
+        assert get_chord_cache_info()['transpose']['misses'] == 2
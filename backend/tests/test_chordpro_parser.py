@@ -0,0 +1,115 @@
+"""
+Tests for the single-pass ChordPro parser and its parse cache.
+"""
+
+import pytest
+from chordme.chordpro_parser import (
+    parse_chordpro, clear_parse_cache, get_parse_cache_info, content_hash, ParseCache
+)
+
+
+SAMPLE_SONG = """{title: Amazing Grace}
+{artist: John Newton}
+{key: G}
+
+{start_of_verse: 1}
+[G]Amazing [C]grace how [G]sweet the sound
+{end_of_verse}
+
+{start_of_chorus}
+[D]That saved a [G]wretch like me
+{end_of_chorus}
+{comment: Repeat [G] chorus}"""
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_parse_cache()
+    yield
+    clear_parse_cache()
+
+
+class TestParseChordPro:
+    """Test AST construction."""
+
+    def test_directives(self):
+        song = parse_chordpro(SAMPLE_SONG)
+
+        assert song.get_directive_value('title') == 'Amazing Grace'
+        assert song.get_directive_value('ARTIST') == 'John Newton'
+        assert song.get_directive('start_of_chorus').value is None
+        assert song.get_directive('missing') is None
+
+    def test_chords_in_order(self):
+        song = parse_chordpro(SAMPLE_SONG)
+
+        assert song.chords == ('G', 'C', 'G', 'D', 'G', 'G')
+        assert song.unique_chords == ('G', 'C', 'D')
+
+    def test_chord_positions_and_lyrics(self):
+        song = parse_chordpro(SAMPLE_SONG)
+        line = song.lines[5]
+
+        assert line.lyrics == 'Amazing grace how sweet the sound'
+        assert [(token.name, token.position) for token in line.chords] == [
+            ('G', 0), ('C', 8), ('G', 18)
+        ]
+
+    def test_line_directive(self):
+        song = parse_chordpro(SAMPLE_SONG)
+
+        assert song.lines[0].directive.name == 'title'
+        assert song.lines[3].is_blank
+        assert song.lines[5].directive is None
+
+    def test_sections(self):
+        song = parse_chordpro(SAMPLE_SONG)
+
+        assert [(s.section_type, s.label, s.closed) for s in song.sections] == [
+            ('verse', '1', True), ('chorus', None, True)
+        ]
+        chorus_lines = song.section_lines(song.sections[1])
+        assert [line.lyrics for line in chorus_lines] == ['That saved a wretch like me']
+
+    def test_short_aliases_and_unclosed_sections(self):
+        song = parse_chordpro("{soc}\n[C]La la\n{sov}\n[G]Da da")
+
+        assert [(s.section_type, s.start_line, s.end_line, s.closed) for s in song.sections] == [
+            ('chorus', 0, 1, False), ('verse', 2, 3, False)
+        ]
+
+    def test_empty_content(self):
+        song = parse_chordpro(None)
+
+        assert song.chords == ()
+        assert song.directives == ()
+        assert len(song.lines) == 1
+
+
+class TestParseCache:
+    """Test content-hash memoization."""
+
+    def test_identical_content_shares_ast(self):
+        first = parse_chordpro(SAMPLE_SONG)
+        second = parse_chordpro(SAMPLE_SONG)
+
+        assert first is second
+        assert first.content_hash == content_hash(SAMPLE_SONG)
+        info = get_parse_cache_info()
+        assert info['hits'] == 1
+        assert info['misses'] == 1
+
+    def test_lru_eviction(self):
+        cache = ParseCache(max_size=2)
+        for content in ('[A]', '[B]', '[C]'):
+            cache.put(parse_chordpro(content))
+
+        assert cache.get(content_hash('[A]')) is None
+        assert cache.get(content_hash('[C]')) is not None
+        assert cache.info()['size'] == 2
+
+    def test_ast_is_immutable(self):
+        song = parse_chordpro(SAMPLE_SONG)
+
+        with pytest.raises(Exception):
+            song.chords = ()
@@ -3,7 +3,10 @@ Tests for ChordPro utilities and validation helpers.
 """
 
 import pytest
-from chordme.chordpro_utils import ChordProValidator, validate_chordpro_content, detect_key_signature
+from chordme.chordpro_utils import (
+    ChordProValidator, validate_chordpro_content, detect_key_signature,
+    detect_key_signatures, chord_root_histogram
+)
 
 
 class TestChordProValidator:
@@ -399,4 +402,37 @@ class TestKeyDetection:
             assert isinstance(alt['key'], str)
             assert isinstance(alt['confidence'], (int, float))
             assert isinstance(alt['is_minor'], bool)
-            assert 0.0 <= alt['confidence'] <= 1.0
\ No newline at end of file
+            assert 0.0 <= alt['confidence'] <= 1.0
+
+
+class TestBulkKeyDetection:
+    """Test vectorized batch key detection."""
+
+    def test_matches_single_song_detection(self):
+        """Batch results are identical to per-song detection."""
+        contents = [
+            "[C] [F] [G] [C] [Am] [F] [G] [C]",
+            "[G] [C] [D] [G] [Em] [C] [D] [G]",
+            "[Am] [F] [C] [G] [Am] [F] [C] [G]",
+            "[F] [Bb] [C] [F] [Dm] [Bb] [C] [F]",
+            "[Cmaj7] [Am7] [Dm7] [G7] [Cb] [E#m]",
+            "{key: Bb} [C] [G]",
+            "Just lyrics",
+            "",
+            "[invalid] [X]",
+        ]
+
+        assert detect_key_signatures(contents) == [detect_key_signature(c) for c in contents]
+
+    def test_empty_batch(self):
+        """Empty batches return no results."""
+        assert detect_key_signatures([]) == []
+
+    def test_chord_root_histogram(self):
+        """Chord roots are folded into sharp-spelled pitch classes."""
+        counts, total = chord_root_histogram("[C] [Db] [C#m] [Cb] [G7]")
+
+        assert counts[0] == 1  # C
+        assert counts[1] == 2  # C# / Db
+        assert counts[7] == 1  # G
+        assert total == 5  # Cb has no pitch class but still counts as a chord
@@ -0,0 +1,161 @@
+"""
+Tests for the offline item-item collaborative filtering model.
+"""
+
+import random
+import pytest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from chordme import db
+from chordme.item_similarity import InteractionMatrix, SongNeighborIndex
+from chordme.models import User, Song, SongNeighbor, UserFavorite
+from chordme.music_discovery_service import MusicDiscoveryService
+
+
+def brute_force_neighbors(users, songs, weights, song_id, min_similarity=0.0):
+    vectors = {}
+    for user, song, weight in zip(users, songs, weights):
+        vectors.setdefault(song, {}).setdefault(user, 0.0)
+        vectors[song][user] += weight
+    vectors = {song: {user: np.log1p(w) for user, w in vector.items()} for song, vector in vectors.items()}
+    reference = vectors[song_id]
+    reference_norm = np.sqrt(sum(v * v for v in reference.values()))
+    results = {}
+    for other, vector in vectors.items():
+        if other == song_id:
+            continue
+        shared = set(reference) & set(vector)
+        if not shared:
+            continue
+        dot = sum(reference[user] * vector[user] for user in shared)
+        score = dot / (reference_norm * np.sqrt(sum(v * v for v in vector.values())))
+        if score >= min_similarity:
+            results[other] = (score, len(shared))
+    return results
+
+
+class TestInteractionMatrix:
+    """Test the sparse matrix and its cosine neighbours."""
+
+    def test_neighbors_match_brute_force(self):
+        rng = random.Random(3)
+        users = [rng.randint(1, 40) for _ in range(600)]
+        songs = [rng.randint(1, 80) for _ in range(600)]
+        weights = [rng.choice([1.0, 2.0, 3.0]) for _ in range(600)]
+        matrix = InteractionMatrix(users, songs, weights)
+
+        for song_id in range(1, 81):
+            expected = brute_force_neighbors(users, songs, weights, song_id)
+            actual = matrix.neighbors(song_id, limit=1000, min_similarity=0.0)
+            assert {other for other, _, _ in actual} == set(expected)
+            for other, score, co_occurrences in actual:
+                assert score == pytest.approx(expected[other][0])
+                assert co_occurrences == expected[other][1]
+            scores = [score for _, score, _ in actual]
+            assert scores == sorted(scores, reverse=True)
+
+    def test_limit_keeps_best_neighbors(self):
+        rng = random.Random(5)
+        users = [rng.randint(1, 30) for _ in range(400)]
+        songs = [rng.randint(1, 50) for _ in range(400)]
+        matrix = InteractionMatrix(users, songs, [1.0] * 400)
+
+        full = matrix.neighbors(7, limit=1000, min_similarity=0.0)
+        assert matrix.neighbors(7, limit=5, min_similarity=0.0) == full[:5]
+
+    def test_merge_equals_full_build(self):
+        users, songs, weights = [1, 1, 2, 2, 3], [10, 11, 10, 12, 11], [3.0, 1.0, 2.0, 1.0, 1.0]
+        merged = InteractionMatrix(users[:3], songs[:3], weights[:3]).merge(users[3:], songs[3:], weights[3:])
+        full = InteractionMatrix(users, songs, weights)
+
+        for song_id in (10, 11, 12):
+            assert merged.neighbors(song_id) == full.neighbors(song_id)
+        assert list(merged.songs_of_users([2])) == [10, 12]
+
+    def test_max_songs_per_user(self):
+        matrix = InteractionMatrix([1, 1, 1], [10, 11, 12], [3.0, 1.0, 2.0], max_songs_per_user=2)
+
+        assert len(matrix) == 2
+        assert list(matrix.songs_of_users([1])) == [10, 12]
+
+    def test_unknown_song_and_empty_matrix(self):
+        assert InteractionMatrix([1], [10], [1.0]).neighbors(99) == []
+        assert InteractionMatrix([], [], []).neighbors(10) == []
+
+
+class TestSongNeighborIndex:
+    """Test the maintenance job and the recommendations that read its output."""
+
+    @pytest.fixture
+    def library(self, client):
+        owner = User(email='owner@test.com', password='password123')
+        fans = [User(email=f'fan{i}@test.com', password='password123') for i in range(3)]
+        db.session.add_all([owner] + fans)
+        db.session.commit()
+
+        songs = [Song(title=f'Song {i}', user_id=owner.id, content='[C]la', share_settings='public')
+                 for i in range(4)]
+        db.session.add_all(songs)
+        db.session.commit()
+        return owner, fans, songs
+
+    def favorite(self, user, song, created_at):
+        favorite = UserFavorite(user.id, song.id)
+        favorite.created_at = created_at
+        db.session.add(favorite)
+        db.session.commit()
+
+    def test_rebuild_and_incremental_update(self, library):
+        owner, fans, songs = library
+        now = datetime.utcnow()
+        for fan in fans[:2]:
+            self.favorite(fan, songs[0], now)
+            self.favorite(fan, songs[1], now)
+
+        index = SongNeighborIndex()
+        details = index.rebuild(db.session)
+        assert details['songs'] == 2
+        rows = SongNeighbor.query.filter_by(song_id=songs[0].id).all()
+        assert [(row.neighbor_id, row.co_occurrences) for row in rows] == [(songs[1].id, 2)]
+        assert rows[0].score == pytest.approx(1.0)
+
+        self.favorite(fans[2], songs[0], now + timedelta(seconds=1))
+        self.favorite(fans[2], songs[2], now + timedelta(seconds=1))
+        details = index.update(db.session)
+        assert details['interactions'] == 2
+
+        neighbors = {row.neighbor_id for row in SongNeighbor.query.filter_by(song_id=songs[0].id)}
+        assert neighbors == {songs[1].id, songs[2].id}
+        assert index.update(db.session) == {'interactions': 0, 'songs': 0}
+
+    def test_collaborative_filtering_reads_neighbors(self, library):
+        owner, fans, songs = library
+        fan = fans[0]
+        db.session.add_all([
+            SongNeighbor(song_id=songs[0].id, neighbor_id=songs[1].id, score=0.9, co_occurrences=3),
+            SongNeighbor(song_id=songs[0].id, neighbor_id=songs[2].id, score=0.2, co_occurrences=1),
+            SongNeighbor(song_id=songs[3].id, neighbor_id=songs[2].id, score=0.3, co_occurrences=1),
+            SongNeighbor(song_id=songs[3].id, neighbor_id=songs[0].id, score=0.5, co_occurrences=1),
+        ])
+        db.session.commit()
+
+        user_songs = [{'song': songs[0]}, {'song': songs[3]}]
+        recommendations = MusicDiscoveryService._collaborative_filtering(fan.id, user_songs, 10)
+
+        assert [rec['song_id'] for rec in recommendations] == [songs[1].id, songs[2].id]
+        assert recommendations[0]['relevance_score'] == pytest.approx(0.9 * 0.8)
+        assert recommendations[1]['relevance_score'] == pytest.approx(0.5 * 0.8)
+        assert all(rec['recommendation_type'] == 'collaborative' for rec in recommendations)
+
+    def test_jobs_are_skipped_without_numpy(self, library, monkeypatch):
+        owner, fans, songs = library
+        self.favorite(fans[0], songs[0], datetime.utcnow())
+        self.favorite(fans[0], songs[1], datetime.utcnow())
+        monkeypatch.setattr('chordme.item_similarity.NUMPY_AVAILABLE', False)
+
+        index = SongNeighborIndex()
+        assert index.rebuild(db.session) == {'skipped': 'numpy is not installed'}
+        assert index.update(db.session) == {'skipped': 'numpy is not installed'}
+        assert SongNeighbor.query.count() == 0
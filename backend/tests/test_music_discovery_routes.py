@@ -331,7 +331,7 @@ class TestMusicDiscoveryRoutes:
             assert 'trending_songs' in trending
             assert 'trending_factors' in trending
             
-            mock_service.assert_called_once_with(user.id, timeframe='7d', limit=20)
+            mock_service.assert_called_once_with(user.id, timeframe='7d', limit=20, genre=None)
     
     def test_get_trending_songs_custom_timeframe(self, client, auth_user):
         """Test trending songs with custom timeframe."""
@@ -343,7 +343,7 @@ class TestMusicDiscoveryRoutes:
             response = client.get('/api/v1/analytics/discovery/trending?timeframe=1d&limit=5', headers=headers)
             
             assert response.status_code == 200
-            mock_service.assert_called_once_with(user.id, timeframe='1d', limit=5)
+            mock_service.assert_called_once_with(user.id, timeframe='1d', limit=5, genre=None)
     
     def test_get_trending_songs_invalid_timeframe(self, client, auth_user):
         """Test trending songs with invalid timeframe."""
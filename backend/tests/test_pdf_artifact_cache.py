@@ -0,0 +1,168 @@
+"""
+Tests for the content-addressed cache of rendered PDFs.
+"""
+
+import os
+import threading
+import pytest
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+from chordme import db
+from chordme.models import User, Song, PDFExportJob
+from chordme.pdf_artifact_cache import PDFArtifactCache, artifact_key
+from chordme.pdf_generator import export_job_options
+
+
+SONG = {'title': 'Amazing Grace', 'artist': 'John Newton', 'content': '[G]Amazing [C]grace'}
+
+
+class TestArtifactKey:
+    """Test what the content address depends on."""
+
+    def test_key_is_stable(self):
+        options = export_job_options({'paper_size': 'letter'})
+        assert artifact_key('song', [SONG], options) == artifact_key('song', [dict(SONG)], dict(options))
+
+    def test_key_changes_with_inputs(self):
+        options = export_job_options({})
+        base = artifact_key('song', [SONG], options)
+
+        assert artifact_key('song', [{**SONG, 'content': '[G]Amazing [D]grace'}], options) != base
+        assert artifact_key('song', [{**SONG, 'title': 'Grace'}], options) != base
+        assert artifact_key('song', [SONG], {**options, 'orientation': 'landscape'}) != base
+        assert artifact_key('song', [SONG], {**options, 'colors': {'chords': '#ff0000'}}) != base
+        assert artifact_key('songbook', [SONG], options) != base
+        assert artifact_key('song', [SONG, SONG], options) != base
+
+    def test_key_changes_with_template_definition(self):
+        options = export_job_options({'template': 'modern'})
+        template = MagicMock()
+        template.to_json.side_effect = ['{"font": 1}', '{"font": 2}']
+
+        with patch('chordme.pdf_templates.get_template', return_value=template):
+            assert artifact_key('song', [SONG], options) != artifact_key('song', [SONG], options)
+
+    def test_key_changes_with_generator_version(self):
+        options = export_job_options({})
+        base = artifact_key('song', [SONG], options)
+
+        with patch('chordme.pdf_artifact_cache.GENERATOR_VERSION', 2):
+            assert artifact_key('song', [SONG], options) != base
+
+
+class TestPDFArtifactCache:
+    """Test storage, hits and size-bounded eviction."""
+
+    def test_get_or_render_renders_once(self, tmp_path):
+        cache = PDFArtifactCache(str(tmp_path))
+        render = MagicMock(return_value=b'%PDF one')
+
+        assert cache.get_or_render('a' * 64, render) == b'%PDF one'
+        assert cache.get_or_render('a' * 64, render) == b'%PDF one'
+        assert render.call_count == 1
+
+        stats = cache.get_stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+        assert stats['bytes'] == len(b'%PDF one')
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = PDFArtifactCache(str(tmp_path), max_bytes=25)
+        cache.put('a' * 64, b'x' * 10)
+        cache.put('b' * 64, b'x' * 10)
+        cache.get('a' * 64)
+        cache.put('c' * 64, b'x' * 10)
+
+        assert cache.get('b' * 64) is None
+        assert cache.get('a' * 64) is not None
+        assert cache.get('c' * 64) is not None
+        assert not os.path.exists(cache._path('b' * 64))
+        assert cache.get_stats()['evictions'] == 1
+        assert cache.get_stats()['bytes'] == 20
+
+    def test_index_is_rebuilt_from_disk(self, tmp_path):
+        PDFArtifactCache(str(tmp_path)).put('a' * 64, b'%PDF')
+
+        cache = PDFArtifactCache(str(tmp_path))
+        assert cache.get_stats()['entries'] == 1
+        assert cache.get('a' * 64) == b'%PDF'
+
+    def test_get_or_submit_stores_successful_renders(self, tmp_path):
+        cache = PDFArtifactCache(str(tmp_path))
+        failed = Future()
+        failed.set_exception(RuntimeError('render failed'))
+        assert cache.get_or_submit('a' * 64, lambda: failed) is failed
+        assert cache.get('a' * 64) is None
+
+        rendered = Future()
+        future = cache.get_or_submit('a' * 64, lambda: rendered)
+        rendered.set_result(b'%PDF')
+        assert future.result() == b'%PDF'
+
+        hit = cache.get_or_submit('a' * 64, MagicMock(side_effect=AssertionError('rendered again')))
+        assert hit.done() and hit.result() == b'%PDF'
+
+    def test_disabled_cache_always_renders(self, tmp_path):
+        cache = PDFArtifactCache(str(tmp_path))
+        cache.enabled = False
+        render = MagicMock(return_value=b'%PDF')
+
+        cache.get_or_render('a' * 64, render)
+        cache.get_or_render('a' * 64, render)
+        assert render.call_count == 2
+        assert os.listdir(tmp_path) == []
+
+    def test_config_flag_is_read_on_use(self, tmp_path):
+        app = MagicMock(instance_path=str(tmp_path))
+        app.config = {'PDF_ARTIFACT_CACHE_DIR': str(tmp_path / 'artifacts')}
+        cache = PDFArtifactCache()
+        cache.init_app(app)
+        render = MagicMock(return_value=b'%PDF')
+
+        app.config['PDF_ARTIFACT_CACHE_ENABLED'] = False
+        cache.get_or_render('a' * 64, render)
+        assert cache.get_stats()['enabled'] is False
+        assert not os.path.exists(tmp_path / 'artifacts')
+
+        app.config['PDF_ARTIFACT_CACHE_ENABLED'] = True
+        cache.get_or_render('a' * 64, render)
+        cache.get_or_render('a' * 64, render)
+        assert render.call_count == 2
+        assert cache.get_stats()['hits'] == 1
+
+
+class TestJobArtifactReuse:
+    """Test that export jobs reuse cached artifacts."""
+
+    def test_single_song_job_skips_render_on_hit(self, client, tmp_path):
+        from chordme.pdf_job_manager import PDFJobManager, PDFJobScheduler
+
+        user = User(email='artifact@test.com', password='password123')
+        db.session.add(user)
+        db.session.commit()
+        song = Song('Cached Song', user.id, '[C]la la')
+        db.session.add(song)
+        db.session.commit()
+
+        manager = PDFJobManager()
+        manager.temp_dir = str(tmp_path)
+        manager._scheduler = PDFJobScheduler(manager._process_job, render_processes=0)
+        cache = PDFArtifactCache(str(tmp_path / 'artifacts'))
+        generate = MagicMock(return_value=b'%PDF cached')
+
+        with patch('chordme.pdf_job_manager.pdf_artifact_cache', cache), \
+                patch('chordme.pdf_generator.generate_song_pdf', generate), \
+                client.application.test_request_context():
+            for _ in range(2):
+                job = PDFExportJob(user_id=user.id, job_type='single', song_ids=[song.id],
+                                   export_options={'paper_size': 'letter'})
+                db.session.add(job)
+                db.session.commit()
+                manager._process_single_song_job(job, threading.Event())
+                assert job.status == 'completed'
+                with open(job.output_file_path, 'rb') as f:
+                    assert f.read() == b'%PDF cached'
+        manager.shutdown()
+
+        assert generate.call_count == 1
+        assert cache.get_stats()['hits'] == 1
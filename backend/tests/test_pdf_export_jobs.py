@@ -6,11 +6,18 @@ Tests the async PDF generation system and job management.
 import pytest
 import tempfile
 import os
+import subprocess
+import sys
+import threading
+import time
 from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import update
 
 from chordme import app, db
 from chordme.models import User, Song, PDFExportJob
-from chordme.pdf_job_manager import PDFJobManager
+from chordme.pdf_job_manager import JobCancelled, PDFJobManager, PDFJobScheduler
 
 
 class TestPDFExportJob:
@@ -378,4 +385,257 @@ class TestPDFJobManager:
         
         # Test empty title
         filename = job_manager._create_safe_filename("", "pdf")
-        assert filename == "song.pdf"
\ No newline at end of file
+        assert filename == "song.pdf"
+
+
+class TestPDFJobScheduler:
+    """Test cases for the bounded, prioritised job scheduler."""
+    
+    def run_until_idle(self, scheduler, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            stats = scheduler.get_stats()
+            if stats['queued'] == 0 and stats['running'] == 0:
+                return
+            time.sleep(0.01)
+        raise AssertionError("Scheduler did not finish its jobs")
+    
+    def test_priority_order(self):
+        """Single songs run before songbooks, songbooks before batches."""
+        order = []
+        gate = threading.Event()
+        
+        def run_job(job_id, cancel_event):
+            if job_id == 1:
+                gate.wait(5)
+            order.append(job_id)
+        
+        scheduler = PDFJobScheduler(run_job, workers=1, render_processes=0, max_jobs_per_user=5)
+        scheduler.submit(1, 1, 'batch')
+        time.sleep(0.05)
+        for job_id, job_type in [(2, 'batch'), (3, 'multi_song'), (4, 'single'), (5, 'batch'), (6, 'single')]:
+            scheduler.submit(job_id, 1, job_type)
+        gate.set()
+        self.run_until_idle(scheduler)
+        scheduler.shutdown()
+        
+        assert order == [1, 4, 6, 3, 2, 5]
+    
+    def test_per_user_cap(self):
+        """A user's extra jobs wait while other users' jobs run."""
+        running = []
+        peak = {}
+        lock = threading.Lock()
+        
+        def run_job(job_id, cancel_event):
+            user_id = job_id // 10
+            with lock:
+                running.append(user_id)
+                peak[user_id] = max(peak.get(user_id, 0), running.count(user_id))
+            time.sleep(0.05)
+            with lock:
+                running.remove(user_id)
+        
+        scheduler = PDFJobScheduler(run_job, workers=4, render_processes=0, max_jobs_per_user=1)
+        for job_id in (10, 11, 12, 20, 21):
+            scheduler.submit(job_id, job_id // 10, 'single')
+        self.run_until_idle(scheduler)
+        scheduler.shutdown()
+        
+        assert peak == {1: 1, 2: 1}
+        assert scheduler.stats['completed'] == 5
+    
+    def test_cancel_queued_job(self):
+        """Cancelled jobs are dropped from the queue without running."""
+        ran = []
+        gate = threading.Event()
+        
+        def run_job(job_id, cancel_event):
+            if job_id == 1:
+                gate.wait(5)
+            ran.append(job_id)
+        
+        scheduler = PDFJobScheduler(run_job, workers=1, render_processes=0)
+        scheduler.submit(1, 1, 'single')
+        scheduler.submit(2, 2, 'single')
+        assert scheduler.cancel(2) is True
+        assert scheduler.cancel(99) is False
+        gate.set()
+        self.run_until_idle(scheduler)
+        scheduler.shutdown()
+        
+        assert ran == [1]
+        assert scheduler.stats['cancelled'] == 1
+    
+    def test_duplicate_submit_runs_once(self):
+        """Queueing a job_id twice runs it once and keeps the worker alive."""
+        ran = []
+        gate = threading.Event()
+        
+        def run_job(job_id, cancel_event):
+            if job_id == 1:
+                gate.wait(5)
+            ran.append(job_id)
+        
+        scheduler = PDFJobScheduler(run_job, workers=1, render_processes=0)
+        scheduler.submit(1, 1, 'single')
+        scheduler.submit(2, 2, 'single')
+        scheduler.submit(2, 2, 'single')
+        scheduler.submit(3, 3, 'single')
+        gate.set()
+        self.run_until_idle(scheduler)
+        scheduler.shutdown()
+        
+        assert ran == [1, 2, 3]
+        assert scheduler.stats['completed'] == 3
+    
+    def test_cancel_stops_running_fan_out(self):
+        """Cancelling a running job stops its remaining renders."""
+        rendered = []
+        result = {}
+        
+        def render(i):
+            rendered.append(i)
+            if i == 3:
+                scheduler.cancel(1)
+            return i * i
+        
+        def run_job(job_id, cancel_event):
+            try:
+                for key, future in scheduler.render_ordered(render, ((i, (i,)) for i in range(100)),
+                                                            cancel_event, window=2):
+                    result.setdefault('squares', []).append(future.result())
+            except JobCancelled:
+                result['cancelled'] = True
+        
+        scheduler = PDFJobScheduler(run_job, workers=1, render_processes=0)
+        scheduler.submit(1, 1, 'batch')
+        self.run_until_idle(scheduler)
+        scheduler.shutdown()
+        
+        assert result['cancelled'] is True
+        assert len(rendered) < 10
+        assert result['squares'] == [0, 1]
+        assert scheduler.stats['cancelled'] == 1
+    
+    def test_render_ordered_across_processes(self):
+        """Renders fan out over the process pool and come back in order."""
+        scheduler = PDFJobScheduler(lambda job_id, cancel_event: None, render_processes=2)
+        try:
+            results = [(key, future.result()) for key, future in
+                       scheduler.render_ordered(pow, ((i, (i, 2)) for i in range(8)))]
+        finally:
+            scheduler.shutdown()
+        
+        assert results == [(i, i * i) for i in range(8)]
+    
+    def test_render_worker_does_not_boot_app(self):
+        """The render process entry points import the PDF modules without the app."""
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = (
+            "import sys, pdf_render_worker\n"
+            "pdf_render_worker.warm_pdf_generators()\n"
+            "pdf = pdf_render_worker.render_song_pdf("
+            "{'title': 'T', 'artist': 'A', 'content': '[C]La'}, {})\n"
+            "assert pdf.startswith(b'%PDF')\n"
+            "print(sorted(m for m in sys.modules if m.startswith('chordme')))\n"
+            "print('flask' in sys.modules)\n"
+        )
+        result = subprocess.run([sys.executable, '-c', script], cwd=backend_dir,
+                                capture_output=True, text=True, timeout=120)
+        
+        assert result.returncode == 0, result.stderr
+        modules, flask_loaded = result.stdout.strip().splitlines()[-2:]
+        assert 'chordme.api' not in modules
+        assert 'chordme.pdf_generator' in modules
+        assert flask_loaded == 'False'
+    
+    def test_manager_cancel_signals_scheduler(self, client):
+        """Cancelling through the manager also stops the running job."""
+        user = User(email='scheduler@test.com', password='TestPassword123!')
+        db.session.add(user)
+        db.session.commit()
+        job = PDFExportJob(user_id=user.id, job_type='single', song_ids=[1])
+        db.session.add(job)
+        db.session.commit()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = PDFJobManager()
+            manager.temp_dir = temp_dir
+            manager._scheduler = MagicMock()
+            
+            assert manager.cancel_job(job.id) is True
+            manager._scheduler.cancel.assert_called_once_with(job.id)
+            assert manager.get_job(job.id).status == 'cancelled'
+            
+            # A cancelled job is skipped if a worker picks it up afterwards
+            manager._process_job(job.id)
+            assert manager.get_job(job.id).started_at is None
+            manager._scheduler = None
+            manager.shutdown()
+        
+        db.session.delete(job)
+        db.session.commit()
+    
+    def test_cancel_from_another_process_stops_job(self, client):
+        """A cancel committed by another worker or instance reaches the local job."""
+        user = User(email='remote-cancel@test.com', password='TestPassword123!')
+        db.session.add(user)
+        db.session.commit()
+        jobs = [PDFExportJob(user_id=user.id, job_type='single', song_ids=[1]) for _ in range(2)]
+        db.session.add_all(jobs)
+        db.session.commit()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = PDFJobManager()
+            manager.temp_dir = temp_dir
+            manager._scheduler = MagicMock()
+            manager._scheduler.active_jobs.return_value = [job.id for job in jobs]
+            with db.engine.begin() as connection:
+                connection.execute(update(PDFExportJob).where(PDFExportJob.id == jobs[0].id)
+                                   .values(status='cancelled'))
+            
+            assert manager._sync_cancellations() == [jobs[0].id]
+            manager._scheduler.cancel.assert_called_once_with(jobs[0].id)
+            manager._scheduler = None
+            manager.shutdown()
+        
+        for job in jobs:
+            db.session.delete(job)
+        db.session.commit()
+    
+    def test_finish_does_not_overwrite_cancel(self, client):
+        """A job that finishes after its row was cancelled leaves the row cancelled."""
+        user = User(email='late-cancel@test.com', password='TestPassword123!')
+        db.session.add(user)
+        db.session.commit()
+        job = PDFExportJob(user_id=user.id, job_type='single', song_ids=[1])
+        db.session.add(job)
+        db.session.commit()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = PDFJobManager()
+            manager.temp_dir = temp_dir
+            output_path = os.path.join(temp_dir, 'late.pdf')
+            
+            def finish_after_cancel(running_job, cancel_event):
+                # The cancel lands after the last render, before the final write
+                with db.engine.begin() as connection:
+                    connection.execute(update(PDFExportJob).where(PDFExportJob.id == running_job.id)
+                                       .values(status='cancelled'))
+                with open(output_path, 'wb') as f:
+                    f.write(b'%PDF')
+                running_job.mark_completed(output_path, 'late.pdf', 4)
+            
+            with patch.object(manager, '_process_single_song_job', side_effect=finish_after_cancel):
+                manager._process_job(job.id, threading.Event())
+            
+            db.session.expire_all()
+            row = db.session.get(PDFExportJob, job.id)
+            assert row.status == 'cancelled'
+            assert row.output_file_path is None
+            assert not os.path.exists(output_path)
+            manager.shutdown()
+        
+        db.session.delete(job)
+        db.session.commit()
@@ -5,7 +5,9 @@ Unit tests for PDF generation utilities.
 import pytest
 from io import BytesIO
 from reportlab.lib.pagesizes import letter, A4, legal
-from chordme.pdf_generator import ChordProPDFGenerator, generate_song_pdf
+from chordme.pdf_generator import (
+    ChordProPDFGenerator, generate_song_pdf, get_pdf_generator, clear_generator_pool, warm_pdf_generators
+)
 from chordme.pdf_templates import get_template
 from chordme.pdf_template_schema import PDFTemplateConfig
 
@@ -369,6 +371,54 @@ The [Em]hour I [C]first be[G]lieved
         assert pdf_bytes.startswith(b'%PDF')
 
 
+class TestGeneratorPool:
+    """Test cases for the shared generator pool."""
+    
+    def setup_method(self):
+        clear_generator_pool()
+    
+    def test_same_options_share_a_generator(self):
+        """Test generators are reused per configuration."""
+        generator = get_pdf_generator(template_name='modern', font_size=12)
+        assert get_pdf_generator(font_size=12, template_name='modern') is generator
+        assert get_pdf_generator(template_name='modern', font_size=14) is not generator
+    
+    def test_customization_leaves_shared_template_unchanged(self):
+        """Test custom colors are applied to a copy of the template."""
+        template = get_template('classic')
+        original_color = template.colors.title
+        
+        generator = get_pdf_generator(template_name='classic', colors={'title': '#123456'})
+        assert generator.template.colors.title == '#123456'
+        assert get_template('classic').colors.title == original_color
+        assert generator.source_template is template
+    
+    def test_replaced_template_rebuilds_generator(self):
+        """Test a generator is rebuilt when its template is replaced."""
+        from chordme.pdf_templates import get_template_manager
+        manager = get_template_manager()
+        generator = get_pdf_generator(template_name='minimal')
+        original = manager._templates['minimal']
+        try:
+            manager._templates['minimal'] = PDFTemplateConfig.from_dict(original.to_dict())
+            assert get_pdf_generator(template_name='minimal') is not generator
+        finally:
+            manager._templates['minimal'] = original
+    
+    def test_pooled_generator_output_matches_fresh_generator(self):
+        """Test reused generators produce the same PDFs as fresh ones."""
+        content = "{title: Pooled}\n[C]Hello [G]world"
+        warm_pdf_generators()
+        first = generate_song_pdf(content, template_name='classic', include_chord_diagrams=True)
+        second = generate_song_pdf(content, template_name='classic', include_chord_diagrams=True)
+        fresh = ChordProPDFGenerator(
+            template_name='classic', include_chord_diagrams=True,
+            margins={'top': 1.0, 'bottom': 1.0, 'left': 1.0, 'right': 1.0},
+            colors={'title': '#000000', 'artist': '#555555', 'chords': '#333333', 'lyrics': '#000000'}
+        ).generate_pdf(content)
+        assert first == second == fresh
+
+
 class TestPDFContentValidation:
     """Test cases for validating PDF generation with specific content scenarios."""
     
@@ -0,0 +1,163 @@
+"""
+Tests for out-of-band PDF job progress reporting.
+"""
+
+import threading
+import pytest
+from unittest.mock import patch
+
+from chordme import db
+from chordme.models import User, Song, PDFExportJob
+from chordme.pdf_job_progress import PDFJobProgressChannel, PROGRESS_EVENT
+from chordme.utils import generate_jwt_token
+from chordme.websocket_server import websocket_server
+
+
+@pytest.fixture
+def job(client):
+    user = User(email='progress@test.com', password='password123')
+    db.session.add(user)
+    db.session.commit()
+    job = PDFExportJob(user_id=user.id, job_type='batch', song_ids=[1, 2, 3, 4])
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def row_of(job_id):
+    db.session.expire_all()
+    return db.session.get(PDFExportJob, job_id)
+
+
+class TestPDFJobProgressChannel:
+    """Test progress state, coarse row writes and pushes."""
+
+    def test_progress_is_held_without_writing_the_row(self, job):
+        channel = PDFJobProgressChannel(db_interval=3600)
+        job.update_progress(status='processing')
+        db.session.commit()
+        channel.transition(job)
+
+        for processed in range(1, 4):
+            channel.update(job, processed_count=processed)
+
+        assert channel.get(job.id)['processed_count'] == 3
+        assert channel.get(job.id)['progress'] == 75
+        assert row_of(job.id).processed_count == 0
+        assert channel.get_stats()['db_writes'] == 0
+
+    def test_row_is_written_at_the_interval(self, job):
+        channel = PDFJobProgressChannel(db_interval=0)
+        channel.update(job, processed_count=2)
+
+        assert row_of(job.id).processed_count == 2
+        assert channel.get_stats()['db_writes'] == 1
+
+    def test_final_transition_applies_progress_and_clears_state(self, job):
+        channel = PDFJobProgressChannel(db_interval=3600)
+        job.update_progress(status='processing')
+        channel.transition(job)
+        channel.update(job, processed_count=4)
+
+        channel.apply(job)
+        job.mark_completed('/tmp/out.zip', 'out.zip', 10)
+        db.session.commit()
+        channel.transition(job)
+
+        assert channel.get(job.id) is None
+        row = row_of(job.id)
+        assert (row.status, row.processed_count, row.progress) == ('completed', 4, 100)
+
+    def test_progress_is_pushed_to_owner(self, job):
+        channel = PDFJobProgressChannel(db_interval=3600)
+        with patch.object(websocket_server, 'emit_to_user') as emit_to_user:
+            channel.update(job, progress=40)
+
+        user_id, event, data = emit_to_user.call_args[0]
+        assert (user_id, event) == (job.user_id, PROGRESS_EVENT)
+        assert data['progress'] == 40
+        assert 'song_ids' not in data
+
+    def test_authenticated_sessions_receive_pushes(self, job):
+        token = generate_jwt_token(job.user_id)
+        with patch('chordme.websocket_server.rate_limiter') as rate_limiter:
+            rate_limiter.allow_request.return_value = True
+            sio = websocket_server.socketio.test_client(websocket_server.app, auth={'token': token})
+        try:
+            sio.get_received()
+            websocket_server.emit_to_user(job.user_id, PROGRESS_EVENT, {'id': job.id, 'progress': 10})
+            websocket_server.emit_to_user(job.user_id + 1, PROGRESS_EVENT, {'id': 0, 'progress': 99})
+
+            received = [event for event in sio.get_received() if event['name'] == PROGRESS_EVENT]
+            assert [event['args'][0] for event in received] == [{'id': job.id, 'progress': 10}]
+        finally:
+            sio.disconnect()
+
+
+class TestJobStatusEndpoint:
+    """Test the status endpoint answers running jobs from the channel."""
+
+    def test_running_job_status_comes_from_channel(self, client, job):
+        from chordme.pdf_job_progress import pdf_job_progress
+        headers = {'Authorization': f'Bearer {generate_jwt_token(job.user_id)}'}
+        job.update_progress(status='processing')
+        db.session.commit()
+        pdf_job_progress.transition(job)
+        pdf_job_progress.update(job, processed_count=1)
+
+        try:
+            with patch('chordme.pdf_job_manager.PDFJobManager.get_job') as get_job:
+                response = client.get(f'/api/v1/pdf/jobs/{job.id}', headers=headers)
+            assert response.status_code == 200
+            assert response.get_json()['data']['processed_count'] == 1
+            assert response.get_json()['data']['progress'] == 25
+            get_job.assert_not_called()
+
+            other = User(email='other-progress@test.com', password='password123')
+            db.session.add(other)
+            db.session.commit()
+            other_headers = {'Authorization': f'Bearer {generate_jwt_token(other.id)}'}
+            assert client.get(f'/api/v1/pdf/jobs/{job.id}', headers=other_headers).status_code == 403
+        finally:
+            job.update_progress(status='cancelled')
+            db.session.commit()
+            pdf_job_progress.transition(job)
+            db.session.delete(job)
+            db.session.commit()
+
+    def test_batch_job_commits_only_state_changes(self, client, tmp_path):
+        from chordme.pdf_job_manager import PDFJobManager, PDFJobScheduler
+        from chordme.pdf_job_progress import pdf_job_progress
+
+        user = User(email='batch-progress@test.com', password='password123')
+        db.session.add(user)
+        db.session.commit()
+        songs = [Song(f'Song {i}', user.id, f'[C]{i}') for i in range(5)]
+        db.session.add_all(songs)
+        db.session.commit()
+        job = PDFExportJob(user_id=user.id, job_type='batch', song_ids=[song.id for song in songs])
+        db.session.add(job)
+        db.session.commit()
+
+        manager = PDFJobManager()
+        manager.temp_dir = str(tmp_path)
+        manager._scheduler = PDFJobScheduler(manager._process_job, render_processes=0)
+        generate = lambda content, title, **options: b'%PDF'
+        commits = []
+        commit = db.session.commit
+        
+        def counting_commit():
+            commits.append(1)
+            commit()
+        
+        with patch('chordme.pdf_generator.generate_song_pdf', side_effect=generate), \
+                patch.object(pdf_job_progress, 'db_interval', 3600), \
+                patch.object(db.session, 'commit', counting_commit), \
+                client.application.test_request_context():
+            manager._process_job(job.id, threading.Event())
+        manager.shutdown()
+
+        row = row_of(job.id)
+        assert row.status == 'completed'
+        assert row.processed_count == 5
+        assert len(commits) < len(songs)
@@ -0,0 +1,144 @@
+"""
+Tests for resolving song permissions in bulk.
+"""
+
+import pytest
+from contextlib import contextmanager
+from unittest.mock import patch
+from sqlalchemy import event
+
+import chordme.pdf_job_manager
+from chordme import db
+from chordme.models import User, Song
+from chordme.permission_helpers import (
+    check_song_permission, resolve_song_permissions, first_denied_song, SecurityAuditLogger
+)
+from chordme.utils import generate_jwt_token
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def library(client):
+    owner = User(email='resolver-owner@test.com', password='password123')
+    reader = User(email='resolver-reader@test.com', password='password123')
+    db.session.add_all([owner, reader])
+    db.session.commit()
+
+    private = Song('Private', owner.id, '[C]private')
+    public = Song('Public', owner.id, '[C]public')
+    public.share_settings = 'public'
+    shared_read = Song('Shared Read', owner.id, '[C]read')
+    shared_read.add_shared_user(reader.id, 'read')
+    shared_edit = Song('Shared Edit', owner.id, '[C]edit')
+    shared_edit.add_shared_user(reader.id, 'edit')
+    shared_admin = Song('Shared Admin', owner.id, '[C]admin')
+    shared_admin.add_shared_user(reader.id, 'admin')
+    own = Song('Own', reader.id, '[C]own')
+    songs = [private, public, shared_read, shared_edit, shared_admin, own]
+    db.session.add_all(songs)
+    db.session.commit()
+    return owner, reader, songs
+
+
+class TestResolveSongPermissions:
+    """Test the bulk resolver against the per-song check."""
+
+    @pytest.mark.parametrize('level', ['read', 'edit', 'admin', 'unknown'])
+    def test_matches_check_song_permission(self, client, library, level):
+        owner, reader, songs = library
+        song_ids = [song.id for song in songs] + [99999]
+
+        with client.application.test_request_context():
+            for user in (owner, reader):
+                resolved = resolve_song_permissions(song_ids, user.id, level)
+                for song_id in song_ids:
+                    song, has_permission = check_song_permission(song_id, user.id, level)
+                    bulk_song, bulk_permission = resolved[song_id]
+                    assert (bulk_song is None, bulk_permission) == (song is None, has_permission)
+                    if song is not None:
+                        assert bulk_song.id == song.id
+
+    def test_runs_one_query_per_batch(self, client, library):
+        _, reader, songs = library
+        reader_id, song_ids = reader.id, [song.id for song in songs]
+        db.session.expire_all()
+
+        with client.application.test_request_context(), count_queries() as statements:
+            resolve_song_permissions(song_ids * 3, reader_id, 'read')
+        assert len(statements) == 1
+
+        db.session.expire_all()
+        with client.application.test_request_context(), count_queries() as statements, \
+                patch('chordme.permission_helpers.PERMISSION_BATCH_SIZE', 2):
+            resolve_song_permissions(song_ids, reader_id, 'read')
+        assert len(statements) == 3
+
+    def test_logs_one_aggregated_event(self, client, library):
+        _, reader, songs = library
+        private, public, shared_read = songs[:3]
+
+        with client.application.test_request_context(), \
+                patch.object(SecurityAuditLogger, 'log_security_event') as log_security_event:
+            resolved = resolve_song_permissions([public.id, private.id, shared_read.id, 99999],
+                                                reader.id, 'edit')
+
+        assert first_denied_song(resolved) == public.id
+        log_security_event.assert_called_once()
+        event_type, details = log_security_event.call_args[0]
+        assert event_type == 'BULK_SONG_ACCESS_ATTEMPT'
+        assert log_security_event.call_args[1]['severity'] == 'CRITICAL'
+        assert details['requested_count'] == 4
+        assert details['granted_count'] == 0
+        assert details['denied'] == {
+            str(public.id): 'insufficient_edit_permission',
+            str(private.id): 'no_access_permission',
+            str(shared_read.id): 'insufficient_edit_permission',
+            '99999': 'song_not_found'
+        }
+
+    def test_granted_songs_log_at_info(self, client, library):
+        owner, _, songs = library
+
+        with client.application.test_request_context(), \
+                patch.object(SecurityAuditLogger, 'log_security_event') as log_security_event:
+            resolved = resolve_song_permissions([song.id for song in songs[:5]], owner.id, 'admin')
+
+        assert first_denied_song(resolved) is None
+        assert log_security_event.call_args[1]['severity'] == 'INFO'
+
+
+class TestBatchExportPermissions:
+    """Test batch exports check permissions in bulk."""
+
+    def test_batch_export_reports_first_denied_song(self, client, library):
+        _, reader, songs = library
+        private, public = songs[:2]
+        headers = {'Authorization': f'Bearer {generate_jwt_token(reader.id)}'}
+
+        try:
+            # pdf_job_manager is imported up front so it binds the real function,
+            # not the mock; its own reference is patched alongside
+            with patch('chordme.permission_helpers.check_song_permission') as check, \
+                    patch('chordme.pdf_job_manager.check_song_permission') as job_check:
+                response = client.post('/api/v1/pdf/export/async/batch', headers=headers,
+                                       json={'song_ids': [public.id, private.id]})
+            assert response.status_code == 404
+            assert response.get_json()['error']['message'] == f"Song {private.id} not found or access denied"
+            check.assert_not_called()
+            job_check.assert_not_called()
+        finally:
+            Song.query.delete()
+            db.session.commit()
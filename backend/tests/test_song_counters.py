@@ -0,0 +1,160 @@
+"""
+Tests for write-behind song view and favorite counters.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy.dialects import postgresql
+
+from chordme import db
+from chordme.models import User, Song
+from chordme.etag_cache import generate_query_etag
+from chordme.query_cache import cached_model_dicts
+from chordme.song_counters import (
+    CounterDelta, SongCounterBuffer, apply_counter_deltas, counter_version_aggregates,
+    counter_version_columns
+)
+
+
+class TestSongCounterBuffer:
+    """Test buffering and batched flushing with the SQL backend."""
+
+    @pytest.fixture
+    def songs(self, client):
+        user = User(email='counter@test.com', password='password123')
+        db.session.add(user)
+        db.session.commit()
+        songs = [Song(title=f'Song {i}', user_id=user.id, content='[C]la') for i in range(3)]
+        db.session.add_all(songs)
+        db.session.commit()
+        return songs
+
+    def test_views_are_written_behind(self, songs):
+        buffer = SongCounterBuffer()
+        updated_at = songs[0].updated_at
+        seen = datetime(2026, 5, 1, 12)
+
+        for _ in range(3):
+            buffer.increment_view(songs[0].id, at=seen)
+        buffer.increment_view(songs[1].id, at=seen - timedelta(hours=1))
+        assert db.session.get(Song, songs[0].id).view_count == 0
+
+        assert buffer.flush() == {'flushed_songs': 2}
+        db.session.expire_all()
+        song = db.session.get(Song, songs[0].id)
+        assert song.view_count == 3
+        assert song.last_accessed == seen
+        assert song.updated_at == updated_at
+        assert db.session.get(Song, songs[1].id).view_count == 1
+        assert buffer.get_stats()['pending_songs'] == 0
+        assert buffer.flush() == {'flushed_songs': 0}
+
+    def test_last_accessed_never_moves_backwards(self, songs):
+        buffer = SongCounterBuffer()
+        buffer.increment_view(songs[0].id, at=datetime(2026, 5, 2))
+        buffer.flush()
+        buffer.increment_view(songs[0].id, at=datetime(2026, 5, 1))
+        buffer.flush()
+
+        db.session.expire_all()
+        assert db.session.get(Song, songs[0].id).last_accessed == datetime(2026, 5, 2)
+
+    def test_favorite_count_is_maintained_and_clamped(self, songs):
+        buffer = SongCounterBuffer()
+        buffer.add_favorite(songs[0].id)
+        buffer.add_favorite(songs[0].id)
+        buffer.add_favorite(songs[0].id, -1)
+        buffer.add_favorite(songs[1].id, -1)
+        buffer.flush()
+
+        db.session.expire_all()
+        assert db.session.get(Song, songs[0].id).favorite_count == 1
+        assert db.session.get(Song, songs[1].id).favorite_count == 0
+        assert db.session.get(Song, songs[0].id).view_count == 0
+
+    def test_failed_flush_keeps_deltas(self, songs):
+        buffer = SongCounterBuffer()
+        buffer.increment_view(songs[0].id)
+
+        with patch('chordme.song_counters.apply_counter_deltas', side_effect=RuntimeError('down')):
+            assert buffer.flush()['flushed_songs'] == 0
+        buffer.increment_view(songs[0].id)
+        stats = buffer.get_stats()
+        assert stats['failed_flushes'] == 1
+        assert stats['pending_songs'] == 1
+        assert stats['flush_lag_seconds'] >= 0
+
+        buffer.flush()
+        db.session.expire_all()
+        assert db.session.get(Song, songs[0].id).view_count == 2
+
+    def test_max_pending_forces_flush(self, songs):
+        buffer = SongCounterBuffer(max_pending=2)
+        buffer.increment_view(songs[0].id)
+        buffer.increment_view(songs[1].id)
+
+        assert buffer.get_stats()['pending_songs'] == 0
+        assert buffer.stats['flushes'] == 1
+
+    def test_flushed_views_feed_trending(self, songs):
+        buffer = SongCounterBuffer()
+        buffer.increment_view(songs[2].id)
+
+        with patch('chordme.trending.trending_engine.record_many') as record_many:
+            buffer.flush()
+
+        events = list(record_many.call_args[0][0])
+        assert [(event.song_id, event.event, event.count) for event in events] == [(songs[2].id, 'view', 1)]
+
+    def test_flushes_change_validators_and_fragments(self, songs):
+        buffer = SongCounterBuffer()
+        query = Song.query.filter(Song.id == songs[0].id)
+
+        def versions():
+            return db.session.query(Song.id, Song.updated_at, *counter_version_columns()).filter(
+                Song.id == songs[0].id).all()
+
+        etag = generate_query_etag(query, Song, counter_version_aggregates())
+        assert cached_model_dicts(Song, versions())[0]['view_count'] == 0
+
+        buffer.increment_view(songs[0].id)
+        buffer.flush()
+        db.session.expire_all()
+
+        assert generate_query_etag(query, Song, counter_version_aggregates()) != etag
+        assert cached_model_dicts(Song, versions())[0]['view_count'] == 1
+
+    def test_increment_view_count_uses_buffer(self, songs):
+        with patch('chordme.song_counters.song_counters.increment_view') as increment_view:
+            songs[0].increment_view_count()
+
+        increment_view.assert_called_once_with(songs[0].id)
+        assert songs[0] not in db.session.dirty
+
+
+class TestCounterStatements:
+    """Test the batched UPDATE statements."""
+
+    def test_postgresql_uses_update_from_values(self):
+        class FakeSession:
+            def __init__(self):
+                self.statements = []
+
+            def get_bind(self):
+                return type('Bind', (), {'dialect': postgresql.dialect()})()
+
+            def execute(self, statement, *args):
+                self.statements.append(statement)
+                return type('Result', (), {'rowcount': 2})()
+
+        session = FakeSession()
+        deltas = {1: CounterDelta(views=2), 2: CounterDelta(favorites=-1)}
+
+        assert apply_counter_deltas(session, deltas) == 2
+        assert len(session.statements) == 1
+        sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+        assert 'UPDATE songs SET' in sql
+        assert 'FROM (VALUES' in sql
+        assert 'updated_at=songs.updated_at' in sql
@@ -0,0 +1,265 @@
+"""
+Tests for the column-oriented song feature store used by music discovery.
+"""
+
+import random
+import pytest
+from collections import Counter
+
+from chordme import db
+from chordme.models import User, Song
+from chordme.music_discovery_service import MusicDiscoveryService
+from chordme.song_features import (
+    SongFeatureStore, get_song_feature_store, reset_song_feature_stores, sync_song_feature_store
+)
+
+
+GENRES = ['Rock', 'rock', 'Jazz', 'Pop', None]
+KEYS = ['C', 'G', 'D', 'F', None]
+DIFFICULTIES = ['easy', 'medium', 'hard', 'expert', None]
+TEMPOS = [None, 0, 70, 90, 120, 125, 180]
+
+
+def make_song(song_id, owner_id=1, **features):
+    song = Song(title=f'Song {song_id}', artist='Artist', content='[C]la', user_id=owner_id,
+                genre=features.get('genre'), song_key=features.get('song_key'),
+                tempo=features.get('tempo'), difficulty=features.get('difficulty'),
+                share_settings=features.get('share_settings', 'public'),
+                shared_with=features.get('shared_with'))
+    song.id = song_id
+    song.is_deleted = False
+    return song
+
+
+def ranking(item):
+    """Best first, ties in id order."""
+    return -item[1], item[0]
+
+
+def add_to_store(store, song):
+    store.upsert(song.id, song.user_id, song.genre, song.song_key, song.tempo, song.difficulty,
+                 song.share_settings, song.shared_with, song.is_deleted)
+
+
+@pytest.fixture
+def catalogue():
+    rng = random.Random(7)
+    songs = [
+        make_song(song_id, owner_id=rng.choice([1, 2, 3]), genre=rng.choice(GENRES),
+                  song_key=rng.choice(KEYS), tempo=rng.choice(TEMPOS),
+                  difficulty=rng.choice(DIFFICULTIES),
+                  share_settings=rng.choice(['public', 'private', 'private']),
+                  shared_with=rng.choice([[], [], [1], [2, 'friend@example.com']]))
+        for song_id in range(1, 301)
+    ]
+    store = SongFeatureStore(initial_capacity=16)
+    for song in songs:
+        add_to_store(store, song)
+    return store, {song.id: song for song in songs}
+
+
+class TestSongFeatureStore:
+    """Test that vectorized scoring matches the row-by-row implementation."""
+
+    def test_feature_similarity_matches_scalar(self, catalogue):
+        store, songs = catalogue
+
+        for reference in list(songs.values())[:25]:
+            expected = sorted(
+                ((song.id, MusicDiscoveryService._calculate_feature_similarity(reference, song))
+                 for song in songs.values()
+                 if song.id != reference.id and song.can_user_access(1)),
+                key=ranking
+            )
+            expected = [item for item in expected if item[1] > 0.1][:10]
+
+            result = store.similar_to(reference, 1, 10, threshold=0.1)
+
+            assert [song_id for song_id, _ in result] == [song_id for song_id, _ in expected]
+            assert [score for _, score in result] == pytest.approx([score for _, score in expected])
+
+    def test_content_similarity_matches_scalar(self, catalogue):
+        store, songs = catalogue
+        history = [{'song': songs[song_id]} for song_id in (3, 8, 15, 42)]
+        preferences = MusicDiscoveryService._analyze_user_preferences(history)
+        excluded = {item['song'].id for item in history}
+
+        expected = sorted(
+            ((song.id, MusicDiscoveryService._calculate_content_similarity(song, preferences))
+             for song in songs.values()
+             if song.user_id != 2 and song.id not in excluded and song.can_user_access(2)),
+            key=ranking
+        )
+        expected = [item for item in expected if item[1] > 0.3][:15]
+
+        result = store.match_preferences(preferences, 2, 15, exclude_ids=excluded)
+
+        assert [song_id for song_id, _ in result] == [song_id for song_id, _ in expected]
+        assert [score for _, score in result] == pytest.approx([score for _, score in expected])
+
+    def test_top_k_breaks_ties_by_id(self):
+        rng = random.Random(11)
+        songs = {}
+        store = SongFeatureStore(initial_capacity=16)
+        for song_id in rng.sample(range(1, 6001), 6000):
+            songs[song_id] = make_song(song_id, owner_id=rng.choice([1, 2]), genre=rng.choice(['Rock', 'Pop']),
+                                       song_key=rng.choice(['C', None]), tempo=rng.choice([None, 100, 120]),
+                                       difficulty=rng.choice(['easy', None]),
+                                       share_settings=rng.choice(['public', 'private']))
+            add_to_store(store, songs[song_id])
+        preferences = {'preferred_genres': Counter({'Rock': 2}), 'preferred_keys': Counter(),
+                       'preferred_difficulties': Counter(), 'average_tempo': None}
+
+        expected = sorted(
+            ((song.id, MusicDiscoveryService._calculate_content_similarity(song, preferences))
+             for song in songs.values() if song.user_id != 2 and song.can_user_access(2)),
+            key=ranking
+        )
+        result = store.match_preferences(preferences, 2, 25)
+        expected = [item for item in expected if item[1] > 0.3][:25]
+        assert [song_id for song_id, _ in result] == [song_id for song_id, _ in expected]
+        assert [score for _, score in result] == pytest.approx([score for _, score in expected])
+
+        reference = make_song(0, genre='rock', song_key='C', tempo=110, difficulty='easy')
+        expected = sorted(
+            ((song.id, MusicDiscoveryService._calculate_feature_similarity(reference, song))
+             for song in songs.values() if song.can_user_access(2)),
+            key=ranking
+        )
+        result = store.similar_to(reference, 2, 25, threshold=0.1)
+        expected = [item for item in expected if item[1] > 0.1][:25]
+        assert [song_id for song_id, _ in result] == [song_id for song_id, _ in expected]
+
+    def test_threshold_is_exclusive(self):
+        store = SongFeatureStore()
+        store.upsert(1, 1, 'Rock', None, None, None, 'public', [])
+
+        assert store.similar_to(make_song(99, genre='Rock'), 2, 5, threshold=0.4) == []
+        assert store.similar_to(make_song(99, genre='Rock'), 2, 5, threshold=0.3) == [(1, pytest.approx(0.4))]
+
+    def test_access_mask(self):
+        store = SongFeatureStore()
+        for song in (make_song(1, owner_id=5, genre='Rock', share_settings='private'),
+                     make_song(2, owner_id=6, genre='Rock', share_settings='private'),
+                     make_song(3, owner_id=6, genre='Rock', share_settings='private', shared_with=[5]),
+                     make_song(4, owner_id=6, genre='Rock', share_settings='public')):
+            add_to_store(store, song)
+        reference = make_song(99, genre='Rock')
+
+        assert sorted(song_id for song_id, _ in store.similar_to(reference, 5, 10, threshold=0)) == [1, 3, 4]
+        assert sorted(song_id for song_id, _ in store.similar_to(reference, 7, 10, threshold=0)) == [4]
+
+        store.upsert(3, 6, 'Rock', None, None, None, 'private', [])
+        store.discard(4)
+
+        assert sorted(song_id for song_id, _ in store.similar_to(reference, 5, 10, threshold=0)) == [1]
+
+    def test_top_k_is_best_first(self):
+        store = SongFeatureStore()
+        for song_id, tempo in enumerate([120, 60, 118, 125, 100, 121], start=1):
+            store.upsert(song_id, 1, 'Rock', 'C', tempo, 'easy', 'public', [])
+
+        result = store.similar_to(make_song(99, genre='Rock', song_key='C', tempo=120,
+                                            difficulty='easy'), 2, 3, threshold=0)
+
+        assert [song_id for song_id, _ in result] == [1, 6, 3]
+        assert store.similar_to(make_song(99, genre='Rock'), 2, 0) == []
+
+    def test_arrays_stay_compact(self):
+        store = SongFeatureStore(initial_capacity=16)
+        for song_id in range(1, 2001):
+            store.upsert(song_id, 1, f'Genre {song_id}', f'Key {song_id % 24}', 100, 'easy', 'public', [])
+
+        # ids, owners, tempo: 8 bytes; four int32 codes; flags and presence: 1 byte
+        assert store.bytes_per_row == 3 * 8 + 4 * 4 + 2
+        for name in SongFeatureStore.ARRAYS:
+            array = getattr(store, name)
+            assert array.ndim == 1 and array.shape == store.ids.shape
+        assert len(store.vocabularies['genre']) == 2000
+        assert store.similar_to(make_song(0, genre='genre 7'), 1, 5, threshold=0.3) == [(7, pytest.approx(0.4))]
+
+
+class TestFeatureStoreRefresh:
+    """Test building from the database and incremental refresh on commit."""
+
+    @pytest.fixture(autouse=True)
+    def no_store(self, app):
+        # The maintenance scheduler may have built one when the app started
+        reset_song_feature_stores()
+
+    def test_build_and_incremental_updates(self, app):
+        owner = User(email='owner@example.com', password='password123')
+        viewer = User(email='viewer@example.com', password='password123')
+        db.session.add_all([owner, viewer])
+        db.session.commit()
+        db.session.add_all([
+            Song(title='Rock 1', artist='A', content='[C]x', user_id=owner.id, genre='Rock',
+                 song_key='C', tempo=120, difficulty='easy', share_settings='public'),
+            Song(title='Private', artist='A', content='[C]x', user_id=owner.id, genre='Rock',
+                 song_key='C', tempo=120, difficulty='easy'),
+        ])
+        db.session.commit()
+        reference = Song(title='Ref', artist='B', content='[C]x', user_id=viewer.id, genre='rock',
+                         song_key='C', tempo=118, difficulty='easy')
+
+        assert get_song_feature_store() is None
+        assert sync_song_feature_store() == {'built': True, 'songs': 2, 'duration_ms': pytest.approx(0, abs=1e4)}
+        store = get_song_feature_store()
+        assert len(store) == 2
+        assert [s for s, _ in store.similar_to(reference, viewer.id, 5, threshold=0)] == [1]
+
+        db.session.add(Song(title='Rock 2', artist='A', content='[C]x', user_id=owner.id,
+                            genre='Rock', song_key='C', tempo=119, difficulty='easy',
+                            share_settings='public'))
+        private = Song.query.filter_by(title='Private').one()
+        private.add_shared_user(viewer.id)
+        db.session.commit()
+
+        assert get_song_feature_store() is store
+        assert sorted(s for s, _ in store.similar_to(reference, viewer.id, 5, threshold=0)) == [1, 2, 3]
+
+        Song.query.filter_by(title='Rock 1').one().soft_delete()
+        db.session.commit()
+
+        assert sorted(s for s, _ in store.similar_to(reference, viewer.id, 5, threshold=0)) == [2, 3]
+
+    def test_rollback_is_not_applied(self, app):
+        owner = User(email='owner@example.com', password='password123')
+        db.session.add(owner)
+        db.session.commit()
+        sync_song_feature_store()
+        store = get_song_feature_store()
+
+        db.session.add(Song(title='Rock', artist='A', content='[C]x', user_id=owner.id,
+                            genre='Rock', share_settings='public'))
+        db.session.flush()
+        db.session.rollback()
+
+        assert len(store) == 0
+
+    def test_service_uses_store(self, app):
+        owner = User(email='owner@example.com', password='password123')
+        viewer = User(email='viewer@example.com', password='password123')
+        db.session.add_all([owner, viewer])
+        db.session.commit()
+        songs = [Song(title=f'Rock {i}', artist='A', content='[C]x', user_id=owner.id,
+                      genre='Rock', difficulty='',
+                      share_settings='public' if i % 2 else 'private') for i in range(6)]
+        db.session.add_all(songs)
+        db.session.commit()
+        expected = [song for song in songs
+                    if song.id != songs[1].id and song.can_user_access(viewer.id)
+                    and MusicDiscoveryService._calculate_feature_similarity(songs[1], song) > 0.4]
+        user_songs = [{'song': songs[0]}]
+
+        # Row by row until the store is built, then from the store
+        for built in (False, True):
+            if built:
+                sync_song_feature_store()
+            assert (get_song_feature_store() is not None) == built
+
+            similar = MusicDiscoveryService._find_similar_by_features(songs[1], viewer.id, 10)
+            assert [item['song_id'] for item in similar] == [song.id for song in expected]
+
+            recommendations = MusicDiscoveryService._content_based_filtering(viewer.id, user_songs, 10)
+            assert {item['song_id'] for item in recommendations} == {songs[1].id, songs[3].id, songs[5].id}
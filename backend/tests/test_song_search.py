@@ -0,0 +1,206 @@
+"""
+Tests for the full-text song search engine.
+"""
+
+import pytest
+from datetime import datetime
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select, text
+
+from chordme.song_search import (
+    SQLiteFTS5Backend, compile_search_query, decode_search_cursor, encode_search_cursor,
+    get_search_backend, parse_search_query, register_search_index, reset_search_backend_cache,
+    search_fingerprint, to_fts5_match, to_tsquery
+)
+
+
+def compile_query(query):
+    return compile_search_query(parse_search_query(query))
+
+
+class TestQueryCompilation:
+    """Test translation of the parsed search syntax to native operators."""
+
+    def test_terms_are_required_prefixes(self):
+        compiled = compile_query('amazing grace')
+
+        assert to_tsquery(compiled) == 'amazing:* & grace:*'
+        assert to_fts5_match(compiled) == ('"amazing"* AND "grace"*', None)
+
+    def test_phrases_use_adjacency(self):
+        compiled = compile_query('"Amazing Grace" hymn')
+
+        assert to_tsquery(compiled) == '(amazing <-> grace) & hymn:*'
+        assert to_fts5_match(compiled) == ('"amazing grace" AND "hymn"*', None)
+
+    def test_or_terms_become_alternatives(self):
+        compiled = compile_query('rock OR blues')
+
+        assert to_tsquery(compiled) == '(rock:* | blues:*)'
+        assert to_fts5_match(compiled) == ('("rock"* OR "blues"*)', None)
+
+    def test_not_terms_are_excluded(self):
+        compiled = compile_query('love -sad NOT slow')
+
+        assert to_tsquery(compiled) == 'love:* & !sad & !slow'
+        assert to_fts5_match(compiled) == ('"love"* NOT ("sad" OR "slow")', None)
+
+    def test_only_exclusions(self):
+        compiled = compile_query('-sad')
+
+        assert not compiled.has_positive
+        assert to_fts5_match(compiled) == (None, '"sad"')
+
+    def test_operator_characters_are_stripped(self):
+        compiled = compile_query("rock:* & !roll | 'x'")
+
+        assert to_tsquery(compiled) == 'rock:* & roll:* & x:*'
+
+    def test_punctuation_only_query_is_empty(self):
+        assert compile_query('!!! ...').is_empty
+
+
+@pytest.fixture
+def songs_engine():
+    """In-memory SQLite database with a minimal songs table and its FTS index."""
+    metadata = MetaData()
+    songs = Table(
+        'songs', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('title', String),
+        Column('artist', String),
+        Column('lyrics', String),
+        Column('content', String),
+        Column('view_count', Integer, default=0),
+    )
+    register_search_index(songs)
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    reset_search_backend_cache()
+    yield engine, songs
+    reset_search_backend_cache()
+    metadata.drop_all(engine)
+
+
+def search(engine, songs, query):
+    backend = get_search_backend(engine)
+    model = type('SongModel', (), {
+        'id': songs.c.id, 'title': songs.c.title, 'artist': songs.c.artist,
+        'lyrics': songs.c.lyrics, 'content': songs.c.content, '__tablename__': 'songs',
+    })
+    statement, rank = backend.apply(select(songs.c.title), model, query)
+    if rank is not None:
+        statement = statement.order_by(rank.desc())
+    with engine.connect() as connection:
+        return connection.execute(statement).scalars().all()
+
+
+class TestSQLiteFullText:
+    """Test the FTS5 index, its triggers and ranking."""
+
+    def test_backend_detected(self, songs_engine):
+        engine, _ = songs_engine
+
+        assert isinstance(get_search_backend(engine), SQLiteFTS5Backend)
+
+    def test_title_outranks_lyrics(self, songs_engine):
+        engine, songs = songs_engine
+        with engine.begin() as connection:
+            connection.execute(songs.insert(), [
+                {'title': 'Morning Song', 'artist': 'Band', 'content': '[G]grace in the morning'},
+                {'title': 'Grace', 'artist': 'Choir', 'content': '[C]la la'},
+                {'title': 'Evening', 'artist': 'Grace Trio', 'content': '[D]night'},
+            ] + [{'title': f'Filler {i}', 'artist': 'Other', 'content': 'nothing'} for i in range(10)])
+
+        assert search(engine, songs, 'grace') == ['Grace', 'Evening', 'Morning Song']
+
+    def test_index_follows_updates_and_deletes(self, songs_engine):
+        engine, songs = songs_engine
+        with engine.begin() as connection:
+            connection.execute(songs.insert(), [{'id': 1, 'title': 'Wonderwall', 'content': ''}])
+            connection.execute(songs.update().where(songs.c.id == 1).values(title='Champagne'))
+
+        assert search(engine, songs, 'wonderwall') == []
+        assert search(engine, songs, 'champ') == ['Champagne']
+
+        with engine.begin() as connection:
+            connection.execute(songs.delete().where(songs.c.id == 1))
+
+        assert search(engine, songs, 'champagne') == []
+
+    def test_exclusion_only_query(self, songs_engine):
+        engine, songs = songs_engine
+        with engine.begin() as connection:
+            connection.execute(songs.insert(), [
+                {'title': 'Sad Song', 'content': ''},
+                {'title': 'Happy Song', 'content': ''},
+            ])
+
+        assert search(engine, songs, '-sad') == ['Happy Song']
+
+    def test_existing_database_is_indexed(self):
+        engine = create_engine('sqlite://')
+        with engine.begin() as connection:
+            connection.execute(text(
+                'CREATE TABLE songs (id INTEGER PRIMARY KEY, title TEXT, artist TEXT, '
+                'lyrics TEXT, content TEXT)'
+            ))
+            connection.execute(text("INSERT INTO songs (title, content) VALUES ('Yesterday', '')"))
+        reset_search_backend_cache()
+
+        songs = Table('songs', MetaData(), autoload_with=engine)
+        assert search(engine, songs, 'yesterday') == ['Yesterday']
+        reset_search_backend_cache()
+
+
+class TestSearchCursor:
+    """Test opaque keyset cursors."""
+
+    def test_round_trip(self):
+        fingerprint = search_fingerprint({'query': 'grace', 'user_id': '1'})
+        sort_key = [0.4375, 12, datetime(2024, 5, 1, 10, 30, 15, 123456), 42]
+
+        cursor = encode_search_cursor(sort_key, 120, fingerprint)
+
+        assert decode_search_cursor(cursor, fingerprint) == (sort_key, 120)
+
+    def test_rejects_cursor_from_other_search(self):
+        cursor = encode_search_cursor([3, datetime(2024, 1, 1), 7], 10,
+                                      search_fingerprint({'query': 'grace'}))
+
+        with pytest.raises(ValueError):
+            decode_search_cursor(cursor, search_fingerprint({'query': 'rock'}))
+
+    @pytest.mark.parametrize('cursor', ['not-a-cursor', '', 'eyJrIjoxfQ'])
+    def test_rejects_malformed_cursor(self, cursor):
+        with pytest.raises(ValueError):
+            decode_search_cursor(cursor, search_fingerprint({}))
+
+
+class TestKeysetPagination:
+    """Test that Song.search pages through every row exactly once."""
+
+    def test_null_view_counts_are_not_skipped(self, client):
+        from chordme import db
+        from chordme.models import User, Song
+
+        user = User(email='keyset@test.com', password='password123')
+        db.session.add(user)
+        db.session.commit()
+        songs = [Song(f'Keyset {i}', user.id, '[C]la') for i in range(5)]
+        db.session.add_all(songs)
+        db.session.commit()
+        Song.query.filter(Song.id.in_([songs[1].id, songs[3].id])).update(
+            {Song.view_count: None}, synchronize_session=False)
+        Song.query.filter(Song.id == songs[2].id).update({Song.view_count: 5}, synchronize_session=False)
+        db.session.commit()
+
+        seen, after = [], None
+        while True:
+            page = Song.search(user_id=user.id, limit=2, after=after).all()
+            if not page:
+                break
+            seen.extend(song.id for song in page)
+            after = Song.search_sort_key(page[-1])
+
+        assert sorted(seen) == sorted(song.id for song in songs)
+        assert seen[0] == songs[2].id
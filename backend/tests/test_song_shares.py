@@ -0,0 +1,154 @@
+"""
+Tests for the normalized song_shares table and SQL visibility predicates.
+"""
+
+import pytest
+
+from chordme import db
+from chordme.models import User, Song, SongShare
+from chordme.song_shares import shares_from_json, sync_song_shares
+from chordme.utils import generate_jwt_token
+
+
+def shares_of(song_id):
+    return {share.user_id: share.level for share in SongShare.query.filter_by(song_id=song_id)}
+
+
+@pytest.fixture
+def users(client):
+    users = [User(email=f'share{i}@test.com', password='password123') for i in range(3)]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+class TestDualWrite:
+    """Test that share rows follow the JSON sharing columns."""
+
+    def test_shares_from_json(self):
+        assert shares_from_json([1, 2, 'friend@test.com', True], {'1': 'edit', '2': 'owner'}) == \
+            {1: 'edit', 2: 'read'}
+        assert shares_from_json(None, None) == {}
+
+    def test_share_changes_are_written(self, users):
+        owner, editor, reader = users
+        song = Song('Shared', owner.id, '[C]la')
+        song.add_shared_user(editor.id, 'edit')
+        db.session.add(song)
+        db.session.commit()
+        assert shares_of(song.id) == {editor.id: 'edit'}
+        granted_at = SongShare.query.filter_by(song_id=song.id).one().created_at
+
+        song.add_shared_user(reader.id)
+        song.add_shared_user(editor.id, 'admin')
+        db.session.commit()
+        assert shares_of(song.id) == {editor.id: 'admin', reader.id: 'read'}
+        assert SongShare.query.filter_by(song_id=song.id, user_id=editor.id).one().created_at == granted_at
+
+        song.remove_shared_user(editor.id)
+        db.session.commit()
+        assert shares_of(song.id) == {reader.id: 'read'}
+
+    def test_assigned_columns_and_unknown_users(self, users):
+        owner, editor, _ = users
+        song = Song('Assigned', owner.id, '[C]la', shared_with=[editor.id, 99999, 'x@test.com'],
+                    permissions={str(editor.id): 'edit'})
+        db.session.add(song)
+        db.session.commit()
+        assert shares_of(song.id) == {editor.id: 'edit'}
+
+        song.shared_with = []
+        db.session.commit()
+        assert shares_of(song.id) == {}
+
+    def test_deleted_song_loses_shares(self, users):
+        owner, editor, _ = users
+        song = Song('Deleted', owner.id, '[C]la')
+        song.add_shared_user(editor.id)
+        db.session.add(song)
+        db.session.commit()
+        song_id = song.id
+
+        db.session.delete(song)
+        db.session.commit()
+        assert shares_of(song_id) == {}
+
+    def test_sync_backfills_and_repairs(self, users):
+        owner, editor, reader = users
+        song = Song('Legacy', owner.id, '[C]la')
+        db.session.add(song)
+        db.session.commit()
+        # Bulk update that bypasses the session hooks
+        Song.query.filter_by(id=song.id).update(
+            {'shared_with': [editor.id, reader.id], 'permissions': {str(reader.id): 'edit'}},
+            synchronize_session=False)
+        db.session.commit()
+        assert shares_of(song.id) == {}
+
+        stats = sync_song_shares(batch_size=1)
+        assert shares_of(song.id) == {editor.id: 'read', reader.id: 'edit'}
+        assert (stats['scanned'], stats['inserted']) == (1, 2)
+        assert sync_song_shares()['inserted'] == 0
+
+
+class TestVisibilityPredicates:
+    """Test the SQL predicates against the Python checks."""
+
+    @pytest.fixture
+    def songs(self, users):
+        owner, editor, reader = users
+        private = Song('Private', owner.id, '[C]a', artist='Band')
+        public = Song('Public', owner.id, '[C]b', artist='Band', share_settings='public')
+        shared = Song('Shared', owner.id, '[C]c', artist='Band')
+        shared.add_shared_user(reader.id, 'read')
+        shared.add_shared_user(editor.id, 'edit')
+        songs = [private, public, shared]
+        db.session.add_all(songs)
+        db.session.commit()
+        return songs
+
+    def test_accessible_to_matches_can_user_access(self, users, songs):
+        for user in users:
+            visible = {song.id for song in Song.query.filter(Song.accessible_to(user.id))}
+            assert visible == {song.id for song in songs if song.can_user_access(user.id)}
+
+    def test_shared_to_filters_levels(self, users, songs):
+        _, editor, reader = users
+        shared = songs[2]
+        assert [song.id for song in Song.query.filter(Song.shared_to(reader.id))] == [shared.id]
+        assert Song.query.filter(Song.shared_to(reader.id, ['edit', 'admin'])).count() == 0
+        assert Song.query.filter(Song.shared_to(editor.id, ['edit', 'admin'])).count() == 1
+
+    def test_search_includes_shared_songs(self, users, songs):
+        _, _, reader = users
+        shared = songs[2]
+        assert shared.id not in [song.id for song in Song.search(user_id=reader.id, include_public=False)]
+        assert [song.id for song in Song.search(user_id=reader.id, include_public=False,
+                                                include_shared=True)] == [shared.id]
+
+    def test_artist_exploration_filters_in_sql(self, client, users, songs):
+        from chordme.music_discovery_service import MusicDiscoveryService
+        _, _, reader = users
+        private, public, shared = songs
+        public.view_count = 5
+
+        with client.application.test_request_context():
+            result = MusicDiscoveryService.get_artist_exploration('Band', reader.id)
+        assert [song['id'] for song in result['songs']] == [public.id, shared.id]
+
+    def test_shared_songs_endpoint(self, client, users, songs):
+        _, editor, reader = users
+        shared = songs[2]
+
+        response = client.get('/api/v1/songs/shared',
+                              headers={'Authorization': f'Bearer {generate_jwt_token(reader.id)}'})
+        assert response.status_code == 200
+        assert [song['id'] for song in response.get_json()['data']['songs']] == [shared.id]
+
+        response = client.get('/api/v1/songs/shared?permission_level=edit',
+                              headers={'Authorization': f'Bearer {generate_jwt_token(reader.id)}'})
+        assert response.get_json()['data']['songs'] == []
+
+        response = client.get('/api/v1/songs/shared?permission_level=owner',
+                              headers={'Authorization': f'Bearer {generate_jwt_token(editor.id)}'})
+        assert response.status_code == 400
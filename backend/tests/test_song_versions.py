@@ -1,8 +1,12 @@
 """Tests for song version history functionality."""
 
 import pytest
+import random
 from chordme import db
 from chordme.models import User, Song, SongVersion
+from chordme.version_store import (
+    VersionStore, VersionStorageError, apply_delta, content_hash, diff_lines, encode_delta
+)
 import json
 
 
@@ -116,6 +120,106 @@ class TestSongVersionModel:
                 db.session.commit()
 
 
+class TestVersionStore:
+    """Test keyframe and delta storage of versions."""
+    
+    @pytest.fixture
+    def song(self, client):
+        user = User('store@example.com', 'password123')
+        db.session.add(user)
+        db.session.commit()
+        song = Song('Stored Song', user.id, '{title: Stored Song}\n[C]Line one\n[G]Line two\n')
+        db.session.add(song)
+        db.session.commit()
+        return song
+    
+    def edit(self, song, i):
+        lines = song.content.splitlines(keepends=True)
+        lines.insert(1 + i % 3, f'[Am]Added line {i}\n')
+        song.content = ''.join(lines)
+    
+    def test_delta_round_trip(self):
+        rng = random.Random(7)
+        words = ['[C]la', '[G]da', '[Am]dum', '{chorus}', '']
+        for _ in range(200):
+            old = '\n'.join(rng.choice(words) for _ in range(rng.randint(0, 12)))
+            new = '\n'.join(rng.choice(words) for _ in range(rng.randint(0, 12)))
+            new += rng.choice(['', '\n'])
+            assert apply_delta(old, diff_lines(old, new)) == new
+    
+    def test_keyframes_and_reconstruction(self, song):
+        store = VersionStore(keyframe_interval=5)
+        contents = []
+        for i in range(12):
+            contents.append(song.content)
+            store.snapshot(song, song.user_id)
+            self.edit(song, i)
+        db.session.commit()
+        store.clear_cache()
+        db.session.expire_all()
+        
+        versions = SongVersion.query.filter_by(song_id=song.id).order_by(SongVersion.version_number).all()
+        assert [v.keyframe_number for v in versions] == [1] * 5 + [6] * 5 + [11] * 2
+        assert [v.is_keyframe for v in versions].count(True) == 3
+        for version, content in zip(reversed(versions), reversed(contents)):
+            assert store.content_of(version) == content
+            assert version.content_size == len(content)
+        assert store.stats['deltas_applied'] == 9
+        
+        delta_size = sum(len(v.payload) for v in versions if not v.is_keyframe)
+        assert delta_size < sum(len(c) for c in contents) / 4
+    
+    def test_unchanged_snapshot_is_skipped(self, song):
+        store = VersionStore()
+        assert store.snapshot(song, song.user_id) is not None
+        db.session.commit()
+        
+        assert store.snapshot(song, song.user_id) is None
+        song.title = 'Renamed'
+        assert store.snapshot(song, song.user_id).version_number == 2
+    
+    def test_broken_chain_is_detected(self, song):
+        store = VersionStore()
+        for i in range(3):
+            store.snapshot(song, song.user_id)
+            self.edit(song, i)
+        db.session.commit()
+        store.clear_cache()
+        
+        first = SongVersion.query.filter_by(song_id=song.id, version_number=1).first()
+        second = SongVersion.query.filter_by(song_id=song.id, version_number=2).first()
+        latest = SongVersion.query.filter_by(song_id=song.id, version_number=3).first()
+        second.payload = encode_delta(store.content_of(first), 'Something else\n')
+        db.session.commit()
+        store.clear_cache()
+        with pytest.raises(VersionStorageError):
+            store.content_of(latest)
+        
+        db.session.delete(second)
+        db.session.commit()
+        store.clear_cache()
+        with pytest.raises(VersionStorageError):
+            store.content_of(latest)
+    
+    def test_compact_legacy_versions(self, song):
+        store = VersionStore(keyframe_interval=2)
+        for number in range(1, 4):
+            version = SongVersion(song.id, number, song.title, None, song.user_id)
+            version.legacy_content = f'{song.content}[D]Legacy {number}\n'
+            db.session.add(version)
+        db.session.commit()
+        
+        assert store.compact_legacy() == {'songs': 1, 'versions': 3}
+        store.clear_cache()
+        db.session.expire_all()
+        versions = SongVersion.query.filter_by(song_id=song.id).order_by(SongVersion.version_number).all()
+        assert [v.keyframe_number for v in versions] == [1, 1, 3]
+        assert all(v.legacy_content is None for v in versions)
+        assert store.content_of(versions[1]) == f'{song.content}[D]Legacy 2\n'
+        assert versions[1].content_hash == content_hash(store.content_of(versions[1]))
+        assert store.compact_legacy() == {'songs': 0, 'versions': 0}
+
+
 class TestVersionHistoryAPI:
     """Test version history API endpoints."""
     
@@ -159,6 +263,8 @@ class TestVersionHistoryAPI:
         assert version['title'] == 'Test Song'  # Original title before update
         assert version['version_number'] == 1
         assert 'created_at' in version
+        assert 'content' not in version  # Listings never load content
+        assert version['content_size'] > 0
     
     def test_get_specific_version(self, client, auth_headers, sample_song):
         """Test getting a specific version by ID."""
@@ -182,6 +288,7 @@ class TestVersionHistoryAPI:
         assert data['status'] == 'success'
         assert data['data']['id'] == version_id
         assert data['data']['title'] == 'Test Song'  # Original title
+        assert data['data']['content'] == sample_song['content']
     
     def test_restore_song_version(self, client, auth_headers, sample_song):
         """Test restoring a song to a previous version."""
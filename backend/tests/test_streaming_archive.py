@@ -0,0 +1,115 @@
+"""
+Tests for streaming ZIP exports.
+"""
+
+import io
+import threading
+import zipfile
+import pytest
+from unittest.mock import patch
+
+from chordme import db
+from chordme.models import User, Song, PDFExportJob
+from chordme.streaming_archive import iter_songs, stream_zip, unique_filename, write_zip
+
+
+class TestStreamZip:
+    """Test the archive writers."""
+
+    def test_entries_are_streamed_as_produced(self):
+        produced = []
+
+        def entries():
+            for i in range(50):
+                produced.append(i)
+                yield f'song-{i}.cho', (f'{{title: Song {i}}}\n' + f'[C]line {i}\n' * 200).encode('utf-8')
+
+        chunks = stream_zip(entries(), compression=zipfile.ZIP_STORED, chunk_size=4096)
+        first = next(chunks)
+        assert len(produced) < 50  # The first chunk is sent before later songs are read
+
+        data = first + b''.join(chunks)
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            assert archive.testzip() is None
+            assert len(archive.namelist()) == 50
+            assert archive.read('song-7.cho').decode('utf-8').startswith('{title: Song 7}')
+
+    def test_deflated_stream_matches_file_archive(self, tmp_path):
+        entries = [(f'{i}.txt', f'content {i}\n' * 100) for i in range(10)]
+        streamed = zipfile.ZipFile(io.BytesIO(b''.join(stream_zip(iter(entries)))))
+        path = str(tmp_path / 'export.zip')
+
+        assert write_zip(iter(entries), path) > 0
+        with zipfile.ZipFile(path) as written:
+            for name, content in entries:
+                assert streamed.read(name) == written.read(name) == content.encode('utf-8')
+
+    def test_empty_archive(self):
+        with zipfile.ZipFile(io.BytesIO(b''.join(stream_zip([])))) as archive:
+            assert archive.namelist() == []
+
+    def test_unique_filename(self):
+        used = set()
+        assert [unique_filename('Song.cho', used) for _ in range(3)] == ['Song.cho', 'Song_1.cho', 'Song_2.cho']
+
+
+class TestSongExports:
+    """Test the export endpoints and jobs that stream songs."""
+
+    @pytest.fixture
+    def user(self, client):
+        user = User(email='export@test.com', password='password123')
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def test_iter_songs_keeps_order_in_batches(self, user):
+        songs = [Song(f'Song {i}', user.id, f'[C]{i}') for i in range(5)]
+        db.session.add_all(songs)
+        db.session.commit()
+        song_ids = [songs[3].id, songs[0].id, 9999, songs[4].id, songs[1].id]
+
+        rows = list(iter_songs(song_ids, batch_size=2))
+        assert [row.id for row in rows] == [songs[3].id, songs[0].id, songs[4].id, songs[1].id]
+        assert rows[0].content == '[C]3'
+
+    def test_download_all_streams_songs(self, client, auth_token):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        assert client.get('/api/v1/songs/download-all', headers=headers).status_code == 404
+
+        for title in ('Same Title', 'Same Title', 'Other'):
+            client.post('/api/v1/songs', json={'title': title, 'content': '[C]la la'}, headers=headers)
+
+        response = client.get('/api/v1/songs/download-all', headers=headers)
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.headers['Content-Type'] == 'application/zip'
+
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            assert sorted(archive.namelist()) == ['Other.cho', 'Same-Title.cho', 'Same-Title_1.cho']
+            assert archive.read('Other.cho').decode('utf-8') == '{title: Other}\n[C]la la'
+
+    def test_batch_job_writes_zip_incrementally(self, client, user, tmp_path):
+        from chordme.pdf_job_manager import PDFJobManager, PDFJobScheduler
+
+        songs = [Song(f'Song {i}', user.id, f'[C]{i}') for i in range(3)]
+        db.session.add_all(songs)
+        db.session.commit()
+        job = PDFExportJob(user_id=user.id, job_type='batch', song_ids=[song.id for song in songs])
+        db.session.add(job)
+        db.session.commit()
+
+        manager = PDFJobManager()
+        manager.temp_dir = str(tmp_path)
+        manager._scheduler = PDFJobScheduler(manager._process_job, render_processes=0)
+        generate = lambda content, title, **options: f'%PDF {title}'.encode('utf-8')
+        with patch('chordme.pdf_generator.generate_song_pdf', side_effect=generate), \
+                client.application.test_request_context():
+            manager._process_batch_job(job, threading.Event())
+        manager.shutdown()
+
+        assert job.status == 'completed'
+        assert job.processed_count == 3
+        with zipfile.ZipFile(job.output_file_path) as archive:
+            assert archive.namelist() == ['Song-0.pdf', 'Song-1.pdf', 'Song-2.pdf']
+            assert archive.read('Song-2.pdf') == b'%PDF Song 2'
@@ -0,0 +1,177 @@
+"""
+Tests for the time-decayed trending engine.
+"""
+
+import math
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from chordme import db
+from chordme.models import User, Song, SongEngagementBucket, SongTrendingScore
+from chordme.music_discovery_service import MusicDiscoveryService
+from chordme.trending import (
+    EngagementEvent, TIMEFRAMES, TrendingEngine, bucket_start, genre_scope, window_start
+)
+
+
+NOW = datetime(2026, 3, 10, 12, 30)
+
+
+class TestTimeframes:
+    """Test the decay arithmetic."""
+
+    def test_log_scores_decay_exponentially(self):
+        spec = TIMEFRAMES['1d']
+        score = spec.log_score(4.0, NOW)
+
+        assert spec.decayed(score, NOW) == pytest.approx(4.0)
+        assert spec.decayed(score, NOW + spec.half_life) == pytest.approx(2.0)
+        # One view a full window ago is exactly at the prune threshold
+        assert spec.log_score(1.0, NOW - spec.window) == pytest.approx(spec.prune_threshold(NOW))
+
+    def test_buckets_and_windows(self):
+        assert bucket_start(NOW, 'hour') == datetime(2026, 3, 10, 12)
+        assert bucket_start(NOW, 'day') == datetime(2026, 3, 10)
+        assert window_start(TIMEFRAMES['1d'], NOW) == datetime(2026, 3, 9, 13)
+        assert window_start(TIMEFRAMES['7d'], NOW) == datetime(2026, 3, 4)
+
+    def test_genre_scope(self):
+        assert genre_scope(' Rock ') == genre_scope('rock') == 'genre:rock'
+        assert genre_scope('') is None
+        assert genre_scope(None) is None
+
+
+class TestTrendingEngine:
+    """Test recording and leaderboards with the SQL backend."""
+
+    @pytest.fixture
+    def songs(self, client):
+        user = User(email='trend@test.com', password='password123')
+        db.session.add(user)
+        db.session.commit()
+        songs = [Song(title=f'Song {i}', user_id=user.id, content='[C]la', genre=genre, share_settings='public')
+                 for i, genre in enumerate(['Rock', 'Rock', 'Jazz', None])]
+        db.session.add_all(songs)
+        db.session.commit()
+        return songs
+
+    def test_recent_activity_outranks_older_activity(self, songs):
+        engine = TrendingEngine()
+        engine.record_many([
+            EngagementEvent(songs[0].id, 'view', count=10, genre='Rock', at=NOW - timedelta(hours=12)),
+            EngagementEvent(songs[1].id, 'view', count=4, genre='Rock', at=NOW - timedelta(hours=1)),
+            EngagementEvent(songs[2].id, 'favorite', genre='Jazz', at=NOW),
+        ])
+
+        top = engine.top('1d', 10, now=NOW)
+        assert [song_id for song_id, _ in top] == [songs[2].id, songs[1].id, songs[0].id]
+        assert top[0][1] == pytest.approx(5.0)
+        assert top[2][1] == pytest.approx(10 * 2 ** -2)
+
+        assert [song_id for song_id, _ in engine.top('1d', 10, genre='rock', now=NOW)] == [songs[1].id, songs[0].id]
+        assert engine.top('1d', 1, now=NOW) == top[:1]
+
+    def test_increments_combine(self, songs):
+        engine = TrendingEngine()
+        for hours in (0, 3, 6):
+            engine.record(songs[0].id, 'view', genre='Rock', at=NOW - timedelta(hours=hours))
+
+        expected = sum(2 ** (-hours / 6) for hours in (0, 3, 6))
+        assert engine.top('1d', 1, now=NOW)[0][1] == pytest.approx(expected)
+        assert SongTrendingScore.query.filter_by(timeframe='1d', song_id=songs[0].id).count() == 2
+
+    def test_window_counts(self, songs):
+        engine = TrendingEngine()
+        engine.record_many([
+            EngagementEvent(songs[0].id, 'view', count=3, at=NOW),
+            EngagementEvent(songs[0].id, 'favorite', at=NOW - timedelta(hours=2)),
+            EngagementEvent(songs[0].id, 'performance', at=NOW - timedelta(days=3)),
+        ])
+
+        assert engine.window_counts([songs[0].id], '1d', now=NOW)[songs[0].id] == {
+            'views': 3, 'practices': 0, 'performances': 0, 'favorites': 1
+        }
+        assert engine.window_counts([songs[0].id], '7d', now=NOW)[songs[0].id]['performances'] == 1
+        assert SongEngagementBucket.query.filter_by(song_id=songs[0].id, granularity='day').count() == 2
+
+    def test_unknown_events_are_ignored(self, songs):
+        engine = TrendingEngine()
+
+        assert engine.record_many([EngagementEvent(songs[0].id, 'share'),
+                                   EngagementEvent(songs[0].id, 'view', count=0)]) == 0
+        assert SongEngagementBucket.query.count() == 0
+
+    def test_rebuild_matches_incremental_ranking(self, songs):
+        engine = TrendingEngine()
+        engine.record_many([
+            EngagementEvent(songs[0].id, 'view', count=2, genre='Rock', at=NOW - timedelta(days=5)),
+            EngagementEvent(songs[1].id, 'practice', genre='Rock', at=NOW - timedelta(days=1)),
+            EngagementEvent(songs[2].id, 'view', genre='Jazz', at=NOW),
+        ])
+        incremental = [song_id for song_id, _ in engine.top('7d', 10, now=NOW)]
+
+        details = engine.rebuild(now=NOW)
+        assert details['backend'] == 'sql'
+        assert [song_id for song_id, _ in engine.top('7d', 10, now=NOW)] == incremental
+        assert [song_id for song_id, _ in engine.top('7d', 10, genre='Jazz', now=NOW)] == [songs[2].id]
+
+    def test_prune_drops_inactive_songs_and_old_buckets(self, songs):
+        engine = TrendingEngine()
+        engine.record(songs[0].id, 'view', at=NOW - timedelta(days=2))
+        engine.record(songs[1].id, 'view', at=NOW)
+
+        details = engine.prune(now=NOW)
+        assert details['pruned_entries'] == 1
+        assert details['deleted_buckets'] == 1  # The two day old hourly bucket
+        assert [song_id for song_id, _ in engine.top('1d', 10, now=NOW)] == [songs[1].id]
+        assert [song_id for song_id, _ in engine.top('30d', 10, now=NOW)] == [songs[1].id, songs[0].id]
+
+    def test_service_reads_leaderboard(self, songs):
+        private = Song(title='Private', user_id=songs[0].user_id, content='[C]la', share_settings='private')
+        other = User(email='other@test.com', password='password123')
+        db.session.add_all([private, other])
+        db.session.commit()
+        engine = TrendingEngine()
+        engine.record_many([
+            EngagementEvent(private.id, 'favorite', count=10),
+            EngagementEvent(songs[1].id, 'view', count=3, genre='Rock'),
+            EngagementEvent(songs[2].id, 'view', genre='Jazz'),
+        ])
+
+        with patch('chordme.music_discovery_service.trending_engine', engine):
+            trending = MusicDiscoveryService.get_trending_songs(other.id, timeframe='1d', limit=5)
+            rock = MusicDiscoveryService.get_trending_songs(other.id, timeframe='1d', limit=5, genre='Rock')
+
+        assert [item['song_id'] for item in trending['trending_songs']] == [songs[1].id, songs[2].id]
+        assert trending['trending_songs'][0]['recent_activity']['views'] == 3
+        assert [item['song_id'] for item in rock['trending_songs']] == [songs[1].id]
+        assert rock['genre'] == 'Rock'
+
+
+class TestRedisLeaderboards:
+    """Test the Redis sorted set backend against a mocked client."""
+
+    def test_reads_and_writes_sorted_sets(self):
+        client = MagicMock()
+        spec = TIMEFRAMES['7d']
+        client.zrevrange.return_value = [(b'12', spec.log_score(3.0, NOW))]
+        engine = TrendingEngine(leaderboard_size=50)
+
+        with patch.object(engine, '_redis', return_value=client), \
+                patch.object(engine, '_redis_key', side_effect=lambda tf, scope: f"trending:{tf}:{scope}"), \
+                patch.object(engine, '_write_buckets') as write_buckets, \
+                patch('chordme.trending.db') as mock_db:
+            engine.record(12, 'view', count=3, genre='Rock', at=NOW)
+            top = engine.top('7d', 5, now=NOW)
+
+        write_buckets.assert_called_once()
+        script = client.register_script.return_value
+        keys = sorted(call.kwargs['keys'][0] for call in script.call_args_list)
+        assert keys == sorted(f"trending:{tf}:{scope}" for tf in TIMEFRAMES for scope in ('all', 'genre:rock'))
+        args = script.call_args_list[0].kwargs['args']
+        assert args[:2] == [50, 12]
+        client.pipeline.return_value.execute.assert_called_once()
+        client.zrevrange.assert_called_once_with('trending:7d:all', 0, 4, withscores=True)
+        assert top == [(12, pytest.approx(3.0))]
+        assert math.isfinite(float(args[2]))
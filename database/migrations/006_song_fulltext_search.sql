@@ -0,0 +1,18 @@
+-- ChordMe Database Migration Script
+-- Version: 006_song_fulltext_search
+-- Description: Weighted tsvector column with a GIN index for ranked full-text song search
+
+-- Weighted search document: title (A) > artist (B) > lyrics (C) > raw ChordPro content (D).
+-- A stored generated column is recomputed by PostgreSQL on every insert and update,
+-- after the BEFORE triggers from migration 003 have refreshed the lyrics column.
+ALTER TABLE songs ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(artist, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(lyrics, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(content, '')), 'D')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_songs_search_vector ON songs USING gin(search_vector);
+
+COMMENT ON COLUMN songs.search_vector IS 'Weighted full-text document used by Song.search (ts_rank weights D=0.1, C=0.2, B=0.4, A=1.0)';
@@ -0,0 +1,22 @@
+-- ChordMe Database Migration Script
+-- Version: 007_song_neighbors
+-- Description: Precomputed item-item collaborative filtering neighbours for music discovery
+
+-- Top cosine neighbours of each song over the user x song interaction matrix
+-- (favorites, practice/performance sessions, setlist performances and setlist membership).
+-- Rebuilt daily and patched incrementally from new interactions by the
+-- song_neighbors maintenance tasks; read by personalized recommendations.
+CREATE TABLE IF NOT EXISTS song_neighbors (
+    id SERIAL PRIMARY KEY,
+    song_id UUID NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+    neighbor_id UUID NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+    score REAL NOT NULL,
+    co_occurrences INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_song_neighbor UNIQUE (song_id, neighbor_id)
+);
+
+-- Recommendations read all neighbours of a user's songs, best first
+CREATE INDEX IF NOT EXISTS idx_song_neighbors_song_score ON song_neighbors(song_id, score DESC);
+
+COMMENT ON TABLE song_neighbors IS 'Item-item cosine neighbours of each song, maintained by chordme.item_similarity';
@@ -0,0 +1,38 @@
+-- ChordMe Database Migration Script
+-- Version: 008_song_trending
+-- Description: Bucketed engagement counters and decayed trending leaderboards for music discovery
+
+-- Views, favorites, practice and performance sessions per song and hour/day.
+-- Hourly buckets are kept for 2 days and daily buckets for 31 days by the
+-- prune_trending maintenance task.
+CREATE TABLE IF NOT EXISTS song_engagement_buckets (
+    id SERIAL PRIMARY KEY,
+    song_id UUID NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+    granularity VARCHAR(10) NOT NULL CHECK (granularity IN ('hour', 'day')),
+    bucket_start TIMESTAMP NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    favorites INTEGER NOT NULL DEFAULT 0,
+    practices INTEGER NOT NULL DEFAULT 0,
+    performances INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT unique_song_engagement_bucket UNIQUE (song_id, granularity, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_song_engagement_buckets_window ON song_engagement_buckets(granularity, bucket_start);
+
+-- Log-space exponentially decayed scores per timeframe ('1d', '7d', '30d') and
+-- scope ('all' or 'genre:<name>'). Only used when Redis is not configured;
+-- otherwise the leaderboards are Redis sorted sets.
+CREATE TABLE IF NOT EXISTS song_trending_scores (
+    id SERIAL PRIMARY KEY,
+    timeframe VARCHAR(10) NOT NULL,
+    scope VARCHAR(120) NOT NULL,
+    song_id UUID NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+    score DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_song_trending_score UNIQUE (timeframe, scope, song_id)
+);
+
+-- Top-N reads walk this index backwards
+CREATE INDEX IF NOT EXISTS idx_song_trending_scores_rank ON song_trending_scores(timeframe, scope, score DESC);
+
+COMMENT ON TABLE song_trending_scores IS 'Decayed trending leaderboards maintained by chordme.trending (SQL fallback for Redis sorted sets)';
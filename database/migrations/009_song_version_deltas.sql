@@ -0,0 +1,20 @@
+-- ChordMe Database Migration Script
+-- Version: 009_song_version_deltas
+-- Description: Store song versions as periodic keyframes and compressed line-level deltas
+
+-- Every SONG_VERSION_KEYFRAME_INTERVAL-th version stores its full content
+-- zlib compressed in payload (keyframe_number = version_number); the others
+-- store a compressed diff against the previous version. Existing rows keep
+-- their text in content until the compact_song_versions maintenance task
+-- re-encodes them.
+ALTER TABLE song_versions ALTER COLUMN content DROP NOT NULL;
+ALTER TABLE song_versions ADD COLUMN IF NOT EXISTS payload BYTEA;
+ALTER TABLE song_versions ADD COLUMN IF NOT EXISTS keyframe_number INTEGER;
+ALTER TABLE song_versions ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+ALTER TABLE song_versions ADD COLUMN IF NOT EXISTS content_size INTEGER;
+
+-- Lets the compaction task find songs with legacy full-text versions
+CREATE INDEX IF NOT EXISTS idx_song_versions_legacy ON song_versions(song_id) WHERE content_hash IS NULL;
+
+COMMENT ON COLUMN song_versions.payload IS 'zlib compressed keyframe text or JSON line delta against the previous version (chordme.version_store)';
+COMMENT ON COLUMN song_versions.content IS 'Full text of versions written before delta compression';
@@ -0,0 +1,42 @@
+-- ChordMe Database Migration Script
+-- Version: 010_song_shares
+-- Description: Normalized, indexed song shares replacing scans of the JSON sharing columns
+
+-- One row per user a song is shared with. Written alongside songs.shared_with
+-- and songs.permissions (chordme.song_shares), which remain the source of
+-- truth until every reader uses this table.
+CREATE TABLE IF NOT EXISTS song_shares (
+    id SERIAL PRIMARY KEY,
+    song_id UUID NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    level VARCHAR(10) NOT NULL DEFAULT 'read' CHECK (level IN ('read', 'edit', 'admin')),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_song_share UNIQUE (song_id, user_id)
+);
+
+-- "Shared with me" and visibility predicates look shares up by user
+CREATE INDEX IF NOT EXISTS idx_song_shares_user_song ON song_shares(user_id, song_id);
+CREATE INDEX IF NOT EXISTS idx_song_shares_user_level ON song_shares(user_id, level, song_id);
+
+-- Backfill from the JSON columns where they exist; the sync_song_shares
+-- maintenance task repeats this and repairs any later drift
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'songs' AND column_name = 'shared_with'
+    ) THEN
+        INSERT INTO song_shares (song_id, user_id, level)
+        SELECT s.id, u.id,
+               CASE WHEN s.permissions::json ->> u.id::text IN ('edit', 'admin')
+                    THEN s.permissions::json ->> u.id::text
+                    ELSE 'read' END
+        FROM songs s
+        CROSS JOIN LATERAL json_array_elements_text(s.shared_with::json) AS shared(user_ref)
+        JOIN users u ON u.id::text = shared.user_ref
+        WHERE json_typeof(s.shared_with::json) = 'array'
+        ON CONFLICT (song_id, user_id) DO NOTHING;
+    END IF;
+END $$;
+
+COMMENT ON TABLE song_shares IS 'Users each song is shared with and their permission level, dual-written by chordme.song_shares';
@@ -0,0 +1,22 @@
+-- ChordMe Database Migration Script
+-- Version: 011_security_audit_events
+-- Description: Security audit events written in batches by the audit pipeline's database sink
+
+-- Written only when AUDIT_SINKS includes 'database' (chordme.audit_pipeline).
+-- user_id has no foreign key so the audit trail outlives deleted users.
+CREATE TABLE IF NOT EXISTS security_audit_events (
+    id SERIAL PRIMARY KEY,
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    event_type VARCHAR(100) NOT NULL,
+    severity VARCHAR(10) NOT NULL DEFAULT 'INFO',
+    user_id UUID,
+    ip_address VARCHAR(45),
+    user_agent VARCHAR(500),
+    details JSONB
+);
+
+CREATE INDEX IF NOT EXISTS idx_security_audit_events_timestamp ON security_audit_events(timestamp);
+CREATE INDEX IF NOT EXISTS idx_security_audit_events_user ON security_audit_events(user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_security_audit_events_type ON security_audit_events(event_type, timestamp);
+
+COMMENT ON TABLE security_audit_events IS 'Security audit log, batch-inserted by chordme.audit_pipeline';
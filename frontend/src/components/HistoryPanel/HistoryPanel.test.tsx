@@ -11,6 +11,7 @@ vi.mock('./HistoryPanel.css', () => ({}));
 vi.mock('../../services/versionHistory', () => ({
   versionHistoryService: {
     getVersions: vi.fn(),
+    getVersion: vi.fn(),
     restoreVersion: vi.fn(),
     formatVersionForDisplay: vi.fn(),
   },
@@ -179,6 +180,32 @@ describe('HistoryPanel', () => {
     });
   });
 
+  it('loads version content for preview when the list omits it', async () => {
+    const onPreview = vi.fn();
+    vi.mocked(versionHistoryService.getVersions).mockResolvedValue(
+      mockVersions.map(({ content: _content, ...summary }) => summary)
+    );
+    vi.mocked(versionHistoryService.getVersion).mockResolvedValue(
+      mockVersions[0]
+    );
+    render(<HistoryPanel {...defaultProps} onPreview={onPreview} />);
+
+    await waitFor(() => {
+      expect(screen.getByText('Version 2')).toBeInTheDocument();
+    });
+
+    fireEvent.click(screen.getAllByText('Preview')[0]);
+
+    await waitFor(() => {
+      expect(versionHistoryService.getVersion).toHaveBeenCalledWith(
+        'test-song-123',
+        1
+      );
+      expect(onPreview).toHaveBeenCalledWith(mockVersions[0]);
+      expect(screen.getByText('Version 2 content')).toBeInTheDocument();
+    });
+  });
+
   it('handles restore button click with confirmation', async () => {
     const onRestore = vi.fn();
     render(<HistoryPanel {...defaultProps} onRestore={onRestore} />);
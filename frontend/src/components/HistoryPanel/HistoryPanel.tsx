@@ -1,6 +1,9 @@
 import React, { useState, useEffect } from 'react';
 import { versionHistoryService } from '../../services/versionHistory';
-import type { SongVersion } from '../../services/versionHistory';
+import type {
+  SongVersion,
+  SongVersionSummary,
+} from '../../services/versionHistory';
 import './HistoryPanel.css';
 
 interface HistoryPanelProps {
@@ -21,7 +24,7 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({
   onRestore,
   onPreview,
 }) => {
-  const [versions, setVersions] = useState<SongVersion[]>([]);
+  const [versions, setVersions] = useState<SongVersionSummary[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [selectedVersion, setSelectedVersion] = useState<SongVersion | null>(
@@ -50,7 +53,7 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({
     }
   };
 
-  const handleRestore = async (version: SongVersion) => {
+  const handleRestore = async (version: SongVersionSummary) => {
     if (
       window.confirm(
         `Are you sure you want to restore to version ${version.version_number}? This will create a new version with the restored content.`
@@ -58,8 +61,12 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({
     ) {
       setRestoring(version.id);
       try {
+        const fullVersion =
+          version.content !== undefined
+            ? (version as SongVersion)
+            : await versionHistoryService.getVersion(songId, version.id);
         await versionHistoryService.restoreVersion(songId, version.id);
-        onRestore(version);
+        onRestore(fullVersion);
         // Reload versions to show the new restoration
         await loadVersions();
       } catch (err) {
@@ -72,12 +79,28 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({
     }
   };
 
-  const handlePreview = (version: SongVersion) => {
-    setSelectedVersion(version);
-    onPreview(version);
+  const handlePreview = async (version: SongVersionSummary) => {
+    let fullVersion: SongVersion;
+    if (version.content !== undefined) {
+      fullVersion = version as SongVersion;
+    } else {
+      try {
+        fullVersion = await versionHistoryService.getVersion(
+          songId,
+          version.id
+        );
+      } catch (err) {
+        setError(
+          err instanceof Error ? err.message : 'Failed to load version'
+        );
+        return;
+      }
+    }
+    setSelectedVersion(fullVersion);
+    onPreview(fullVersion);
   };
 
-  const formatVersionDisplay = (version: SongVersion) => {
+  const formatVersionDisplay = (version: SongVersionSummary) => {
     return versionHistoryService.formatVersionForDisplay(version);
   };
 
@@ -191,7 +214,7 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({
                           <div className="version-preview">
                             <h4>Content Preview:</h4>
                             <pre className="content-preview">
-                              {version.content}
+                              {selectedVersion?.content}
                             </pre>
                           </div>
                         )}
@@ -8,13 +8,19 @@ export interface SongVersion {
   content: string;
   user_id: number;
   created_at: string;
+  content_size?: number;
 }
 
+// Version history listings omit content; fetch a single version to read it
+export type SongVersionSummary = Omit<SongVersion, 'content'> & {
+  content?: string;
+};
+
 export interface VersionHistoryResponse {
   status: string;
   message: string;
   data: {
-    versions: SongVersion[];
+    versions: SongVersionSummary[];
   };
 }
 
@@ -44,7 +50,7 @@ export class VersionHistoryService {
   /**
    * Get all versions for a song
    */
-  async getVersions(songId: string | number): Promise<SongVersion[]> {
+  async getVersions(songId: string | number): Promise<SongVersionSummary[]> {
     try {
       const response = await apiService.getSongVersions(songId);
       return response.data.versions;
@@ -88,7 +94,7 @@ export class VersionHistoryService {
   /**
    * Format a version for display in the history panel
    */
-  formatVersionForDisplay(version: SongVersion): {
+  formatVersionForDisplay(version: SongVersionSummary): {
     title: string;
     subtitle: string;
     timestamp: string;
@@ -101,7 +107,7 @@ export class VersionHistoryService {
       title: `Version ${version.version_number}`,
       subtitle: version.title,
       timestamp: relativeTime,
-      content: version.content,
+      content: version.content ?? '',
     };
   }
 